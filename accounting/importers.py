@@ -0,0 +1,99 @@
+"""Chart-of-accounts import for core.imports - replaces process_account_row()."""
+from django.utils import timezone
+
+from core.imports import Importer, RowError, cell, parse_bool, parse_choice, register
+
+from .models import Account, AccountCategory, AccountGroup
+
+IMPORTED_CATEGORY = dict(code='IMP', name='Imported')
+
+
+@register
+class AccountImporter(Importer):
+    """Columns: code/account_code, name/account_name, type/account_type, description,
+    balance_side, is_active, group_code/group.
+
+    Options (the import form's checkboxes): `update_existing` overwrites accounts whose
+    code already exists instead of reporting them; `create_groups` creates a group for
+    an unknown group code, under an 'Imported' category."""
+    name = 'accounts'
+    models = ('accounting.Account',)
+    update_fields = ['name', 'type', 'description', 'balance_side', 'is_active', 'group', 'updated_at']
+
+    def load(self):
+        self.groups = {g.code: g for g in AccountGroup.objects.filter(company=self.company)}
+        self.new_groups = {}
+        self.category = None
+
+    def key(self, row):
+        code = cell(row, 'code', 'account_code')
+        return str(code) if code != '' else None
+
+    def existing(self, keys):
+        return {a.code: a for a in Account.objects.filter(company=self.company, code__in=keys)}
+
+    def _group(self, group_code):
+        group = self.groups.get(group_code)
+        if group is None and self.option('create_groups'):
+            # Created in write(), ahead of the chunk's accounts.
+            group = AccountGroup(
+                company=self.company, code=group_code, name=f'Group {group_code}',
+                description='Imported account group',
+            )
+            self.groups[group_code] = self.new_groups[group_code] = group
+        return group
+
+    def build(self, row, current):
+        code = self.key(row)
+        name = cell(row, 'name', 'account_name')
+        if not code or not name:
+            raise RowError('Missing required fields: code and name')
+        group_code = cell(row, 'group_code', 'group')
+        group = self._group(str(group_code)) if group_code != '' else None
+        if group_code != '' and group is None:
+            raise RowError(f"Unknown account group '{group_code}' (tick 'create groups' to create it)")
+
+        account = current.get(code)
+        if account is not None and not self.option('update_existing'):
+            raise RowError(f"Account with code '{code}' already exists")
+        if account is None:
+            if group is None:
+                raise RowError('Missing account group - a new account needs group_code')
+            account = current[code] = Account(company=self.company, code=code)
+        account.name = name
+        account.type = parse_choice(cell(row, 'type', 'account_type'), Account.ACCOUNT_TYPES, 'account type', 'asset')
+        account.description = cell(row, 'description')
+        account.balance_side = parse_choice(cell(row, 'balance_side'), Account.BALANCE_SIDES, 'balance side', 'debit')
+        account.is_active = parse_bool(cell(row, 'is_active'))
+        if group is not None:
+            account.group = group
+        return account
+
+    def write(self, instances):
+        try:
+            self._write(instances)
+        except Exception:
+            # The chunk is rolled back - anything created for it has to be created
+            # again with the next chunk that needs it.
+            self.category = None
+            for group in self.new_groups.values():
+                group.pk, group._state.adding = None, True
+            raise
+        self.new_groups = {}
+
+    def _write(self, instances):
+        if self.new_groups:
+            if self.category is None:
+                self.category, _ = AccountCategory.objects.get_or_create(
+                    company=self.company, name=IMPORTED_CATEGORY['name'],
+                    defaults={'code': IMPORTED_CATEGORY['code']},
+                )
+            for group in self.new_groups.values():
+                group.category = self.category
+            AccountGroup.objects.bulk_create(self.new_groups.values())
+        now = timezone.now()
+        for account in instances:
+            account.updated_at = now
+        new = [a for a in instances if a.pk is None]
+        Account.objects.bulk_update([a for a in instances if a.pk is not None], self.update_fields)
+        Account.objects.bulk_create(new)
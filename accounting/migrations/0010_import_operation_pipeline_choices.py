@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0009_accountcategory_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importexportoperation',
+            name='data_type',
+            field=models.CharField(choices=[('accounts', 'Accounts'), ('groups', 'Account Groups'), ('chart', 'Chart of Accounts'), ('template', 'Account Template'), ('customers', 'Customers'), ('suppliers', 'Suppliers'), ('products', 'Products'), ('opening_stock', 'Opening Stock')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='importexportoperation',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('completed_with_errors', 'Completed with Errors'), ('failed', 'Failed')], default='pending', max_length=30),
+        ),
+    ]
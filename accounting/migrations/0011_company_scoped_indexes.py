@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0010_import_operation_pipeline_choices'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['company', 'date'], name='acct_entry_co_date_idx'),
+        ),
+    ]
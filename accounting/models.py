@@ -125,6 +125,12 @@ class JournalEntry(models.Model):
     def __str__(self):
         return f"Entry #{self.id} - {self.journal.name}"
 
+    class Meta:
+        # Trial balance / ledger / statement periods - see core/query_plans.py.
+        indexes = [
+            models.Index(fields=['company', 'date'], name='acct_entry_co_date_idx'),
+        ]
+
 class JournalItem(models.Model):
     entry = models.ForeignKey(JournalEntry, on_delete=models.CASCADE, related_name='items')
     account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='journal_items')
@@ -480,7 +486,8 @@ class AccountReconciliation(models.Model):
 
 
 class ImportExportOperation(models.Model):
-    """Track import/export operations"""
+    """Track import/export operations. Imports run in the background (core/imports.py),
+    which keeps record_count/success_count/error_count current after every chunk."""
     OPERATION_TYPES = [
         ('import', 'Import'),
         ('export', 'Export'),
@@ -491,12 +498,17 @@ class ImportExportOperation(models.Model):
         ('groups', 'Account Groups'),
         ('chart', 'Chart of Accounts'),
         ('template', 'Account Template'),
+        ('customers', 'Customers'),
+        ('suppliers', 'Suppliers'),
+        ('products', 'Products'),
+        ('opening_stock', 'Opening Stock'),
     ]
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
+        ('completed_with_errors', 'Completed with Errors'),
         ('failed', 'Failed'),
     ]
     
@@ -507,7 +519,7 @@ class ImportExportOperation(models.Model):
     record_count = models.IntegerField(default=0)
     success_count = models.IntegerField(default=0)
     error_count = models.IntegerField(default=0)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='pending')  # 'completed_with_errors' didn't fit in 20
     error_log = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -8,7 +8,7 @@ from .views import (
     account_types_ui, account_templates_ui, account_analysis_ui, account_reconciliation_ui,
     account_import_export_ui, coa_settings_ui,
     template_create, template_apply, reconciliation_create, reconciliation_detail,
-    settings_update, import_accounts, export_accounts,
+    settings_update, import_accounts, import_operation_status, export_accounts,
     api_chart_of_accounts, api_journal_entries, api_create_journal_entry,
     api_journal_entry_detail, api_update_journal_entry, api_delete_journal_entry,
     api_post_journal_entry, api_journal_templates, api_apply_journal_template,
@@ -53,6 +53,7 @@ urlpatterns = [
     path('import-export/', account_import_export_ui, name='account_import_export'),
     path('import-export/template/', template_create, name='template_import_export'),
     path('import-accounts/', import_accounts, name='import_accounts'),
+    path('import-export/operations/<int:pk>/status/', import_operation_status, name='import_operation_status'),
     path('export-accounts/', export_accounts, name='export_accounts'),
     path('import-export/template/', export_accounts, {'template_only': True}, name='export_template'),
     path('coa-settings/', coa_settings_ui, name='coa_settings'),
@@ -4,9 +4,11 @@ from django.contrib import messages
 from django.http import JsonResponse
 from .models import Account, AccountGroup, AccountCategory, Journal, JournalEntry, JournalItem, JournalTemplate, JournalTemplateItem
 from django.views.decorators.http import require_POST
-from django.db.models import Count, Sum, Q, F
+from django.db.models import Count, Sum, Q, F, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 from django.core.paginator import Paginator
 
 # Create your views here.
@@ -1742,219 +1744,54 @@ def settings_update(request):
 
 @login_required
 def import_accounts(request):
-    """Import accounts from file with support for CSV, Excel, and JSON"""
+    """Import accounts from a CSV, Excel or JSON file. The file is queued for the
+    background import pipeline (core/imports.py, accounting/importers.py) and this
+    returns straight away - progress shows up in the operation history."""
     if request.method == 'POST':
         try:
-            from .models import ImportExportOperation
-            import csv
-            import io
-            import json
-            
+            from core.imports import start_import
+
             uploaded_file = request.FILES.get('import_file')
             if not uploaded_file:
                 messages.error(request, 'Please select a file to import.')
                 return redirect('accounting:account_import_export')
-            
-            file_format = request.POST.get('file_format', 'csv')
-            import_type = request.POST.get('import_type', 'accounts')
-            
-            # Create import operation record
-            operation = ImportExportOperation.objects.create(
-                operation_type='import',
-                data_type=import_type,
-                file_name=uploaded_file.name,
-                file_format=file_format,
-                status='processing',
-                created_by=request.user
+
+            operation = start_import(
+                uploaded_file, 'accounts', request.user,
+                data_type=request.POST.get('import_type', 'accounts'),
+                file_format=request.POST.get('file_format'),
+                options=request.POST.dict(),
             )
-            
-            success_count = 0
-            error_count = 0
-            company = request.user.company
-            errors = []
-            
-            try:
-                if file_format == 'csv' or uploaded_file.name.endswith('.csv'):
-                    # Process CSV file
-                    file_content = uploaded_file.read().decode('utf-8')
-                    csv_data = csv.DictReader(io.StringIO(file_content))
-                    
-                    for row_num, row in enumerate(csv_data, start=2):
-                        try:
-                            success, error = process_account_row(row, company, request.POST)
-                            if success:
-                                success_count += 1
-                            else:
-                                error_count += 1
-                                errors.append(f"Row {row_num}: {error}")
-                        except Exception as e:
-                            error_count += 1
-                            errors.append(f"Row {row_num}: {str(e)}")
-                
-                elif file_format == 'excel' or uploaded_file.name.endswith(('.xlsx', '.xls')):
-                    # Process Excel file
-                    try:
-                        import openpyxl
-                        from openpyxl import load_workbook
-                        
-                        wb = load_workbook(uploaded_file)
-                        ws = wb.active
-                        
-                        # Get headers from first row
-                        headers = [cell.value for cell in ws[1]]
-                        
-                        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                            try:
-                                # Convert row to dictionary
-                                row_dict = {headers[i]: value for i, value in enumerate(row) if i < len(headers)}
-                                success, error = process_account_row(row_dict, company, request.POST)
-                                if success:
-                                    success_count += 1
-                                else:
-                                    error_count += 1
-                                    errors.append(f"Row {row_num}: {error}")
-                            except Exception as e:
-                                error_count += 1
-                                errors.append(f"Row {row_num}: {str(e)}")
-                                
-                    except ImportError:
-                        operation.status = 'failed'
-                        operation.error_log = 'openpyxl library not installed. Please install it to process Excel files.'
-                        operation.save()
-                        messages.error(request, 'Excel processing not available. Please install openpyxl library.')
-                        return redirect('accounting:account_import_export')
-                
-                elif file_format == 'json' or uploaded_file.name.endswith('.json'):
-                    # Process JSON file
-                    file_content = uploaded_file.read().decode('utf-8')
-                    json_data = json.loads(file_content)
-                    
-                    if isinstance(json_data, list):
-                        accounts_data = json_data
-                    elif isinstance(json_data, dict) and 'accounts' in json_data:
-                        accounts_data = json_data['accounts']
-                    else:
-                        raise ValueError("Invalid JSON format. Expected list of accounts or object with 'accounts' key.")
-                    
-                    for row_num, account_data in enumerate(accounts_data, start=1):
-                        try:
-                            success, error = process_account_row(account_data, company, request.POST)
-                            if success:
-                                success_count += 1
-                            else:
-                                error_count += 1
-                                errors.append(f"Account {row_num}: {error}")
-                        except Exception as e:
-                            error_count += 1
-                            errors.append(f"Account {row_num}: {str(e)}")
-                
-                else:
-                    operation.status = 'failed'
-                    operation.error_log = f'Unsupported file format: {file_format}'
-                    operation.save()
-                    messages.error(request, f'Unsupported file format: {file_format}. Supported formats: CSV, Excel (XLSX), JSON')
-                    return redirect('accounting:account_import_export')
-                
-                # Update operation
-                operation.record_count = success_count + error_count
-                operation.success_count = success_count
-                operation.error_count = error_count
-                operation.status = 'completed' if error_count == 0 else 'completed_with_errors'
-                operation.completed_at = timezone.now()
-                
-                if errors:
-                    operation.error_log = '\n'.join(errors[:10])  # Store first 10 errors
-                
-                operation.save()
-                
-                if error_count == 0:
-                    messages.success(request, f'Import completed successfully: {success_count} accounts imported.')
-                else:
-                    messages.warning(request, f'Import completed with issues: {success_count} accounts imported, {error_count} errors. Check the operation log for details.')
-                    
-            except Exception as e:
-                operation.status = 'failed'
-                operation.error_log = str(e)
-                operation.save()
-                messages.error(request, f'Import failed: {str(e)}')
-                
+            if operation.status in ('pending', 'processing'):
+                messages.info(request, f'Import of {operation.file_name} started - refresh the operation history for progress.')
+            elif operation.status == 'completed':
+                messages.success(request, f'Import completed successfully: {operation.success_count} accounts imported.')
+            elif operation.status == 'completed_with_errors':
+                messages.warning(request, f'Import completed with issues: {operation.success_count} accounts imported, {operation.error_count} errors. Check the operation log for details.')
+            else:
+                messages.error(request, f'Import failed: {operation.error_log}')
+
         except Exception as e:
             messages.error(request, f'Error processing import: {str(e)}')
-    
+
     return redirect('accounting:account_import_export')
 
 
-def process_account_row(row_data, company, form_data):
-    """Process a single account row from import data"""
-    try:
-        # Required fields
-        code = row_data.get('code') or row_data.get('account_code')
-        name = row_data.get('name') or row_data.get('account_name')
-        account_type = row_data.get('type') or row_data.get('account_type', 'asset')
-        
-        if not code or not name:
-            return False, "Missing required fields: code and name"
-        
-        # Optional fields
-        description = row_data.get('description', '')
-        balance_side = row_data.get('balance_side', 'debit')
-        is_active = str(row_data.get('is_active', 'true')).lower() in ['true', '1', 'yes', 'active']
-        group_code = row_data.get('group_code') or row_data.get('group')
-        
-        # Find or create account group
-        group = None
-        if group_code and form_data.get('create_groups') == 'on':
-            # Create category if needed
-            category, _ = AccountCategory.objects.get_or_create(
-                company=company,
-                name='Imported',
-                defaults={'code': 'IMP'}
-            )
-            
-            # Create group if needed
-            group, _ = AccountGroup.objects.get_or_create(
-                company=company,
-                code=group_code,
-                defaults={
-                    'name': f'Group {group_code}', 
-                    'category': category,
-                    'description': 'Imported account group'
-                }
-            )
-        
-        # Check for existing account
-        existing_account = Account.objects.filter(company=company, code=code).first()
-        
-        if existing_account:
-            if form_data.get('update_existing') == 'on':
-                # Update existing account
-                existing_account.name = name
-                existing_account.type = account_type
-                existing_account.description = description
-                existing_account.balance_side = balance_side
-                existing_account.is_active = is_active
-                if group:
-                    existing_account.group = group
-                existing_account.save()
-                return True, None
-            else:
-                return False, f"Account with code '{code}' already exists"
-        else:
-            # Create new account
-            Account.objects.create(
-                company=company,
-                code=code,
-                name=name,
-                type=account_type,
-                balance_side=balance_side,
-                group=group,
-                description=description,
-                is_active=is_active
-            )
-            return True, None
-            
-    except Exception as e:
-        return False, str(e)
+@login_required
+def import_operation_status(request, pk):
+    """Progress of one import/export operation, for polling from the import pages."""
+    from .models import ImportExportOperation
+
+    operation = get_object_or_404(ImportExportOperation, pk=pk, created_by__company=request.user.company)
+    return JsonResponse({
+        'id': operation.pk,
+        'status': operation.status,
+        'record_count': operation.record_count,
+        'success_count': operation.success_count,
+        'error_count': operation.error_count,
+        'error_log': operation.error_log,
+        'completed_at': operation.completed_at,
+    })
 
 
 @login_required
@@ -1962,7 +1799,6 @@ def export_accounts(request):
     """Export accounts to file with support for CSV, Excel, JSON, and PDF"""
     try:
         from .models import ImportExportOperation
-        import csv
         import json
         from django.http import HttpResponse
         
@@ -1996,138 +1832,55 @@ def export_accounts(request):
         if not include_inactive:
             accounts = accounts.filter(is_active=True)
         
-        if file_format == 'csv':
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="accounts_export.csv"'
-            
-            writer = csv.writer(response)
-            
-            # Write headers
-            headers = ['code', 'name', 'type', 'balance_side', 'description', 'is_active']
-            if include_groups:
-                headers.extend(['group_code', 'group_name'])
-            if include_balances:
-                headers.append('current_balance')
-            
-            writer.writerow(headers)
-            
-            # Write data
-            for account in accounts:
-                row = [
-                    account.code,
-                    account.name,
-                    account.type,
-                    account.balance_side,
-                    account.description,
-                    account.is_active
-                ]
-                
-                if include_groups:
-                    row.extend([
-                        account.group.code if account.group else '',
-                        account.group.name if account.group else ''
-                    ])
-                
-                if include_balances:
-                    balance = calculate_account_balance(account)
-                    row.append(balance)
-                
-                writer.writerow(row)
-            
-            operation.record_count = accounts.count()
-            operation.success_count = accounts.count()
-            operation.status = 'completed'
-            operation.completed_at = timezone.now()
-            operation.file_name = 'accounts_export.csv'
-            operation.save()
-            
-            return response
-            
-        elif file_format == 'excel':
-            try:
-                import openpyxl
-                from openpyxl import Workbook
-                from openpyxl.styles import Font, PatternFill
-                from django.http import HttpResponse
-                import io
-                
-                wb = Workbook()
-                ws = wb.active
-                ws.title = "Chart of Accounts"
-                
-                # Headers
-                headers = ['Code', 'Name', 'Type', 'Balance Side', 'Description', 'Active']
-                if include_groups:
-                    headers.extend(['Group Code', 'Group Name'])
-                if include_balances:
-                    headers.append('Current Balance')
-                
-                # Style headers
-                header_font = Font(bold=True)
-                header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                
-                # Write data
-                for row_num, account in enumerate(accounts, 2):
-                    data = [
-                        account.code,
-                        account.name,
-                        account.get_type_display(),
-                        account.get_balance_side_display(),
-                        account.description,
-                        'Yes' if account.is_active else 'No'
-                    ]
-                    
-                    if include_groups:
-                        data.extend([
-                            account.group.code if account.group else '',
-                            account.group.name if account.group else ''
-                        ])
-                    
-                    if include_balances:
-                        balance = calculate_account_balance(account)
-                        data.append(balance)
-                    
-                    for col, value in enumerate(data, 1):
-                        ws.cell(row=row_num, column=col, value=value)
-                
-                # Auto-adjust column widths
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-                
-                # Save to response
-                output = io.BytesIO()
-                wb.save(output)
-                output.seek(0)
-                
-                response = HttpResponse(
-                    output.getvalue(),
-                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                response['Content-Disposition'] = 'attachment; filename="accounts_export.xlsx"'
-                
-                operation.record_count = accounts.count()
-                operation.success_count = accounts.count()
+        if include_groups:
+            accounts = accounts.select_related('group')
+        if include_balances:
+            # One grouped join instead of calculate_account_balance()'s two aggregate
+            # queries per exported account.
+            accounts = accounts.annotate(
+                total_debit=Coalesce(Sum('journal_items__debit'), Value(Decimal('0'))),
+                total_credit=Coalesce(Sum('journal_items__credit'), Value(Decimal('0'))),
+            )
+
+        def balance(account):
+            if account.balance_side == 'debit':
+                return account.total_debit - account.total_credit
+            return account.total_credit - account.total_debit
+
+        def finish_operation(file_name):
+            def on_finish(count):
+                operation.record_count = operation.success_count = count
                 operation.status = 'completed'
                 operation.completed_at = timezone.now()
-                operation.file_name = 'accounts_export.xlsx'
+                operation.file_name = file_name
                 operation.save()
-                
-                return response
-                
+            return on_finish
+
+        if file_format in ('csv', 'excel'):
+            from core.exports import Column, Sheet, stream_csv, stream_xlsx
+
+            excel = file_format == 'excel'
+            columns = [
+                Column('Code' if excel else 'code', 'code'),
+                Column('Name' if excel else 'name', 'name', width=40),
+                Column('Type', 'get_type_display') if excel else Column('type', 'type'),
+                Column('Balance Side', 'get_balance_side_display') if excel else Column('balance_side', 'balance_side'),
+                Column('Description' if excel else 'description', 'description', width=50),
+                Column('Active', lambda a: 'Yes' if a.is_active else 'No') if excel else Column('is_active', 'is_active'),
+            ]
+            if include_groups:
+                columns += [
+                    Column('Group Code' if excel else 'group_code', 'group__code'),
+                    Column('Group Name' if excel else 'group_name', 'group__name', width=30),
+                ]
+            if include_balances:
+                columns.append(Column('Current Balance' if excel else 'current_balance', balance))
+            sheet = Sheet('Chart of Accounts', columns, accounts.order_by('code'))
+
+            if not excel:
+                return stream_csv('accounts_export.csv', sheet, finish_operation('accounts_export.csv'))
+            try:
+                return stream_xlsx('accounts_export.xlsx', [sheet], finish_operation('accounts_export.xlsx'))
             except ImportError:
                 operation.status = 'failed'
                 operation.error_log = 'openpyxl library not installed'
@@ -2156,7 +1909,7 @@ def export_accounts(request):
                     }
                 
                 if include_balances:
-                    account_data['current_balance'] = float(calculate_account_balance(account))
+                    account_data['current_balance'] = float(balance(account))
                 
                 accounts_data.append(account_data)
             
@@ -2199,13 +1952,13 @@ def export_accounts(request):
                 total_credit_balance = 0
                 
                 for account in accounts:
-                    balance = calculate_account_balance(account) if include_balances else 0
-                    debit_balance = balance if account.balance_side == 'debit' and balance > 0 else 0
-                    credit_balance = balance if account.balance_side == 'credit' and balance > 0 else 0
+                    account_balance = balance(account) if include_balances else 0
+                    debit_balance = account_balance if account.balance_side == 'debit' and account_balance > 0 else 0
+                    credit_balance = account_balance if account.balance_side == 'credit' and account_balance > 0 else 0
                     
                     accounts_with_balances.append({
                         'account': account,
-                        'balance': balance,
+                        'balance': account_balance,
                         'debit_balance': debit_balance,
                         'credit_balance': credit_balance
                     })
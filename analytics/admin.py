@@ -1,3 +1,22 @@
 from django.contrib import admin
+from unfold.admin import ModelAdmin
+from .models import DailySalesFact, DailyProductSales, SalesFactState
 
-# Register your models here.
+
+@admin.register(DailySalesFact)
+class DailySalesFactAdmin(ModelAdmin):
+    list_display = ('date', 'company', 'revenue', 'cogs', 'expenses', 'invoice_count', 'updated_at')
+    list_filter = ('company',)
+    date_hierarchy = 'date'
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(ModelAdmin):
+    list_display = ('date', 'company', 'product', 'quantity', 'revenue')
+    search_fields = ('product__name',)
+    list_filter = ('company',)
+
+
+@admin.register(SalesFactState)
+class SalesFactStateAdmin(ModelAdmin):
+    list_display = ('company', 'built_at')
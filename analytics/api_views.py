@@ -3,30 +3,31 @@ from datetime import timedelta
 from rest_framework import permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Sum, Count, F
+from django.db.models import Sum, F
 from django.utils import timezone
 
-from sales.models import Invoice, InvoiceItem
-from inventory.models import StockItem, StockMovement
+from inventory.models import StockItem
 from crm.models import CustomerLedger
 from purchase.models import SupplierLedger, Bill
 from products.models import ProductTracking
-from accounting.models import Expense
 
-REVENUE_STATUSES = ['sent', 'paid', 'partially_paid']
+from .facts import ensure_built
+from .models import DailyProductSales, DailySalesFact
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
     """Shop-relevant dashboard numbers: today's sales, outstanding balances, low stock,
-    pending vendor receipts. Company-scoped."""
+    pending vendor receipts. Company-scoped. Today's sales come from the daily fact
+    table (analytics/facts.py)."""
     company = request.user.company
     today = timezone.now().date()
 
-    todays_invoices = Invoice.objects.filter(company=company, invoice_date=today, status__in=REVENUE_STATUSES)
-    todays_sales_total = todays_invoices.aggregate(total=Sum('total'))['total'] or 0
-    todays_sales_count = todays_invoices.count()
+    ensure_built(company)
+    todays_fact = DailySalesFact.objects.filter(company=company, date=today).first()
+    todays_sales_total = todays_fact.revenue if todays_fact else 0
+    todays_sales_count = todays_fact.invoice_count if todays_fact else 0
 
     customer_outstanding = CustomerLedger.objects.filter(company=company).aggregate(
         total_debit=Sum('debit_amount'), total_credit=Sum('credit_amount')
@@ -62,7 +63,12 @@ def profit_report(request):
     beyond draft/cancelled) since a shop wants to know what it sold today, not just what
     was collected. COGS comes from StockMovement rows the sale flow already writes
     (movement_type='sale') rather than re-deriving it, so it can never drift from what
-    inventory valuation actually used.
+    inventory valuation actually used - inventory.costing rewrites each sale movement's
+    total_cost with the cost its item's valuation method (FIFO/LIFO/standard/average)
+    actually consumed.
+
+    Served from the per-day fact table (analytics/facts.py) - at most `days` rows -
+    rather than re-aggregating invoices, movements and expenses on every load.
     """
     company = request.user.company
     try:
@@ -73,32 +79,20 @@ def profit_report(request):
     today = timezone.now().date()
     start = today - timedelta(days=days - 1)
 
-    revenue_by_day = {
-        row['invoice_date']: row['total'] or 0
-        for row in Invoice.objects.filter(
-            company=company, invoice_date__gte=start, invoice_date__lte=today, status__in=REVENUE_STATUSES,
-        ).values('invoice_date').annotate(total=Sum('total'))
-    }
-    cogs_by_day = {
-        row['day']: row['total'] or 0
-        for row in StockMovement.objects.filter(
-            company=company, movement_type='sale', timestamp__date__gte=start, timestamp__date__lte=today,
-        ).annotate(day=F('timestamp__date')).values('day').annotate(total=Sum('total_cost'))
-    }
-    expenses_by_day = {
-        row['expense_date']: row['total'] or 0
-        for row in Expense.objects.filter(
-            company=company, expense_date__gte=start, expense_date__lte=today,
-        ).values('expense_date').annotate(total=Sum('amount'))
+    ensure_built(company)
+    facts = {
+        fact.date: fact
+        for fact in DailySalesFact.objects.filter(company=company, date__gte=start, date__lte=today)
     }
 
     days_out = []
     totals = {'revenue': 0, 'cogs': 0, 'expenses': 0}
     for i in range(days):
         d = start + timedelta(days=i)
-        revenue = revenue_by_day.get(d, 0)
-        cogs = cogs_by_day.get(d, 0)
-        expenses = expenses_by_day.get(d, 0)
+        fact = facts.get(d)
+        revenue = fact.revenue if fact else 0
+        cogs = fact.cogs if fact else 0
+        expenses = fact.expenses if fact else 0
         gross_profit = revenue - cogs
         net_profit = gross_profit - expenses
         totals['revenue'] += revenue
@@ -131,7 +125,8 @@ def profit_report(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def top_products(request):
-    """Best-selling products by revenue over the last `days` days (default 30)."""
+    """Best-selling products by revenue over the last `days` days (default 30), from the
+    per-day product sales facts."""
     company = request.user.company
     try:
         days = min(max(int(request.query_params.get('days', 30)), 1), 365)
@@ -145,13 +140,11 @@ def top_products(request):
     today = timezone.now().date()
     start = today - timedelta(days=days - 1)
 
+    ensure_built(company)
     rows = (
-        InvoiceItem.objects.filter(
-            invoice__company=company, invoice__invoice_date__gte=start, invoice__invoice_date__lte=today,
-            invoice__status__in=REVENUE_STATUSES,
-        )
+        DailyProductSales.objects.filter(company=company, date__gte=start, date__lte=today)
         .values('product__id', 'product__name')
-        .annotate(quantity_sold=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')))
+        .annotate(quantity_sold=Sum('quantity'), revenue=Sum('revenue'))
         .order_by('-revenue')[:limit]
     )
     return Response([
@@ -0,0 +1,13 @@
+"""Analytics dashboard headline metrics - see core/dashboard_metrics.py."""
+from django.db.models import Count, Q, Sum
+
+from core.dashboard_metrics import register
+
+MODULE = 'analytics'
+
+register(MODULE, 'total_sales', 'sales.SalesOrder', Count('id'))
+register(MODULE, 'total_revenue', 'sales.SalesOrder', Sum('total'))
+register(MODULE, 'total_inventory', 'inventory.StockItem', Count('id'))
+register(MODULE, 'total_accounts', 'accounting.Account', Count('id'))
+register(MODULE, 'total_employees', 'hr.Employee', Count('id'))
+register(MODULE, 'total_customers', 'crm.Partner', Count('id', filter=Q(is_customer=True)))
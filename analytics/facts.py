@@ -0,0 +1,230 @@
+"""
+Maintains the daily fact tables (analytics/models.py) that profit_report, top_products
+and dashboard_stats read, instead of re-aggregating Invoice/StockMovement/Expense from
+the raw tables on every dashboard load - a 365-day profit report used to be three
+grouped scans over a year of transactions (the COGS one through `timestamp__date`,
+which no index on timestamp can serve); it's now one range read of at most 365 rows.
+
+Incremental maintenance works at day granularity: a save/delete of an Invoice,
+InvoiceItem, sale StockMovement or Expense marks its (company, day) dirty - both the old
+and new day when an invoice/expense is re-dated - and once the surrounding transaction
+commits, each dirty day is recomputed from the source rows with a handful of aggregates
+bounded to that one day. A POS checkout that writes an invoice, its lines and their
+stock movements in one transaction therefore refreshes its day once, not once per row.
+Recomputing the day rather than applying +/- deltas means a status change, soft delete
+or cost rewrite can never leave the facts drifted from the source.
+
+`rebuild()` recomputes a company's whole history (or a date range) in a few grouped
+queries - `manage.py rebuild_sales_facts` runs it, and ensure_built() runs it once per
+company the first time its facts are read, since days untouched since this table was
+introduced would otherwise be missing. Anything that writes source rows without signals
+(queryset.update(), raw SQL, fixtures) needs a rebuild afterwards.
+"""
+import threading
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import DailyProductSales, DailySalesFact, SalesFactState
+
+REVENUE_STATUSES = ['sent', 'paid', 'partially_paid']
+
+_local = threading.local()
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    end = datetime.combine(day + timedelta(days=1), time.min)
+    if settings.USE_TZ:
+        start, end = timezone.make_aware(start), timezone.make_aware(end)
+    return start, end
+
+
+def _source_querysets(company_id):
+    from accounting.models import Expense
+    from inventory.models import StockMovement
+    from sales.models import Invoice, InvoiceItem
+    return (
+        Invoice.objects.filter(company_id=company_id, status__in=REVENUE_STATUSES),
+        StockMovement.objects.filter(company_id=company_id, movement_type='sale'),
+        Expense.objects.filter(company_id=company_id),
+        InvoiceItem.objects.filter(
+            invoice__company_id=company_id, invoice__status__in=REVENUE_STATUSES, invoice__is_deleted=False,
+        ),
+    )
+
+
+def refresh_day(company_id, day):
+    """Recomputes one (company, day) from the source tables."""
+    invoices, sales, expenses, items = _source_querysets(company_id)
+    start, end = _day_bounds(day)
+    inv = invoices.filter(invoice_date=day).aggregate(total=Sum('total'), count=Count('id'))
+    cogs = sales.filter(timestamp__gte=start, timestamp__lt=end).aggregate(total=Sum('total_cost'))['total']
+    spent = expenses.filter(expense_date=day).aggregate(total=Sum('amount'))['total']
+    products = [
+        DailyProductSales(company_id=company_id, date=day, product_id=row['product_id'], quantity=row['qty'], revenue=row['revenue'])
+        for row in items.filter(invoice__invoice_date=day).values('product_id').annotate(
+            qty=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')),
+        )
+    ]
+
+    with transaction.atomic():
+        DailyProductSales.objects.filter(company_id=company_id, date=day).delete()
+        DailyProductSales.objects.bulk_create(products)
+        if inv['count'] or cogs or spent:
+            DailySalesFact.objects.update_or_create(
+                company_id=company_id, date=day,
+                defaults=dict(revenue=inv['total'] or 0, cogs=cogs or 0, expenses=spent or 0, invoice_count=inv['count']),
+            )
+        else:
+            DailySalesFact.objects.filter(company_id=company_id, date=day).delete()
+
+
+def rebuild(company, start=None, end=None):
+    """Recomputes `company`'s facts for [start, end] (either bound optional) from scratch.
+    A full rebuild (no bounds) also marks the company built for ensure_built()."""
+    invoices, sales, expenses, items = _source_querysets(company.pk)
+    facts = {}
+
+    def fact(day):
+        if day not in facts:
+            facts[day] = DailySalesFact(company=company, date=day)
+        return facts[day]
+
+    def bounded(qs, field):
+        if start:
+            qs = qs.filter(**{f'{field}__gte': start})
+        if end:
+            qs = qs.filter(**{f'{field}__lte': end})
+        return qs
+
+    for row in bounded(invoices, 'invoice_date').values('invoice_date').annotate(total=Sum('total'), count=Count('id')):
+        fact(row['invoice_date']).revenue = row['total'] or 0
+        fact(row['invoice_date']).invoice_count = row['count']
+    for row in bounded(sales.annotate(day=TruncDate('timestamp')), 'day').values('day').annotate(total=Sum('total_cost')):
+        fact(row['day']).cogs = row['total'] or 0
+    for row in bounded(expenses, 'expense_date').values('expense_date').annotate(total=Sum('amount')):
+        fact(row['expense_date']).expenses = row['total'] or 0
+    products = [
+        DailyProductSales(company=company, date=row['invoice__invoice_date'], product_id=row['product_id'], quantity=row['qty'], revenue=row['revenue'])
+        for row in bounded(items, 'invoice__invoice_date').values('invoice__invoice_date', 'product_id').annotate(
+            qty=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price')),
+        )
+    ]
+
+    with transaction.atomic():
+        bounded(DailySalesFact.objects.filter(company=company), 'date').delete()
+        bounded(DailyProductSales.objects.filter(company=company), 'date').delete()
+        DailySalesFact.objects.bulk_create(facts.values(), batch_size=1000)
+        DailyProductSales.objects.bulk_create(products, batch_size=1000)
+        if start is None and end is None:
+            SalesFactState.objects.update_or_create(company=company, defaults={'built_at': timezone.now()})
+    return len(facts)
+
+
+def ensure_built(company):
+    """Runs the company's one full rebuild if it has never had one. Concurrent first
+    readers queue on the company row (FOR NO KEY UPDATE, which doesn't block inserts
+    referencing it), so exactly one of them rebuilds and the others find the state row
+    when they get the lock - no duplicate rebuild, no IntegrityError on the state.
+    `manage.py rebuild_sales_facts` after a deploy takes this off the first request."""
+    if SalesFactState.objects.filter(company=company).exists():
+        return
+    from user_auth.models import Company
+    with transaction.atomic():
+        Company.objects.select_for_update(no_key=True).filter(pk=company.pk).first()
+        if not SalesFactState.objects.filter(company=company).exists():
+            rebuild(company)
+
+
+# --- incremental maintenance -------------------------------------------------------
+
+def _pending():
+    if not hasattr(_local, 'days'):
+        _local.days, _local.invoice_ids = set(), set()
+    return _local.days, _local.invoice_ids
+
+
+def _schedule(days=(), invoice_ids=()):
+    pending_days, pending_invoices = _pending()
+    pending_days.update((c, d) for c, d in days if c and d)
+    pending_invoices.update(i for i in invoice_ids if i)
+    # Registered on every call: the first callback to run after commit drains the whole
+    # set and the rest find it empty. A rolled-back transaction's entries just ride
+    # along with the next commit - recomputing a day is always safe. robust=True: a
+    # failed refresh is logged, never raised into the already-committed write.
+    transaction.on_commit(_flush, robust=True)
+
+
+def _flush():
+    from sales.models import Invoice
+    days, invoice_ids = _pending()
+    if invoice_ids:
+        days.update(Invoice.all_objects.filter(pk__in=invoice_ids).values_list('company_id', 'invoice_date'))
+    pending = sorted(days)
+    days.clear()
+    invoice_ids.clear()
+    for company_id, day in pending:
+        refresh_day(company_id, day)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _remember_day(sender, instance, **kwargs):
+    field = 'invoice_date' if sender._meta.model_name == 'invoice' else 'expense_date'
+    instance._fact_day = (instance.__dict__.get('company_id'), _as_date(instance.__dict__.get(field)))
+
+
+def _invoice_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    _schedule(days=[getattr(instance, '_fact_day', (None, None)), (instance.company_id, instance.invoice_date)])
+    instance._fact_day = (instance.company_id, instance.invoice_date)
+
+
+def _expense_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    day = _as_date(instance.expense_date)
+    _schedule(days=[getattr(instance, '_fact_day', (None, None)), (instance.company_id, day)])
+    instance._fact_day = (instance.company_id, day)
+
+
+def _invoice_item_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    _schedule(invoice_ids=[instance.invoice_id])
+
+
+def _movement_changed(sender, instance, **kwargs):
+    if kwargs.get('raw') or instance.movement_type != 'sale' or not instance.timestamp:
+        return
+    _schedule(days=[(instance.company_id, _as_date(instance.timestamp))])
+
+
+def _movements_costed(sender, movements, **kwargs):
+    _schedule(days=[
+        (m.company_id, _as_date(m.timestamp)) for m in movements if m.movement_type == 'sale' and m.timestamp
+    ])
+
+
+def connect_signals():
+    from inventory.costing import movements_costed
+    for sender in ('sales.Invoice', 'accounting.Expense'):
+        post_init.connect(_remember_day, sender=sender, dispatch_uid=f'analytics_facts_init_{sender}')
+    for signal in (post_save, post_delete):
+        name = 'save' if signal is post_save else 'delete'
+        signal.connect(_invoice_changed, sender='sales.Invoice', dispatch_uid=f'analytics_facts_invoice_{name}')
+        signal.connect(_expense_changed, sender='accounting.Expense', dispatch_uid=f'analytics_facts_expense_{name}')
+        signal.connect(_invoice_item_changed, sender='sales.InvoiceItem', dispatch_uid=f'analytics_facts_item_{name}')
+        signal.connect(_movement_changed, sender='inventory.StockMovement', dispatch_uid=f'analytics_facts_movement_{name}')
+    movements_costed.connect(_movements_costed, dispatch_uid='analytics_facts_movements_costed')
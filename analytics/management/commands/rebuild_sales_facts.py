@@ -0,0 +1,42 @@
+"""
+Recomputes the daily sales/COGS/expense fact tables (analytics/facts.py) from the source
+tables - after a bulk import, a raw-SQL fix, or anything else that wrote invoices,
+stock movements or expenses without going through their save() signals.
+
+Usage: python manage.py rebuild_sales_facts
+       python manage.py rebuild_sales_facts --company 3
+       python manage.py rebuild_sales_facts --company 3 --since 2026-01-01
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.facts import rebuild
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-company daily analytics fact tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only this company id (default: every company).')
+        parser.add_argument('--since', help='Only rebuild days on or after this YYYY-MM-DD date.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a YYYY-MM-DD date.')
+
+        companies = Company.objects.order_by('id')
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+            if not companies.exists():
+                raise CommandError(f"No company with id {options['company']}.")
+
+        for company in companies:
+            days = rebuild(company, start=since)
+            self.stdout.write(f'{company.name}: {days} day(s) rebuilt')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0009_attribute_updated_at'),
+        ('user_auth', '0004_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesFactState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField()),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_fact_state', to='user_auth.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='user_auth.company')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'unique_together': {('company', 'date', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cogs', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales_facts', to='user_auth.company')),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('company', 'date')},
+            },
+        ),
+    ]
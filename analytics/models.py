@@ -1,3 +1,52 @@
+"""
+Pre-aggregated daily facts behind the analytics endpoints (analytics/api_views.py). Every
+row is derived - maintained by analytics/facts.py from Invoice/InvoiceItem/StockMovement/
+Expense saves and rebuildable at any time with `manage.py rebuild_sales_facts` - so none
+of these are ever edited by hand or synced between devices.
+"""
 from django.db import models
 
-# Create your models here.
+
+class DailySalesFact(models.Model):
+    """One row per (company, day) with any sales/COGS/expense activity."""
+    company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='daily_sales_facts')
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    cogs = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    invoice_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('company', 'date')
+        ordering = ['date']
+
+    def __str__(self):
+        return f'{self.company_id}:{self.date} revenue={self.revenue}'
+
+
+class DailyProductSales(models.Model):
+    """Units and line revenue (quantity x unit_price, same basis top_products has always
+    reported) per (company, day, product)."""
+    company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='daily_product_sales')
+    date = models.DateField()
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('company', 'date', 'product')
+
+    def __str__(self):
+        return f'{self.company_id}:{self.date} product={self.product_id} qty={self.quantity}'
+
+
+class SalesFactState(models.Model):
+    """Marks a company whose fact history has been fully built. Until it exists, the
+    incremental updates only cover days touched since deployment, so the endpoints
+    trigger one full rebuild first (facts.ensure_built())."""
+    company = models.OneToOneField('user_auth.Company', on_delete=models.CASCADE, related_name='sales_fact_state')
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.company_id} built {self.built_at}'
@@ -1,3 +1,62 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from user_auth.models import Company, Role, User
+from accounting.models import Expense
+from crm.models import Customer
+from sales.models import Invoice
+from analytics.facts import rebuild
+from analytics.models import DailySalesFact
+
+
+class DailySalesFactTests(TestCase):
+    """analytics.facts - incremental per-day maintenance and the endpoints reading it."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company,
+            role=Role.objects.create(name='Owner', level=1),
+        )
+        self.customer = Customer.objects.create(company=self.company, name='Walk-in')
+        self.today = date.today()
+
+    def _invoice(self, total, status='paid', day=None):
+        return Invoice.objects.create(
+            company=self.company, customer=self.customer, status=status, total=Decimal(total),
+            invoice_date=day or self.today,
+        )
+
+    def test_saves_refresh_their_day_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._invoice('100')
+            self._invoice('50', status='draft')
+            Expense.objects.create(company=self.company, category='rent', amount=Decimal('30'), expense_date=self.today)
+        fact = DailySalesFact.objects.get(company=self.company, date=self.today)
+        self.assertEqual((fact.revenue, fact.expenses, fact.invoice_count), (Decimal('100'), Decimal('30'), 1))
+
+    def test_redating_an_invoice_moves_it_between_days(self):
+        yesterday = self.today - timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = self._invoice('100')
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice.invoice_date = yesterday
+            invoice.save()
+        self.assertFalse(DailySalesFact.objects.filter(company=self.company, date=self.today).exists())
+        self.assertEqual(DailySalesFact.objects.get(company=self.company, date=yesterday).revenue, Decimal('100'))
+
+    def test_profit_report_reads_facts_and_builds_history_once(self):
+        # Written before the company was ever built, without any commit callbacks -
+        # ensure_built() must pick it up with a full rebuild on first read.
+        self._invoice('80', day=self.today - timedelta(days=2))
+        client = APIClient()
+        client.force_authenticate(user=self.owner)
+
+        data = client.get('/api/analytics/profit-report/?days=7').json()
 
-# Create your tests here.
+        self.assertEqual(Decimal(data['totals']['revenue']), Decimal('80'))
+        self.assertEqual(len(data['days']), 7)
+        self.assertEqual(rebuild(self.company), 1)
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum, F, Q
+from django.db.models import Count, F, Q
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
@@ -23,16 +23,6 @@ try:
 except ImportError:
     Account = None
 
-try:
-    from hr.models import Employee
-except ImportError:
-    Employee = None
-
-try:
-    from crm.models import Partner
-except ImportError:
-    Partner = None
-
 # Create your views here.
 
 @login_required
@@ -41,42 +31,10 @@ def analytics_dashboard(request):
     try:
         company = request.user.company
         
-        # Get metrics safely
-        total_sales = 0
-        total_inventory = 0
-        total_accounts = 0
-        total_employees = 0
-        total_customers = 0
-        
-        if SalesOrder:
-            try:
-                total_sales = SalesOrder.objects.filter(company=company).count()
-            except:
-                total_sales = 0
-        
-        if StockItem:
-            try:
-                total_inventory = StockItem.objects.filter(company=company).count()
-            except:
-                total_inventory = 0
-        
-        if Account:
-            try:
-                total_accounts = Account.objects.filter(company=company).count()
-            except:
-                total_accounts = 0
-        
-        if Employee:
-            try:
-                total_employees = Employee.objects.filter(company=company).count()
-            except:
-                total_employees = 0
-        
-        if Partner:
-            try:
-                total_customers = Partner.objects.filter(company=company, is_customer=True).count()
-            except:
-                total_customers = 0
+        # Headline counts - registered in analytics/dashboard_metrics.py, computed in one
+        # aggregate per model and cached (core/dashboard_metrics.py)
+        from core.dashboard_metrics import get_metrics
+        metrics = get_metrics('analytics', company)
 
         # Sales by month (safely)
         sales_by_month = []
@@ -93,11 +51,11 @@ def analytics_dashboard(request):
                 sales_by_month = []
 
         data = {
-            'total_sales': total_sales,
-            'total_inventory': total_inventory,
-            'total_accounts': total_accounts,
-            'total_employees': total_employees,
-            'total_customers': total_customers,
+            'total_sales': metrics['total_sales'],
+            'total_inventory': metrics['total_inventory'],
+            'total_accounts': metrics['total_accounts'],
+            'total_employees': metrics['total_employees'],
+            'total_customers': metrics['total_customers'],
             'sales_by_month': sales_by_month,
         }
         return JsonResponse(data)
@@ -110,57 +68,9 @@ def dashboard_ui(request):
     try:
         company = request.user.company
         
-        # Calculate key metrics
-        metrics = {
-            'total_sales': 0,
-            'total_revenue': 0,
-            'total_inventory': 0,
-            'total_employees': 0,
-            'total_customers': 0,
-            'total_accounts': 0,
-        }
-        
-        # Sales metrics
-        if SalesOrder:
-            try:
-                sales_orders = SalesOrder.objects.filter(company=company)
-                metrics['total_sales'] = sales_orders.count()
-                metrics['total_revenue'] = sales_orders.aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
-            except:
-                pass
-        
-        # Inventory metrics
-        if StockItem:
-            try:
-                metrics['total_inventory'] = StockItem.objects.filter(company=company).count()
-            except:
-                pass
-        
-        # Employee metrics
-        if Employee:
-            try:
-                metrics['total_employees'] = Employee.objects.filter(company=company).count()
-            except:
-                pass
-        
-        # Customer metrics
-        if Partner:
-            try:
-                metrics['total_customers'] = Partner.objects.filter(
-                    company=company, 
-                    is_customer=True
-                ).count()
-            except:
-                pass
-        
-        # Account metrics
-        if Account:
-            try:
-                metrics['total_accounts'] = Account.objects.filter(company=company).count()
-            except:
-                pass
+        # Key metrics - see analytics/dashboard_metrics.py
+        from core.dashboard_metrics import get_metrics
+        metrics = get_metrics('analytics', company)
         
         # Recent activity (placeholder)
         recent_sales = []
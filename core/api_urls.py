@@ -3,7 +3,7 @@ from .api_views import (
     health, global_search, lease_numbers, export_company_snapshot,
     desktop_setup_status, pair_desktop_with_production, sync_now, sync_status, register_device,
     sync_conflicts, discard_sync_conflict,
-    export_all_companies_backup, export_all_companies_backup_excel,
+    export_all_companies_backup, export_all_companies_backup_excel, query_instrumentation,
 )
 from .recycle_bin import recycle_bin_list, recycle_bin_restore, recycle_bin_purge, recycle_bin_empty
 
@@ -21,6 +21,7 @@ urlpatterns = [
     path('sync-conflicts/<int:entry_id>/discard/', discard_sync_conflict, name='core-discard-sync-conflict'),
     path('export-backup/', export_all_companies_backup, name='core-export-backup'),
     path('export-backup/excel/', export_all_companies_backup_excel, name='core-export-backup-excel'),
+    path('instrumentation/', query_instrumentation, name='core-query-instrumentation'),
     path('recycle-bin/', recycle_bin_list, name='recycle-bin-list'),
     path('recycle-bin/restore/', recycle_bin_restore, name='recycle-bin-restore'),
     path('recycle-bin/purge/', recycle_bin_purge, name='recycle-bin-purge'),
@@ -111,72 +111,15 @@ def global_search(request):
     if not q or len(q) < 2:
         return Response({'error': 'q must be at least 2 characters.'}, status=400)
     company = request.user.company
-    results = []
-
-    from sales.models import Invoice, CreditNote, Payment
-    from purchase.models import Bill, PurchasePayment
-    from products.models import Product
-    from crm.models import Customer
-    from purchase.models import Supplier
-
-    for inv in Invoice.objects.filter(company=company, invoice_number__icontains=q).select_related('customer')[:10]:
-        results.append({
-            'type': 'invoice', 'id': inv.id, 'number': inv.invoice_number,
-            'label': f'Invoice {inv.invoice_number}',
-            'subtitle': inv.customer.name if inv.customer else 'Walk-in',
-        })
-
-    for bill in Bill.objects.filter(company=company, bill_number__icontains=q).select_related('supplier__partner')[:10]:
-        results.append({
-            'type': 'bill', 'id': bill.id, 'number': bill.bill_number,
-            'label': f'Bill {bill.bill_number}',
-            'subtitle': bill.supplier.partner.name if bill.supplier else '',
-        })
-
-    for cn in CreditNote.objects.filter(company=company, credit_number__icontains=q).select_related('customer')[:10]:
-        results.append({
-            'type': 'credit_note', 'id': cn.id, 'number': cn.credit_number,
-            'label': f'Credit Note {cn.credit_number}',
-            'subtitle': cn.customer.name if cn.customer else '',
-        })
-
-    for pay in Payment.objects.filter(company=company, payment_number__icontains=q).select_related('customer')[:10]:
-        results.append({
-            'type': 'payment', 'id': pay.id, 'number': pay.payment_number,
-            'label': f'Payment {pay.payment_number}',
-            'subtitle': pay.customer.name if pay.customer else '',
-        })
-
-    for pay in PurchasePayment.objects.filter(company=company, payment_number__icontains=q).select_related('supplier__partner')[:10]:
-        results.append({
-            'type': 'purchase_payment', 'id': pay.id, 'number': pay.payment_number,
-            'label': f'Vendor Payment {pay.payment_number}',
-            'subtitle': pay.supplier.partner.name if pay.supplier else '',
-        })
-
-    from django.db.models import Q
-    for p in Product.objects.filter(
-        Q(sku__icontains=q) | Q(name__icontains=q) | Q(barcode__icontains=q), company=company
-    )[:10]:
-        results.append({
-            'type': 'product', 'id': p.id, 'number': p.sku,
-            'label': p.name, 'subtitle': p.sku,
-        })
-
-    for c in Customer.objects.filter(Q(name__icontains=q) | Q(customer_code__icontains=q) | Q(phone__icontains=q), company=company)[:10]:
-        results.append({
-            'type': 'customer', 'id': c.id, 'number': c.customer_code,
-            'label': c.name, 'subtitle': c.customer_code,
-        })
-
-    for s in Supplier.objects.filter(
-        Q(partner__name__icontains=q) | Q(supplier_code__icontains=q), company=company
-    ).select_related('partner')[:10]:
-        results.append({
-            'type': 'supplier', 'id': s.id, 'number': s.supplier_code,
-            'label': s.partner.name, 'subtitle': s.supplier_code,
-        })
 
+    # One ranked query over the company's search documents (core/search.py) instead of
+    # one leading-wildcard scan per record type.
+    from core.search import ensure_built, search
+    ensure_built(company)
+    results = [
+        {'type': doc.doc_type, 'id': doc.object_id, 'number': doc.number, 'label': doc.label, 'subtitle': doc.subtitle}
+        for doc in search(company, q)
+    ]
     return Response({'results': results})
 
 
@@ -392,22 +335,32 @@ def export_all_companies_backup_excel(request):
     """Same data as export_all_companies_backup, rendered as a multi-sheet workbook
     for human review only - see core.excel_export's module docstring for why this is
     never a restore path."""
-    from django.http import HttpResponse
-    from core.excel_export import build_backup_workbook
-    import io
+    from core.excel_export import backup_sheets
+    from core.exports import stream_xlsx
+    from core.snapshot import all_companies_querysets
 
-    objects = export_all_companies_snapshot()
     try:
-        wb = build_backup_workbook(objects)
+        return stream_xlsx('mobile-corner-backup.xlsx', backup_sheets(all_companies_querysets()))
     except ImportError:
         return Response({'error': 'Excel export requires the openpyxl library, which is not installed.'}, status=500)
 
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-    )
-    response['Content-Disposition'] = 'attachment; filename="mobile-corner-backup.xlsx"'
-    return response
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsSuperuser])
+def query_instrumentation(request):
+    """This worker process's per-view query stats (core/instrumentation.py), worst
+    first by `sort` (default avg_queries), at most `limit` views (default 50). DELETE
+    clears them. Superuser-only - SQL fingerprints span every company's requests."""
+    from core.instrumentation import SORT_KEYS, config, store
+
+    if request.method == 'DELETE':
+        store.clear()
+        return Response(status=204)
+    sort = request.query_params.get('sort', 'avg_queries')
+    if sort not in SORT_KEYS:
+        return Response({'error': f"sort must be one of {', '.join(SORT_KEYS)}."}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    return Response({'enabled': config('ENABLED'), 'views': store.snapshot(sort=sort, limit=limit)})
@@ -0,0 +1,276 @@
+"""
+Repeatable benchmarks of the hot paths, reported as JSON so a performance change can be
+measured against a saved baseline rather than argued about.
+
+Each benchmark is a function registered with @benchmark(name), run against one
+company's data (typically a core.synthetic preset) as one of its users:
+
+- pos_search.scanned_code / pos_search.browse - the POS lookup for a scanned IMEI and
+  for a typed product name;
+- pos_checkout - a one-line cash sale through the real endpoint (stock reduction,
+  costing, payment, PDF);
+- trial_balance - the JournalEntry trial_balance action;
+- profit_report - a year of the daily profit report;
+- snapshot.export / snapshot.import - the desktop app's full-company snapshot, and
+  loading it back over itself (only possible in a single-company database, which is
+  how the desktop app runs it - skipped otherwise);
+- mrp - an automatic MRP run;
+- manufacturing.schedule - a finite-capacity scheduling run over the open work orders;
+- manufacturing.kpis - the manufacturing KPIs, computed (not read from the cache).
+
+API benchmarks go through DRF's test client, so middleware, permissions and
+serialisation are all in the measurement. Each run is timed with perf_counter() and its
+queries counted through the same execute_wrapper() as core.instrumentation. Benchmarks
+that write run inside a transaction that is rolled back afterwards, so every run starts
+from the same data (and on_commit work - fact refreshes, search re-indexing - never
+runs, nor is it measured); files they save go to a temporary MEDIA_ROOT.
+
+run() does `warmup` unmeasured runs first (cold caches, lazily built indexes), then
+`repeat` measured ones, and reports min/median/max wall time, median SQL time and the
+query count range per benchmark. With a baseline report (a previous run's JSON), each
+benchmark also gets the baseline's median and the change in percent.
+
+`manage.py run_benchmarks` is the command-line front end.
+"""
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+Benchmark = namedtuple('Benchmark', 'name run writes')
+
+_registry = []
+
+
+class Skip(Exception):
+    """Raised by a benchmark that can't run against this database."""
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def benchmark(name, writes=False):
+    """Registers `run(context)` as the benchmark `name`. `writes` benchmarks are rolled
+    back after every run."""
+    def decorator(run):
+        _registry.append(Benchmark(name, run, writes))
+        return run
+    return decorator
+
+
+def registered():
+    return list(_registry)
+
+
+class Context:
+    """What a benchmark runs against - the company, the user, an authenticated API
+    client, and the sample records picked once per run()."""
+
+    def __init__(self, company, user):
+        from rest_framework.test import APIClient
+
+        self.company = company
+        self.user = user
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        if response.status_code >= 400:
+            raise BenchmarkError(f'GET {path}: HTTP {response.status_code}')
+        return response
+
+    def post(self, path, data):
+        response = self.client.post(path, data, format='json')
+        if response.status_code >= 400:
+            raise BenchmarkError(f'POST {path}: HTTP {response.status_code} {getattr(response, "data", "")}')
+        return response
+
+    @cached_property
+    def scanned_code(self):
+        from products.models import ProductTracking
+        unit = ProductTracking.objects.filter(
+            product__company=self.company, status='available', imei_number__isnull=False,
+        ).order_by('pk').first()
+        if unit is None:
+            raise Skip('no available IMEI-tracked unit')
+        return unit.imei_number
+
+    @cached_property
+    def stocked_product(self):
+        from inventory.models import StockItem
+        item = StockItem.objects.filter(
+            company=self.company, product__tracking_method='none', product__is_saleable=True,
+            available_quantity__gte=1, stock_status='available',
+        ).select_related('product').order_by('pk').first()
+        if item is None:
+            raise Skip('no untracked product in stock')
+        return item.product
+
+    @cached_property
+    def snapshot(self):
+        from core.snapshot import export_snapshot
+        return export_snapshot(self.company)
+
+
+def _median(values):
+    return round(statistics.median(values), 1)
+
+
+def _measure(bench, context):
+    from core.instrumentation import _QueryRecorder, _wrap_all
+
+    recorder = _QueryRecorder()
+    with transaction.atomic():
+        started = time.perf_counter()
+        with _wrap_all(recorder):
+            bench.run(context)
+        wall_ms = (time.perf_counter() - started) * 1000
+        if bench.writes:
+            transaction.set_rollback(True)
+    return wall_ms, recorder.seconds * 1000, recorder.count
+
+
+def run_one(bench, context, repeat=5, warmup=1):
+    result = {'name': bench.name}
+    try:
+        for _ in range(warmup):
+            _measure(bench, context)
+        runs = [_measure(bench, context) for _ in range(max(repeat, 1))]
+    except Skip as exc:
+        return {**result, 'status': 'skipped', 'reason': str(exc)}
+    except Exception as exc:
+        return {**result, 'status': 'error', 'error': f'{type(exc).__name__}: {exc}'}
+    wall, sql, queries = zip(*runs)
+    return {
+        **result,
+        'status': 'ok',
+        'runs': len(runs),
+        'min_ms': round(min(wall), 1),
+        'median_ms': _median(wall),
+        'max_ms': round(max(wall), 1),
+        'median_sql_ms': _median(sql),
+        'min_queries': min(queries),
+        'max_queries': max(queries),
+    }
+
+
+def _row_counts(company):
+    from accounting.models import JournalEntry
+    from inventory.models import StockMovement
+    from products.models import Product
+    from sales.models import Invoice
+    return {
+        'products': Product.all_objects.filter(company=company).count(),
+        'stock_movements': StockMovement.objects.filter(company=company).count(),
+        'invoices': Invoice.all_objects.filter(company=company).count(),
+        'journal_entries': JournalEntry.objects.filter(company=company).count(),
+    }
+
+
+def compare(report, baseline):
+    """Adds the baseline's median and the change against it to every benchmark of
+    `report` that also ran in `baseline`."""
+    previous = {row['name']: row for row in baseline.get('benchmarks', []) if row.get('status') == 'ok'}
+    for row in report['benchmarks']:
+        before = previous.get(row['name'])
+        if row['status'] != 'ok' or before is None:
+            continue
+        row['baseline_median_ms'] = before['median_ms']
+        if before['median_ms']:
+            row['change_pct'] = round((row['median_ms'] - before['median_ms']) / before['median_ms'] * 100, 1)
+    return report
+
+
+def run(company, user, names=None, repeat=5, warmup=1, baseline=None):
+    """Runs the registered benchmarks (or just `names`) and returns the report dict."""
+    from django.test import override_settings
+
+    unknown = set(names or ()) - {bench.name for bench in _registry}
+    if unknown:
+        raise ValueError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+    context = Context(company, user)
+    results = []
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        for bench in _registry:
+            if names and bench.name not in names:
+                continue
+            results.append(run_one(bench, context, repeat=repeat, warmup=warmup))
+    report = {
+        'generated_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'company': company.pk,
+        'rows': _row_counts(company),
+        'repeat': repeat,
+        'benchmarks': results,
+    }
+    return compare(report, baseline) if baseline else report
+
+
+# --- the benchmarks ----------------------------------------------------------------
+
+@benchmark('pos_search.scanned_code')
+def _pos_search_scanned(context):
+    context.get('/api/sales/pos/search/', q=context.scanned_code)
+
+
+@benchmark('pos_search.browse')
+def _pos_search_browse(context):
+    context.get('/api/sales/pos/search/', q=context.stocked_product.name.split()[0])
+
+
+@benchmark('pos_checkout', writes=True)
+def _pos_checkout(context):
+    product = context.stocked_product
+    context.post('/api/sales/pos/checkout/', {
+        'items': [{'product_id': product.pk, 'quantity': '1'}],
+        'payment': {'method': 'cash'},
+    })
+
+
+@benchmark('trial_balance')
+def _trial_balance(context):
+    context.get('/api/accounting/journalentries/trial_balance/')
+
+
+@benchmark('profit_report')
+def _profit_report(context):
+    context.get('/api/analytics/profit-report/', days=365)
+
+
+@benchmark('snapshot.export')
+def _snapshot_export(context):
+    from core.snapshot import export_snapshot
+    export_snapshot(context.company)
+
+
+@benchmark('snapshot.import', writes=True)
+def _snapshot_import(context):
+    from core.snapshot import import_snapshot_data
+    from user_auth.models import Company
+    if Company.objects.exclude(pk=context.company.pk).exists():
+        raise Skip('snapshot import needs a single-company database')
+    import_snapshot_data(context.snapshot, expected_company_id=context.company.pk)
+
+
+@benchmark('mrp', writes=True)
+def _mrp(context):
+    from manufacturing.mrp_engine import run_automatic_mrp
+    run_automatic_mrp(context.company)
+
+
+@benchmark('manufacturing.schedule', writes=True)
+def _manufacturing_schedule(context):
+    from manufacturing.scheduling import schedule
+    schedule(context.company)
+
+
+@benchmark('manufacturing.kpis')
+def _manufacturing_kpis(context):
+    from manufacturing.kpis import compute_kpis
+    compute_kpis(context.company, timezone.localdate())
@@ -0,0 +1,83 @@
+"""
+Per-company result caching with write-triggered invalidation - for report/dashboard
+numbers that are expensive to aggregate but only change when the rows underneath them
+are written (inventory analytics, sales reports, dashboard metrics).
+
+Invalidation works through a generation stamp per (namespace, company), not by deleting
+individual keys: every cached value's key embeds the current stamp, and `invalidate()`
+just replaces the stamp, so everything cached under the old one is never read again
+(and ages out on its own TTL). That way a writer never needs to know every filter
+combination a report happened to be cached under - a sales report cached for ten
+different date ranges is invalidated by one stamp bump, not ten deletes.
+
+Uses the 'company' cache alias (settings.CACHES, COMPANY_CACHE_URL). The stamps live in
+that cache too, so invalidation only reaches the processes sharing it: with the
+defaults - DummyCache in development, a per-process LocMemCache in production - a
+write invalidates the worker that made it and every other worker keeps serving what
+it cached until the TTL runs out. Configure a shared backend (file or Redis) for
+invalidation across workers. Under DummyCache every lookup simply misses and the
+value is recomputed, i.e. exactly the pre-cache behavior, so nothing here needs to be
+switched off per environment.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'company'
+DEFAULT_TIMEOUT = 15 * 60
+KEY_PREFIX = 'companycache'
+
+
+def _stamp_key(namespace, company_id):
+    return f'{KEY_PREFIX}:{namespace}:{company_id}:stamp'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _new_stamp():
+    # A wall-clock stamp rather than an incrementing integer: if the stamp key itself is
+    # ever evicted (LocMem's LRU, a Redis restart), starting again from 1 could
+    # resurrect values cached under an older "1" - a fresh time-based stamp can't.
+    return time.time_ns()
+
+
+def generation(namespace, company_id):
+    key = _stamp_key(namespace, company_id)
+    stamp = _cache().get(key)
+    if stamp is None:
+        # add(), not set(): two processes missing at once must agree on one stamp.
+        _cache().add(key, _new_stamp(), None)
+        stamp = _cache().get(key) or _new_stamp()
+    return stamp
+
+
+def make_key(namespace, company_id, *parts):
+    """Cache key for one result under the current generation. `parts` are whatever
+    distinguishes this result from others in the same namespace (a filter set, a
+    date) - hashed, so callers can pass dicts/tuples without worrying about key length
+    or characters memcached-style backends reject."""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest() if parts else 'all'
+    return f'{KEY_PREFIX}:{namespace}:{company_id}:{generation(namespace, company_id)}:{digest}'
+
+
+def get_or_compute(namespace, company_id, compute, *parts, timeout=DEFAULT_TIMEOUT):
+    key = make_key(namespace, company_id, *parts)
+    value = _cache().get(key)
+    if value is None:
+        value = compute()
+        _cache().set(key, value, timeout)
+    return value
+
+
+def invalidate(namespace, company_id):
+    """Drops every result cached for (namespace, company). Deferred to transaction
+    commit when called inside one - invalidating before the writing transaction commits
+    would let a concurrent reader recompute from the old rows and re-cache them under
+    the brand-new stamp, defeating the invalidation entirely."""
+    if company_id is None:
+        return
+    transaction.on_commit(lambda: _cache().set(_stamp_key(namespace, company_id), _new_stamp(), None))
@@ -0,0 +1,133 @@
+"""
+Named, cached dashboard metrics - the headline numbers on the crm/inventory/sales/
+analytics dashboards, which used to be 15-25 independent count()/aggregate() queries on
+every page view (and CACHES['default'] is a DummyCache outside Vercel, so nothing was
+ever reused).
+
+Each app registers its metrics in its own `dashboard_metrics.py` (imported from its
+AppConfig.ready()):
+
+    register('crm', 'new_leads', 'crm.Lead', Count('id', filter=Q(status='new')))
+    register('crm', 'new_leads_this_month', 'crm.Lead',
+             lambda now: Count('id', filter=Q(created_at__gte=month_start(now))))
+
+`aggregate` is an aggregate expression, or a callable taking the current time for
+anything relative to "now". get_metrics(module, company) computes every metric of a
+module in one aggregate() per source model - conditional aggregates
+(`Count(filter=Q(...))`) rather than one filtered count() each - and caches the
+resulting dict in the 'dashboard' cache alias (settings.CACHES - locmem, file or Redis
+via DASHBOARD_CACHE_URL) for DASHBOARD_METRICS_TIMEOUT seconds, keyed per module,
+company and day so "this month"/"today" metrics roll over by themselves.
+
+register() also connects post_save/post_delete on the metric's source model, so any
+write to it drops the cached dict of every module that reads that model for the
+writing company - on commit, for the same reason as core.company_cache.invalidate().
+Steady-state dashboard loads are then a single cache get.
+
+Lists (recent records, top-N tables) stay in the views - they're already single
+LIMITed queries and would go stale far more visibly than a count.
+"""
+from collections import defaultdict, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+CACHE_ALIAS = 'dashboard'
+KEY_PREFIX = 'dashmetrics'
+
+Metric = namedtuple('Metric', 'name model_label aggregate company_path')
+
+_registry = defaultdict(dict)             # module -> {name: Metric}
+_modules_by_model = defaultdict(set)      # model_label -> {module}
+_company_paths = defaultdict(set)         # model_label -> {company_path}
+
+
+def month_start(now):
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(module, company_id, day):
+    return f'{KEY_PREFIX}:{module}:{company_id}:{day.isoformat()}'
+
+
+def register(module, name, model_label, aggregate, company_path='company'):
+    """Registers one metric. `company_path` is the lookup from `model_label` to its
+    company, for models scoped through a parent (e.g. 'grn__company')."""
+    _registry[module][name] = Metric(name, model_label, aggregate, company_path)
+    _modules_by_model[model_label].add(module)
+    _company_paths[model_label].add(company_path)
+    uid = f'dashboard_metrics_{model_label}'
+    post_save.connect(_invalidate_for_instance, sender=model_label, dispatch_uid=f'{uid}_save')
+    post_delete.connect(_invalidate_for_instance, sender=model_label, dispatch_uid=f'{uid}_delete')
+
+
+def compute_metrics(module, company, now=None):
+    """Every registered metric of `module` for `company`, uncached - one query per
+    (source model, company path) pair."""
+    now = now or timezone.now()
+    groups = defaultdict(list)
+    for metric in _registry[module].values():
+        groups[(metric.model_label, metric.company_path)].append(metric)
+
+    values = {}
+    for (model_label, company_path), metrics in groups.items():
+        model = apps.get_model(model_label)
+        aggregates = {
+            m.name: m.aggregate(now) if callable(m.aggregate) else m.aggregate
+            for m in metrics
+        }
+        result = model.objects.filter(**{company_path: company}).aggregate(**aggregates)
+        for name, value in result.items():
+            values[name] = value if value is not None else 0
+    return values
+
+
+def get_metrics(module, company):
+    now = timezone.now()
+    key = _key(module, company.pk, timezone.localdate(now))
+    values = _cache().get(key)
+    if values is None:
+        values = compute_metrics(module, company, now)
+        _cache().set(key, values, getattr(settings, 'DASHBOARD_METRICS_TIMEOUT', 300))
+    return values
+
+
+def invalidate(modules, company_id):
+    if company_id is None or not modules:
+        return
+    keys = [_key(module, company_id, timezone.localdate()) for module in modules]
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def invalidate_model(model_label, company_id):
+    """Drops the cached metrics of every module reading `model_label` for one company -
+    for bulk writes, which send no post_save (see core.imports)."""
+    invalidate(_modules_by_model.get(model_label), company_id)
+
+
+def _company_id(instance, company_path):
+    """Walks `company_path` ('company', 'grn__company', ...) on an instance to the
+    company's id without loading the company itself."""
+    *parents, last = company_path.split('__')
+    obj = instance
+    for part in parents:
+        obj = getattr(obj, part, None)
+        if obj is None:
+            return None
+    return getattr(obj, f'{last}_id', None)
+
+
+def _invalidate_for_instance(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    label = sender._meta.label
+    for company_path in _company_paths[label]:
+        invalidate(_modules_by_model[label], _company_id(instance, company_path))
@@ -406,6 +406,12 @@ class DesktopSyncLoop:
                 save_sync_config(config)
                 return {'status': 'auth_required', 'pushed': pushed, 'failed': failed}
 
+            if resp.status_code == 409 and _in_progress(resp):
+                # An earlier attempt at this same write (same client_request_id) is
+                # still running on production and will most likely succeed - keep it
+                # pending, and everything after it, for the next cycle to replay.
+                break
+
             if 200 <= resp.status_code < 300:
                 entry.status = 'synced'
                 entry.synced_at = timezone.now()
@@ -428,6 +434,16 @@ class DesktopSyncLoop:
         return {'status': 'drained', 'pushed': pushed, 'failed': failed}
 
 
+def _in_progress(resp):
+    """Whether a 409 is core.idempotency's "still being processed" reply rather than a
+    business rejection."""
+    from core.idempotency import IN_PROGRESS
+    try:
+        return resp.json().get('code') == IN_PROGRESS
+    except (ValueError, AttributeError):
+        return False
+
+
 def _build_replay_extras(path, response_data):
     """Given the ORIGINAL local response for one of the five push-eligible paths (see
     core/desktop_sync_middleware.py's PUSH_ELIGIBLE_PATHS), builds the desktop_pks/
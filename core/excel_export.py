@@ -10,60 +10,46 @@ Follows the same lazy-import + graceful-degradation convention already used for
 exports elsewhere in this codebase (see accounting/views.py) - openpyxl is a real
 dependency (already in requirements.txt) so this should never actually hit the
 ImportError path in practice, but callers still handle it the same way as that
-existing convention, for consistency.
+existing convention, for consistency. The workbook itself is produced by
+core.exports, which streams it model by model straight from the database.
 """
-from collections import defaultdict
-
-
-def build_backup_workbook(objects_data):
-    """Given the same {'model', 'pk', 'fields'} list core.snapshot's export functions
-    produce, returns an openpyxl Workbook with one sheet per model - column headers
-    from the union of field names seen for that model, one row per object, 'pk' as the
-    first column. Raises ImportError if openpyxl isn't installed (caller's
-    responsibility to catch, matching the rest of this codebase's Excel-export
-    convention)."""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill
-
-    by_model = defaultdict(list)
-    for obj in objects_data:
-        by_model[obj['model']].append(obj)
-
-    wb = openpyxl.Workbook()
-    wb.remove(wb.active)  # the default blank sheet - each model gets its own below
-
-    header_font = Font(bold=True)
-    header_fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
-
-    for model_label in sorted(by_model.keys()):
-        rows = by_model[model_label]
-        # Excel sheet names: max 31 chars, no []:*?/\\
-        sheet_name = model_label.replace('.', '_')[:31]
-        ws = wb.create_sheet(sheet_name)
-
-        field_names = []
-        seen = set()
-        for obj in rows:
-            for key in obj['fields'].keys():
-                if key not in seen:
-                    seen.add(key)
-                    field_names.append(key)
-        headers = ['id'] + field_names
-
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-
-        for row_num, obj in enumerate(rows, 2):
-            ws.cell(row=row_num, column=1, value=obj['pk'])
-            for col, field in enumerate(field_names, 2):
-                value = obj['fields'].get(field)
-                # openpyxl can't write lists/dicts (JSONField values, M2M lists) - stringify
-                if isinstance(value, (list, dict)):
-                    value = str(value)
-                ws.cell(row=row_num, column=col, value=value)
-
-    if not wb.sheetnames:
-        wb.create_sheet('Empty')  # a workbook needs at least one sheet
-    return wb
+from django.utils.encoding import is_protected_type
+
+from core.exports import Column, Sheet
+
+
+def _field_column(field):
+    def value(obj):
+        # as the snapshot serializer does: numbers and dates as they are, the rest
+        # (files, UUIDs, JSON) as the field's own string form
+        if field.remote_field is not None:
+            related_id = getattr(obj, field.attname)
+            return related_id if is_protected_type(related_id) else str(related_id)
+        raw = field.value_from_object(obj)
+        return raw if is_protected_type(raw) else field.value_to_string(obj)
+    return Column(field.name, value)
+
+
+def _m2m_column(field):
+    return Column(field.name, lambda obj: [related.pk for related in getattr(obj, field.name).all()])
+
+
+def backup_sheets(querysets):
+    """Given ('app_label.modelname', queryset) pairs - core.snapshot's
+    all_companies_querysets() - returns one core.exports.Sheet per model, in label
+    order: 'id' (the pk) first, then the fields the snapshot serializer writes (foreign
+    keys as raw ids, many-to-many as pk lists). The rows stay querysets, so
+    core.exports.stream_xlsx()/write_xlsx() read one model at a time through
+    .iterator() instead of the whole backup being serialized into a list first."""
+    sheets = []
+    for label, queryset in sorted(querysets, key=lambda pair: pair[0]):
+        meta = queryset.model._meta
+        columns = [Column('id', 'pk')] + [
+            _field_column(field) for field in meta.concrete_model._meta.local_fields if field.serialize
+        ]
+        many_to_many = [field for field in meta.concrete_model._meta.local_many_to_many if field.serialize]
+        columns += [_m2m_column(field) for field in many_to_many]
+        if many_to_many:
+            queryset = queryset.prefetch_related(*(field.name for field in many_to_many))
+        sheets.append(Sheet(label.replace('.', '_'), columns, queryset))
+    return sheets
@@ -0,0 +1,185 @@
+"""
+Streaming CSV/Excel exports with declared columns - for list and report downloads that
+used to build the whole file in memory first.
+
+The payments/delivery-note CSV exports, the chart-of-accounts export, the MRP report
+and the backup workbook each looped over a fully-evaluated queryset (model instances
+cached for the whole request) into either an HttpResponse or a regular openpyxl
+Workbook, which keeps every cell object alive until save() - so memory grew with the
+row count and the first byte only went out once the last row was built. Here:
+
+- an export is declared as Sheet(title, columns, rows): `columns` a list of
+  Column(header, value), where value is a field path ('customer__name', called if it
+  ends in a method like 'get_status_display') or a callable taking the row; `rows` a
+  queryset (read with .iterator(), so nothing is cached) or any iterable.
+- stream_csv() writes through csv.writer into a StreamingHttpResponse, one chunk of
+  rows per yield - the download starts with the header row.
+- stream_xlsx() appends rows to openpyxl write-only worksheets (serialised to a temp
+  file as they're appended, not kept as cell objects), saves the zip to another temp
+  file and streams that back. An .xlsx is a zip whose directory is written last, so
+  unlike CSV the body starts once the rows are read - but memory stays flat either way.
+
+Both take `on_finish(row_count)`, called after the last row - for bookkeeping like an
+ImportExportOperation that used to re-count() the queryset.
+
+openpyxl stays a lazy import, as everywhere else Excel is produced - see
+core.excel_export's module docstring.
+"""
+import csv
+import datetime
+import tempfile
+from collections import namedtuple
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ITERATOR_CHUNK_SIZE = 2000
+CSV_ROWS_PER_CHUNK = 200
+FILE_CHUNK_SIZE = 64 * 1024
+
+Sheet = namedtuple('Sheet', 'title columns rows')
+
+
+class Column:
+    """One exported column. `value` is a '__'-separated attribute/key path or a
+    callable(row); `width` is the Excel column width (defaults to fit the header)."""
+    __slots__ = ('header', 'value', 'width')
+
+    def __init__(self, header, value, width=None):
+        self.header = header
+        self.value = value
+        self.width = width
+
+    def get(self, row):
+        if callable(self.value):
+            return self.value(row)
+        value = row
+        for part in self.value.split('__'):
+            value = value.get(part) if isinstance(value, dict) else getattr(value, part, None)
+            if value is None:
+                return None
+        return value() if callable(value) else value
+
+
+def _iterate(rows):
+    if isinstance(rows, QuerySet):
+        return rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    return iter(rows)
+
+
+def _attachment(response, filename):
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    return '' if value is None else value
+
+
+def csv_chunks(sheet, on_finish=None):
+    """Yields the CSV text of `sheet`, header first, a few hundred rows at a time."""
+    writer = csv.writer(_Echo())
+    columns = sheet.columns
+    yield writer.writerow([c.header for c in columns])
+    count, lines = 0, []
+    for row in _iterate(sheet.rows):
+        lines.append(writer.writerow([_csv_value(c.get(row)) for c in columns]))
+        count += 1
+        if len(lines) >= CSV_ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+    if on_finish:
+        on_finish(count)
+
+
+def stream_csv(filename, sheet, on_finish=None):
+    response = StreamingHttpResponse(csv_chunks(sheet, on_finish), content_type='text/csv')
+    return _attachment(response, filename)
+
+
+def _excel_value(value):
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        # openpyxl refuses tz-aware datetimes
+        return timezone.make_naive(value)
+    if isinstance(value, (list, dict)):
+        # JSONField values, M2M pk lists
+        return str(value)
+    return value
+
+
+def write_xlsx(target, sheets):
+    """Writes `sheets` to `target` (a path or binary file) through a write-only
+    workbook. Returns the number of data rows written. Raises ImportError without
+    openpyxl."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
+    count = 0
+    for sheet in sheets:
+        # Excel sheet names: max 31 chars, no []:*?/\\
+        worksheet = workbook.create_sheet(sheet.title[:31])
+        for index, column in enumerate(sheet.columns, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = column.width or min(len(column.header) + 4, 50)
+        header = []
+        for column in sheet.columns:
+            cell = WriteOnlyCell(worksheet, value=column.header)
+            cell.font, cell.fill = header_font, header_fill
+            header.append(cell)
+        worksheet.append(header)
+        for row in _iterate(sheet.rows):
+            worksheet.append([_excel_value(c.get(row)) for c in sheet.columns])
+            count += 1
+    if not sheets:
+        workbook.create_sheet('Empty')  # a workbook needs at least one sheet
+    workbook.save(target)
+    return count
+
+
+def _file_chunks(handle):
+    try:
+        while True:
+            data = handle.read(FILE_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+    finally:
+        handle.close()
+
+
+def xlsx_chunks(sheets, on_finish=None):
+    """Yields the bytes of the workbook for `sheets`. The workbook is written on the
+    first iteration - i.e. while the response streams, not in the view."""
+    spool = tempfile.TemporaryFile()
+    try:
+        count = write_xlsx(spool, sheets)
+    except BaseException:
+        spool.close()
+        raise
+    if on_finish:
+        on_finish(count)
+    spool.seek(0)
+    yield from _file_chunks(spool)
+
+
+def stream_xlsx(filename, sheets, on_finish=None):
+    """Raises ImportError up front when openpyxl is missing, so callers can still fall
+    back before any of the response is sent."""
+    import openpyxl  # noqa: F401
+    response = StreamingHttpResponse(xlsx_chunks(list(sheets), on_finish), content_type=XLSX_CONTENT_TYPE)
+    return _attachment(response, filename)
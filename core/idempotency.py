@@ -11,11 +11,31 @@ Two entry points sharing one underlying model:
   vendor_invoice_create).
 - `IdempotentCreateMixin`, for ModelViewSets whose `create()` should get the same
   guarantee (Payment, PurchasePayment, Expense, Customer, Supplier).
+
+Both run through `_run_once()`, a two-tier store:
+- A completed response is also written to the Django cache, so a replay is answered
+  from there without touching the table (the DummyCache outside production just makes
+  this tier a no-op - the table stays authoritative either way).
+- The table row is claimed *before* the view runs, as an in-flight placeholder
+  (response_status=0). That INSERT is the lookup: on the common first attempt it
+  simply succeeds - no separate SELECT - and a near-simultaneous retry hits the unique
+  constraint and gets a 409 instead of executing the view a second time. The
+  placeholder is filled in with the response on success, and deleted again if the view
+  fails or raises, so the client can retry. A placeholder older than IN_FLIGHT_TIMEOUT
+  (its process died mid-request) is taken over rather than blocking forever.
+
+Rows are only needed for as long as a client might still retry, so they're purged after
+settings.IDEMPOTENCY_KEY_TTL_DAYS by the `purge_idempotency_keys` management command.
 """
+import hashlib
 import json
+from datetime import timedelta
 from functools import wraps
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework.utils.encoders import JSONEncoder
 
@@ -32,25 +52,78 @@ class IdempotencyKey(models.Model):
     # Django resolves string FK references lazily, after all apps have loaded.
     company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='idempotency_keys')
     client_request_id = models.CharField(max_length=100)
-    response_status = models.PositiveSmallIntegerField()
-    response_body = models.JSONField()
+    # IN_FLIGHT (0) while the claiming request is still running - see _claim().
+    response_status = models.PositiveSmallIntegerField(default=0)
+    response_body = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('company', 'client_request_id')
+        # purge_idempotency_keys deletes by age across all companies.
+        indexes = [models.Index(fields=['created_at'], name='core_idem_created_idx')]
 
     def __str__(self):
         return f'{self.company_id}:{self.client_request_id}'
 
 
-def _find_existing(company, client_request_id):
-    if not (company and client_request_id):
-        return None
-    return IdempotencyKey.objects.filter(company=company, client_request_id=client_request_id).first()
+IN_FLIGHT = 0
+IN_FLIGHT_TIMEOUT = timedelta(minutes=2)
+# The 'code' of the 409 a retry gets while the original attempt is still in flight -
+# core.desktop_sync leaves such a queue entry pending rather than failing it.
+IN_PROGRESS = 'in_progress'
+CACHE_PREFIX = 'idem'
+
+
+def _cache_key(company_id, client_request_id):
+    digest = hashlib.md5(client_request_id.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:{company_id}:{digest}'
+
+
+def _cache_timeout():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL_DAYS', 30) * 86400
 
 
-def _store(company, client_request_id, response):
-    if not (company and client_request_id) or not (200 <= response.status_code < 300):
+def _replay(status, body):
+    return Response(body, status=status)
+
+
+def _claim(company, client_request_id):
+    """Claims (company, client_request_id) for this request. Returns (row, None) when
+    the caller should run the view, or (None, response) when it must not - a replay of
+    the stored response, or a 409 while another attempt is still running."""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(company=company, client_request_id=client_request_id), None
+    except IntegrityError:
+        pass
+
+    existing = IdempotencyKey.objects.filter(company=company, client_request_id=client_request_id).first()
+    if existing is None:
+        # The other attempt failed and released its claim between our INSERT and this
+        # read - just try once more.
+        return _claim(company, client_request_id)
+    if existing.response_status != IN_FLIGHT:
+        cache.set(_cache_key(company.pk, client_request_id), (existing.response_status, existing.response_body), _cache_timeout())
+        return None, _replay(existing.response_status, existing.response_body)
+
+    now = timezone.now()
+    if existing.created_at < now - IN_FLIGHT_TIMEOUT:
+        # Abandoned claim - take it over, unless another retry just did the same.
+        taken = IdempotencyKey.objects.filter(
+            pk=existing.pk, response_status=IN_FLIGHT, created_at=existing.created_at,
+        ).update(created_at=now)
+        if taken:
+            existing.created_at = now
+            return existing, None
+    return None, Response(
+        {'error': 'A request with this client_request_id is still being processed. Retry shortly.', 'code': IN_PROGRESS},
+        status=409,
+    )
+
+
+def _store(claim, response):
+    if not (200 <= response.status_code < 300):
+        claim.delete()
         return
     # response.data can hold raw Python objects a view built by hand (a datetime,
     # Decimal, etc.) rather than already-stringified Serializer output - DRF's own
@@ -62,12 +135,49 @@ def _store(company, client_request_id, response):
     # bill_confirm_received's raw `received_at` datetime once push-back sync started
     # actually replaying it with a client_request_id attached.
     safe_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
-    # get_or_create, not create: a genuine race (two near-simultaneous retries) should
-    # silently keep whichever row won, not raise an IntegrityError up into the response.
-    IdempotencyKey.objects.get_or_create(
-        company=company, client_request_id=client_request_id,
-        defaults={'response_status': response.status_code, 'response_body': safe_body},
-    )
+    claim.response_status = response.status_code
+    claim.response_body = safe_body
+    claim.save(update_fields=['response_status', 'response_body'])
+    cache.set(_cache_key(claim.company_id, claim.client_request_id), (claim.response_status, safe_body), _cache_timeout())
+
+
+def _run_once(request, run):
+    """Shared body of `@idempotent` and IdempotentCreateMixin.create(): runs `run()` at
+    most once per (company, client_request_id) - see the module docstring."""
+    client_request_id = request.data.get('client_request_id')
+    company = getattr(request.user, 'company', None)
+    if not (company and client_request_id):
+        return run()
+
+    cached = cache.get(_cache_key(company.pk, client_request_id))
+    if cached is not None:
+        return _replay(*cached)
+
+    claim, response = _claim(company, client_request_id)
+    if response is not None:
+        return response
+    try:
+        response = run()
+    except BaseException:
+        claim.delete()
+        raise
+    _store(claim, response)
+    return response
+
+
+def purge_expired(older_than=None, batch_size=1000):
+    """Deletes IdempotencyKey rows older than `older_than` (default: now minus
+    settings.IDEMPOTENCY_KEY_TTL_DAYS) in primary-key batches, so a large backlog never
+    becomes one long-running DELETE. Cache entries expire on the same TTL by
+    themselves. Returns the number of rows deleted."""
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=getattr(settings, 'IDEMPOTENCY_KEY_TTL_DAYS', 30))
+    deleted = 0
+    while True:
+        pks = list(IdempotencyKey.objects.filter(created_at__lt=older_than).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
 
 
 def idempotent(view_func):
@@ -80,14 +190,7 @@ def idempotent(view_func):
     """
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        client_request_id = request.data.get('client_request_id')
-        company = getattr(request.user, 'company', None)
-        existing = _find_existing(company, client_request_id)
-        if existing:
-            return Response(existing.response_body, status=existing.response_status)
-        response = view_func(request, *args, **kwargs)
-        _store(company, client_request_id, response)
-        return response
+        return _run_once(request, lambda: view_func(request, *args, **kwargs))
     return wrapper
 
 
@@ -96,11 +199,4 @@ class IdempotentCreateMixin:
     `create()` action the same replay-safe guarantee as `@idempotent`."""
 
     def create(self, request, *args, **kwargs):
-        client_request_id = request.data.get('client_request_id')
-        company = getattr(request.user, 'company', None)
-        existing = _find_existing(company, client_request_id)
-        if existing:
-            return Response(existing.response_body, status=existing.response_status)
-        response = super().create(request, *args, **kwargs)
-        _store(company, client_request_id, response)
-        return response
+        return _run_once(request, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
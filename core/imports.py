@@ -0,0 +1,377 @@
+"""
+Chunked background import pipeline for spreadsheet uploads - chart of accounts,
+customers, suppliers, products and opening stock all go through it.
+
+accounting.views.import_accounts used to read the whole upload into memory
+(`uploaded_file.read().decode()`, or a full - not read-only - openpyxl workbook) and
+then call process_account_row() per row inside the request: a `filter(code=...).first()`
+lookup, a get_or_create() for its category and group, and a save() each - four or five
+queries a row, all before the response, so a few-thousand-row chart of accounts timed
+the request out. Now:
+
+- the upload is spooled to a temp file and an ImportExportOperation is created in
+  'pending' state; the request returns straight away.
+- a background worker (one daemon thread per process, fed from a queue) streams the
+  file - csv.DictReader over the open file, openpyxl in read_only mode - in chunks of
+  CHUNK_SIZE rows.
+- per chunk, the importer resolves every row's key against the database in one
+  `__in` query; small reference tables (account groups, product categories,
+  warehouses) are loaded once per run in Importer.load(). Rows are validated against
+  those lookups in memory, and the chunk is written with bulk_create()/bulk_update()
+  inside one transaction.
+- after each chunk, record_count/success_count/error_count and the error log are
+  written back to the operation, so the import/export page can show progress.
+
+Importers live next to their models (accounting/importers.py, crm/importers.py, ...)
+and register themselves with `@register` from their AppConfig.ready(). An importer
+only has to say how to key a row, fetch the existing records for a set of keys, build
+(or update) one unsaved instance from a row - raising RowError for anything the user
+has to fix - and bulk-write a chunk of built instances.
+
+bulk writes skip save() and post_save, so nothing listening for those sees imported
+rows. Importer.finish() drops the dashboard metrics of the models it wrote, and
+`records_imported` (sender=<model>, company_id=...) is sent once per written model at
+the end of a run for any other cache built on those signals.
+
+BACKGROUND is off on Vercel (settings.IS_PRODUCTION), for the same reason as
+user_auth.activity_log: a frozen serverless instance never gets to run the worker, so
+the import runs inline in the request there. Jobs still queued when a process exits
+are lost - their operations stay 'pending' and the file has to be uploaded again.
+
+All settings live in the settings.IMPORT_PIPELINE dict; any key left out falls back to
+DEFAULTS below.
+"""
+import csv
+import json
+import os
+import queue
+import tempfile
+import threading
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+DEFAULTS = {
+    'BACKGROUND': True,
+    'CHUNK_SIZE': 500,
+    'MAX_LOGGED_ERRORS': 100,
+}
+
+FORMATS_BY_EXTENSION = {'.csv': 'csv', '.xlsx': 'excel', '.xlsm': 'excel', '.json': 'json'}
+TRUE_VALUES = ('true', '1', 'yes', 'y', 'active', 'on')
+
+records_imported = Signal()
+
+_importers = {}
+
+
+def config(name):
+    return getattr(settings, 'IMPORT_PIPELINE', {}).get(name, DEFAULTS[name])
+
+
+class RowError(Exception):
+    """A row that can't be imported as given - the message goes to the operation's
+    error log, prefixed with the row number."""
+
+
+def register(importer_cls):
+    _importers[importer_cls.name] = importer_cls
+    return importer_cls
+
+
+def importer_names():
+    return sorted(_importers)
+
+
+def get_importer(name):
+    try:
+        return _importers[name]
+    except KeyError:
+        raise ValueError(f'No importer registered for {name!r}') from None
+
+
+class Importer:
+    """Base class for one kind of import - see the module docstring for the contract."""
+    name = None
+    models = ()            # labels of every model write() touches, for finish()
+
+    def __init__(self, company, user, options=None):
+        self.company = company
+        self.user = user
+        self.options = options or {}
+
+    def option(self, name):
+        return str(self.options.get(name, '')).lower() in TRUE_VALUES
+
+    def load(self):
+        """Loads the per-run reference lookups. Called once, before the first chunk."""
+
+    def key(self, row):
+        """The value identifying the record a row targets, or None to always create."""
+        return None
+
+    def existing(self, keys):
+        """{key: instance} for those of `keys` already in the database, in as few
+        queries as possible (one `__in` query, typically)."""
+        return {}
+
+    def build(self, row, current):
+        """Returns the unsaved new instance, or the updated existing one, for `row`.
+        `current` starts as existing()'s result; a new instance should be added to it
+        under its key, so a later row of the same chunk with that key finds it."""
+        raise NotImplementedError
+
+    def write(self, instances):
+        """Bulk-writes one chunk of built instances (new ones have no pk)."""
+        raise NotImplementedError
+
+    def finish(self):
+        from core import dashboard_metrics
+        for label in self.models:
+            dashboard_metrics.invalidate_model(label, self.company.pk)
+
+
+# --- row helpers, shared by the importers ---
+
+def cell(row, *names, default=''):
+    """First non-blank value among `names` in a row, stripped if it's text."""
+    for name in names:
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            return value
+    return default
+
+
+def parse_bool(value, default=True):
+    if value in (None, ''):
+        return default
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_decimal(value, field, default=Decimal('0'), minimum=None):
+    if value in (None, ''):
+        return default
+    try:
+        number = Decimal(str(value).strip().replace(',', ''))
+    except InvalidOperation:
+        raise RowError(f"{field} must be a number, got '{value}'") from None
+    if minimum is not None and number < minimum:
+        raise RowError(f'{field} must be at least {minimum}')
+    return number
+
+
+def parse_choice(value, choices, field, default):
+    """Accepts either the stored value or its label, case-insensitively."""
+    if value in (None, ''):
+        return default
+    text = str(value).strip().lower()
+    for stored, label in choices:
+        if text in (str(stored).lower(), str(label).lower()):
+            return stored
+    raise RowError(f"Unknown {field} '{value}'")
+
+
+def owned(instance, company, label, code):
+    """Guards an existing() hit on a globally unique code (customer/supplier code,
+    SKU): it may belong to another company, or to a soft-deleted row."""
+    if instance.company_id != company.pk:
+        raise RowError(f"{label} code '{code}' is already used by another company")
+    if instance.is_deleted:
+        raise RowError(f"{label} '{code}' is in the recycle bin - restore it instead of importing it again")
+    return instance
+
+
+# --- readers ---
+
+def detect_format(file_name, declared=None):
+    """The file's extension wins over the form's format field - the accounts form
+    defaults that field to CSV, so an .xlsx uploaded without touching it used to be
+    decoded as CSV."""
+    extension = os.path.splitext(file_name or '')[1].lower()
+    return FORMATS_BY_EXTENSION.get(extension) or declared or 'csv'
+
+
+def read_rows(path, file_format, collection=None):
+    """Yields (row_number, {header: value}) from the file without loading it whole.
+    Row numbers match what the user sees in a spreadsheet (the header is row 1)."""
+    if file_format == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            yield from enumerate(csv.DictReader(handle), start=2)
+    elif file_format == 'excel':
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [str(h).strip() if h is not None else '' for h in next(rows, ())]
+            for row_number, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield row_number, dict(zip(headers, values))
+        finally:
+            workbook.close()
+    elif file_format == 'json':
+        # JSON has no streaming reader in the stdlib; uploads in this format are the
+        # small hand-written ones, so it's parsed whole.
+        with open(path, encoding='utf-8') as handle:
+            data = json.load(handle)
+        if isinstance(data, dict):
+            data = data.get(collection) or data.get('records')
+        if not isinstance(data, list):
+            raise ValueError(f"Invalid JSON format. Expected a list of records or an object with a '{collection}' key.")
+        yield from enumerate(data, start=1)
+    else:
+        raise ValueError(f'Unsupported file format: {file_format}. Supported formats: CSV, Excel (XLSX), JSON')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- the pipeline ---
+
+def _process_chunk(importer, chunk, errors):
+    """Validates and writes one chunk. Returns (succeeded, failed) row counts."""
+    keys = {key for key in (importer.key(row) for _, row in chunk) if key is not None}
+    current = importer.existing(keys) if keys else {}
+    built = {}
+    failed = 0
+    for row_number, row in chunk:
+        try:
+            instance = importer.build(row, current)
+        except RowError as exc:
+            failed += 1
+            errors.append(f'Row {row_number}: {exc}')
+            continue
+        built[id(instance)] = instance
+    succeeded = len(chunk) - failed
+    if built:
+        try:
+            with transaction.atomic():
+                importer.write(list(built.values()))
+        except Exception as exc:
+            # Keys were checked against the database a moment ago, so this is a race
+            # with another writer or a constraint the importer doesn't pre-validate -
+            # the whole chunk is rolled back and reported as one error.
+            errors.append(f'Rows {chunk[0][0]}-{chunk[-1][0]}: {exc}')
+            failed, succeeded = len(chunk), 0
+    return succeeded, failed
+
+
+def run_import(operation_id, path, importer_name, company_id, user_id, file_format, options=None):
+    """Runs one queued import to completion, updating its ImportExportOperation after
+    every chunk. Removes `path` when done."""
+    from accounting.models import ImportExportOperation
+    from user_auth.models import Company, User
+
+    operation = ImportExportOperation.objects.get(pk=operation_id)
+    operation.status = 'processing'
+    operation.save(update_fields=['status'])
+    errors = []
+    max_errors = config('MAX_LOGGED_ERRORS')
+    try:
+        importer = get_importer(importer_name)(
+            Company.objects.get(pk=company_id), User.objects.filter(pk=user_id).first(), options,
+        )
+        importer.load()
+        for chunk in _chunks(read_rows(path, file_format, collection=operation.data_type), config('CHUNK_SIZE')):
+            succeeded, failed = _process_chunk(importer, chunk, errors)
+            operation.record_count += len(chunk)
+            operation.success_count += succeeded
+            operation.error_count += failed
+            operation.error_log = '\n'.join(errors[:max_errors])
+            operation.save(update_fields=['record_count', 'success_count', 'error_count', 'error_log'])
+        importer.finish()
+        for label in importer.models:
+            records_imported.send(sender=apps.get_model(label), company_id=company_id)
+        operation.status = 'completed' if operation.error_count == 0 else 'completed_with_errors'
+    except Exception as exc:
+        operation.status = 'failed'
+        operation.error_log = '\n'.join(errors[:max_errors] + [str(exc)])
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    operation.completed_at = timezone.now()
+    operation.save(update_fields=['status', 'error_log', 'completed_at'])
+    return operation
+
+
+class ImportWorker:
+    """The queue plus its worker thread, started lazily on the first submitted job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._thread = None
+
+    def submit(self, job):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='import-worker')
+                self._thread.start()
+        self._jobs.put(job)
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def _run(self):
+        from django.db import connection
+        while True:
+            job = self._jobs.get()
+            try:
+                run_import(**job)
+            except Exception as exc:
+                print(f"[imports] operation {job['operation_id']} crashed: {exc}")
+            finally:
+                connection.close()
+                self._jobs.task_done()
+
+
+_worker = ImportWorker()
+
+
+def start_import(uploaded_file, importer_name, user, data_type=None, file_format=None, options=None, background=None):
+    """Spools `uploaded_file` (an UploadedFile, or any django File) to disk, records a
+    pending ImportExportOperation for `user`'s company and hands the job to the worker
+    once the surrounding transaction commits (so the worker can see the operation row).
+    Runs it inline instead when `background` - BACKGROUND by default - is off. Returns
+    the operation."""
+    from accounting.models import ImportExportOperation
+
+    get_importer(importer_name)
+    file_format = detect_format(uploaded_file.name, file_format)
+    suffix = os.path.splitext(uploaded_file.name)[1]
+    with tempfile.NamedTemporaryFile(prefix='erp-import-', suffix=suffix, delete=False) as spool:
+        for piece in uploaded_file.chunks():
+            spool.write(piece)
+
+    operation = ImportExportOperation.objects.create(
+        operation_type='import',
+        data_type=data_type or importer_name,
+        file_name=uploaded_file.name,
+        file_format=file_format,
+        status='pending',
+        created_by=user,
+    )
+    job = dict(
+        operation_id=operation.pk, path=spool.name, importer_name=importer_name,
+        company_id=user.company_id, user_id=user.pk, file_format=file_format,
+        # a QueryDict (request.POST) would dict() into lists - take each key's last value
+        options=options.dict() if hasattr(options, 'dict') else dict(options or {}),
+    )
+    if config('BACKGROUND') if background is None else background:
+        transaction.on_commit(lambda: _worker.submit(job))
+        return operation
+    return run_import(**job)
@@ -0,0 +1,215 @@
+"""
+Opt-in per-view query instrumentation: how many queries each view runs, how long they
+take, which ones repeat, and the request's wall time - so N+1 patterns (a per-row
+StockItem lookup, `account.group.name` in a loop, a price aggregate per search result)
+can be found on staging or production, not just read about in code review.
+
+QueryInstrumentationMiddleware wraps every query of a request in
+connection.execute_wrapper() (works without DEBUG, unlike connection.queries) and, once
+the response is built, folds the request into a per-view entry of an in-process store:
+
+- requests, total/max query count, total/max SQL time, total/max wall time;
+- duplicate fingerprints - SQL with its parameters dropped and `IN (...)` lists
+  collapsed, counted when the same fingerprint runs more than once in one request,
+  which is what an N+1 looks like from the outside.
+
+Views are keyed by URL name (`namespace:name`), else the view's dotted path. The store
+is bounded - MAX_VIEWS views (least recently hit evicted first), MAX_FINGERPRINTS
+duplicate fingerprints per view (the rarest dropped) - and per process: each worker
+has its own, read through `GET /api/core/instrumentation/` (superuser only; DELETE
+clears it) or `manage.py query_report`.
+
+Streaming responses (the CSV/Excel exports) are measured up to the response object;
+queries run while the body streams afterwards aren't counted.
+
+BUDGETS maps a view key to {'queries': n, 'ms': wall ms}; a request over either logs a
+warning on the `core.instrumentation` logger. DEFAULT_BUDGET applies to views without
+their own entry (unset = no warning).
+
+Off unless QUERY_INSTRUMENTATION['ENABLED'] - the middleware is registered
+unconditionally and returns straight through when disabled, like
+core.desktop_sync_middleware.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_VIEWS': 500,
+    'MAX_FINGERPRINTS': 20,
+    'BUDGETS': {},
+    'DEFAULT_BUDGET': None,
+    'EXCLUDE_PREFIXES': ('/static', '/media', '/api/core/instrumentation'),
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def config(name):
+    return getattr(settings, 'QUERY_INSTRUMENTATION', {}).get(name, DEFAULTS[name])
+
+
+def fingerprint(sql):
+    """`sql` with its shape kept and its values dropped - Django passes parameters
+    separately, so only the variable-length IN lists need collapsing."""
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class _QueryRecorder:
+    """execute_wrapper callback collecting one request's queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+class ViewStats:
+    __slots__ = (
+        'view', 'requests', 'queries', 'max_queries', 'sql_ms', 'max_sql_ms', 'wall_ms', 'max_wall_ms',
+        'duplicates', 'over_budget',
+    )
+
+    def __init__(self, view):
+        self.view = view
+        self.requests = self.queries = self.max_queries = self.over_budget = 0
+        self.sql_ms = self.max_sql_ms = self.wall_ms = self.max_wall_ms = 0.0
+        self.duplicates = Counter()  # fingerprint -> extra executions across requests
+
+    def add(self, queries, sql_ms, wall_ms, fingerprints, over_budget):
+        self.requests += 1
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.sql_ms += sql_ms
+        self.max_sql_ms = max(self.max_sql_ms, sql_ms)
+        self.wall_ms += wall_ms
+        self.max_wall_ms = max(self.max_wall_ms, wall_ms)
+        self.over_budget += over_budget
+        for sql, times in fingerprints.items():
+            if times > 1:
+                self.duplicates[sql] += times - 1
+        limit = config('MAX_FINGERPRINTS')
+        if len(self.duplicates) > limit:
+            self.duplicates = Counter(dict(self.duplicates.most_common(limit)))
+
+    def as_dict(self):
+        requests = self.requests or 1
+        return {
+            'view': self.view,
+            'requests': self.requests,
+            'avg_queries': round(self.queries / requests, 1),
+            'max_queries': self.max_queries,
+            'avg_sql_ms': round(self.sql_ms / requests, 1),
+            'max_sql_ms': round(self.max_sql_ms, 1),
+            'avg_wall_ms': round(self.wall_ms / requests, 1),
+            'max_wall_ms': round(self.max_wall_ms, 1),
+            'duplicate_queries': sum(self.duplicates.values()),
+            'over_budget': self.over_budget,
+            'top_duplicates': [{'sql': sql, 'extra_executions': n} for sql, n in self.duplicates.most_common(5)],
+        }
+
+
+class Store:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = OrderedDict()
+
+    def record(self, view, queries, sql_ms, wall_ms, fingerprints, over_budget=False):
+        with self._lock:
+            stats = self._views.pop(view, None) or ViewStats(view)
+            stats.add(queries, sql_ms, wall_ms, fingerprints, over_budget)
+            self._views[view] = stats  # most recently hit last
+            while len(self._views) > config('MAX_VIEWS'):
+                self._views.popitem(last=False)
+
+    def snapshot(self, sort='avg_queries', limit=None):
+        """Per-view dicts (see ViewStats.as_dict()), worst first by `sort`."""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._views.values()]
+        rows.sort(key=lambda row: row[sort], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+store = Store()
+
+SORT_KEYS = ('avg_queries', 'max_queries', 'avg_sql_ms', 'avg_wall_ms', 'max_wall_ms', 'duplicate_queries', 'requests')
+
+
+def view_key(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    return match.view_name or match._func_path
+
+
+def budget_for(view):
+    return config('BUDGETS').get(view, config('DEFAULT_BUDGET'))
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not config('ENABLED') or request.path.startswith(tuple(config('EXCLUDE_PREFIXES'))):
+            return self.get_response(request)
+
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        with _wrap_all(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+        sql_ms = recorder.seconds * 1000
+
+        view = view_key(request)
+        budget = budget_for(view) or {}
+        over = (
+            ('queries' in budget and recorder.count > budget['queries'])
+            or ('ms' in budget and wall_ms > budget['ms'])
+        )
+        if over:
+            worst = recorder.fingerprints.most_common(1)
+            logger.warning(
+                '%s over budget: %d queries (budget %s), %.0f ms (budget %s); most repeated: %s',
+                view, recorder.count, budget.get('queries', '-'), wall_ms, budget.get('ms', '-'),
+                f'{worst[0][1]}x {worst[0][0][:200]}' if worst else '-',
+            )
+        store.record(view, recorder.count, sql_ms, wall_ms, recorder.fingerprints, over)
+        return response
+
+
+class _wrap_all:
+    """execute_wrapper() on every configured database connection."""
+
+    def __init__(self, recorder):
+        self.contexts = [connections[alias].execute_wrapper(recorder) for alias in connections]
+
+    def __enter__(self):
+        for context in self.contexts:
+            context.__enter__()
+
+    def __exit__(self, *exc):
+        for context in reversed(self.contexts):
+            context.__exit__(*exc)
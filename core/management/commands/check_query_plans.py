@@ -0,0 +1,38 @@
+"""
+Prints the database's plan for every critical query registered in core/query_plans.py,
+run for one company - the same check core.tests.QueryPlanTests makes against seeded
+data, but against a real database with real row counts and statistics. Exits non-zero
+when any query reads a table in full.
+
+Usage: python manage.py check_query_plans --company 3
+       python manage.py check_query_plans --company 3 --quiet
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.query_plans import check
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Check that the critical company-scoped queries are served by indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True, help='Company id to run the queries for.')
+        parser.add_argument('--quiet', action='store_true', help='Only print the queries that scan.')
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f"No company with id {options['company']}.")
+
+        failed = []
+        for name, plan, scans in check(company):
+            if scans:
+                failed.append(name)
+            if scans or not options['quiet']:
+                status = self.style.ERROR(f"scans {', '.join(scans)}") if scans else self.style.SUCCESS('ok')
+                self.stdout.write(f'{name}: {status}')
+                self.stdout.write(plan + '\n')
+        if failed:
+            raise CommandError(f"{len(failed)} critical quer{'y' if len(failed) == 1 else 'ies'} fall back to a full scan: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS('All critical queries use indexes.'))
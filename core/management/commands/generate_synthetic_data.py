@@ -0,0 +1,61 @@
+"""
+Fills a company with a synthetic large-tenant dataset (core/synthetic.py) for
+benchmarking - a new company by default, so the data never mixes with real records.
+Prints the company id and the user to pass to `run_benchmarks`.
+
+Usage: python manage.py generate_synthetic_data --preset small
+       python manage.py generate_synthetic_data --preset large --company-name "Load Test" --seed 7
+       python manage.py generate_synthetic_data --preset tiny --company 3 --invoices 5000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import PRESETS, generate
+
+SIZE_OPTIONS = ('products', 'tracked_units', 'customers', 'stock_movements', 'invoices', 'days')
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic large-tenant dataset with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', default='small', choices=list(PRESETS))
+        parser.add_argument('--company', type=int, help='Add to this existing company id instead of creating one.')
+        parser.add_argument('--company-name', default='Synthetic Benchmark Co', help='Name of the company to create.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (same preset + seed = same data shape).')
+        for name in SIZE_OPTIONS:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f'Override the preset\'s {name}.')
+
+    def handle(self, *args, **options):
+        from user_auth.models import Company, Role, User
+
+        if options['company']:
+            company = Company.objects.filter(pk=options['company']).first()
+            if company is None:
+                raise CommandError(f"No company with id {options['company']}.")
+        else:
+            if Company.objects.filter(name=options['company_name']).exists():
+                raise CommandError(f"Company {options['company_name']!r} already exists - pass --company {{id}} to add to it.")
+            company = Company.objects.create(name=options['company_name'])
+
+        owner_role, _ = Role.objects.get_or_create(name='Owner', defaults={'level': 1})
+        email = f'benchmark+{company.pk}@synthetic.local'
+        user = User.objects.filter(email=email).first() or User.objects.create_user(
+            email=email, password=None, company=company, role=owner_role,
+        )
+
+        overrides = {name: options[name] for name in SIZE_OPTIONS if options[name] is not None}
+        started = time.perf_counter()
+        counts = generate(
+            company, options['preset'], seed=options['seed'], user=user,
+            progress=lambda message: self.stdout.write(f'  {message}'), **overrides,
+        )
+        elapsed = time.perf_counter() - started
+
+        for name, count in counts.items():
+            self.stdout.write(f'{name:>16}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated in {elapsed:.1f}s. Benchmark with: '
+            f'python manage.py run_benchmarks --company {company.pk} --user {email}'
+        ))
@@ -0,0 +1,54 @@
+"""
+Runs a spreadsheet import (core/imports.py) from the command line, in the foreground -
+for files too big to upload comfortably, and for the importers that have no upload form
+yet (customers, suppliers, opening_stock). The operation is recorded like any other, so
+it shows in the import/export history of the user's company.
+
+Usage: python manage.py import_records accounts chart.xlsx --user owner@example.com --create-groups
+       python manage.py import_records customers customers.csv --user owner@example.com --update-existing
+       python manage.py import_records opening_stock stock.xlsx --user owner@example.com
+"""
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import importer_names, start_import
+
+
+class Command(BaseCommand):
+    help = 'Import records from a CSV/Excel/JSON file through the chunked import pipeline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('importer', help='Importer name - one of the registered importers (accounts, customers, ...).')
+        parser.add_argument('path', help='File to import (.csv, .xlsx or .json).')
+        parser.add_argument('--user', required=True, help='Email of the user the import runs as - its company is the one imported into.')
+        parser.add_argument('--update-existing', action='store_true', help='Update records whose code/SKU already exists.')
+        parser.add_argument('--create-groups', action='store_true', help='accounts: create unknown account groups.')
+        parser.add_argument('--create-categories', action='store_true', help='products: create unknown categories.')
+
+    def handle(self, *args, **options):
+        from user_auth.models import User
+
+        if options['importer'] not in importer_names():
+            raise CommandError(f"Unknown importer {options['importer']!r} - choose from {', '.join(importer_names())}.")
+        if not os.path.isfile(options['path']):
+            raise CommandError(f"No such file: {options['path']}")
+        user = User.objects.filter(email=options['user']).select_related('company').first()
+        if user is None or user.company_id is None:
+            raise CommandError(f"No user {options['user']!r} with a company.")
+
+        flags = {name: 'on' for name in ('update_existing', 'create_groups', 'create_categories') if options[name]}
+        with open(options['path'], 'rb') as handle:
+            operation = start_import(
+                File(handle, name=os.path.basename(options['path'])), options['importer'], user,
+                options=flags, background=False,
+            )
+
+        summary = f'{operation.success_count} of {operation.record_count} row(s) imported into {user.company}.'
+        if operation.error_log:
+            self.stderr.write(operation.error_log)
+        if operation.status == 'failed':
+            raise CommandError(f'Import failed. {summary}')
+        style = self.style.SUCCESS if operation.status == 'completed' else self.style.WARNING
+        self.stdout.write(style(summary))
@@ -0,0 +1,30 @@
+"""
+Retention for core.idempotency.IdempotencyKey: deletes rows older than
+settings.IDEMPOTENCY_KEY_TTL_DAYS (or --days), in batches. Meant for a daily cron/
+scheduled job - without it the table grows by one row per offline-capable write forever.
+
+Usage: python manage.py purge_idempotency_keys
+       python manage.py purge_idempotency_keys --days 7 --batch-size 5000
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than the retention period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override settings.IDEMPOTENCY_KEY_TTL_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is not None and days < 1:
+            raise CommandError('--days must be at least 1.')
+        older_than = timezone.now() - timedelta(days=days) if days is not None else None
+        deleted = purge_expired(older_than=older_than, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} idempotency key(s).'))
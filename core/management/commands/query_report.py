@@ -0,0 +1,87 @@
+"""
+Prints the views with the worst query counts / latency (core/instrumentation.py).
+
+The stats live in each worker process's memory, so there are two ways to get them:
+
+- `--server`: read a running deployment's store through its superuser-only
+  /api/core/instrumentation/ endpoint (one worker's view - whichever served the call).
+- `--path`: request the given paths in this process as `--user`, with instrumentation
+  on, and report on just those - for profiling a screen on a copy of production data
+  without enabling anything on the server.
+
+Usage: python manage.py query_report --server https://erp.example.com --token <JWT access token>
+       python manage.py query_report --path /api/sales/pos/search/?q=iphone --path /accounting/ledger/ --user owner@example.com
+       python manage.py query_report --path /api/core/search/?q=inv --user owner@example.com --repeat 5 --sort avg_wall_ms
+"""
+import json
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.instrumentation import SORT_KEYS
+
+
+class Command(BaseCommand):
+    help = 'Print the views with the most queries / slowest responses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', help='Base URL of a running deployment to read the stats from.')
+        parser.add_argument('--token', help='--server: a superuser JWT access token.')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request in-process (repeatable).')
+        parser.add_argument('--user', help='--path: email of the user to request as.')
+        parser.add_argument('--repeat', type=int, default=1, help='--path: requests per path (default 1).')
+        parser.add_argument('--sort', default='avg_queries', choices=SORT_KEYS)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['server']:
+            rows = self._fetch(options)
+        elif options['paths']:
+            rows = self._profile(options)
+        else:
+            raise CommandError('Pass --server (read a running deployment) or --path (profile in-process).')
+
+        if not rows:
+            self.stdout.write('No requests recorded.')
+            return
+        self.stdout.write(f"{'view':<48} {'reqs':>5} {'avg q':>7} {'max q':>6} {'avg sql':>8} {'avg ms':>8} {'dups':>6} {'over':>5}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['view'][:48]:<48} {row['requests']:>5} {row['avg_queries']:>7} {row['max_queries']:>6} "
+                f"{row['avg_sql_ms']:>8} {row['avg_wall_ms']:>8} {row['duplicate_queries']:>6} {row['over_budget']:>5}"
+            )
+            for duplicate in row['top_duplicates'][:3]:
+                self.stdout.write(self.style.WARNING(f"    +{duplicate['extra_executions']}x {duplicate['sql'][:140]}"))
+
+    def _fetch(self, options):
+        if not options['token']:
+            raise CommandError('--server needs --token.')
+        url = f"{options['server'].rstrip('/')}/api/core/instrumentation/?sort={options['sort']}&limit={options['limit']}"
+        request = urllib.request.Request(url, headers={'Authorization': f"Bearer {options['token']}"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                data = json.load(response)
+        except OSError as exc:
+            raise CommandError(f'Could not read {url}: {exc}')
+        if not data.get('enabled'):
+            self.stdout.write(self.style.WARNING('Instrumentation is disabled on that server (QUERY_INSTRUMENTATION).'))
+        return data['views']
+
+    def _profile(self, options):
+        from django.test import Client, override_settings
+        from core.instrumentation import store
+        from user_auth.models import User
+
+        user = User.objects.filter(email=options['user'] or '').first()
+        if user is None:
+            raise CommandError('--path needs --user with an existing email.')
+        client = Client()
+        client.force_login(user)
+        store.clear()
+        with override_settings(QUERY_INSTRUMENTATION={'ENABLED': True, 'EXCLUDE_PREFIXES': ()}):
+            for path in options['paths']:
+                for _ in range(max(options['repeat'], 1)):
+                    response = client.get(path)
+                    if response.status_code >= 400:
+                        self.stderr.write(f'{path}: HTTP {response.status_code}')
+        return store.snapshot(sort=options['sort'], limit=options['limit'])
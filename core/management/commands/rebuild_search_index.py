@@ -0,0 +1,37 @@
+"""
+Rebuilds the global search index (core/search.py) from the source tables - after a raw
+SQL fix, a queryset.update() of numbers/names, or anything else that wrote invoices,
+bills, payments, products, customers or suppliers without going through their save()
+signals. Also the way to backfill a company up front rather than on its first search.
+
+Usage: python manage.py rebuild_search_index
+       python manage.py rebuild_search_index --company 3
+       python manage.py rebuild_search_index --company 3 --type product --type customer
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import SOURCES_BY_TYPE, rebuild
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-company global search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only this company id (default: every company).')
+        parser.add_argument(
+            '--type', action='append', dest='types', choices=sorted(SOURCES_BY_TYPE),
+            help='Only this document type (repeatable; default: all).',
+        )
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by('id')
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+            if not companies.exists():
+                raise CommandError(f"No company with id {options['company']}.")
+
+        for company in companies:
+            count = rebuild(company, doc_types=options['types'])
+            self.stdout.write(f'{company.name}: {count} document(s) indexed')
+        self.stdout.write(self.style.SUCCESS('Done.'))
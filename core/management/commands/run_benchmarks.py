@@ -0,0 +1,64 @@
+"""
+Runs the benchmark suite (core/benchmarks.py) against one company and prints the
+report as JSON - save it, and pass it back as --baseline after a change to see each
+benchmark's median against it.
+
+Usage: python manage.py run_benchmarks --company 3 --user benchmark+3@synthetic.local --output baseline.json
+       python manage.py run_benchmarks --company 3 --user benchmark+3@synthetic.local --baseline baseline.json
+       python manage.py run_benchmarks --company 3 --user owner@example.com --only pos_search.scanned_code --repeat 20
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import registered, run
+
+
+class Command(BaseCommand):
+    help = 'Run the performance benchmarks and report timings and query counts as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, required=True)
+        parser.add_argument('--user', help="Email of the user to run as (default: the company's first active user).")
+        parser.add_argument(
+            '--only', action='append', dest='names', choices=[bench.name for bench in registered()],
+            help='Only this benchmark (repeatable).',
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Measured runs per benchmark (default 5).')
+        parser.add_argument('--warmup', type=int, default=1, help='Unmeasured runs first (default 1).')
+        parser.add_argument('--baseline', help='A previous report to compare against.')
+        parser.add_argument('--output', help='Write the report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        from user_auth.models import Company, User
+
+        company = Company.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f"No company with id {options['company']}.")
+        users = User.objects.filter(company=company, is_active=True)
+        user = users.filter(email=options['user']).first() if options['user'] else users.order_by('pk').first()
+        if user is None:
+            raise CommandError(f'No matching active user in {company}.')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {exc}")
+
+        report = run(
+            company, user, names=options['names'], repeat=options['repeat'], warmup=options['warmup'],
+            baseline=baseline,
+        )
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
+        else:
+            self.stdout.write(output)
+        failed = [row['name'] for row in report['benchmarks'] if row['status'] == 'error']
+        if failed:
+            raise CommandError(f"Failed: {', '.join(failed)}")
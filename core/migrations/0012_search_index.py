@@ -0,0 +1,85 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+# Substring index on core_searchdocument.text - see core/search.py's module docstring.
+# Vendor-specific, so RunPython rather than a model Meta index.
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5("
+    "text, content='core_searchdocument', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER core_searchdocument_fts_ai AFTER INSERT ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER core_searchdocument_fts_ad AFTER DELETE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER core_searchdocument_fts_au AFTER UPDATE OF text ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO core_searchdocument_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX core_searchdocument_text_trgm ON core_searchdocument USING gin (text gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(SQLITE_FTS[0])
+        except OperationalError:
+            # SQLite built without FTS5 / older than 3.34 (no trigram tokenizer):
+            # core.search falls back to LIKE.
+            return
+        for statement in SQLITE_FTS[1:]:
+            schema_editor.execute(statement)
+
+
+def drop_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_searchdocument_text_trgm')
+    elif vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS core_searchdocument_fts_{trigger}')
+        schema_editor.execute('DROP TABLE IF EXISTS core_searchdocument_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_idempotencykey_in_flight_and_retention'),
+        ('user_auth', '0004_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField()),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_index_state', to='user_auth.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('number', models.CharField(blank=True, max_length=100)),
+                ('label', models.CharField(max_length=255)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('text', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='user_auth.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'doc_type'], name='core_search_company_type')],
+                'unique_together': {('doc_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# core.recycle_bin._registry() as of this migration: (app_label, model_name, company lookup).
+BINNED_MODELS = [
+    ('sales', 'Invoice', 'company'),
+    ('sales', 'Payment', 'company'),
+    ('purchase', 'Bill', 'company'),
+    ('purchase', 'PurchasePayment', 'company'),
+    ('purchase', 'Supplier', 'company'),
+    ('crm', 'Customer', 'company'),
+    ('products', 'Product', 'company'),
+    ('products', 'ProductTracking', 'product__company'),
+    ('accounting', 'Expense', 'company'),
+    ('user_auth', 'User', 'company'),
+]
+
+
+def backfill_deleted_items(apps, schema_editor):
+    """One entry per row already in the bin. Historical models have no __str__, so the
+    repr comes from the row's latest 'deleted' RecordDeletionLog entry when it has one."""
+    from django.utils import timezone
+
+    DeletedItem = apps.get_model('core', 'DeletedItem')
+    RecordDeletionLog = apps.get_model('core', 'RecordDeletionLog')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    now = timezone.now()
+    for app_label, model_name, lookup in BINNED_MODELS:
+        model = apps.get_model(app_label, model_name)
+        rows = list(
+            model._base_manager.filter(is_deleted=True)
+            .values_list('pk', f'{lookup}_id' if lookup == 'company' else lookup, 'deleted_at', 'deleted_by_id')
+        )
+        if not rows:
+            continue
+        content_type = ContentType.objects.filter(app_label=app_label, model=model_name.lower()).first()
+        reprs = {}
+        if content_type is not None:
+            logs = RecordDeletionLog.objects.filter(
+                content_type=content_type, action='deleted', object_id__in=[row[0] for row in rows],
+            ).order_by('performed_at')
+            reprs = dict(logs.values_list('object_id', 'object_repr'))  # latest wins
+        DeletedItem.objects.bulk_create([
+            DeletedItem(
+                company_id=company_id, model_label=f'{app_label}.{model_name.lower()}', object_id=pk,
+                object_repr=reprs.get(pk, f'{model._meta.verbose_name} #{pk}')[:255],
+                deleted_at=deleted_at or now, deleted_by_id=deleted_by_id,
+            )
+            for pk, company_id, deleted_at, deleted_by_id in rows
+            if company_id is not None
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_search_index'),
+        ('user_auth', '0004_activitylog_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('sales', '0010_invoice_discount_type'),
+        ('purchase', '0022_bill_discount_type'),
+        ('crm', '0010_alter_customerledger_reference_id'),
+        ('products', '0009_attribute_updated_at'),
+        ('accounting', '0010_import_operation_pipeline_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('object_repr', models.CharField(max_length=255)),
+                ('deleted_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deleted_items', to='user_auth.company')),
+                ('deleted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', '-deleted_at', '-id'], name='core_bin_company_deleted'), models.Index(fields=['company', 'model_label', '-deleted_at', '-id'], name='core_bin_company_model')],
+                'unique_together': {('model_label', 'object_id')},
+            },
+        ),
+        migrations.RunPython(backfill_deleted_items, migrations.RunPython.noop),
+    ]
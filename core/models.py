@@ -86,6 +86,35 @@ class RecordDeletionLog(models.Model):
         return f'{self.action} {self.content_type.model} #{self.object_id} by {self.performed_by}'
 
 
+
+class DeletedItem(models.Model):
+    """The recycle bin's contents: one row per soft-deleted record of a model the bin
+    manages (core.recycle_bin._registry()), with what the list shows precomputed at
+    deletion time. Maintained by core.recycle_bin's signal handlers whenever a row's
+    is_deleted flips or the row is purged, so listing the bin is one indexed, keyset-
+    paginated query rather than a scan of every soft-deletable table."""
+    company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='deleted_items')
+    # app_label.model_name, as the recycle bin API names models ('accounting.expense').
+    model_label = models.CharField(max_length=100)
+    # PositiveBigIntegerField for desktop-range PKs - see RecordDeletionLog.object_id.
+    object_id = models.PositiveBigIntegerField()
+    object_repr = models.CharField(max_length=255)
+    deleted_at = models.DateTimeField()
+    deleted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+    )
+
+    class Meta:
+        unique_together = ('model_label', 'object_id')
+        indexes = [
+            models.Index(fields=['company', '-deleted_at', '-id'], name='core_bin_company_deleted'),
+            models.Index(fields=['company', 'model_label', '-deleted_at', '-id'], name='core_bin_company_model'),
+        ]
+
+    def __str__(self):
+        return f'{self.model_label} #{self.object_id} deleted {self.deleted_at}'
+
+
 # IdempotencyKey and NumberSequence are defined in core/idempotency.py and
 # core/numbering.py respectively (kept alongside the logic that uses them, rather than
 # dumped into this general models.py) - but Django's app registry only registers a model
@@ -101,3 +130,4 @@ from core.idempotency import IdempotencyKey  # noqa: E402,F401
 from core.numbering import NumberSequence  # noqa: E402,F401
 from core.device_registry import DeviceIdRangeCounter, DeviceRegistration, DesktopDeviceIdentity  # noqa: E402,F401
 from core.desktop_sync_queue import DesktopSyncQueueEntry  # noqa: E402,F401
+from core.search import SearchDocument, SearchIndexState  # noqa: E402,F401
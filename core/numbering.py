@@ -19,7 +19,22 @@ this never causes a gap or jump in an already-live sequence.
 `lease_range()` (used only by the desktop app's lease-grant endpoint, see
 core/api_views.py::lease_numbers) shares the exact same counter, so a leased range can
 never be independently re-issued by a concurrent single next_number() call.
+
+Block pool (opt-in, settings.NUMBER_BLOCK_SIZE > 0): every next_number() call above is a
+select_for_update() on one hot row per (company, sequence), so a busy tenant's
+concurrent sales orders/payments/GRNs all queue behind each other on that lock for the
+rest of their transaction. For sequences SEQUENCES marks as gap-tolerant, _BlockPool
+instead leases a whole block through the same counter (lease_range()) and hands numbers
+out of it in-process, so only one caller per block ever touches the row. Fiscal
+documents (`gapless=True`) never use the pool. Numbers left in a block at process exit
+are handed back to the counter when nothing has leased past them since, and otherwise
+abandoned as a gap - the trade-off that restricts the pool to gap-tolerant sequences.
 """
+import atexit
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
 from django.db import models, transaction
 from django.utils import timezone
 
@@ -113,11 +128,15 @@ def next_number(company, sequence_key, prefix, digits, model_cls, field_name, ma
     row" lookup only filtered `payment_number__isnull=False`, not a year prefix) - so it
     needs `label_year=True` with `year_scoped=False` to reproduce that exact behavior.
     """
-    with transaction.atomic():
-        seq, year = _locked_sequence(company, sequence_key, year_scoped, model_cls, manager_name, field_name, prefix)
-        value = seq.next_value
-        seq.next_value = value + 1
-        seq.save(update_fields=['next_value'])
+    block_size = _block_size(sequence_key)
+    if block_size:
+        value, year = _pool.take(company, sequence_key, year_scoped, block_size, model_cls, field_name, manager_name, prefix)
+    else:
+        with transaction.atomic():
+            seq, year = _locked_sequence(company, sequence_key, year_scoped, model_cls, manager_name, field_name, prefix)
+            value = seq.next_value
+            seq.next_value = value + 1
+            seq.save(update_fields=['next_value'])
     display_year = timezone.now().year if (label_year and year is None) else year
     return format_number(prefix, digits, value, display_year)
 
@@ -157,31 +176,124 @@ def lease_range(company, sequence_key, prefix, digits, count, model_cls, field_n
 # candidate+uniqueness-loop scheme, not a "last number + 1" sequence, and isn't printed
 # on customer receipts, so it's a lower-priority follow-up rather than forced into this
 # shape.
+#
+# `gapless` marks the fiscal documents (invoices and the credit/debit notes that amend
+# them) whose numbering must stay strictly consecutive - those always take the locked
+# single-number path in next_number(). Every other sequence tolerates the occasional
+# gap, so it may be served from the in-process block pool below when
+# settings.NUMBER_BLOCK_SIZE enables it.
 SEQUENCES = {
-    'quotation': dict(model_label='sales.Quotation', prefix='QUO', digits=6, field_name='quotation_number', manager_name='objects', year_scoped=False),
-    'sales_order': dict(model_label='sales.SalesOrder', prefix='SO', digits=6, field_name='order_number', manager_name='objects', year_scoped=False),
-    'delivery_note': dict(model_label='sales.DeliveryNote', prefix='DN', digits=6, field_name='delivery_number', manager_name='objects', year_scoped=False),
-    'invoice': dict(model_label='sales.Invoice', prefix='INV', digits=6, field_name='invoice_number', manager_name='all_objects', year_scoped=False),
-    'payment': dict(model_label='sales.Payment', prefix='PAY', digits=6, field_name='payment_number', manager_name='all_objects', year_scoped=False),
-    'credit_note': dict(model_label='sales.CreditNote', prefix='CN', digits=6, field_name='credit_number', manager_name='objects', year_scoped=False),
-    'debit_note': dict(model_label='purchase.DebitNote', prefix='DBN', digits=6, field_name='debit_number', manager_name='objects', year_scoped=False),
-    'supplier': dict(model_label='purchase.Supplier', prefix='SUP', digits=6, field_name='supplier_code', manager_name='all_objects', year_scoped=False),
-    'purchase_order': dict(model_label='purchase.PurchaseOrder', prefix='PO', digits=4, field_name='po_number', manager_name='objects', year_scoped=True),
-    'grn': dict(model_label='purchase.GoodsReceiptNote', prefix='GRN', digits=4, field_name='grn_number', manager_name='objects', year_scoped=True),
-    'quality_inspection': dict(model_label='purchase.QualityInspection', prefix='QI', digits=4, field_name='inspection_number', manager_name='objects', year_scoped=True),
-    'bill': dict(model_label='purchase.Bill', prefix='BILL', digits=4, field_name='bill_number', manager_name='all_objects', year_scoped=True),
-    'purchase_payment': dict(model_label='purchase.PurchasePayment', prefix='PAY', digits=6, field_name='payment_number', manager_name='all_objects', year_scoped=False, label_year=True),
-    'customer': dict(model_label='crm.Customer', prefix='CUST', digits=6, field_name='customer_code', manager_name='all_objects', year_scoped=False),
+    'quotation': dict(model_label='sales.Quotation', prefix='QUO', digits=6, field_name='quotation_number', manager_name='objects', year_scoped=False, gapless=False),
+    'sales_order': dict(model_label='sales.SalesOrder', prefix='SO', digits=6, field_name='order_number', manager_name='objects', year_scoped=False, gapless=False),
+    'delivery_note': dict(model_label='sales.DeliveryNote', prefix='DN', digits=6, field_name='delivery_number', manager_name='objects', year_scoped=False, gapless=False),
+    'invoice': dict(model_label='sales.Invoice', prefix='INV', digits=6, field_name='invoice_number', manager_name='all_objects', year_scoped=False, gapless=True),
+    'payment': dict(model_label='sales.Payment', prefix='PAY', digits=6, field_name='payment_number', manager_name='all_objects', year_scoped=False, gapless=False),
+    'credit_note': dict(model_label='sales.CreditNote', prefix='CN', digits=6, field_name='credit_number', manager_name='objects', year_scoped=False, gapless=True),
+    'debit_note': dict(model_label='purchase.DebitNote', prefix='DBN', digits=6, field_name='debit_number', manager_name='objects', year_scoped=False, gapless=True),
+    'supplier': dict(model_label='purchase.Supplier', prefix='SUP', digits=6, field_name='supplier_code', manager_name='all_objects', year_scoped=False, gapless=False),
+    'purchase_order': dict(model_label='purchase.PurchaseOrder', prefix='PO', digits=4, field_name='po_number', manager_name='objects', year_scoped=True, gapless=False),
+    'grn': dict(model_label='purchase.GoodsReceiptNote', prefix='GRN', digits=4, field_name='grn_number', manager_name='objects', year_scoped=True, gapless=False),
+    'quality_inspection': dict(model_label='purchase.QualityInspection', prefix='QI', digits=4, field_name='inspection_number', manager_name='objects', year_scoped=True, gapless=False),
+    'bill': dict(model_label='purchase.Bill', prefix='BILL', digits=4, field_name='bill_number', manager_name='all_objects', year_scoped=True, gapless=False),
+    'purchase_payment': dict(model_label='purchase.PurchasePayment', prefix='PAY', digits=6, field_name='payment_number', manager_name='all_objects', year_scoped=False, label_year=True, gapless=False),
+    'customer': dict(model_label='crm.Customer', prefix='CUST', digits=6, field_name='customer_code', manager_name='all_objects', year_scoped=False, gapless=False),
     # Manual ledger debit/credit adjustments - one sequence_key per (entity, direction)
     # since the model's own save() picks its prefix (DR/CR) at save time from a single
     # `entry_type` field, and each prefix needs its own independent counter.
-    'customer_ledger_debit': dict(model_label='crm.CustomerLedgerAdjustment', prefix='DR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False),
-    'customer_ledger_credit': dict(model_label='crm.CustomerLedgerAdjustment', prefix='CR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False),
-    'supplier_ledger_debit': dict(model_label='purchase.SupplierLedgerAdjustment', prefix='DR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False),
-    'supplier_ledger_credit': dict(model_label='purchase.SupplierLedgerAdjustment', prefix='CR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False),
+    'customer_ledger_debit': dict(model_label='crm.CustomerLedgerAdjustment', prefix='DR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False, gapless=False),
+    'customer_ledger_credit': dict(model_label='crm.CustomerLedgerAdjustment', prefix='CR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False, gapless=False),
+    'supplier_ledger_debit': dict(model_label='purchase.SupplierLedgerAdjustment', prefix='DR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False, gapless=False),
+    'supplier_ledger_credit': dict(model_label='purchase.SupplierLedgerAdjustment', prefix='CR', digits=6, field_name='adjustment_number', manager_name='all_objects', year_scoped=False, gapless=False),
 }
 
 
+def _block_size(sequence_key):
+    """Block size for `sequence_key`'s pool, or 0 when it must take the locked path -
+    the pool is off (the default), or the sequence is gapless. Unknown keys are treated
+    as gapless."""
+    size = getattr(settings, 'NUMBER_BLOCK_SIZE', 0)
+    if size <= 1 or SEQUENCES.get(sequence_key, {}).get('gapless', True):
+        return 0
+    return size
+
+
+class _BlockPool:
+    """Thread-safe in-process pool of leased number blocks, keyed by (company_id,
+    counter key) - the year-qualified key for year-scoped sequences, so a block leased
+    in December is never drawn from in January.
+
+    A freshly leased block is published to the pool only once the transaction that
+    leased it commits (transaction.on_commit() - immediate outside atomic()): the caller
+    gets the block's first number straight away, but if its transaction rolls back, the
+    counter advance rolls back with it and the rest of the block must not be handed out
+    either, or the next lease would re-issue the same numbers. Several documents numbered
+    inside one transaction therefore each lease their own block; the remainders are all
+    published on commit and drawn on by later callers, so they're spent out of order
+    rather than lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = defaultdict(deque)  # (company_id, key) -> deque of [next, end]
+        self._atexit_registered = False
+
+    def take(self, company, sequence_key, year_scoped, block_size, model_cls, field_name, manager_name, prefix):
+        year = timezone.now().year if year_scoped else None
+        pool_key = (company.pk, f'{sequence_key}-{year}' if year_scoped else sequence_key)
+        with self._lock:
+            blocks = self._blocks[pool_key]
+            if blocks:
+                block = blocks[0]
+                value = block[0]
+                if value < block[1]:
+                    block[0] += 1
+                else:
+                    blocks.popleft()
+                return value, year
+
+        start, end, _ = lease_range(
+            company, sequence_key, prefix, 0, block_size, model_cls, field_name, manager_name, year_scoped,
+        )
+        if end > start:
+            transaction.on_commit(lambda: self._publish(pool_key, start + 1, end))
+        return start, year
+
+    def _publish(self, pool_key, start, end):
+        with self._lock:
+            self._blocks[pool_key].append([start, end])
+            if not self._atexit_registered:
+                atexit.register(self.release)
+                self._atexit_registered = True
+
+    def release(self):
+        """Returns every unused number to its counter where that's still safe - the
+        counter sits exactly at the block's end, i.e. nothing was leased after it -
+        and abandons the rest as a gap. Registered with atexit on first use."""
+        with self._lock:
+            pending = [(key, block) for key, blocks in self._blocks.items() for block in blocks]
+            self._blocks.clear()
+        returned = voided = 0
+        # Latest blocks first, so a process holding two consecutive blocks of the same
+        # sequence can hand both back.
+        for (company_id, key), (start, end) in sorted(pending, key=lambda p: -p[1][1]):
+            try:
+                updated = NumberSequence.objects.filter(
+                    company_id=company_id, sequence_key=key, next_value=end + 1,
+                ).update(next_value=start)
+            except Exception as exc:
+                print(f'[numbering] could not release {key} {start}-{end} for company {company_id}: {exc}')
+                updated = 0
+            if updated:
+                returned += end - start + 1
+            else:
+                voided += end - start + 1
+        if returned or voided:
+            print(f'[numbering] block pool released: {returned} number(s) returned, {voided} voided')
+
+
+_pool = _BlockPool()
+
+
 def resolve_model(model_label):
     from django.apps import apps
     return apps.get_model(model_label)
@@ -0,0 +1,158 @@
+"""
+Query-plan regression checks for the hot company-scoped queries.
+
+Nearly every screen filters by company plus a date, status or type, and for a long time
+most tables only had their implicit single-column FK indexes - fine on a demo database,
+a sequential scan of every tenant's rows on a real one. The composite indexes added for
+this (Invoice/Bill (company, date, status), StockMovement (company, movement_type,
+timestamp), JournalEntry (company, date), StockItem (company, product)) only keep
+working as long as the queries keep the shape they were chosen for - an extra OR, a
+function wrapped around a column or a reordered filter silently turns an index search
+back into a scan. So the critical queries are registered here, each as a function
+building the queryset the code runs (or the exact shape it runs) for a company, and
+sequential_scans() reads the database's own plan for it:
+
+- SQLite: EXPLAIN QUERY PLAN - a `SCAN <table>` line is a full pass over that table
+  (or over one of its indexes in order, which is no better at volume); `SEARCH` is an
+  index lookup.
+- Postgres: EXPLAIN with enable_seqscan off for the one statement, so a seeded test
+  database's few rows - where a seq scan is genuinely cheaper - don't hide a missing
+  index; a `Seq Scan` that survives that has no usable index at all.
+
+core.tests.QueryPlanTests runs every registered query against seeded data and fails on
+any scan; `manage.py check_query_plans` prints the plans against a real database.
+"""
+import re
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.utils import timezone
+
+CriticalQuery = namedtuple('CriticalQuery', 'name build')
+
+_registry = []
+
+_SQLITE_SCAN = re.compile(r'\bSCAN (\w+)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def critical_query(name):
+    """Registers `build(company)` -> QuerySet as the critical query `name`."""
+    def decorator(build):
+        _registry.append(CriticalQuery(name, build))
+        return build
+    return decorator
+
+
+def registered():
+    return list(_registry)
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+    return queryset.explain()
+
+
+def sequential_scans(plan):
+    """Model tables `plan` reads in full."""
+    pattern = _POSTGRES_SCAN if connection.vendor == 'postgresql' else _SQLITE_SCAN
+    tables = {model._meta.db_table for model in apps.get_models()}
+    return sorted({name for name in pattern.findall(plan) if name in tables})
+
+
+def check(company):
+    """[(name, plan, scanned tables)] for every registered query."""
+    results = []
+    for query in _registry:
+        plan = explain(query.build(company))
+        results.append((query.name, plan, sequential_scans(plan)))
+    return results
+
+
+# --- the registered queries --------------------------------------------------------
+
+def _period():
+    today = date.today()
+    return today - timedelta(days=30), today
+
+
+@critical_query('pos_search.scanned_code')
+def _pos_scanned_code(company):
+    from sales.api_views import pos_scanned_units
+    return pos_scanned_units(company, '356938035643809')[:20]
+
+
+@critical_query('customer_ledger.page')
+def _customer_ledger_page(company):
+    from crm.models import Customer, CustomerLedger
+    customer_id = Customer.all_objects.filter(company=company).values_list('pk', flat=True).first()
+    start, end = _period()
+    # A company with no customers yet still gets the plan - it's the same for any id.
+    entries = CustomerLedger.objects.filter(
+        customer_id=customer_id or 0, transaction_date__gte=start, transaction_date__lte=end,
+    )
+    return entries.order_by('-transaction_date', '-created_at')[:25]
+
+
+@critical_query('trial_balance.account_totals')
+def _trial_balance(company):
+    from django.db.models import Sum
+    from accounting.models import JournalEntry, JournalItem
+    start, end = _period()
+    entries = JournalEntry.objects.filter(company=company, date__gte=start, date__lte=end)
+    return JournalItem.objects.filter(entry__in=entries).values('account').annotate(debit=Sum('debit'), credit=Sum('credit'))
+
+
+@critical_query('profit_report.daily_facts')
+def _profit_report(company):
+    from analytics.models import DailySalesFact
+    start, end = _period()
+    return DailySalesFact.objects.filter(company=company, date__gte=start, date__lte=end)
+
+
+@critical_query('sales_report.invoices')
+def _sales_report(company):
+    from sales.models import Invoice
+    start, end = _period()
+    return Invoice.objects.filter(
+        company=company, invoice_date__gte=start, invoice_date__lte=end, status__in=['sent', 'paid', 'partially_paid'],
+    )
+
+
+@critical_query('analytics.sale_movements')
+def _sale_movements(company):
+    from inventory.models import StockMovement
+    start, end = _period()
+    # A timestamp range, not timestamp__date - a function around the column can only
+    # use the index's (company, movement_type) prefix.
+    start, end = (timezone.make_aware(datetime.combine(day, time.min)) for day in (start, end + timedelta(days=1)))
+    return StockMovement.objects.filter(company=company, movement_type='sale', timestamp__gte=start, timestamp__lt=end)
+
+
+@critical_query('purchase.bills_for_period')
+def _bills(company):
+    from purchase.models import Bill
+    start, end = _period()
+    return Bill.objects.filter(company=company, bill_date__gte=start, bill_date__lte=end, status='approved')
+
+
+@critical_query('inventory.stock_for_product')
+def _stock_for_product(company):
+    from inventory.models import StockItem
+    from products.models import Product
+    product = Product.all_objects.filter(company=company).first()
+    return StockItem.objects.filter(company=company, product=product)
+
+
+@critical_query('manufacturing.bom_where_used')
+def _bom_where_used(company):
+    from manufacturing.bom_graph import BOMClosure
+    from products.models import Product
+    product = Product.all_objects.filter(company=company).first()
+    return BOMClosure.objects.filter(company=company, descendant=product).order_by('depth', 'ancestor_id')
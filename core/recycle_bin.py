@@ -1,19 +1,35 @@
 """
-Cross-model recycle bin: aggregates every soft-deleted row for the logged-in user's
-company, and offers restore/purge/empty actions - all Owner/Manager only.
+Cross-model recycle bin: lists every soft-deleted row for the logged-in user's company,
+and offers restore/purge/empty actions - all Owner/Manager only.
+
+The list used to load every soft-deleted row of every registered model, str() each one
+(more FK queries) and sort the lot in Python, unpaginated. It now reads DeletedItem -
+one row per binned record with its repr, model and deletion time written when it was
+deleted - newest first, cursor-paginated on (deleted_at, id) and optionally filtered by
+?model=. The entries are kept in step by the signal handlers below: a save that flips
+is_deleted adds/removes the entry (raw saves - snapshot and desktop-sync imports - are
+reconciled on every save, since there's no loaded state to compare against), and a
+purge or cascade delete removes it. Emptying the bin deletes per model in batches of
+primary keys instead of one delete() call per row.
 
 The model imports are deliberately deferred into functions (not module scope) because
 `core` is imported by every other app's models.py (via SoftDeleteMixin) - importing
 those apps' models back into core at module load time would create an import cycle.
 """
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.utils import timezone
 
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
 from user_auth.permissions import IsOwnerOrManager
 from .mixins import log_deletion
-from .models import RecordDeletionLog
+from .models import DeletedItem, RecordDeletionLog
+
+PURGE_BATCH_SIZE = 500
 
 
 def _registry():
@@ -50,23 +66,43 @@ def _find_model(label):
     return None
 
 
+def _company_id(instance, lookup):
+    """The company id `lookup` ('company', 'product__company') reaches from `instance`."""
+    *path, last = lookup.split('__')
+    for part in path:
+        instance = getattr(instance, part, None)
+        if instance is None:
+            return None
+    return getattr(instance, f'{last}_id', None)
+
+
+class RecycleBinPagination(CursorPagination):
+    ordering = ('-deleted_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 @api_view(['GET'])
 @permission_classes([IsOwnerOrManager])
 def recycle_bin_list(request):
-    company = request.user.company
-    items = []
-    for model, lookup in _registry():
-        qs = model.all_objects.filter(is_deleted=True, **{lookup: company}).select_related('deleted_by')
-        for obj in qs:
-            items.append({
-                'model': _label(model),
-                'id': obj.pk,
-                'repr': str(obj),
-                'deleted_at': obj.deleted_at,
-                'deleted_by': obj.deleted_by.email if obj.deleted_by else None,
-            })
-    items.sort(key=lambda i: i['deleted_at'] or timezone.now(), reverse=True)
-    return Response({'results': items, 'count': len(items)})
+    entries = DeletedItem.objects.filter(company=request.user.company).select_related('deleted_by')
+    label = request.query_params.get('model')
+    if label:
+        if not _find_model(label):
+            return Response({'error': f'Unknown model {label!r}.'}, status=400)
+        entries = entries.filter(model_label=label)
+    paginator = RecycleBinPagination()
+    page = paginator.paginate_queryset(entries, request)
+    return paginator.get_paginated_response([
+        {
+            'model': entry.model_label,
+            'id': entry.object_id,
+            'repr': entry.object_repr,
+            'deleted_at': entry.deleted_at,
+            'deleted_by': entry.deleted_by.email if entry.deleted_by else None,
+        }
+        for entry in page
+    ])
 
 
 def _get_instance(request):
@@ -75,9 +111,15 @@ def _get_instance(request):
     model = _find_model(label) if label else None
     if not model or not obj_id:
         return None, Response({'error': 'model and id are required.'}, status=400)
+    try:
+        obj_id = int(obj_id)
+    except (TypeError, ValueError):
+        return None, Response({'error': 'id must be an integer.'}, status=400)
     try:
         instance = model.all_objects.get(pk=obj_id)
     except model.DoesNotExist:
+        # Gone without a signal (raw SQL, a bulk delete) - drop its stale bin entry.
+        DeletedItem.objects.filter(company=request.user.company, model_label=label, object_id=obj_id).delete()
         return None, Response({'error': 'Not found.'}, status=404)
     # Company scoping - never let one company touch another's soft-deleted rows.
     company = request.user.company
@@ -138,9 +180,80 @@ def recycle_bin_purge(request):
 def recycle_bin_empty(request):
     company = request.user.company
     purged_count = 0
-    for model, lookup in _registry():
-        for obj in list(model.all_objects.filter(is_deleted=True, **{lookup: company})):
-            log_deletion(obj, request.user, 'purged')
-            obj.delete()
-            purged_count += 1
+    with transaction.atomic():
+        for model, lookup in _registry():
+            purged_count += _purge_all(model, lookup, company, request.user)
+        # Anything left had lost its row without a signal.
+        DeletedItem.objects.filter(company=company).delete()
     return Response({'status': 'emptied', 'purged_count': purged_count})
+
+
+def _purge_all(model, lookup, company, user):
+    """Deletes `company`'s soft-deleted `model` rows PURGE_BATCH_SIZE primary keys at a
+    time, logging each from its bin entry's precomputed repr."""
+    label = _label(model)
+    content_type = ContentType.objects.get_for_model(model)
+    deleted = model.all_objects.filter(is_deleted=True, **{lookup: company})
+    purged = 0
+    while True:
+        ids = list(deleted.order_by('pk').values_list('pk', flat=True)[:PURGE_BATCH_SIZE])
+        if not ids:
+            return purged
+        reprs = dict(
+            DeletedItem.objects.filter(model_label=label, object_id__in=ids).values_list('object_id', 'object_repr')
+        )
+        RecordDeletionLog.objects.bulk_create([
+            RecordDeletionLog(
+                company=company, content_type=content_type, object_id=pk, action='purged', performed_by=user,
+                object_repr=reprs.get(pk, f'{model._meta.verbose_name} #{pk}'),
+            )
+            for pk in ids
+        ])
+        # Cascades (an invoice's items, ...) and the post_delete handler below - which
+        # drops the bin entries - run per batch.
+        _, per_model = model.all_objects.filter(pk__in=ids).delete()
+        purged += per_model.get(model._meta.label, 0)
+
+
+# --- keeping DeletedItem in step ---------------------------------------------------
+
+def _remember_deleted(sender, instance, **kwargs):
+    instance._bin_was_deleted = instance.is_deleted
+
+
+def _record_changed(sender, instance, lookup, **kwargs):
+    was_deleted = getattr(instance, '_bin_was_deleted', None)
+    instance._bin_was_deleted = instance.is_deleted
+    if not kwargs.get('raw') and was_deleted == instance.is_deleted:
+        return  # the common case: a save that didn't touch is_deleted
+    if not instance.is_deleted:
+        DeletedItem.objects.filter(model_label=_label(sender), object_id=instance.pk).delete()
+        return
+    company_id = _company_id(instance, lookup)
+    if company_id is None:
+        return
+    DeletedItem.objects.update_or_create(
+        model_label=_label(sender), object_id=instance.pk,
+        defaults={
+            'company_id': company_id,
+            'object_repr': str(instance)[:255],
+            'deleted_at': instance.deleted_at or timezone.now(),
+            'deleted_by_id': instance.deleted_by_id,
+        },
+    )
+
+
+def _record_removed(sender, instance, **kwargs):
+    DeletedItem.objects.filter(model_label=_label(sender), object_id=instance.pk).delete()
+
+
+def connect_signals():
+    for model, lookup in _registry():
+        label = _label(model)
+
+        def changed(sender, instance, _lookup=lookup, **kwargs):
+            _record_changed(sender, instance, _lookup, **kwargs)
+
+        post_init.connect(_remember_deleted, sender=model, dispatch_uid=f'recycle_bin_init_{label}')
+        post_save.connect(changed, sender=model, weak=False, dispatch_uid=f'recycle_bin_save_{label}')
+        post_delete.connect(_record_removed, sender=model, dispatch_uid=f'recycle_bin_delete_{label}')
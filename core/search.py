@@ -0,0 +1,321 @@
+"""
+Per-company search index behind core.api_views.global_search.
+
+global_search used to run eight `icontains` queries per keystroke - invoices, bills,
+credit notes, payments, vendor payments, products, customers and suppliers - each a
+leading-wildcard LIKE that no b-tree index can serve, so every one scanned the company's
+whole table and the box got slower with every document the shop recorded. Here every
+searchable record has one SearchDocument row: its type and id, the number/label/subtitle
+a result shows, and `text` - the same fields the old queries matched (numbers, names,
+SKU, barcode, phone), case-folded and joined. A search is then one query over that one
+table, ranked exact number > number prefix > label prefix > substring, and the table is
+indexed for substring matching:
+
+- Postgres: a pg_trgm GIN index on `text` (migration 0012), which serves
+  `LIKE '%term%'` directly, and results are additionally ordered by trigram similarity.
+- SQLite (desktop): an external-content FTS5 table `core_searchdocument_fts` with the
+  trigram tokenizer, kept in step with core_searchdocument by triggers. Terms of 3+
+  characters are looked up through it; 2-character terms (shorter than a trigram) and
+  SQLite builds without FTS5 fall back to LIKE on the one table.
+
+Maintenance follows analytics.facts: a save/delete of any indexed model marks
+(type, id) dirty, and once the transaction commits the dirty rows are re-read in one
+query per type and upserted (or their documents removed when the row is gone or
+soft-deleted). Raw saves are indexed too - the re-read happens after commit, when a
+snapshot/sync import's related rows all exist - so desktop pulls stay searchable.
+A supplier's name lives on its crm.Partner, so partner saves re-index their supplier.
+Subtitles (an invoice's customer name, ...) are refreshed when the document itself is
+next saved; renaming a customer doesn't re-index its history.
+
+Bulk writes skip signals: chunked imports (core.imports.records_imported) re-index the
+imported types, and rebuild() - `manage.py rebuild_search_index`, and ensure_built() on a
+company's first search - recomputes everything else.
+"""
+import threading
+
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+FTS_TABLE = 'core_searchdocument_fts'
+RESULT_LIMIT = 50
+BATCH_SIZE = 500
+
+_local = threading.local()
+_fts_available = {}
+
+
+class SearchDocument(models.Model):
+    """One searchable record. Derived - rebuilt from the source tables, never synced."""
+    company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='search_documents')
+    doc_type = models.CharField(max_length=30)
+    # PositiveBigIntegerField for desktop-range PKs - see RecordDeletionLog.object_id.
+    object_id = models.PositiveBigIntegerField()
+    number = models.CharField(max_length=100, blank=True)
+    label = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    # Case-folded, whitespace-joined searchable fields. On SQLite, triggers copy this
+    # column into core_searchdocument_fts - a migration that makes Django rebuild this
+    # table (most AlterFields on SQLite) drops them, and must recreate them.
+    text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('doc_type', 'object_id')
+        indexes = [models.Index(fields=['company', 'doc_type'], name='core_search_company_type')]
+
+    def __str__(self):
+        return f'{self.doc_type} #{self.object_id}: {self.label}'
+
+
+class SearchIndexState(models.Model):
+    """Marks a company whose documents have been fully built (see ensure_built())."""
+    company = models.OneToOneField('user_auth.Company', on_delete=models.CASCADE, related_name='search_index_state')
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.company_id} built {self.built_at}'
+
+
+# --- what gets indexed -------------------------------------------------------------
+
+def _name(obj, default=''):
+    return obj.name if obj is not None else default
+
+
+class Source:
+    """One indexed model: `fields` are the '__' paths whose values are searchable,
+    `number`/`label`/`subtitle` build the result a client shows."""
+
+    def __init__(self, doc_type, model, fields, number, label, subtitle, related=(), manager='all_objects'):
+        self.doc_type = doc_type
+        self.model_label = model
+        self.fields = fields
+        self.number = number
+        self.label = label
+        self.subtitle = subtitle
+        self.related = related
+        self.manager = manager
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def queryset(self):
+        """Every row, soft-deleted included (so removal can be detected)."""
+        return getattr(self.model, self.manager).select_related(*self.related)
+
+    def indexed(self, obj):
+        return not getattr(obj, 'is_deleted', False)
+
+    def document(self, obj, now):
+        values = []
+        for path in self.fields:
+            value = obj
+            for part in path.split('__'):
+                value = getattr(value, part, None) if value is not None else None
+            if value:
+                values.append(str(value))
+        number = self.number(obj) or ''
+        return SearchDocument(
+            company_id=obj.company_id, doc_type=self.doc_type, object_id=obj.pk,
+            number=number[:100], label=(self.label(obj) or number)[:255],
+            subtitle=(self.subtitle(obj) or '')[:255], text=normalise(' '.join(values)), updated_at=now,
+        )
+
+
+SOURCES = [
+    Source(
+        'invoice', 'sales.Invoice', ['invoice_number'], lambda o: o.invoice_number,
+        lambda o: f'Invoice {o.invoice_number}', lambda o: _name(o.customer, 'Walk-in'), related=['customer'],
+    ),
+    Source(
+        'bill', 'purchase.Bill', ['bill_number'], lambda o: o.bill_number,
+        lambda o: f'Bill {o.bill_number}', lambda o: _name(o.supplier and o.supplier.partner),
+        related=['supplier__partner'],
+    ),
+    Source(
+        'credit_note', 'sales.CreditNote', ['credit_number'], lambda o: o.credit_number,
+        lambda o: f'Credit Note {o.credit_number}', lambda o: _name(o.customer), related=['customer'],
+        manager='objects',
+    ),
+    Source(
+        'payment', 'sales.Payment', ['payment_number'], lambda o: o.payment_number,
+        lambda o: f'Payment {o.payment_number}', lambda o: _name(o.customer), related=['customer'],
+    ),
+    Source(
+        'purchase_payment', 'purchase.PurchasePayment', ['payment_number'], lambda o: o.payment_number,
+        lambda o: f'Vendor Payment {o.payment_number}', lambda o: _name(o.supplier and o.supplier.partner),
+        related=['supplier__partner'],
+    ),
+    Source(
+        'product', 'products.Product', ['sku', 'name', 'barcode'], lambda o: o.sku,
+        lambda o: o.name, lambda o: o.sku,
+    ),
+    Source(
+        'customer', 'crm.Customer', ['name', 'customer_code', 'phone'], lambda o: o.customer_code,
+        lambda o: o.name, lambda o: o.customer_code,
+    ),
+    Source(
+        'supplier', 'purchase.Supplier', ['partner__name', 'supplier_code'], lambda o: o.supplier_code,
+        lambda o: _name(o.partner), lambda o: o.supplier_code, related=['partner'],
+    ),
+]
+SOURCES_BY_TYPE = {source.doc_type: source for source in SOURCES}
+
+
+def normalise(value):
+    return ' '.join(str(value).casefold().split())
+
+
+# --- writing documents -------------------------------------------------------------
+
+def _upsert(documents):
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['doc_type', 'object_id'],
+        update_fields=['company', 'number', 'label', 'subtitle', 'text', 'updated_at'],
+    )
+
+
+def reindex(doc_type, object_ids):
+    """Brings the documents of `object_ids` (of one type) in line with their rows."""
+    source = SOURCES_BY_TYPE[doc_type]
+    object_ids = list(object_ids)
+    now = timezone.now()
+    for start in range(0, len(object_ids), BATCH_SIZE):
+        batch = object_ids[start:start + BATCH_SIZE]
+        rows = [obj for obj in source.queryset().filter(pk__in=batch) if source.indexed(obj)]
+        _upsert([source.document(obj, now) for obj in rows])
+        kept = {obj.pk for obj in rows}
+        SearchDocument.objects.filter(doc_type=doc_type, object_id__in=[pk for pk in batch if pk not in kept]).delete()
+
+
+def rebuild(company, doc_types=None):
+    """Recomputes `company`'s documents (all types, or just `doc_types`) from scratch.
+    Returns the number of documents written. A full rebuild marks the company built."""
+    now = timezone.now()
+    count = 0
+    with transaction.atomic():
+        for source in SOURCES:
+            if doc_types is not None and source.doc_type not in doc_types:
+                continue
+            SearchDocument.objects.filter(company=company, doc_type=source.doc_type).delete()
+            documents = []
+            rows = source.queryset().filter(company=company).iterator(chunk_size=BATCH_SIZE)
+            for obj in rows:
+                if source.indexed(obj):
+                    documents.append(source.document(obj, now))
+                if len(documents) >= BATCH_SIZE:
+                    _upsert(documents)
+                    count, documents = count + len(documents), []
+            _upsert(documents)
+            count += len(documents)
+        if doc_types is None:
+            SearchIndexState.objects.update_or_create(company=company, defaults={'built_at': now})
+    return count
+
+
+def ensure_built(company):
+    """The company's first full index, built once: as analytics.facts.ensure_built(),
+    a first search waits on the company row while another one builds, then finds
+    the index there. `manage.py rebuild_search_index` builds it ahead of any search."""
+    if SearchIndexState.objects.filter(company=company).exists():
+        return
+    from user_auth.models import Company
+    with transaction.atomic():
+        Company.objects.select_for_update(no_key=True).filter(pk=company.pk).first()
+        if not SearchIndexState.objects.filter(company=company).exists():
+            rebuild(company)
+
+
+# --- searching ---------------------------------------------------------------------
+
+class _Similarity(models.Func):
+    function = 'similarity'
+    output_field = models.FloatField()
+
+
+def _has_fts():
+    alias = connection.alias
+    if alias not in _fts_available:
+        _fts_available[alias] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[alias]
+
+
+def search(company, q, limit=RESULT_LIMIT):
+    """The ranked documents matching `q` in `company` (one query)."""
+    term = normalise(q)
+    documents = SearchDocument.objects.filter(company=company)
+    if connection.vendor == 'sqlite' and len(term) >= 3 and _has_fts():
+        phrase = '"' + term.replace('"', '""') + '"'
+        documents = documents.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [phrase]),
+        )
+    else:
+        documents = documents.filter(text__contains=term)
+    ordering = [Case(
+        When(number__iexact=term, then=Value(0)),
+        When(number__istartswith=term, then=Value(1)),
+        When(label__istartswith=term, then=Value(2)),
+        default=Value(3), output_field=IntegerField(),
+    )]
+    if connection.vendor == 'postgresql':
+        ordering.append(_Similarity('text', Value(term)).desc())
+    return list(documents.order_by(*ordering, 'label')[:limit])
+
+
+# --- incremental maintenance -------------------------------------------------------
+
+def _pending():
+    if not hasattr(_local, 'keys'):
+        _local.keys = set()
+    return _local.keys
+
+
+def _schedule(keys):
+    _pending().update(keys)
+    # Same drain-on-first-callback scheme as analytics.facts._schedule().
+    transaction.on_commit(_flush, robust=True)
+
+
+def _flush():
+    pending = _pending()
+    by_type = {}
+    while pending:
+        doc_type, object_id = pending.pop()
+        by_type.setdefault(doc_type, set()).add(object_id)
+    for doc_type, object_ids in by_type.items():
+        reindex(doc_type, object_ids)
+
+
+def _record_changed(sender, instance, **kwargs):
+    doc_type = _TYPE_BY_MODEL.get(sender._meta.label)
+    if doc_type and instance.pk:
+        _schedule([(doc_type, instance.pk)])
+
+
+def _partner_changed(sender, instance, **kwargs):
+    from purchase.models import Supplier
+    _schedule(('supplier', pk) for pk in Supplier.all_objects.filter(partner_id=instance.pk).values_list('pk', flat=True))
+
+
+def _records_imported(sender, company_id, **kwargs):
+    from user_auth.models import Company
+    doc_type = _TYPE_BY_MODEL.get(sender._meta.label)
+    if doc_type:
+        rebuild(Company.objects.get(pk=company_id), doc_types=[doc_type])
+
+
+_TYPE_BY_MODEL = {source.model_label: source.doc_type for source in SOURCES}
+
+
+def connect_signals():
+    from core.imports import records_imported
+    for source in SOURCES:
+        post_save.connect(_record_changed, sender=source.model_label, dispatch_uid=f'search_index_save_{source.doc_type}')
+        post_delete.connect(_record_changed, sender=source.model_label, dispatch_uid=f'search_index_delete_{source.doc_type}')
+    post_save.connect(_partner_changed, sender='crm.Partner', dispatch_uid='search_index_partner_save')
+    records_imported.connect(_records_imported, dispatch_uid='search_index_imported')
@@ -104,6 +104,7 @@ MANIFEST = [
     ('inventory', 'WarehouseZone', ('via', 'warehouse')),
     ('inventory', 'WarehouseBin', ('via', 'warehouse')),
     ('inventory', 'StockItem', 'direct'),
+    ('inventory', 'CostLayer', 'direct'),
     ('inventory', 'StockLot', ('via', 'stock_item')),
     ('inventory', 'StockSerial', ('via', 'stock_item')),
     ('inventory', 'StockReservation', ('via', 'stock_item')),
@@ -167,23 +168,37 @@ MANIFEST = [
 # Deliberately excluded (see module docstring): no reliable path to a single company.
 # accounting.AccountingAuditLog, accounting.AccountTemplate, accounting.AccountTemplateGroup,
 # accounting.AccountTemplateAccount, accounting.ImportExportOperation, user_auth.ActivityLog
+# Also excluded, though company-scoped: analytics.DailySalesFact, analytics.DailyProductSales
+# and analytics.SalesFactState - pure aggregates of rows already in MANIFEST, rebuilt on
+# first read after an import (analytics.facts.ensure_built()), and core.SearchDocument /
+# core.SearchIndexState - the search index - and core.DeletedItem - the recycle bin's
+# listing - both re-derived from the imported rows themselves (core/search.py,
+# core/recycle_bin.py).
 
 
-def _queryset_for(app_label, model_name, scope, company):
-    from django.apps import apps
-    model = apps.get_model(app_label, model_name)
-    manager = getattr(model, 'all_objects', None) or model.objects
+def _company_path(scope):
+    """The lookup from a MANIFEST model to its company FK, or None for 'global'."""
     if scope == 'global':
-        return manager.all()
+        return None
     if scope == 'direct':
-        return manager.filter(company=company)
+        return 'company'
     if isinstance(scope, tuple) and scope[0] == 'via':
-        return manager.filter(**{f'{scope[1]}__company': company})
+        return f'{scope[1]}__company'
     if isinstance(scope, tuple) and scope[0] == 'via2':
-        return manager.filter(**{f'{scope[1]}__{scope[2]}__company': company})
+        return f'{scope[1]}__{scope[2]}__company'
     raise ValueError(f'Unknown scope spec: {scope!r}')
 
 
+def _queryset_for(app_label, model_name, scope, company):
+    from django.apps import apps
+    model = apps.get_model(app_label, model_name)
+    manager = getattr(model, 'all_objects', None) or model.objects
+    path = _company_path(scope)
+    if path is None:
+        return manager.all()
+    return manager.filter(**{path: company})
+
+
 def export_snapshot(company):
     """Returns a list of serialized objects (django.core.serializers 'python' format -
     [{'model': 'app.model', 'pk': ..., 'fields': {...}}, ...]) for every in-scope model,
@@ -233,6 +248,23 @@ def export_all_companies_snapshot():
     return objects
 
 
+def all_companies_querysets():
+    """The rows export_all_companies_snapshot() returns, as one unevaluated queryset
+    per model - ('app_label.modelname', queryset) pairs, Company first, then MANIFEST
+    order. Each row appears once (a company-scoped row belongs to exactly one company),
+    so a caller can read the models one at a time instead of holding the whole system's
+    data in a list - the backup workbook does."""
+    from django.apps import apps
+
+    yield Company._meta.label_lower, Company.objects.order_by('pk')
+    for app_label, model_name, scope in MANIFEST:
+        model = apps.get_model(app_label, model_name)
+        manager = getattr(model, 'all_objects', None) or model.objects
+        path = _company_path(scope)
+        queryset = manager.all() if path is None else manager.filter(**{f'{path}__isnull': False})
+        yield model._meta.label_lower, queryset.order_by('pk')
+
+
 def export_snapshot_delta(company, since):
     """Like export_snapshot(), but scoped to what's changed since `since` (an ISO
     timestamp string, or None for a full export identical to export_snapshot()'s
@@ -85,7 +85,7 @@ CLASSIFICATION = {
     ('purchase', 'PurchaseReturn'): {'kind': EVENT},
     ('purchase', 'PurchaseApproval'): {'kind': EVENT},
 
-    # --- inventory --- (StockItem/StockAlert deliberately absent - DERIVED, excluded)
+    # --- inventory --- (StockItem/CostLayer/StockAlert deliberately absent - DERIVED, excluded)
     ('inventory', 'Warehouse'): {'kind': STATE},
     ('inventory', 'StockLot'): {'kind': STATE},
     ('inventory', 'StockSerial'): {'kind': STATE},
@@ -134,8 +134,19 @@ CLASSIFICATION = {
 # greppable "yes, deliberately excluded" record rather than a silent omission.
 DERIVED_MODELS = {
     ('inventory', 'StockItem'),
+    ('inventory', 'CostLayer'),
     ('inventory', 'StockAlert'),
     ('accounting', 'FinancialStatement'),
+    ('analytics', 'DailySalesFact'),
+    ('analytics', 'DailyProductSales'),
+    ('analytics', 'SalesFactState'),
+    ('core', 'SearchDocument'),
+    ('core', 'SearchIndexState'),
+    ('core', 'DeletedItem'),
+    ('manufacturing', 'BOMClosure'),
+    ('manufacturing', 'BOMGraphState'),
+    ('purchase', 'SupplierMonthlyScore'),
+    ('purchase', 'SupplierScorecardState'),
 }
 
 # DERIVED *fields* on models that otherwise sync normally as STATE - never trust these
@@ -145,6 +156,11 @@ DERIVED_FIELDS = {
     ('sales', 'Invoice'): ['paid_amount'],
     ('purchase', 'Bill'): ['paid_amount'],
     ('crm', 'SupplierRating'): ['overall_rating'],
+    ('purchase', 'Supplier'): ['quality_rating', 'delivery_rating', 'price_rating', 'overall_rating'],
+    ('manufacturing', 'SupplierLeadTime'): [
+        'lead_time_days', 'min_lead_time_days', 'max_lead_time_days', 'on_time_delivery_rate', 'actual_deliveries',
+        'late_deliveries',
+    ],
 }
 
 
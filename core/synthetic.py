@@ -0,0 +1,407 @@
+"""
+Synthetic large-tenant data for performance work - see core.benchmarks for what is
+measured against it.
+
+seed_erp and seed_shop_demo build a few dozen hand-written records through create()
+and the real API flows, which is right for a demo and useless for judging whether a
+screen survives a shop with five years of history. generate() fills one company with
+a PRESETS-sized dataset instead, written with bulk_create() in BATCH_SIZE chunks so the
+`large` preset (10k products, 1M stock movements, 500k invoices, five years of journal
+entries) takes minutes rather than days:
+
+- a warehouse, product categories and a small chart of accounts (created once, reused
+  by later runs against the same company);
+- products (a fifth of them IMEI-tracked, with available ProductTracking units for the
+  POS scanner path), one StockItem per product with an opening CostLayer;
+- stock movements - receipts and sales spread over the history window, with stock
+  quantities set from their net (topped up by an adjustment where sales outran
+  receipts);
+- customers and invoices with their lines, mostly paid;
+- balanced two-line journal entries every day of the window.
+
+Everything is drawn from random.Random(seed), so the same preset and seed give the
+same shape of data. Codes that are unique across companies (SKU, IMEI, barcode) carry
+the company id; invoice numbers and customer codes are leased from core.numbering like
+any other batch, so real documents created afterwards continue the sequence.
+
+Bulk writes skip save() and every signal, so none of the models' own side effects run -
+no customer ledger postings, no journal entries for the invoices, no per-movement cost
+layering. The data is shaped for load, not bookkeeping. The derived tables are brought
+up to date at the end the way an import run does it (core.imports.records_imported and
+the dashboard metrics), plus a full analytics.facts rebuild, so the first benchmark
+run doesn't pay for building them.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+BATCH_SIZE = 5000
+
+# products / tracked_units / customers / stock_movements / invoices: row counts.
+# lines_per_invoice: upper bound, each invoice gets 1..n lines. days: the history window
+# every dated row falls in. journal_entries_per_day: entries on each day of that window.
+PRESETS = {
+    'tiny': dict(
+        products=20, tracked_units=20, customers=10, stock_movements=200, invoices=50,
+        lines_per_invoice=2, days=30, journal_entries_per_day=2,
+    ),
+    'small': dict(
+        products=1000, tracked_units=2000, customers=1000, stock_movements=50_000, invoices=20_000,
+        lines_per_invoice=3, days=365, journal_entries_per_day=20,
+    ),
+    'medium': dict(
+        products=5000, tracked_units=10_000, customers=5000, stock_movements=250_000, invoices=100_000,
+        lines_per_invoice=3, days=730, journal_entries_per_day=40,
+    ),
+    'large': dict(
+        products=10_000, tracked_units=20_000, customers=20_000, stock_movements=1_000_000, invoices=500_000,
+        lines_per_invoice=3, days=1826, journal_entries_per_day=60,
+    ),
+}
+
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Oppo', 'Vivo', 'Nokia', 'Anker', 'Generic']
+KINDS = ['Phone', 'Charger', 'Cable', 'Case', 'Earbuds', 'Power Bank', 'Screen Guard', 'Smart Watch']
+
+# (code, name, type, balance_side) - enough accounts for the journal entry patterns below.
+ACCOUNTS = [
+    ('SYN-1000', 'Cash', 'asset', 'debit'),
+    ('SYN-1100', 'Accounts Receivable', 'asset', 'debit'),
+    ('SYN-1200', 'Inventory', 'asset', 'debit'),
+    ('SYN-2000', 'Accounts Payable', 'liability', 'credit'),
+    ('SYN-3000', "Owner's Equity", 'equity', 'credit'),
+    ('SYN-4000', 'Sales', 'income', 'credit'),
+    ('SYN-5000', 'Cost of Goods Sold', 'expense', 'debit'),
+    ('SYN-6000', 'Operating Expenses', 'expense', 'debit'),
+]
+
+# (debit account, credit account, description, amount range) - one picked per entry.
+ENTRY_PATTERNS = [
+    ('SYN-1000', 'SYN-4000', 'Cash sales', (50, 5000)),
+    ('SYN-1100', 'SYN-4000', 'Credit sales', (100, 8000)),
+    ('SYN-1000', 'SYN-1100', 'Customer receipt', (100, 8000)),
+    ('SYN-5000', 'SYN-1200', 'Cost of sales', (30, 4000)),
+    ('SYN-1200', 'SYN-2000', 'Stock purchase', (500, 20000)),
+    ('SYN-2000', 'SYN-1000', 'Supplier payment', (500, 20000)),
+    ('SYN-6000', 'SYN-1000', 'Operating expense', (20, 1500)),
+]
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def _keep_auto_now_add(model, field_name):
+    """bulk_create() stamps auto_now_add fields with now() - history needs its own
+    values, so the flag is lifted for the duration of the write."""
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Generator:
+    def __init__(self, company, user, sizes, seed=0, progress=None):
+        self.company = company
+        self.user = user
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+        self.today = timezone.localdate()
+        self.start = self.today - timedelta(days=sizes['days'] - 1)
+        self.counts = {}
+
+    def _day(self):
+        return self.start + timedelta(days=self.rng.randrange(self.sizes['days']))
+
+    def _moment(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.sizes['days'] * 86400))
+
+    def run(self):
+        with transaction.atomic():
+            self._reference_data()
+            self._products()
+            self._tracked_units()
+            self._stock()
+            self._customers()
+            self._invoices()
+            self._journal_entries()
+        return self.counts
+
+    def _reference_data(self):
+        from accounting.models import Account, AccountCategory, AccountGroup, Journal
+        from inventory.models import Warehouse
+        from products.models import ProductCategory
+
+        company = self.company
+        self.warehouse, _ = Warehouse.objects.get_or_create(
+            company=company, code='SYN-WH', defaults={'name': 'Synthetic Warehouse'},
+        )
+        self.categories = [
+            ProductCategory.objects.get_or_create(company=company, name=kind, defaults={'code': f'SYN-{index}'})[0]
+            for index, kind in enumerate(KINDS)
+        ]
+        category, _ = AccountCategory.objects.get_or_create(company=company, code='SYN', defaults={'name': 'Synthetic'})
+        group, _ = AccountGroup.objects.get_or_create(
+            company=company, code='SYN', defaults={'name': 'Synthetic', 'category': category},
+        )
+        self.accounts = {
+            code: Account.objects.get_or_create(
+                company=company, code=code,
+                defaults={'name': name, 'type': account_type, 'balance_side': side, 'group': group},
+            )[0]
+            for code, name, account_type, side in ACCOUNTS
+        }
+        self.journal, _ = Journal.objects.get_or_create(company=company, name='Synthetic General', defaults={'type': 'general'})
+
+    def _products(self):
+        from products.models import Product
+
+        offset = Product.all_objects.filter(company=self.company).count()
+        company_id = self.company.pk
+        products = []
+        for n in range(offset, offset + self.sizes['products']):
+            kind_index = self.rng.randrange(len(KINDS))
+            tracked = KINDS[kind_index] == 'Phone' or self.rng.random() < 0.1
+            cost = Decimal(self.rng.randint(2, 900))
+            products.append(Product(
+                company_id=company_id, name=f'{self.rng.choice(BRANDS)} {KINDS[kind_index]} {n}',
+                brand=BRANDS[n % len(BRANDS)], sku=f'SYN{company_id}-{n:07d}',
+                barcode=None if tracked else f'2{company_id:05d}{n:07d}',
+                category=self.categories[kind_index], cost_price=cost,
+                selling_price=(cost * Decimal('1.3')).quantize(Decimal('1')),
+                tracking_method='imei' if tracked else 'none', requires_individual_tracking=tracked,
+                reorder_level=Decimal(10), minimum_stock=Decimal(5), safety_stock=Decimal(5),
+                lead_time_days=self.rng.randint(1, 14), created_by=self.user,
+            ))
+        self.products = []
+        for chunk in _chunks(products):
+            self.products.extend(Product.objects.bulk_create(chunk))
+        self.tracked_products = [p for p in self.products if p.tracking_method != 'none']
+        self.counts['products'] = len(self.products)
+        self.progress(f'{len(self.products)} products')
+
+    def _tracked_units(self):
+        from products.models import ProductTracking
+
+        if not self.tracked_products:
+            self.counts['tracked_units'] = 0
+            return
+        offset = ProductTracking.all_objects.filter(product__company=self.company).count()
+        company_id = self.company.pk
+        units = []
+        for n in range(offset, offset + self.sizes['tracked_units']):
+            product = self.rng.choice(self.tracked_products)
+            units.append(ProductTracking(
+                product=product, imei_number=f'{company_id:05d}{n:010d}', status='available',
+                current_warehouse=self.warehouse, purchase_price=product.cost_price, purchase_date=self._day(),
+            ))
+        for chunk in _chunks(units):
+            ProductTracking.objects.bulk_create(chunk)
+        self.counts['tracked_units'] = len(units)
+        self.progress(f'{len(units)} tracked units')
+
+    def _stock(self):
+        from inventory.models import CostLayer, StockItem, StockMovement
+
+        items = [
+            StockItem(
+                company=self.company, product=product, category=product.category, warehouse=self.warehouse,
+                average_cost=product.cost_price, last_purchase_cost=product.cost_price,
+                is_tracked=product.tracking_method != 'none',
+            )
+            for product in self.products
+        ]
+        stock_items = []
+        for chunk in _chunks(items):
+            stock_items.extend(StockItem.objects.bulk_create(chunk))
+        if not stock_items:
+            self.counts['stock_movements'] = 0
+            return
+
+        net = dict.fromkeys((item.pk for item in stock_items), 0)
+        movements, written = [], 0
+
+        def flush():
+            nonlocal movements, written
+            with _keep_auto_now_add(StockMovement, 'timestamp'):
+                StockMovement.objects.bulk_create(movements)
+            written += len(movements)
+            movements = []
+
+        def movement(item, movement_type, quantity, timestamp):
+            cost = item.average_cost
+            receipt = movement_type != 'sale'
+            movements.append(StockMovement(
+                company=self.company, stock_item=item, movement_type=movement_type, quantity=Decimal(quantity),
+                unit_cost=cost, total_cost=cost * quantity, timestamp=timestamp, performed_by=self.user,
+                to_warehouse=self.warehouse if receipt else None, from_warehouse=None if receipt else self.warehouse,
+                reference_type='grn' if movement_type == 'grn_receipt' else ('invoice' if movement_type == 'sale' else 'stock_adjustment'),
+            ))
+            net[item.pk] += quantity if receipt else -quantity
+            if len(movements) >= BATCH_SIZE:
+                flush()
+
+        for _ in range(self.sizes['stock_movements']):
+            item = self.rng.choice(stock_items)
+            if self.rng.random() < 0.2:
+                movement(item, 'grn_receipt', self.rng.randint(20, 60), self._moment())
+            else:
+                movement(item, 'sale', self.rng.randint(1, 3), self._moment())
+        # Sales outran receipts on some items - top them up so on-hand stays positive.
+        for item in stock_items:
+            if net[item.pk] < 10:
+                movement(item, 'adjustment_in', 10 - net[item.pk], self.now)
+        flush()
+
+        layers = []
+        for item in stock_items:
+            quantity = Decimal(net[item.pk])
+            item.quantity = item.available_quantity = quantity
+            item.total_cost_value = quantity * item.average_cost
+            item.last_movement_date = self.now
+            layers.append(CostLayer(
+                company=self.company, stock_item=item, quantity=quantity, remaining_quantity=quantity,
+                unit_cost=item.average_cost, received_at=self.now,
+            ))
+        StockItem.objects.bulk_update(
+            stock_items, ['quantity', 'available_quantity', 'total_cost_value', 'last_movement_date'], batch_size=BATCH_SIZE,
+        )
+        for chunk in _chunks(layers):
+            CostLayer.objects.bulk_create(chunk)
+        self.counts['stock_items'] = len(stock_items)
+        self.counts['stock_movements'] = written
+        self.progress(f'{written} stock movements')
+
+    def _customers(self):
+        from core.numbering import format_number, lease_range
+        from crm.models import Customer
+
+        count = self.sizes['customers']
+        start, _, year = lease_range(self.company, 'customer', 'CUST', 6, count, Customer, 'customer_code', 'all_objects')
+        customers = [
+            Customer(
+                company=self.company, name=f'Customer {start + n}', customer_code=format_number('CUST', 6, start + n, year),
+                phone=f'03{self.rng.randrange(10 ** 9):09d}', created_by=self.user,
+            )
+            for n in range(count)
+        ]
+        self.customers = []
+        for chunk in _chunks(customers):
+            self.customers.extend(Customer.objects.bulk_create(chunk))
+        self.counts['customers'] = len(self.customers)
+        self.progress(f'{len(self.customers)} customers')
+
+    def _invoices(self):
+        from core.numbering import format_number, lease_range
+        from sales.models import Invoice, InvoiceItem
+
+        count = self.sizes['invoices']
+        if not count or not self.customers or not self.products:
+            self.counts['invoices'] = self.counts['invoice_items'] = 0
+            return
+        start, _, year = lease_range(self.company, 'invoice', 'INV', 6, count, Invoice, 'invoice_number', 'all_objects')
+        written_items = 0
+        for chunk_start in range(0, count, BATCH_SIZE):
+            invoices, lines = [], []
+            for n in range(chunk_start, min(chunk_start + BATCH_SIZE, count)):
+                invoice_lines = []
+                for product in self.rng.sample(self.products, min(self.rng.randint(1, self.sizes['lines_per_invoice']), len(self.products))):
+                    quantity = Decimal(self.rng.randint(1, 3))
+                    invoice_lines.append(InvoiceItem(
+                        product=product, quantity=quantity, unit_price=product.selling_price,
+                        line_total=quantity * product.selling_price,
+                    ))
+                total = sum(line.line_total for line in invoice_lines)
+                roll = self.rng.random()
+                status = 'paid' if roll < 0.9 else ('partially_paid' if roll < 0.95 else 'sent')
+                day = self._day()
+                invoices.append(Invoice(
+                    company=self.company, customer=self.rng.choice(self.customers), created_by=self.user,
+                    invoice_number=format_number('INV', 6, start + n, year), invoice_date=day,
+                    due_date=day + timedelta(days=30), subtotal=total, total=total, status=status,
+                    paid_amount=total if status == 'paid' else (total / 2 if status == 'partially_paid' else 0),
+                ))
+                lines.append(invoice_lines)
+            invoices = Invoice.objects.bulk_create(invoices)
+            items = []
+            for invoice, invoice_lines in zip(invoices, lines):
+                for line in invoice_lines:
+                    line.invoice = invoice
+                    items.append(line)
+            InvoiceItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+            written_items += len(items)
+            self.progress(f'{min(chunk_start + BATCH_SIZE, count)} of {count} invoices')
+        self.counts['invoices'] = count
+        self.counts['invoice_items'] = written_items
+
+    def _journal_entries(self):
+        from accounting.models import JournalEntry, JournalItem
+
+        per_day = self.sizes['journal_entries_per_day']
+        days = [self.start + timedelta(days=offset) for offset in range(self.sizes['days'])]
+        entries, patterns, written = [], [], 0
+
+        def flush():
+            nonlocal entries, patterns, written
+            created = JournalEntry.objects.bulk_create(entries)
+            items = []
+            for entry, (debit, credit, description, amount) in zip(created, patterns):
+                items.append(JournalItem(entry=entry, account=self.accounts[debit], debit=amount, description=description))
+                items.append(JournalItem(entry=entry, account=self.accounts[credit], credit=amount, description=description))
+            JournalItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+            written += len(entries)
+            entries, patterns = [], []
+
+        for day in days:
+            for _ in range(per_day):
+                debit, credit, description, (low, high) = self.rng.choice(ENTRY_PATTERNS)
+                entries.append(JournalEntry(
+                    company=self.company, journal=self.journal, date=day,
+                    reference=f'SYN-{day:%Y%m%d}-{len(entries)}', created_by=self.user,
+                ))
+                patterns.append((debit, credit, description, Decimal(self.rng.randint(low, high))))
+                if len(entries) >= BATCH_SIZE:
+                    flush()
+        if entries:
+            flush()
+        self.counts['journal_entries'] = written
+        self.progress(f'{written} journal entries')
+
+
+WRITTEN_MODELS = [
+    'products.Product', 'products.ProductTracking', 'inventory.StockItem', 'inventory.StockMovement',
+    'inventory.CostLayer', 'crm.Customer', 'sales.Invoice', 'sales.InvoiceItem',
+    'accounting.JournalEntry', 'accounting.JournalItem',
+]
+
+
+def refresh_derived(company):
+    """What an import run does after its bulk writes (core.imports.Importer.finish()),
+    for every model generate() wrote, plus the analytics facts."""
+    from django.apps import apps
+    from analytics import facts
+    from core.dashboard_metrics import invalidate_model
+    from core.imports import records_imported
+
+    for label in WRITTEN_MODELS:
+        invalidate_model(label, company.pk)
+        records_imported.send(sender=apps.get_model(label), company_id=company.pk)
+    facts.rebuild(company)
+
+
+def generate(company, preset='small', seed=0, user=None, progress=None, **overrides):
+    """Adds a `preset`-sized dataset (PRESETS, individual sizes overridable by keyword)
+    to `company`. Returns {model: rows written}."""
+    sizes = {**PRESETS[preset], **overrides}
+    counts = Generator(company, user, sizes, seed=seed, progress=progress).run()
+    refresh_derived(company)
+    return counts
@@ -1,6 +1,6 @@
 from datetime import date
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 
 from user_auth.models import Company, Role, User
@@ -77,6 +77,9 @@ class RecycleBinTests(TestCase):
         self.assertIn(exp.id, [e['id'] for e in r.json()['results']])
         self.assertTrue(RecordDeletionLog.objects.filter(object_id=exp.id, action='restored').exists())
 
+        r = self.client.post('/api/core/recycle-bin/restore/', {'model': 'accounting.expense', 'id': 'abc'}, format='json')
+        self.assertEqual(r.status_code, 400)
+
     def test_purge_actually_removes_the_row(self):
         exp = self._make_expense()
         self.client.force_authenticate(user=self.owner)
@@ -98,6 +101,33 @@ class RecycleBinTests(TestCase):
         self.assertGreaterEqual(r.json()['purged_count'], 2)
         self.assertFalse(Expense.all_objects.filter(pk__in=[exp1.id, exp2.id]).exists())
 
+    def test_bin_is_cursor_paginated_newest_first_and_filterable_by_model(self):
+        from crm.models import Customer
+
+        expenses = [self._make_expense() for _ in range(3)]
+        customer = Customer.objects.create(company=self.company, name='Gone Customer')
+        for record in expenses + [customer]:
+            record.soft_delete(self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+        with self.assertNumQueries(1):  # the page, nothing per row
+            page = self.client.get('/api/core/recycle-bin/', {'page_size': 2}).json()
+        self.assertEqual([(i['model'], i['id']) for i in page['results']], [
+            ('crm.customer', customer.id), ('accounting.expense', expenses[2].id),
+        ])
+        self.assertEqual(page['results'][0]['repr'], str(customer))
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([i['id'] for i in rest['results']], [expenses[1].id, expenses[0].id])
+        self.assertIsNone(rest['next'])
+
+        filtered = self.client.get('/api/core/recycle-bin/', {'model': 'crm.customer'}).json()
+        self.assertEqual([i['id'] for i in filtered['results']], [customer.id])
+        self.assertEqual(self.client.get('/api/core/recycle-bin/', {'model': 'x.y'}).status_code, 400)
+
+        expenses[0].restore()
+        ids = [i['id'] for i in self.client.get('/api/core/recycle-bin/', {'model': 'accounting.expense'}).json()['results']]
+        self.assertEqual(ids, [expenses[2].id, expenses[1].id])
+
     def test_non_admin_cannot_hit_recycle_bin(self):
         self.client.force_authenticate(user=self.cashier)
         r = self.client.get('/api/core/recycle-bin/')
@@ -164,3 +194,491 @@ class PaginationFilterSortTests(TestCase):
         r = self.client.get('/api/sales/invoices/?ordering=-total')
         totals = [float(inv['total']) for inv in r.json()['results']]
         self.assertEqual(totals, sorted(totals, reverse=True))
+
+
+class NumberBlockPoolTests(TestCase):
+    """core.numbering's opt-in block pool: gap-tolerant sequences draw from one leased
+    block, gapless ones keep the locked single-number path."""
+
+    def setUp(self):
+        from unittest import mock
+        from core import numbering
+        self.numbering = numbering
+        self.company = Company.objects.create(name='Test Shop')
+        patcher = mock.patch.object(numbering, '_pool', numbering._BlockPool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _next(self, key):
+        config = self.numbering.SEQUENCES[key]
+        return self.numbering.next_number(
+            self.company, key, config['prefix'], config['digits'], None, config['field_name'],
+        )
+
+    def _counter(self, key):
+        return self.numbering.NumberSequence.objects.get(company=self.company, sequence_key=key).next_value
+
+    def test_gap_tolerant_sequence_leases_one_block(self):
+        numbers = []
+        with self.settings(NUMBER_BLOCK_SIZE=5):
+            for _ in range(3):
+                # Each call stands in for its own committed request.
+                with self.captureOnCommitCallbacks(execute=True):
+                    numbers.append(self._next('sales_order'))
+        self.assertEqual(numbers, ['SO-000001', 'SO-000002', 'SO-000003'])
+        self.assertEqual(self._counter('sales_order'), 6)
+
+        self.numbering._pool.release()
+        self.assertEqual(self._counter('sales_order'), 4)
+
+    def test_gapless_sequence_bypasses_the_pool(self):
+        with self.settings(NUMBER_BLOCK_SIZE=5):
+            self.assertEqual(self._next('invoice'), 'INV-000001')
+            self.assertEqual(self._next('invoice'), 'INV-000002')
+        self.assertEqual(self._counter('invoice'), 3)
+
+
+class IdempotencyStoreTests(TestCase):
+    """core.idempotency's claim-then-store flow: replays, in-flight conflicts, released
+    claims on failure, and TTL purging."""
+
+    def setUp(self):
+        from types import SimpleNamespace
+        self.company = Company.objects.create(name='Test Shop')
+        self.request = SimpleNamespace(
+            data={'client_request_id': 'abc-1'}, user=SimpleNamespace(company=self.company),
+        )
+        self.calls = 0
+
+    def _view(self, status=201):
+        from rest_framework.response import Response
+
+        def run():
+            self.calls += 1
+            return Response({'id': self.calls}, status=status)
+        return run
+
+    def test_retry_replays_stored_response(self):
+        from core.idempotency import _run_once
+        first = _run_once(self.request, self._view())
+        second = _run_once(self.request, self._view())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((second.status_code, second.data), (201, first.data))
+
+    def test_in_flight_claim_blocks_a_concurrent_retry(self):
+        from core.idempotency import IdempotencyKey, _run_once
+        IdempotencyKey.objects.create(company=self.company, client_request_id='abc-1')
+        response = _run_once(self.request, self._view())
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    def test_desktop_drain_leaves_an_in_flight_replay_pending(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from core.desktop_sync import DesktopSyncLoop
+        from core.desktop_sync_queue import DesktopSyncQueueEntry
+        from core.idempotency import IdempotencyKey, _run_once
+
+        IdempotencyKey.objects.create(company=self.company, client_request_id='abc-1')
+        in_flight = _run_once(self.request, self._view())
+        entries = [
+            DesktopSyncQueueEntry.objects.create(
+                company=self.company, client_request_id=f'abc-{n}', method='POST', path='/api/x/', payload_json='{}',
+            )
+            for n in (1, 2)
+        ]
+        replies = {
+            'in_flight': SimpleNamespace(status_code=409, json=lambda: in_flight.data),
+            'rejected': SimpleNamespace(status_code=409, json=lambda: {'error': 'Duplicate reference.'}),
+        }
+        config = {'device_id': 'desk-1', 'production_url': 'http://production'}
+        for reply, expected in (('in_flight', ['pending', 'pending']), ('rejected', ['failed', 'failed'])):
+            with mock.patch('requests.request', return_value=replies[reply]):
+                DesktopSyncLoop().drain('http://production', 'token', config)
+            self.assertEqual([DesktopSyncQueueEntry.objects.get(pk=e.pk).status for e in entries], expected)
+
+    def test_failed_attempt_releases_its_claim(self):
+        from core.idempotency import IdempotencyKey, _run_once
+        _run_once(self.request, self._view(status=400))
+        self.assertFalse(IdempotencyKey.objects.exists())
+        _run_once(self.request, self._view())
+        self.assertEqual(self.calls, 2)
+
+    def test_purge_expired_deletes_old_rows_only(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.idempotency import IdempotencyKey, purge_expired
+        old = IdempotencyKey.objects.create(company=self.company, client_request_id='old', response_status=201)
+        IdempotencyKey.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=90))
+        IdempotencyKey.objects.create(company=self.company, client_request_id='new', response_status=201)
+        self.assertEqual(purge_expired(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('client_request_id', flat=True)), ['new'])
+
+
+class DashboardMetricsTests(TestCase):
+    """core.dashboard_metrics: one conditional aggregate per source model, cached, and
+    dropped again by a write to any of those models."""
+
+    def setUp(self):
+        from django.core.cache import caches
+        caches['dashboard'].clear()
+        self.company = Company.objects.create(name='Test Shop')
+
+    def test_metrics_are_cached_until_a_source_model_is_written(self):
+        from core.dashboard_metrics import get_metrics
+        from crm.models import Lead
+
+        Lead.objects.create(company=self.company, name='A', status='new')
+        with self.assertNumQueries(9):  # one per source model the crm dashboard reads
+            metrics = get_metrics('crm', self.company)
+        self.assertEqual((metrics['total_leads'], metrics['new_leads'], metrics['converted_leads']), (1, 1, 0))
+        with self.assertNumQueries(0):
+            get_metrics('crm', self.company)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.create(company=self.company, name='B', status='converted')
+        self.assertEqual(get_metrics('crm', self.company)['converted_leads'], 1)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'company': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'company-cache-tests'},
+})
+class CompanyCacheTests(TestCase):
+    """core.company_cache: results kept in the 'company' alias until the company's stamp moves."""
+
+    def test_invalidate_drops_one_companys_results(self):
+        from core import company_cache
+
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)  # noqa: E731
+        self.assertEqual(company_cache.get_or_compute('report', 1, compute, 'x'), 1)
+        self.assertEqual(company_cache.get_or_compute('report', 1, compute, 'x'), 1)
+        self.assertEqual(company_cache.get_or_compute('report', 2, compute, 'x'), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            company_cache.invalidate('report', 1)
+        self.assertEqual(company_cache.get_or_compute('report', 1, compute, 'x'), 3)
+        self.assertEqual(company_cache.get_or_compute('report', 2, compute, 'x'), 2)
+
+
+class ImportPipelineTests(TestCase):
+    """core.imports - chunked validation and bulk writes, run inline (the worker thread's
+    own connection can't see this test's uncommitted rows)."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company,
+            role=Role.objects.create(name='Owner', level=1),
+        )
+
+    def _import(self, importer, name, content, **options):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from core.imports import start_import
+        upload = SimpleUploadedFile(name, content.encode() if isinstance(content, str) else content)
+        return start_import(upload, importer, self.owner, options=options, background=False)
+
+    def test_accounts_are_validated_per_chunk_and_errors_reported_by_row(self):
+        from django.test import override_settings
+        from accounting.models import Account, AccountCategory, AccountGroup
+
+        category = AccountCategory.objects.create(company=self.company, code='AST', name='Assets')
+        group = AccountGroup.objects.create(company=self.company, category=category, code='CASH', name='Cash')
+        Account.objects.create(company=self.company, group=group, code='1000', name='Till', type='asset')
+        rows = [
+            'code,name,type,group_code',
+            '1001,Bank,asset,CASH',
+            '1000,Till again,asset,CASH',     # exists, update_existing off
+            '1002,,asset,CASH',               # no name
+            '2000,Payables,liability,AP',     # new group, created on demand
+            '2000,Payables (dup),liability,AP',
+        ]
+        with override_settings(IMPORT_PIPELINE={'CHUNK_SIZE': 2}):
+            operation = self._import('accounts', 'chart.csv', '\n'.join(rows), create_groups='on')
+
+        self.assertEqual(operation.status, 'completed_with_errors')
+        self.assertEqual((operation.record_count, operation.success_count, operation.error_count), (5, 2, 3))
+        self.assertIn("Row 3: Account with code '1000' already exists", operation.error_log)
+        self.assertIn('Row 4: Missing required fields', operation.error_log)
+        # Row 6 repeats 2000 in the next chunk, after row 5 created it.
+        self.assertIn("Row 6: Account with code '2000' already exists", operation.error_log)
+        self.assertEqual(Account.objects.get(company=self.company, code='2000').group.category.code, 'IMP')
+        self.assertEqual(Account.objects.filter(company=self.company).count(), 3)
+
+    def test_customers_get_partners_and_sequence_codes(self):
+        from crm.models import Customer
+
+        operation = self._import('customers', 'customers.csv', 'name,email\nAli,ali@example.com\nSara,not-an-email\nBilal,')
+
+        self.assertEqual((operation.success_count, operation.error_count), (2, 1))
+        codes = sorted(Customer.objects.filter(company=self.company).values_list('customer_code', flat=True))
+        self.assertEqual(codes, ['CUST-000001', 'CUST-000002'])
+        self.assertTrue(Customer.objects.get(name='Ali').partner.is_customer)
+
+    def test_products_then_opening_stock_from_excel(self):
+        import io
+        from decimal import Decimal
+        from openpyxl import Workbook
+        from inventory.models import CostLayer, StockItem, StockMovement, Warehouse
+        from products.models import Product
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['name', 'sku', 'category', 'cost_price'])
+        sheet.append(['Cable', 'CBL-1', 'Accessories', 10])
+        sheet.append(['Charger', None, 'Accessories', '20'])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        operation = self._import('products', 'products.xlsx', buffer.getvalue(), create_categories='on')
+        self.assertEqual((operation.status, operation.success_count), ('completed', 2))
+        charger = Product.objects.get(name='Charger')
+        self.assertTrue(charger.sku.startswith(f'PRD-{self.company.pk}-'))
+        self.assertEqual(charger.category.name, 'Accessories')
+
+        Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+        operation = self._import(
+            'opening_stock', 'stock.csv',
+            f'sku,quantity,unit_cost\nCBL-1,10,10\nCBL-1,10,20\n{charger.sku},5,\nNOPE,1,1',
+        )
+        self.assertEqual((operation.success_count, operation.error_count), (3, 1))
+        cable = StockItem.objects.get(product__sku='CBL-1')
+        self.assertEqual((cable.quantity, cable.average_cost, cable.available_quantity), (Decimal('20'), Decimal('15'), Decimal('20')))
+        self.assertEqual(StockItem.objects.get(product=charger).average_cost, Decimal('20'))
+        self.assertEqual(StockMovement.objects.filter(movement_type='opening_stock').count(), 3)
+        self.assertEqual(CostLayer.objects.filter(stock_item=cable).count(), 2)
+
+    def test_view_checkboxes_reach_the_importer(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from products.models import Product
+
+        self.client.force_login(self.owner)
+        with override_settings(IMPORT_PIPELINE={'BACKGROUND': False}):
+            response = self.client.post('/products/import/', {
+                'file': SimpleUploadedFile('products.csv', b'name,sku,category\nCable,CBL-1,Accessories'),
+                'create_categories': 'on',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Product.objects.get(sku='CBL-1').category.name, 'Accessories')
+
+
+class StreamingExportTests(TestCase):
+    """core.exports - declared columns streamed from .iterator() into CSV or a
+    write-only workbook."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        for amount in (5, 7):
+            Expense.objects.create(company=self.company, category='rent', amount=amount, expense_date=date(2026, 1, 2))
+
+    def _columns(self):
+        from core.exports import Column
+        return [
+            Column('Category', 'get_category_display'),
+            Column('Amount', 'amount'),
+            Column('Company', 'company__name'),
+            Column('Created', 'created_at'),
+        ]
+
+    def test_csv_streams_header_then_rows_and_reports_the_count(self):
+        from core.exports import Sheet, stream_csv
+
+        counted = []
+        response = stream_csv('x.csv', Sheet('x', self._columns()[:3], Expense.objects.order_by('amount')), counted.append)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(lines[0], 'Category,Amount,Company')
+        self.assertEqual(lines[1:], ['Rent,5.00,Test Shop', 'Rent,7.00,Test Shop'])
+        self.assertEqual(counted, [2])
+
+    def test_xlsx_has_one_sheet_per_declared_sheet(self):
+        import io
+        from openpyxl import load_workbook
+        from core.excel_export import backup_sheets
+        from core.exports import Sheet, stream_xlsx
+
+        sheets = [Sheet('Expenses', self._columns(), Expense.objects.order_by('amount'))]
+        sheets += backup_sheets([('user_auth.company', Company.objects.all()), ('accounting.expense', Expense.objects.order_by('pk'))])
+        response = stream_xlsx('x.xlsx', sheets)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(workbook.sheetnames, ['Expenses', 'accounting_expense', 'user_auth_company'])
+        rows = list(workbook['Expenses'].iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('Category', 'Amount', 'Company', 'Created'))
+        self.assertEqual(rows[2][:3], ('Rent', 7, 'Test Shop'))
+        header, *rows = workbook['accounting_expense'].iter_rows(values_only=True)
+        self.assertEqual(header[:2], ('id', 'is_deleted'))
+        self.assertEqual([(row[header.index('company')], row[header.index('amount')]) for row in rows], [(self.company.pk, 5), (self.company.pk, 7)])
+        self.assertEqual(list(workbook['user_auth_company'].iter_rows(values_only=True))[1][:2], (self.company.pk, 'Test Shop'))
+
+    def test_backup_workbook_covers_every_company_once(self):
+        from core.snapshot import all_companies_querysets, export_all_companies_snapshot
+
+        Company.objects.create(name='Other Shop')
+        streamed = sorted((label, pk) for label, queryset in all_companies_querysets() for pk in queryset.values_list('pk', flat=True))
+        self.assertEqual(streamed, sorted((obj['model'], obj['pk']) for obj in export_all_companies_snapshot()))
+        admin = User.objects.create_superuser(email='root@test.local', password='x')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get('/api/core/export-backup/excel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+
+class SearchIndexTests(TestCase):
+    """core.search - documents maintained on commit, one ranked query per search."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company,
+            role=Role.objects.create(name='Owner', level=1),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _search(self, q):
+        response = self.client.get('/api/core/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [(r['type'], r['label']) for r in response.data['results']]
+
+    def test_saves_and_soft_deletes_maintain_the_index(self):
+        from crm.models import Customer
+        from products.models import Product
+
+        with self.captureOnCommitCallbacks(execute=True):
+            widget = Product.objects.create(company=self.company, name='Blue Widget', sku='BW-1')
+            Product.objects.create(company=self.company, name='Widget Stand', sku='WS-1')
+            Customer.objects.create(company=self.company, name='Widget Traders')
+        self.assertEqual(
+            self._search('WIDGET'),
+            [('product', 'Widget Stand'), ('customer', 'Widget Traders'), ('product', 'Blue Widget')],
+        )
+        self.assertEqual(self._search('bw-1'), [('product', 'Blue Widget')])  # exact number first
+        self.assertEqual(self._search('bw'), [('product', 'Blue Widget')])  # shorter than a trigram
+
+        with self.captureOnCommitCallbacks(execute=True):
+            widget.name = 'Red Gadget'
+            widget.save()
+        self.assertEqual(self._search('gadget'), [('product', 'Red Gadget')])
+        with self.captureOnCommitCallbacks(execute=True):
+            widget.soft_delete(self.owner)
+        self.assertEqual(self._search('gadget'), [])
+
+    def test_first_search_backfills_rows_written_without_signals(self):
+        from core.search import SearchDocument, SearchIndexState
+        from crm.models import Customer
+
+        Customer.objects.create(company=self.company, name='Acme Stores')
+        SearchDocument.objects.all().delete()  # as if written before the index existed
+        self.assertFalse(SearchIndexState.objects.filter(company=self.company).exists())
+
+        self.assertEqual(self._search('acme'), [('customer', 'Acme Stores')])
+        self.assertTrue(SearchIndexState.objects.filter(company=self.company).exists())
+
+
+class QueryPlanTests(TestCase):
+    """core.query_plans - every registered critical query must be served by an index."""
+
+    def setUp(self):
+        from crm.models import Customer
+        from products.models import Product
+
+        self.company = Company.objects.create(name='Test Shop')
+        other = Company.objects.create(name='Other Shop')
+        for company in (self.company, other):
+            Customer.objects.create(company=company, name=f'{company.name} customer', customer_code=f'C-{company.pk}')
+            Product.objects.create(company=company, name=f'{company.name} product')
+
+    def test_critical_queries_do_not_scan(self):
+        from core.query_plans import check
+
+        results = check(self.company)
+        self.assertGreaterEqual(len(results), 8)
+        for name, plan, scans in results:
+            with self.subTest(query=name):
+                self.assertEqual(scans, [], f'{name} scans {scans}:\n{plan}')
+
+    def test_a_company_without_customers_is_checked_too(self):
+        from core.query_plans import check
+
+        results = {name: scans for name, _, scans in check(Company.objects.create(name='New Shop'))}
+        self.assertEqual(results['customer_ledger.page'], [])
+
+    def test_a_scan_is_detected(self):
+        from core.query_plans import explain, sequential_scans
+        from sales.models import Invoice
+
+        plan = explain(Invoice.objects.filter(notes__icontains='x'))
+        self.assertEqual(sequential_scans(plan), ['sales_invoice'])
+
+
+class QueryInstrumentationTests(TestCase):
+    """core.instrumentation - per-view query stats and budget warnings, opt-in."""
+
+    def setUp(self):
+        from core.instrumentation import store
+        store.clear()
+        self.company = Company.objects.create(name='Test Shop')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company,
+            role=Role.objects.create(name='Owner', level=1), is_superuser=True,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_disabled_by_default(self):
+        from core.instrumentation import store
+        self.client.get('/api/core/search/', {'q': 'ab'})
+        self.assertEqual(store.snapshot(), [])
+
+    def test_records_views_and_warns_over_budget(self):
+        budgets = {'core-search': {'queries': 1}}
+        with override_settings(QUERY_INSTRUMENTATION={'ENABLED': True, 'BUDGETS': budgets}):
+            with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+                self.client.get('/api/core/search/', {'q': 'ab'})
+                self.client.get('/api/core/search/', {'q': 'cd'})
+            response = self.client.get('/api/core/instrumentation/')
+
+        self.assertIn('core-search over budget', logs.output[0])
+        [row] = response.data['views']
+        self.assertEqual((row['view'], row['requests'], row['over_budget']), ('core-search', 2, 2))
+        self.assertGreater(row['avg_queries'], 1)
+
+
+class SyntheticBenchmarkTests(TestCase):
+    """core.synthetic + core.benchmarks - the tiny preset, and every benchmark against it."""
+
+    def setUp(self):
+        from core.synthetic import generate
+
+        self.company = Company.objects.create(name='Synthetic Shop')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company,
+            role=Role.objects.create(name='Owner', level=1),
+        )
+        self.counts = generate(self.company, 'tiny', seed=1, user=self.owner)
+
+    def test_generates_consistent_stock(self):
+        from inventory.models import StockItem, StockMovement
+        from sales.models import Invoice
+
+        self.assertEqual(Invoice.objects.filter(company=self.company).count(), 50)
+        self.assertGreaterEqual(self.counts['stock_movements'], 200)
+        self.assertFalse(StockMovement.objects.filter(company=self.company, timestamp__date__gt=date.today()).exists())
+        self.assertFalse(StockItem.objects.filter(company=self.company, quantity__lt=10).exists())
+
+    def test_every_benchmark_runs(self):
+        from core.benchmarks import compare, run
+        from sales.models import Invoice
+
+        report = run(self.company, self.owner, repeat=1, warmup=0)
+        statuses = {row['name']: row['status'] for row in report['benchmarks']}
+        self.assertEqual(set(statuses.values()), {'ok'}, report['benchmarks'])
+        self.assertIn('pos_checkout', statuses)
+        # writes are rolled back
+        self.assertEqual(Invoice.objects.filter(company=self.company).count(), 50)
+
+        compared = compare(report, report)
+        self.assertTrue(all(row['change_pct'] == 0 for row in compared['benchmarks']))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from . import dashboard_metrics  # noqa: F401 - registers this app's dashboard metrics
+        from . import importers  # noqa: F401 - registers this app's importer with core.imports
@@ -0,0 +1,33 @@
+"""CRM dashboard headline metrics - see core/dashboard_metrics.py."""
+from datetime import timedelta
+
+from django.db.models import Count, Q, Sum
+
+from core.dashboard_metrics import month_start, register
+
+MODULE = 'crm'
+
+register(MODULE, 'total_customers', 'crm.Customer', Count('id'))
+register(MODULE, 'new_customers_this_month', 'crm.Customer', lambda now: Count('id', filter=Q(created_at__gte=month_start(now))))
+
+register(MODULE, 'total_leads', 'crm.Lead', Count('id'))
+register(MODULE, 'new_leads', 'crm.Lead', Count('id', filter=Q(status='new')))
+register(MODULE, 'qualified_leads', 'crm.Lead', Count('id', filter=Q(status='qualified')))
+register(MODULE, 'converted_leads', 'crm.Lead', Count('id', filter=Q(status='converted')))
+register(MODULE, 'new_leads_this_month', 'crm.Lead', lambda now: Count('id', filter=Q(created_at__gte=month_start(now))))
+
+register(MODULE, 'total_opportunities', 'crm.Opportunity', Count('id'))
+register(MODULE, 'active_opportunities', 'crm.Opportunity', Count('id', filter=Q(stage__in=['qualification', 'proposal', 'negotiation'])))
+register(MODULE, 'won_opportunities', 'crm.Opportunity', Count('id', filter=Q(stage='won')))
+register(MODULE, 'total_opportunity_value', 'crm.Opportunity', Sum('estimated_value'))
+
+register(MODULE, 'total_partners', 'crm.Partner', Count('id'))
+register(MODULE, 'total_campaigns', 'crm.Campaign', Count('id'))
+register(MODULE, 'active_campaigns', 'crm.Campaign', Count('id', filter=Q(status='active')))
+
+register(MODULE, 'calls_this_week', 'crm.CommunicationLog', lambda now: Count('id', filter=Q(type='call', timestamp__gte=now - timedelta(days=7))))
+register(MODULE, 'pending_followups', 'crm.CommunicationLog', lambda now: Count('id', filter=Q(follow_up_required=True, follow_up_date__lte=now.date())))
+
+register(MODULE, 'total_sales_orders', 'sales.SalesOrder', Count('id'))
+register(MODULE, 'pending_quotations', 'sales.Quotation', Count('id', filter=Q(status='draft')))
+register(MODULE, 'total_suppliers', 'purchase.Supplier', Count('id'))
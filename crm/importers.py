@@ -0,0 +1,90 @@
+"""Customer import for core.imports."""
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+
+from core.imports import Importer, RowError, cell, owned, register
+from core.numbering import format_number, lease_range
+
+from .models import Customer, Partner
+
+
+def clean_email(row):
+    email = cell(row, 'email')
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowError(f"Invalid email '{email}'") from None
+    return email
+
+
+@register
+class CustomerImporter(Importer):
+    """Columns: name, customer_code/code, email, phone, address, customer_group, cnic,
+    preferred_payment_method. A row whose code already exists updates that customer
+    with the `update_existing` option and is reported otherwise; rows without a code
+    always create a customer, numbered from the 'customer' sequence like
+    Customer.save() does. New customers get their Partner record the same way."""
+    name = 'customers'
+    models = ('crm.Customer', 'crm.Partner')
+    update_fields = ['name', 'email', 'phone', 'address', 'customer_group', 'cnic', 'preferred_payment_method', 'updated_at']
+
+    def key(self, row):
+        code = cell(row, 'customer_code', 'code')
+        return str(code) if code != '' else None
+
+    def existing(self, keys):
+        return {
+            c.customer_code: c
+            for c in Customer.all_objects.filter(customer_code__in=keys).select_related('partner')
+        }
+
+    def build(self, row, current):
+        name = cell(row, 'name', 'customer_name')
+        if not name:
+            raise RowError('Missing required field: name')
+        code = self.key(row)
+        customer = current.get(code) if code else None
+        if customer is not None:
+            owned(customer, self.company, 'Customer', code)
+            if not self.option('update_existing'):
+                raise RowError(f"Customer with code '{code}' already exists")
+        else:
+            customer = Customer(company=self.company, customer_code=code or '', created_by=self.user)
+            if code:
+                current[code] = customer
+        customer.name = str(name)
+        customer.email = clean_email(row)
+        customer.phone = str(cell(row, 'phone', 'mobile'))
+        customer.address = cell(row, 'address')
+        customer.customer_group = cell(row, 'customer_group', 'group')
+        customer.cnic = str(cell(row, 'cnic'))
+        customer.preferred_payment_method = cell(row, 'preferred_payment_method')
+
+        partner = customer.partner
+        if partner is None:
+            partner = Partner(company=self.company, partner_type='individual', is_customer=True, created_by=self.user)
+        partner.name, partner.email, partner.phone = customer.name, customer.email, customer.phone
+        customer.partner = partner
+        return customer
+
+    def write(self, instances):
+        now = timezone.now()
+        new = [c for c in instances if c.pk is None]
+        updated = [c for c in instances if c.pk is not None]
+
+        Partner.objects.bulk_create([c.partner for c in instances if c.partner.pk is None])
+        for customer in updated:
+            customer.partner.updated_at = customer.updated_at = now
+        Partner.objects.bulk_update([c.partner for c in updated], ['name', 'email', 'phone', 'updated_at'])
+        Customer.objects.bulk_update(updated, self.update_fields + ['partner'])
+
+        unnumbered = [c for c in new if not c.customer_code]
+        if unnumbered:
+            start, _, _ = lease_range(
+                self.company, 'customer', 'CUST', 6, len(unnumbered), Customer, 'customer_code', 'all_objects',
+            )
+            for offset, customer in enumerate(unnumbered):
+                customer.customer_code = format_number('CUST', 6, start + offset)
+        Customer.objects.bulk_create(new)
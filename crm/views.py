@@ -26,25 +26,12 @@ def crm_dashboard(request):
     """Enhanced CRM module dashboard with comprehensive metrics and integrations"""
     company = request.user.company
     
-    # Basic CRM metrics
-    total_customers = Customer.objects.filter(company=company).count()
-    total_leads = Lead.objects.filter(company=company).count()
-    total_opportunities = Opportunity.objects.filter(company=company).count()
-    total_partners = Partner.objects.filter(company=company).count()
-    
-    # Lead metrics
-    new_leads = Lead.objects.filter(company=company, status='new').count()
-    qualified_leads = Lead.objects.filter(company=company, status='qualified').count()
-    converted_leads = Lead.objects.filter(company=company, status='converted').count()
-    
-    # Opportunity metrics
-    active_opportunities = Opportunity.objects.filter(
-        company=company, 
-        stage__in=['qualification', 'proposal', 'negotiation']
-    ).count()
-    won_opportunities = Opportunity.objects.filter(company=company, stage='won').count()
-    total_opportunity_value = Opportunity.objects.filter(company=company).aggregate(
-        total=Sum('estimated_value'))['total'] or 0
+    # Headline counts/sums - registered in crm/dashboard_metrics.py, computed in one
+    # conditional aggregate per model and cached (core/dashboard_metrics.py)
+    from core.dashboard_metrics import get_metrics
+    metrics = get_metrics('crm', company)
+    total_leads = metrics['total_leads']
+    converted_leads = metrics['converted_leads']
     
     # Recent activities
     recent_customers = Customer.objects.filter(company=company).order_by('-created_at')[:5]
@@ -52,44 +39,6 @@ def crm_dashboard(request):
     recent_opportunities = Opportunity.objects.filter(company=company).order_by('-created_at')[:5]
     recent_communications = CommunicationLog.objects.filter(company=company).order_by('-timestamp')[:10]
     
-    # Sales integration - get sales data from sales module
-    from sales.models import SalesOrder, Quotation
-    total_sales_orders = SalesOrder.objects.filter(company=company).count()
-    pending_quotations = Quotation.objects.filter(company=company, status='draft').count()
-    
-    # Purchase integration - get supplier data
-    from purchase.models import Supplier
-    total_suppliers = Supplier.objects.filter(company=company).count()
-    
-    # Monthly statistics
-    current_month = timezone.now().replace(day=1)
-    new_customers_this_month = Customer.objects.filter(
-        company=company, 
-        created_at__gte=current_month
-    ).count()
-    new_leads_this_month = Lead.objects.filter(
-        company=company, 
-        created_at__gte=current_month
-    ).count()
-    
-    # Campaign metrics
-    total_campaigns = Campaign.objects.filter(company=company).count()
-    active_campaigns = Campaign.objects.filter(company=company, status='active').count()
-    
-    # Communication metrics
-    calls_this_week = CommunicationLog.objects.filter(
-        company=company,
-        type='call',
-        timestamp__gte=timezone.now() - timedelta(days=7)
-    ).count()
-    
-    # Follow-up reminders
-    pending_followups = CommunicationLog.objects.filter(
-        company=company,
-        follow_up_required=True,
-        follow_up_date__lte=timezone.now().date()
-    ).count()
-    
     # Lead conversion rate
     if total_leads > 0:
         conversion_rate = (converted_leads / total_leads) * 100
@@ -104,32 +53,32 @@ def crm_dashboard(request):
     
     context = {
         # Basic metrics
-        'total_customers': total_customers,
+        'total_customers': metrics['total_customers'],
         'total_leads': total_leads,
-        'total_opportunities': total_opportunities,
-        'total_partners': total_partners,
-        'total_suppliers': total_suppliers,
-        'total_campaigns': active_campaigns,
+        'total_opportunities': metrics['total_opportunities'],
+        'total_partners': metrics['total_partners'],
+        'total_suppliers': metrics['total_suppliers'],
+        'total_campaigns': metrics['active_campaigns'],
         
         # Lead metrics
-        'new_leads': new_leads,
-        'qualified_leads': qualified_leads,
+        'new_leads': metrics['new_leads'],
+        'qualified_leads': metrics['qualified_leads'],
         'converted_leads': converted_leads,
         'conversion_rate': round(conversion_rate, 1),
         
         # Opportunity metrics
-        'active_opportunities': active_opportunities,
-        'won_opportunities': won_opportunities,
-        'total_opportunity_value': total_opportunity_value,
+        'active_opportunities': metrics['active_opportunities'],
+        'won_opportunities': metrics['won_opportunities'],
+        'total_opportunity_value': metrics['total_opportunity_value'],
         'pipeline_by_stage': pipeline_by_stage,
         
         # Monthly stats
-        'new_customers_this_month': new_customers_this_month,
-        'new_leads_this_month': new_leads_this_month,
+        'new_customers_this_month': metrics['new_customers_this_month'],
+        'new_leads_this_month': metrics['new_leads_this_month'],
         
         # Activity metrics
-        'calls_this_week': calls_this_week,
-        'pending_followups': pending_followups,
+        'calls_this_week': metrics['calls_this_week'],
+        'pending_followups': metrics['pending_followups'],
         
         # Recent activities
         'recent_customers': recent_customers,
@@ -138,8 +87,8 @@ def crm_dashboard(request):
         'recent_communications': recent_communications,
         
         # Sales integration
-        'total_sales_orders': total_sales_orders,
-        'pending_quotations': pending_quotations,
+        'total_sales_orders': metrics['total_sales_orders'],
+        'pending_quotations': metrics['pending_quotations'],
     }
     return render(request, 'crm/dashboard.html', context)
 
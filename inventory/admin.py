@@ -1,6 +1,6 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
-from .models import StockItem, StockMovement, Warehouse, StockAlert
+from .models import StockItem, StockMovement, Warehouse, StockAlert, CostLayer
 from products.models import ProductCategory
 
 @admin.register(Warehouse)
@@ -26,3 +26,9 @@ class StockAlertAdmin(ModelAdmin):
     list_display = ('stock_item', 'company', 'alert_type', 'triggered_at', 'resolved', 'resolved_at')
     search_fields = ('stock_item__product__name',)
     list_filter = ('company', 'alert_type', 'resolved')
+
+@admin.register(CostLayer)
+class CostLayerAdmin(ModelAdmin):
+    list_display = ('stock_item', 'company', 'quantity', 'remaining_quantity', 'unit_cost', 'received_at')
+    search_fields = ('stock_item__product__name',)
+    list_filter = ('company',)
@@ -0,0 +1,348 @@
+"""
+Inventory analytics for the reports page (inventory.views.reports_ui) - real ABC
+classification, stock aging and turnover figures in place of the hard-coded placeholder
+percentages the page used to show.
+
+Every figure is built from a handful of grouped SQL aggregates (one per dimension:
+per-product stock, per-product movement totals, per-warehouse, per-category,
+per-movement-type, per-aging-bucket) rather than one query per warehouse/category/
+product, so the page costs the same number of queries for a 20-product shop as for a
+20,000-product one. The Pareto ranking on top of that is done in memory over the
+per-product rows (one sort + one running sum), which is cheaper than expressing
+cumulative shares in SQL portably across both Postgres and the desktop app's SQLite.
+
+Results are cached per company (core.company_cache) and invalidated whenever a
+StockMovement, StockItem or StockLot (the aging buckets read lots) is saved or deleted -
+see the receivers at the bottom of this file, connected from InventoryConfig.ready().
+"""
+from bisect import bisect_left
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db.models import Case, Count, DecimalField, Exists, F, OuterRef, Q, Sum, Value, When, CharField
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from core import company_cache
+
+CACHE_NAMESPACE = 'inventory_analytics'
+
+# Cumulative-value cut-offs for the Pareto split: the products making up the first 80%
+# of value are class A, the next 15% class B, the long tail class C.
+ABC_THRESHOLDS = (0.80, 0.95)
+
+AGING_BUCKETS = [
+    ('0-30 days', 0, 30),
+    ('31-60 days', 31, 60),
+    ('61-90 days', 61, 90),
+    ('90+ days', 91, None),
+]
+
+# Mirrors the incoming/outgoing groupings in StockMovement.update_stock_quantities() -
+# 'inter_warehouse_transfer' is deliberately in neither: it moves stock between two of
+# the company's own warehouses, so it nets to zero at product level.
+INCOMING_MOVEMENT_TYPES = [
+    'grn_receipt', 'quality_pass', 'transfer_in', 'adjustment_in', 'production_in',
+    'quarantine_out', 'sales_return', 'customer_return', 'material_return', 'opening_stock',
+]
+OUTGOING_MOVEMENT_TYPES = [
+    'sale', 'transfer_out', 'adjustment_out', 'production_out', 'purchase_return',
+    'grn_return', 'quarantine_in', 'material_issue', 'scrap', 'expiry', 'damage',
+]
+SALE_RETURN_MOVEMENT_TYPES = ['sales_return', 'customer_return']
+
+_MONEY = DecimalField(max_digits=20, decimal_places=2)
+
+
+def _stock_value_expr(quantity_field='quantity', cost_field='average_cost'):
+    return Sum(F(quantity_field) * F(cost_field), output_field=_MONEY)
+
+
+def _sum_when(condition, field='total_cost'):
+    return Coalesce(Sum(Case(When(condition, then=F(field)), output_field=_MONEY)), Value(Decimal('0')), output_field=_MONEY)
+
+
+def _performance_label(turnover_ratio):
+    if turnover_ratio >= 8:
+        return 'Excellent'
+    if turnover_ratio >= 4:
+        return 'Good'
+    if turnover_ratio >= 2:
+        return 'Average'
+    return 'Poor'
+
+
+def classify_abc(rows, value_key, thresholds=ABC_THRESHOLDS):
+    """Tags each row dict with `abc_class` ('A'/'B'/'C') and `cumulative_share` by its
+    share of the cumulative total of `value_key`, highest value first. Returns the rows
+    sorted by value. A row is placed by the cumulative share *before* it, so the single
+    most valuable product is always class A even if it alone exceeds the A cut-off."""
+    ranked = sorted(rows, key=lambda r: r[value_key], reverse=True)
+    values = [max(r[value_key], 0.0) for r in ranked]
+    total = sum(values)
+    if not total:
+        for row in ranked:
+            row['abc_class'] = 'C'
+            row['cumulative_share'] = 0.0
+        return ranked
+    running = list(accumulate(values))
+    for row, before, after in zip(ranked, [0.0] + running[:-1], running):
+        row['abc_class'] = 'ABC'[bisect_left(thresholds, before / total + 1e-12)]
+        row['cumulative_share'] = after / total
+    return ranked
+
+
+def _product_rows(company, period_start):
+    """One row per product: current on-hand quantity/value (one grouped StockItem
+    query) merged with its movement totals over the period (one grouped StockMovement
+    query)."""
+    from .models import StockItem, StockMovement
+
+    stock = (
+        StockItem.objects.filter(company=company, is_active=True)
+        .values('product_id', 'product__name')
+        .annotate(on_hand=Sum('quantity'), value=_stock_value_expr())
+    )
+    movements = (
+        StockMovement.objects.filter(company=company, timestamp__gte=period_start, is_reversed=False)
+        .values('stock_item__product_id')
+        .annotate(
+            cogs=_sum_when(Q(movement_type='sale')),
+            returned=_sum_when(Q(movement_type__in=SALE_RETURN_MOVEMENT_TYPES)),
+            units_sold=_sum_when(Q(movement_type='sale'), field='quantity'),
+            in_value=_sum_when(Q(movement_type__in=INCOMING_MOVEMENT_TYPES)),
+            out_value=_sum_when(Q(movement_type__in=OUTGOING_MOVEMENT_TYPES)),
+        )
+    )
+    by_product = {m['stock_item__product_id']: m for m in movements}
+
+    rows = []
+    for s in stock:
+        m = by_product.get(s['product_id'], {})
+        closing = float(s['value'] or 0)
+        in_value = float(m.get('in_value') or 0)
+        out_value = float(m.get('out_value') or 0)
+        # Opening value reconstructed by unwinding the period's net flow from today's
+        # balance - avoids needing a stored month-end snapshot table for a turnover
+        # figure that only has to be directionally right.
+        opening = max(closing - in_value + out_value, 0.0)
+        rows.append({
+            'product_id': s['product_id'],
+            'product_name': s['product__name'],
+            'quantity': float(s['on_hand'] or 0),
+            'stock_value': closing,
+            'avg_inventory_value': (opening + closing) / 2,
+            'cogs': max(float(m.get('cogs') or 0) - float(m.get('returned') or 0), 0.0),
+            'units_sold': float(m.get('units_sold') or 0),
+        })
+    return rows
+
+
+def _aging(company, now):
+    """Stock value bucketed by how long it has been on hand. Lot-tracked stock ages by
+    each open lot's own received_date (remaining quantity only); stock with no open
+    lots falls back to the StockItem's last receipt (or creation) date. Two grouped
+    queries total, one per source."""
+    from .models import StockItem, StockLot
+
+    def bucket_case(date_expr):
+        whens = []
+        for label, low, high in AGING_BUCKETS:
+            if high is None:
+                continue
+            whens.append(When(**{f'{date_expr}__gt': now - timedelta(days=high + 1)}, then=Value(label)))
+        return Case(*whens, default=Value(AGING_BUCKETS[-1][0]), output_field=CharField())
+
+    lots = (
+        StockLot.objects.filter(stock_item__company=company, is_active=True, remaining_quantity__gt=0)
+        .annotate(bucket=bucket_case('received_date'))
+        .values('bucket')
+        .annotate(count=Count('id'), value=_stock_value_expr('remaining_quantity', 'unit_cost'))
+    )
+    open_lots = StockLot.objects.filter(stock_item=OuterRef('pk'), is_active=True, remaining_quantity__gt=0)
+    unlotted = (
+        StockItem.objects.filter(company=company, is_active=True, quantity__gt=0)
+        .annotate(has_lots=Exists(open_lots), aged_from=Coalesce('last_received_date', 'created_at'))
+        .filter(has_lots=False)
+        .annotate(bucket=bucket_case('aged_from'))
+        .values('bucket')
+        .annotate(count=Count('id'), value=_stock_value_expr())
+    )
+
+    totals = {label: {'count': 0, 'value': 0.0} for label, _low, _high in AGING_BUCKETS}
+    for row in list(lots) + list(unlotted):
+        totals[row['bucket']]['count'] += row['count']
+        totals[row['bucket']]['value'] += float(row['value'] or 0)
+    grand_total = sum(t['value'] for t in totals.values())
+    return [{
+        'label': label,
+        'count': totals[label]['count'],
+        'value': totals[label]['value'],
+        'percentage': (totals[label]['value'] / grand_total * 100) if grand_total else 0.0,
+    } for label, _low, _high in AGING_BUCKETS]
+
+
+def _abc_summary(ranked, value_key):
+    total_count = len(ranked)
+    summary = {}
+    for cls in 'ABC':
+        members = [r for r in ranked if r['abc_class'] == cls]
+        summary[cls] = {
+            'count': len(members),
+            'value': sum(r['stock_value'] for r in members),
+            'usage_value': sum(r[value_key] for r in members),
+            'percentage': (len(members) / total_count * 100) if total_count else 0.0,
+        }
+    return summary
+
+
+def compute_inventory_analytics(company, period_days=365, top_n=10):
+    """Everything reports_ui renders, uncached - see get_inventory_analytics() for the
+    cached entry point. ABC classes rank products by consumption value (COGS) over the
+    period, the textbook basis; a shop with no sales recorded in the period yet falls
+    back to ranking by on-hand stock value rather than lumping everything into C."""
+    from products.models import ProductCategory
+    from .models import StockItem, StockMovement, Warehouse
+
+    now = timezone.now()
+    period_start = now - timedelta(days=period_days)
+    items = StockItem.objects.filter(company=company, is_active=True)
+
+    summary = items.aggregate(
+        total_items=Count('id'),
+        total_value=_stock_value_expr(),
+        low_stock_items=Count('id', filter=Q(quantity__lte=F('min_stock'), min_stock__gt=0)),
+        out_of_stock_items=Count('id', filter=Q(quantity=0)),
+    )
+    total_value = float(summary['total_value'] or 0)
+
+    rows = _product_rows(company, period_start)
+    basis = 'cogs' if any(r['cogs'] > 0 for r in rows) else 'stock_value'
+    ranked = classify_abc(rows, basis)
+
+    top_products = sorted(rows, key=lambda r: r['stock_value'], reverse=True)[:top_n]
+    top_products = [{
+        'product__name': r['product_name'],
+        'total_quantity': r['quantity'],
+        'total_value': r['stock_value'],
+        'percentage': (r['stock_value'] / total_value * 100) if total_value else 0.0,
+    } for r in top_products]
+
+    warehouses = (
+        items.filter(warehouse__is_active=True)
+        .values('warehouse_id', 'warehouse__name', 'warehouse__max_capacity_weight')
+        .annotate(
+            total_items=Count('id'),
+            total_value=_stock_value_expr(),
+            used_weight=Sum(F('quantity') * F('weight_per_unit'), output_field=_MONEY),
+        )
+        .order_by('warehouse__name')
+    )
+    warehouse_analytics = []
+    for w in warehouses:
+        capacity = float(w['warehouse__max_capacity_weight'] or 0)
+        warehouse_analytics.append({
+            'name': w['warehouse__name'],
+            'total_items': w['total_items'],
+            'total_value': float(w['total_value'] or 0),
+            # Only meaningful for warehouses with a configured weight capacity and
+            # products with a unit weight - 0 rather than a made-up figure otherwise.
+            'utilization': min(float(w['used_weight'] or 0) / capacity * 100, 100.0) if capacity else 0.0,
+        })
+
+    categories = (
+        items.filter(product__category__isnull=False)
+        .values('product__category__name')
+        .annotate(total_items=Count('id'), total_value=_stock_value_expr())
+        .order_by('-total_value')[:10]
+    )
+    category_analytics = [{
+        'name': c['product__category__name'],
+        'total_items': c['total_items'],
+        'total_value': float(c['total_value'] or 0),
+    } for c in categories]
+
+    movement_analytics = [{
+        'movement_type': m['movement_type'].replace('_', ' '),
+        'count': m['count'],
+        'total_quantity': float(m['total_quantity'] or 0),
+    } for m in (
+        StockMovement.objects.filter(company=company, timestamp__gte=now - timedelta(days=30))
+        .values('movement_type')
+        .annotate(count=Count('id'), total_quantity=Sum('quantity'))
+        .order_by('-count')
+    )]
+
+    turnover_analysis = []
+    for r in sorted(rows, key=lambda r: r['cogs'], reverse=True)[:top_n]:
+        ratio = r['cogs'] / r['avg_inventory_value'] if r['avg_inventory_value'] else 0.0
+        turnover_analysis.append({
+            'product_name': r['product_name'],
+            'avg_inventory': r['avg_inventory_value'],
+            'cogs': r['cogs'],
+            'turnover_ratio': ratio,
+            'days_in_inventory': (period_days / ratio) if ratio else period_days,
+            'performance': _performance_label(ratio),
+        })
+
+    return {
+        'stock_summary': {
+            'total_items': summary['total_items'],
+            'total_value': total_value,
+            'low_stock_items': summary['low_stock_items'],
+            'out_of_stock_items': summary['out_of_stock_items'],
+            'total_warehouses': Warehouse.objects.filter(company=company, is_active=True).count(),
+            'total_categories': ProductCategory.objects.filter(company=company, is_active=True).count(),
+            'top_products': top_products,
+        },
+        'warehouse_analytics': warehouse_analytics,
+        'category_analytics': category_analytics,
+        'movement_analytics': movement_analytics,
+        'abc_analysis': _abc_summary(ranked, basis),
+        'abc_basis': basis,
+        'aging_analysis': _aging(company, now),
+        'turnover_analysis': turnover_analysis,
+        'period_days': period_days,
+    }
+
+
+def get_inventory_analytics(company, period_days=365):
+    return company_cache.get_or_compute(
+        CACHE_NAMESPACE, company.id,
+        lambda: compute_inventory_analytics(company, period_days=period_days),
+        period_days,
+    )
+
+
+def invalidate_inventory_analytics(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    company_cache.invalidate(CACHE_NAMESPACE, getattr(instance, 'company_id', None))
+
+
+def invalidate_for_lot(sender, instance, **kwargs):
+    # Lots feed the aging buckets; they reach their company through the stock item.
+    if kwargs.get('raw'):
+        return
+    from .models import StockItem
+    company_cache.invalidate(
+        CACHE_NAMESPACE, StockItem.objects.filter(pk=instance.stock_item_id).values_list('company_id', flat=True).first(),
+    )
+
+
+def invalidate_after_import(sender, company_id, **kwargs):
+    if sender._meta.label in ('inventory.StockMovement', 'inventory.StockItem', 'inventory.StockLot'):
+        company_cache.invalidate(CACHE_NAMESPACE, company_id)
+
+
+def connect_signals():
+    from core.imports import records_imported
+    post_save.connect(invalidate_inventory_analytics, sender='inventory.StockMovement', dispatch_uid='inventory_analytics_movement_save')
+    post_delete.connect(invalidate_inventory_analytics, sender='inventory.StockMovement', dispatch_uid='inventory_analytics_movement_delete')
+    post_save.connect(invalidate_inventory_analytics, sender='inventory.StockItem', dispatch_uid='inventory_analytics_item_save')
+    post_delete.connect(invalidate_inventory_analytics, sender='inventory.StockItem', dispatch_uid='inventory_analytics_item_delete')
+    post_save.connect(invalidate_for_lot, sender='inventory.StockLot', dispatch_uid='inventory_analytics_lot_save')
+    post_delete.connect(invalidate_for_lot, sender='inventory.StockLot', dispatch_uid='inventory_analytics_lot_delete')
+    records_imported.connect(invalidate_after_import, dispatch_uid='inventory_analytics_imported')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from .analytics import connect_signals
+        connect_signals()
+        from . import dashboard_metrics  # noqa: F401 - registers this app's dashboard metrics
+        from . import importers  # noqa: F401 - registers this app's importer with core.imports
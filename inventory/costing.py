@@ -0,0 +1,198 @@
+"""
+Cost-layer valuation engine - makes StockItem.valuation_method actually mean something.
+Previously only the weighted/moving-average branches of update_average_cost() did real
+work, and every outgoing movement (most importantly a sale's COGS, see
+sales.Invoice.process_inventory_reduction()) was simply costed at average_cost
+regardless of the configured method.
+
+Every valued receipt now leaves a CostLayer (quantity, remaining_quantity, landed unit
+cost), and every outgoing movement draws those layers down:
+
+- fifo / landed_cost - oldest layer first. Layers always store the landed unit cost
+  (freight/duty/tax/other charges spread per unit, see
+  StockMovement.get_landed_cost_per_unit()), so landed-cost valuation is FIFO over
+  landed layers rather than a separate algorithm.
+- lifo - newest layer first.
+- weighted_avg / moving_avg - costed at the item's average_cost; layers are still drawn
+  down oldest-first so their remaining quantities stay in step with on-hand stock if the
+  method is ever switched later.
+- standard - costed at standard_cost (average_cost if none is set), layers drawn down
+  oldest-first as above.
+
+Any quantity the open layers can't cover (stock that predates this engine, or arrived
+through a path that recorded no cost) is costed at average_cost, the old behaviour.
+
+The outgoing movement's own unit_cost/total_cost are overwritten with the consumed cost,
+so everything that already sums `movement_type='sale'` rows for COGS
+(analytics.api_views.profit_report, products.api_views.ProductViewSet.history) reports
+method-accurate figures without rescanning movement history.
+
+`movements_costed` is sent (sender=StockMovement, movements=[...]) once the rewritten
+costs are saved, for anything that aggregates those figures - bulk_update() fires no
+post_save of its own.
+
+Consumption is batched per document: wrap a posting in `with costing.batch():` and every
+outgoing movement saved inside it is costed together on exit - one locked read of the
+open layers for all affected stock items, one bulk_update of the layers and one of the
+movements - instead of a read/write round-trip per line. Outside a batch a movement is
+costed on its own, as a batch of one.
+"""
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import CostLayer, StockMovement
+
+LAYERED_METHODS = ('fifo', 'lifo', 'landed_cost')
+
+# Movement types that create a cost layer when they carry a unit cost. quality_pass is
+# deliberately absent: it releases stock already costed by its GRN's bill (see
+# purchase.GRNItem._update_inventory_cost()), a layer there would count it twice.
+RECEIPT_MOVEMENT_TYPES = (
+    'grn_receipt', 'transfer_in', 'production_in', 'adjustment_in', 'opening_stock',
+    'sales_return', 'customer_return', 'material_return',
+)
+
+# Movement types that consume layers - stock physically leaving the item, as opposed to
+# status changes (lock/reserve/quarantine_in) that keep it on hand.
+CONSUMING_MOVEMENT_TYPES = (
+    'sale', 'transfer_out', 'adjustment_out', 'production_out', 'material_issue',
+    'purchase_return', 'grn_return', 'scrap', 'expiry', 'damage',
+)
+
+movements_costed = Signal()
+
+_CENT = Decimal('0.01')
+_active_batch = contextvars.ContextVar('inventory_costing_batch', default=None)
+
+
+def _money(value):
+    return Decimal(value).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def record_receipt(stock_item, quantity, unit_cost, source_movement=None, received_at=None):
+    """Adds one receipt layer to `stock_item`. Zero-quantity receipts are ignored."""
+    quantity = Decimal(quantity)
+    if quantity <= 0:
+        return None
+    return CostLayer.objects.create(
+        company_id=stock_item.company_id,
+        stock_item=stock_item,
+        source_movement=source_movement,
+        quantity=quantity,
+        remaining_quantity=quantity,
+        unit_cost=_money(unit_cost or 0),
+        received_at=received_at or timezone.now(),
+    )
+
+
+def open_layer_average(stock_item):
+    """Value-weighted unit cost of the item's open layers, or None if it has none - the
+    carrying cost FIFO/LIFO items report as average_cost."""
+    agg = CostLayer.objects.filter(stock_item=stock_item, remaining_quantity__gt=0).aggregate(
+        qty=Sum('remaining_quantity'), value=Sum(F('remaining_quantity') * F('unit_cost')),
+    )
+    if not agg['qty']:
+        return None
+    return _money(agg['value'] / agg['qty'])
+
+
+def _consume(stock_item, layers, quantity):
+    """Draws `quantity` down from `layers` (this item's open layers, oldest first,
+    mutated in place) and returns the total cost of what was consumed."""
+    method = stock_item.valuation_method
+    ordered = reversed(layers) if method == 'lifo' else layers
+    remaining = Decimal(quantity)
+    layer_cost = Decimal('0')
+    for layer in ordered:
+        if remaining <= 0:
+            break
+        take = min(layer.remaining_quantity, remaining)
+        if take <= 0:
+            continue
+        layer.remaining_quantity -= take
+        layer._touched = True
+        layer_cost += take * layer.unit_cost
+        remaining -= take
+
+    if method in LAYERED_METHODS:
+        return layer_cost + remaining * stock_item.average_cost
+    if method == 'standard':
+        return Decimal(quantity) * (stock_item.standard_cost or stock_item.average_cost)
+    return Decimal(quantity) * stock_item.average_cost
+
+
+def cost_movements(movements):
+    """Costs a set of outgoing movements together - see the module docstring. Rewrites
+    each movement's unit_cost/total_cost, persists the drawn-down layers, and refreshes
+    average_cost for FIFO/LIFO/landed items to the value of what's left."""
+    movements = [m for m in movements if m.pk and m.quantity > 0]
+    if not movements:
+        return
+    with transaction.atomic():
+        open_layers = defaultdict(list)
+        for layer in CostLayer.objects.select_for_update().filter(
+            stock_item_id__in={m.stock_item_id for m in movements}, remaining_quantity__gt=0,
+        ).order_by('received_at', 'id'):
+            open_layers[layer.stock_item_id].append(layer)
+
+        stock_items = {}
+        for movement in movements:
+            stock_item = movement.stock_item
+            stock_items[stock_item.pk] = stock_item
+            total = _consume(stock_item, open_layers[stock_item.pk], movement.quantity)
+            movement.unit_cost = _money(total / movement.quantity)
+            movement.total_cost = _money(total) + sum(
+                (c or 0) for c in (movement.freight_cost, movement.tax_cost, movement.duty_cost, movement.other_charges)
+            )
+
+        touched = [layer for layers in open_layers.values() for layer in layers if getattr(layer, '_touched', False)]
+        if touched:
+            CostLayer.objects.bulk_update(touched, ['remaining_quantity'])
+        StockMovement.objects.bulk_update(movements, ['unit_cost', 'total_cost'])
+
+        revalued = []
+        for stock_item in stock_items.values():
+            if stock_item.valuation_method not in LAYERED_METHODS:
+                continue
+            layers = [l for l in open_layers[stock_item.pk] if l.remaining_quantity > 0]
+            qty = sum((l.remaining_quantity for l in layers), Decimal('0'))
+            if qty:
+                stock_item.average_cost = _money(sum(l.remaining_quantity * l.unit_cost for l in layers) / qty)
+                stock_item.total_cost_value = stock_item.quantity * stock_item.average_cost
+                revalued.append(stock_item)
+        if revalued:
+            type(revalued[0]).objects.bulk_update(revalued, ['average_cost', 'total_cost_value'])
+    movements_costed.send(sender=StockMovement, movements=movements)
+
+
+def consume_for_movement(movement):
+    """Called by StockMovement.save() for every newly-created consuming movement - queued
+    on the active batch if there is one, costed immediately otherwise."""
+    pending = _active_batch.get()
+    if pending is not None:
+        pending.append(movement)
+    else:
+        cost_movements([movement])
+
+
+@contextmanager
+def batch():
+    """Defers layer consumption for every movement saved inside the block to one
+    cost_movements() call on exit. Nested batches join the outermost one."""
+    if _active_batch.get() is not None:
+        yield
+        return
+    pending = []
+    token = _active_batch.set(pending)
+    try:
+        yield
+    finally:
+        _active_batch.reset(token)
+    cost_movements(pending)
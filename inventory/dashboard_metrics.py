@@ -0,0 +1,22 @@
+"""Inventory dashboard headline metrics - see core/dashboard_metrics.py."""
+from django.db.models import Count, F, Q, Sum
+
+from core.dashboard_metrics import register
+
+MODULE = 'inventory'
+
+register(MODULE, 'total_stock_items', 'inventory.StockItem', Count('id', filter=Q(is_active=True)))
+register(MODULE, 'low_stock_items', 'inventory.StockItem', Count('id', filter=Q(quantity__lte=F('min_stock'))))
+register(MODULE, 'locked_items', 'inventory.StockItem', Count('id', filter=Q(stock_status='locked', is_active=True)))
+register(MODULE, 'ready_for_sale', 'inventory.StockItem', Count('id', filter=Q(purchase_status='ready_for_use', suitable_for_sale=True, is_active=True)))
+register(MODULE, 'ready_for_manufacturing', 'inventory.StockItem', Count('id', filter=Q(purchase_status='ready_for_use', suitable_for_manufacturing=True, is_active=True)))
+register(MODULE, 'total_locked_value', 'inventory.StockItem', Sum(F('locked_quantity') * F('average_cost'), filter=Q(locked_quantity__gt=0)))
+
+register(MODULE, 'total_warehouses', 'inventory.Warehouse', Count('id', filter=Q(is_active=True)))
+register(MODULE, 'total_products', 'products.Product', Count('id', filter=Q(is_active=True)))
+register(MODULE, 'total_movements', 'inventory.StockMovement', Count('id'))
+register(
+    MODULE, 'pending_bills_count', 'purchase.GRNInventoryLock',
+    Count('grn', distinct=True, filter=Q(lock_reason='pending_invoice', is_active=True)),
+    company_path='grn__company',
+)
@@ -0,0 +1,117 @@
+"""Opening stock import for core.imports."""
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core.imports import Importer, RowError, cell, parse_decimal, register
+from products.models import Product
+
+from .models import CostLayer, StockItem, StockMovement, Warehouse
+
+_CENT = Decimal('0.01')
+
+
+@register
+class OpeningStockImporter(Importer):
+    """Columns: sku, warehouse (code or name - optional when the company has a single
+    warehouse), quantity, unit_cost (defaults to the product's cost price),
+    batch_number, lot_number.
+
+    Each row is one 'opening_stock' StockMovement into the product's StockItem for that
+    warehouse (created if missing), with the cost layer a costed receipt leaves (see
+    inventory.costing). What StockMovement.save()/update_stock_quantities() would do
+    per row is done here for the whole chunk: the items' quantity and weighted average
+    cost are accumulated in memory, then items, movements and layers are written with
+    one bulk query each. Opening balances aren't journalised - the per-movement
+    post_save journal hook (accounting.integration) doesn't run for bulk inserts."""
+    name = 'opening_stock'
+    models = ('inventory.StockItem', 'inventory.StockMovement')
+    item_fields = [
+        'quantity', 'available_quantity', 'average_cost', 'total_cost_value', 'last_purchase_cost',
+        'last_movement_date', 'last_received_date', 'updated_at',
+    ]
+
+    def load(self):
+        self.warehouses = {}
+        warehouses = list(Warehouse.objects.filter(company=self.company))
+        for warehouse in warehouses:
+            self.warehouses[warehouse.name.lower()] = warehouse
+        for warehouse in warehouses:
+            if warehouse.code:
+                self.warehouses[warehouse.code.lower()] = warehouse
+        self.only_warehouse = warehouses[0] if len(warehouses) == 1 else None
+
+    def key(self, row):
+        sku = cell(row, 'sku')
+        return str(sku) if sku != '' else None
+
+    def existing(self, keys):
+        """Products by SKU, plus their stock items keyed (product_id, warehouse_id)."""
+        products = {p.sku: p for p in Product.objects.filter(company=self.company, sku__in=keys)}
+        items = StockItem.objects.filter(company=self.company, product__in=products.values())
+        found = {(item.product_id, item.warehouse_id): item for item in items}
+        found.update(products)
+        return found
+
+    def _warehouse(self, value):
+        if value == '':
+            if self.only_warehouse is None:
+                raise RowError('Missing required field: warehouse')
+            return self.only_warehouse
+        warehouse = self.warehouses.get(str(value).lower())
+        if warehouse is None:
+            raise RowError(f"Unknown warehouse '{value}'")
+        return warehouse
+
+    def build(self, row, current):
+        sku = self.key(row)
+        if sku is None:
+            raise RowError('Missing required field: sku')
+        product = current.get(sku)
+        if product is None:
+            raise RowError(f"Unknown SKU '{sku}'")
+        if not product.is_stockable:
+            raise RowError(f"Product '{sku}' isn't stockable")
+        warehouse = self._warehouse(cell(row, 'warehouse', 'warehouse_code'))
+        quantity = parse_decimal(cell(row, 'quantity', 'qty'), 'quantity', default=None, minimum=_CENT)
+        if quantity is None:
+            raise RowError('Missing required field: quantity')
+        unit_cost = parse_decimal(cell(row, 'unit_cost', 'cost'), 'unit_cost', product.cost_price, minimum=Decimal('0')).quantize(_CENT)
+
+        item = current.get((product.pk, warehouse.pk))
+        if item is None:
+            item = current[(product.pk, warehouse.pk)] = StockItem(
+                company=self.company, product=product, warehouse=warehouse, category_id=product.category_id,
+            )
+        if not (item.valuation_method == 'standard' and item.standard_cost):
+            total_quantity = item.quantity + quantity
+            item.average_cost = ((item.quantity * item.average_cost + quantity * unit_cost) / total_quantity).quantize(_CENT)
+        item.quantity += quantity
+        item.last_purchase_cost = unit_cost
+
+        return StockMovement(
+            company=self.company, stock_item=item, movement_type='opening_stock',
+            quantity=quantity, unit_cost=unit_cost, total_cost=quantity * unit_cost,
+            to_warehouse=warehouse, batch_number=str(cell(row, 'batch_number', 'batch')),
+            lot_number=str(cell(row, 'lot_number', 'lot')), performed_by=self.user,
+            notes='Opening stock import',
+        )
+
+    def write(self, instances):
+        now = timezone.now()
+        items = list({id(m.stock_item): m.stock_item for m in instances}.values())
+        for item in items:
+            item.available_quantity = max(0, item.quantity - item.reserved_quantity - item.locked_quantity - item.quarantine_quantity)
+            item.total_cost_value = item.quantity * item.average_cost
+            item.last_movement_date = item.last_received_date = item.updated_at = now
+        new_items = [i for i in items if i.pk is None]
+        StockItem.objects.bulk_update([i for i in items if i.pk is not None], self.item_fields)
+        StockItem.objects.bulk_create(new_items)
+        StockMovement.objects.bulk_create(instances)
+        CostLayer.objects.bulk_create([
+            CostLayer(
+                company=self.company, stock_item=m.stock_item, source_movement=m,
+                quantity=m.quantity, remaining_quantity=m.quantity, unit_cost=m.unit_cost, received_at=now,
+            )
+            for m in instances
+        ])
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_costlayer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['company', 'product'], name='inv_stockitem_co_prod_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['company', 'movement_type', 'timestamp'], name='inv_move_co_type_ts_idx'),
+        ),
+    ]
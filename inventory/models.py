@@ -291,20 +291,23 @@ class StockItem(models.Model):
     account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_items')
 
     def save(self, *args, **kwargs):
+        self.refresh_derived_fields()
+        super().save(*args, **kwargs)
+
+    def refresh_derived_fields(self):
+        """What save() recomputes - also called by bulk writers, which bypass save()."""
         # Calculate available quantity
         self.available_quantity = max(0, self.quantity - self.reserved_quantity - self.locked_quantity - self.quarantine_quantity)
         # Calculate total cost value
         self.total_cost_value = self.quantity * self.average_cost
         
         # Set category from product if not set
-        if not self.category and self.product.category:
-            self.category = self.product.category
+        if not self.category_id and self.product.category_id:
+            self.category_id = self.product.category_id
             
         # Update purchase status based on stock status
         if self.stock_status == 'available' and self.purchase_status == 'received_billed':
             self.purchase_status = 'ready_for_use'
-            
-        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.product.name} @ {self.warehouse.name}"
@@ -312,9 +315,25 @@ class StockItem(models.Model):
     class Meta:
         unique_together = ['product', 'warehouse']
         ordering = ['product__name', 'warehouse__name']
+        indexes = [
+            models.Index(fields=['company', 'product'], name='inv_stockitem_co_prod_idx'),
+        ]
+
+    def update_average_cost(self, new_quantity, new_cost, source_movement=None, create_layer=True):
+        """Update average cost for a valued receipt of `new_quantity` at `new_cost`, and
+        record it as a cost layer (see inventory.costing) unless `create_layer` is False."""
+        from .costing import open_layer_average, record_receipt
+
+        if create_layer and self.pk:
+            record_receipt(self, new_quantity, new_cost, source_movement=source_movement)
+        layer_average = open_layer_average(self) if self.valuation_method in ('fifo', 'lifo') else None
+        self.apply_receipt_cost(new_quantity, new_cost, layer_average)
+        self.save()
 
-    def update_average_cost(self, new_quantity, new_cost):
-        """Update average cost using weighted average method"""
+    def apply_receipt_cost(self, new_quantity, new_cost, layer_average=None):
+        """update_average_cost() without the layer or the save, for callers batching
+        receipts; FIFO/LIFO items need `layer_average`, their open layers' average
+        once the receipt's layer exists."""
         if self.valuation_method == 'weighted_avg':
             total_value = (self.quantity * self.average_cost) + (new_quantity * new_cost)
             total_quantity = self.quantity + new_quantity
@@ -328,9 +347,9 @@ class StockItem(models.Model):
                 self.average_cost = total_value / total_quantity if total_quantity > 0 else new_cost
             else:
                 self.average_cost = new_cost
-        elif self.valuation_method == 'fifo':
-            # For FIFO, we'll use the new cost as current cost
-            self.average_cost = new_cost
+        elif self.valuation_method in ('fifo', 'lifo'):
+            # Carrying cost is whatever the open receipt layers are worth
+            self.average_cost = layer_average or new_cost
         elif self.valuation_method == 'standard':
             # Standard cost doesn't change with new purchases
             if self.standard_cost:
@@ -344,7 +363,6 @@ class StockItem(models.Model):
                 
         # Update last purchase cost
         self.last_purchase_cost = new_cost
-        self.save()
 
     def is_low_stock(self):
         """Check if stock is below minimum level"""
@@ -594,12 +612,19 @@ class StockMovement(models.Model):
         if self.other_charges:
             self.total_cost += self.other_charges
             
+        is_new = self.pk is None
         super().save(*args, **kwargs)
         
         # Update stock item quantities based on movement type
         if not self.is_reversed:
             self.update_stock_quantities()
 
+        # Cost outgoing stock from its receipt layers per the item's valuation method
+        # (batched per document when posted inside inventory.costing.batch())
+        from .costing import CONSUMING_MOVEMENT_TYPES, consume_for_movement
+        if is_new and not self.is_reversed and self.movement_type in CONSUMING_MOVEMENT_TYPES:
+            consume_for_movement(self)
+
     def update_stock_quantities(self):
         """Update stock item quantities based on movement type"""
         stock_item = self.stock_item
@@ -692,8 +717,16 @@ class StockMovement(models.Model):
                 additional_costs = (self.freight_cost or 0) + (self.tax_cost or 0) + (self.duty_cost or 0) + (self.other_charges or 0)
                 landed_cost_per_unit += additional_costs / self.quantity
                 
-            stock_item.update_average_cost(self.quantity, landed_cost_per_unit)
+            # quality_pass releases stock its GRN's bill already costed - see
+            # inventory.costing.RECEIPT_MOVEMENT_TYPES
+            stock_item.update_average_cost(
+                self.quantity, landed_cost_per_unit,
+                source_movement=self, create_layer=self.movement_type != 'quality_pass',
+            )
             stock_item.landed_cost = landed_cost_per_unit
+        elif self.movement_type in ['adjustment_in', 'opening_stock', 'sales_return', 'customer_return', 'material_return'] and self.unit_cost > 0:
+            from .costing import record_receipt
+            record_receipt(stock_item, self.quantity, self.get_landed_cost_per_unit(), source_movement=self)
         
         # Update timestamps
         stock_item.last_movement_date = timezone.now()
@@ -767,6 +800,11 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        # Movement history by type over a period (sales COGS for analytics, receipts,
+        # adjustments) - see core/query_plans.py.
+        indexes = [
+            models.Index(fields=['company', 'movement_type', 'timestamp'], name='inv_move_co_type_ts_idx'),
+        ]
 
 
 class StockLot(models.Model):
@@ -835,6 +873,31 @@ class StockLot(models.Model):
         ordering = ['received_date']
 
 
+class CostLayer(models.Model):
+    """One valued receipt into a StockItem - the unit of cost that FIFO/LIFO/landed-cost
+    valuation consumes. Written by inventory.costing whenever stock arrives with a cost
+    (StockItem.update_average_cost() and costed incoming StockMovements), drawn down by
+    outgoing movements (sale, transfer_out, adjustment_out, ...) in the order the
+    StockItem's valuation_method dictates."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='cost_layers')
+    stock_item = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='cost_layers')
+    source_movement = models.ForeignKey('StockMovement', on_delete=models.SET_NULL, null=True, blank=True, related_name='cost_layers')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    remaining_quantity = models.DecimalField(max_digits=12, decimal_places=2)
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2, help_text="Landed cost per unit of this receipt")
+    received_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Layer {self.remaining_quantity}/{self.quantity} @ {self.unit_cost} - {self.stock_item_id}"
+
+    class Meta:
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(fields=['stock_item', 'received_at'], name='inv_costlayer_item_recv_idx'),
+        ]
+
+
 class StockSerial(models.Model):
     """Individual serial number tracking"""
     stock_item = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='serials')
@@ -1161,9 +1224,13 @@ class StockAdjustment(models.Model):
     def post(self, user):
         """Post the adjustment and create stock movements"""
         if self.status == 'approved':
-            # Create stock movements for each adjustment item
-            for item in self.items.all():
-                item.create_stock_movement()
+            from .costing import batch
+
+            # Create stock movements for each adjustment item, costing the outgoing
+            # ones against their receipt layers in one pass
+            with batch():
+                for item in self.items.all():
+                    item.create_stock_movement()
             
             self.status = 'posted'
             self.posted_by = user
@@ -1287,9 +1354,12 @@ class StockTransfer(models.Model):
             self.sent_at = timezone.now()
             self.save()
             
-            # Create outgoing stock movements
-            for item in self.items.all():
-                item.create_outgoing_movement()
+            from .costing import batch
+
+            # Create outgoing stock movements, costed against receipt layers together
+            with batch():
+                for item in self.items.all():
+                    item.create_outgoing_movement()
             
             return True, "Transfer sent successfully"
         return False, f"Cannot send transfer in {self.status} status"
@@ -1365,11 +1435,20 @@ class StockTransferItem(models.Model):
             }
         )
         
+        # Carry the cost the source warehouse's layers released into the destination,
+        # so the stock arrives as a layer at its real cost rather than at zero
+        outgoing = StockMovement.objects.filter(
+            company=self.transfer.company, movement_type='transfer_out',
+            reference_type='transfer_order', reference_id=self.transfer.id,
+            stock_item__product=self.product,
+        ).only('unit_cost').first()
+
         movement = StockMovement.objects.create(
             company=self.transfer.company,
             stock_item=to_stock,
             movement_type='transfer_in',
             quantity=self.received_quantity,
+            unit_cost=outgoing.unit_cost if outgoing else 0,
             from_warehouse=self.transfer.from_warehouse,
             to_warehouse=self.transfer.to_warehouse,
             reference_type='transfer_order',
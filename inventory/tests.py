@@ -1,3 +1,128 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from user_auth.models import Company
+from products.models import Product
+from inventory.analytics import classify_abc, compute_inventory_analytics
+from inventory.models import StockItem, StockMovement, Warehouse
+
+
+class InventoryAnalyticsTests(TestCase):
+    """inventory.analytics - real ABC/aging/turnover figures for reports_ui."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+
+    def _stock(self, name, quantity, cost):
+        product = Product.objects.create(company=self.company, name=name)
+        return StockItem.objects.create(
+            company=self.company, product=product, warehouse=self.warehouse,
+            quantity=Decimal(quantity), average_cost=Decimal(cost),
+        )
+
+    def test_classify_abc_pareto_split(self):
+        rows = [{'v': v} for v in (700, 150, 100, 30, 20)]
+        ranked = classify_abc(rows, 'v')
+        self.assertEqual([r['abc_class'] for r in ranked], ['A', 'A', 'B', 'C', 'C'])
+
+    def test_report_uses_sale_movements_for_cogs_and_turnover(self):
+        fast = self._stock('Fast mover', 10, 5)
+        self._stock('Shelf warmer', 100, 5)
+        StockMovement.objects.create(
+            company=self.company, stock_item=fast, movement_type='sale',
+            quantity=Decimal('8'), unit_cost=Decimal('5'),
+        )
+
+        data = compute_inventory_analytics(self.company)
+
+        self.assertEqual(data['abc_basis'], 'cogs')
+        self.assertEqual(data['abc_analysis']['A']['count'], 1)
+        top = data['turnover_analysis'][0]
+        self.assertEqual(top['product_name'], 'Fast mover')
+        self.assertAlmostEqual(top['cogs'], 40.0)
+        self.assertGreater(top['turnover_ratio'], 0)
+        self.assertEqual(sum(b['count'] for b in data['aging_analysis']), 2)
+        self.assertEqual(data['aging_analysis'][0]['label'], '0-30 days')
+        self.assertAlmostEqual(data['stock_summary']['total_value'], 2 * 5 + 100 * 5)
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'dashboard': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'company': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'inventory-analytics-tests'},
+    })
+    def test_cached_aging_follows_lots(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from inventory.analytics import get_inventory_analytics
+        from inventory.models import StockLot
+
+        item = self._stock('Tinned beans', 10, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            lot = StockLot.objects.create(stock_item=item, lot_number='L1', quantity=10, remaining_quantity=10, unit_cost=2)
+        aged = lambda: {row['label']: row['count'] for row in get_inventory_analytics(self.company)['aging_analysis']}  # noqa: E731
+        self.assertEqual(aged()['0-30 days'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockLot.objects.filter(pk=lot.pk).update(received_date=timezone.now() - timedelta(days=400))
+            lot.refresh_from_db()
+            lot.save()
+        self.assertEqual(aged()['0-30 days'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(sum(aged().values()), 0)
+
+
+class CostLayerTests(TestCase):
+    """inventory.costing - receipt layers consumed per StockItem.valuation_method."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main', code='MAIN')
+
+    def _receive_twice(self, method):
+        product = Product.objects.create(company=self.company, name=f'Widget {method}')
+        item = StockItem.objects.create(
+            company=self.company, product=product, warehouse=self.warehouse, valuation_method=method,
+        )
+        for cost in ('10', '20'):
+            StockMovement.objects.create(
+                company=self.company, stock_item=item, movement_type='opening_stock',
+                quantity=Decimal('5'), unit_cost=Decimal(cost),
+            )
+        item.refresh_from_db()
+        return item
+
+    def _sell(self, item, quantity):
+        return StockMovement.objects.create(
+            company=self.company, stock_item=item, movement_type='sale',
+            quantity=Decimal(quantity), unit_cost=item.average_cost,
+        )
+
+    def test_fifo_consumes_oldest_layer_first(self):
+        item = self._receive_twice('fifo')
+        sale = self._sell(item, '7')
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_cost, Decimal('5') * 10 + Decimal('2') * 20)
+        self.assertEqual(
+            list(item.cost_layers.values_list('remaining_quantity', flat=True)), [Decimal('0'), Decimal('3')],
+        )
+
+    def test_lifo_consumes_newest_layer_first(self):
+        item = self._receive_twice('lifo')
+        sale = self._sell(item, '7')
+        sale.refresh_from_db()
+        self.assertEqual(sale.total_cost, Decimal('5') * 20 + Decimal('2') * 10)
+
+    def test_batch_costs_all_lines_of_a_document_together(self):
+        from inventory import costing
+
+        item = self._receive_twice('fifo')
+        with costing.batch():
+            first = self._sell(item, '3')
+            second = self._sell(item, '3')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.total_cost, Decimal('30'))
+        self.assertEqual(second.total_cost, Decimal('2') * 10 + Decimal('1') * 20)
@@ -28,55 +28,12 @@ def inventory_dashboard(request):
     """Enhanced inventory module dashboard with purchase integration"""
     company = request.user.company
     
-    # Key metrics
-    total_stock_items = StockItem.objects.filter(company=company, is_active=True).count()
-    total_warehouses = Warehouse.objects.filter(company=company, is_active=True).count()
-    total_products = Product.objects.filter(company=company, is_active=True).count()
-    low_stock_items = StockItem.objects.filter(company=company, quantity__lte=F('min_stock')).count()
-    
-    # Enhanced metrics with purchase status
-    locked_items = StockItem.objects.filter(
-        company=company, 
-        stock_status='locked',
-        is_active=True
-    ).count()
-    
-    ready_for_sale = StockItem.objects.filter(
-        company=company,
-        purchase_status='ready_for_use',
-        suitable_for_sale=True,
-        is_active=True
-    ).count()
-    
-    ready_for_manufacturing = StockItem.objects.filter(
-        company=company,
-        purchase_status='ready_for_use',
-        suitable_for_manufacturing=True,
-        is_active=True
-    ).count()
-    
-    # Purchase integration metrics
-    try:
-        from purchase.models import GRNInventoryLock
-        pending_bills_count = GRNInventoryLock.objects.filter(
-            grn__company=company,
-            lock_reason='pending_invoice',
-            is_active=True
-        ).values('grn').distinct().count()
-        
-        total_locked_value = StockItem.objects.filter(
-            company=company,
-            locked_quantity__gt=0
-        ).aggregate(
-            total=Sum(F('locked_quantity') * F('average_cost'))
-        )['total'] or 0
-        
-    except ImportError:
-        pending_bills_count = 0
-        total_locked_value = 0
+    # Headline counts/sums - registered in inventory/dashboard_metrics.py, computed in
+    # one conditional aggregate per model and cached (core/dashboard_metrics.py)
+    from core.dashboard_metrics import get_metrics
+    metrics = get_metrics('inventory', company)
     
     # Stock movements summary
-    total_movements = StockMovement.objects.filter(company=company).count()
     recent_movements = StockMovement.objects.filter(
         company=company
     ).select_related('stock_item__product', 'stock_item__warehouse').order_by('-timestamp')[:5]
@@ -111,16 +68,7 @@ def inventory_dashboard(request):
     ).select_related('product', 'warehouse').order_by('-created_at')[:5]
     
     context = {
-        'total_stock_items': total_stock_items,
-        'total_warehouses': total_warehouses,
-        'total_products': total_products,
-        'low_stock_items': low_stock_items,
-        'locked_items': locked_items,
-        'ready_for_sale': ready_for_sale,
-        'ready_for_manufacturing': ready_for_manufacturing,
-        'pending_bills_count': pending_bills_count,
-        'total_locked_value': total_locked_value,
-        'total_movements': total_movements,
+        **metrics,
         'recent_movements': recent_movements,
         'warehouses_with_stock': warehouses_with_stock,
         'low_stock_alerts': low_stock_alerts,
@@ -828,104 +776,12 @@ def adjustments_ui(request):
 
 @login_required
 def reports_ui(request):
-    """Enhanced Inventory reports and analytics view"""
-    company = request.user.company
-    
-    # Basic stock summary
-    stock_items = StockItem.objects.filter(company=company, is_active=True)
-    
-    # Calculate total value as float to avoid Decimal arithmetic issues
-    total_stock_value = float(sum((item.quantity * item.average_cost) for item in stock_items))
-    
-    stock_summary = {
-        'total_items': stock_items.count(),
-        'total_value': total_stock_value,
-        'low_stock_items': stock_items.filter(quantity__lte=F('min_stock'), min_stock__gt=0).count(),
-        'out_of_stock_items': stock_items.filter(quantity=0).count(),
-        'total_warehouses': Warehouse.objects.filter(company=company, is_active=True).count(),
-        'total_categories': ProductCategory.objects.filter(company=company, is_active=True).count(),
-        'top_products': Product.objects.filter(company=company, is_active=True)[:10]
-    }
-    
-    # Warehouse analytics
-    warehouse_analytics = []
-    for warehouse in Warehouse.objects.filter(company=company, is_active=True):
-        warehouse_stock = stock_items.filter(warehouse=warehouse)
-        warehouse_analytics.append({
-            'name': warehouse.name,
-            'total_items': warehouse_stock.count(),
-            'total_value': float(sum((item.quantity * item.average_cost) for item in warehouse_stock)),
-            'utilization': 85.0  # Mock utilization percentage
-        })
-    
-    # Category analytics
-    category_analytics = []
-    for category in ProductCategory.objects.filter(company=company, is_active=True)[:10]:
-        category_products = Product.objects.filter(category=category, company=company)
-        category_stock = stock_items.filter(product__in=category_products)
-        category_analytics.append({
-            'name': category.name,
-            'total_items': category_stock.count(),
-            'total_value': float(sum((item.quantity * item.average_cost) for item in category_stock))
-        })
-    
-    # Movement analytics (simplified)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_movements = StockMovement.objects.filter(
-        company=company, 
-        timestamp__gte=thirty_days_ago
-    )
-    
-    movement_analytics = []
-    for movement_type in ['in', 'out', 'transfer', 'adjustment']:
-        count = recent_movements.filter(movement_type=movement_type).count()
-        if count > 0:
-            movement_analytics.append({
-                'movement_type': movement_type,
-                'count': count,
-                'total_quantity': sum(m.quantity for m in recent_movements.filter(movement_type=movement_type))
-            })
-    
-    # ABC Analysis (simplified)
-    total_stock_value = stock_summary['total_value']
-    abc_analysis = {
-        'A': {'count': 20, 'value': total_stock_value * 0.7, 'percentage': 20},
-        'B': {'count': 30, 'value': total_stock_value * 0.2, 'percentage': 30},
-        'C': {'count': 50, 'value': total_stock_value * 0.1, 'percentage': 50}
-    }
-    
-    # Aging analysis (simplified)
-    aging_analysis = [
-        {'label': '0-30 days', 'count': 45, 'value': total_stock_value * 0.4, 'percentage': 40},
-        {'label': '31-60 days', 'count': 30, 'value': total_stock_value * 0.3, 'percentage': 30},
-        {'label': '61-90 days', 'count': 20, 'value': total_stock_value * 0.2, 'percentage': 20},
-        {'label': '90+ days', 'count': 15, 'value': total_stock_value * 0.1, 'percentage': 10}
-    ]
-    
-    # Turnover analysis (simplified)
-    turnover_analysis = []
-    for product in Product.objects.filter(company=company, is_active=True)[:10]:
-        stock_item = stock_items.filter(product=product).first()
-        if stock_item:
-            turnover_analysis.append({
-                'product_name': product.name,
-                'avg_inventory': stock_item.quantity,
-                'cogs': float(stock_item.quantity * stock_item.average_cost),
-                'turnover_ratio': 4.5,  # Mock ratio
-                'days_in_inventory': 80,  # Mock days
-                'performance': 'Good'  # Mock performance
-            })
-    
-    context = {
-        'stock_summary': stock_summary,
-        'warehouse_analytics': warehouse_analytics,
-        'category_analytics': category_analytics,
-        'movement_analytics': movement_analytics,
-        'abc_analysis': abc_analysis,
-        'aging_analysis': aging_analysis,
-        'turnover_analysis': turnover_analysis,
-        'report_date': timezone.now(),
-    }
+    """Enhanced Inventory reports and analytics view - every figure comes from
+    inventory.analytics (grouped aggregates, cached per company)."""
+    from .analytics import get_inventory_analytics
+
+    context = dict(get_inventory_analytics(request.user.company))
+    context['report_date'] = timezone.now()
     return render(request, 'inventory/reports-ui-enhanced.html', context)
 
 # New Warehouse Management Views
@@ -46,62 +46,155 @@ class BillOfMaterialsViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
         """Create a duplicate of an existing BOM"""
+        from .versioning import clone
+
         bom = self.get_object()
-        
-        # Create new BOM
-        new_bom = BillOfMaterials.objects.create(
-            company=bom.company,
-            product=bom.product,
-            name=f"{bom.name} (Copy)",
-            version=f"{bom.version}-copy",
-            manufacturing_type=bom.manufacturing_type,
-            lot_size=bom.lot_size,
-            lead_time_days=bom.lead_time_days,
-            scrap_percentage=bom.scrap_percentage,
-            routing_required=bom.routing_required,
-            phantom_bom=bom.phantom_bom,
-            quality_check_required=bom.quality_check_required,
-            quality_specification=bom.quality_specification,
-            created_by=request.user
-        )
-        
-        # Copy BOM items
-        for item in bom.items.all():
-            BillOfMaterialsItem.objects.create(
-                bom=new_bom,
-                component=item.component,
-                quantity=item.quantity,
-                unit_cost=item.unit_cost,
-                waste_percentage=item.waste_percentage,
-                is_optional=item.is_optional,
-                preferred_supplier=item.preferred_supplier,
-                sequence=item.sequence,
-                notes=item.notes
-            )
-        
-        # Copy operations
-        for operation in bom.operations.all():
-            BOMOperation.objects.create(
-                bom=new_bom,
-                work_center=operation.work_center,
-                operation_name=operation.operation_name,
-                description=operation.description,
-                sequence=operation.sequence,
-                setup_time_minutes=operation.setup_time_minutes,
-                run_time_per_unit_minutes=operation.run_time_per_unit_minutes,
-                cleanup_time_minutes=operation.cleanup_time_minutes,
-                operators_required=operation.operators_required,
-                skill_level_required=operation.skill_level_required,
-                quality_check_required=operation.quality_check_required,
-                quality_specification=operation.quality_specification,
-                cost_per_hour=operation.cost_per_hour,
-                work_instruction=operation.work_instruction,
-                safety_notes=operation.safety_notes
+        try:
+            [(_, new_bom)] = clone(
+                request.user.company, [bom.pk], version=f"{bom.version}-copy", name_suffix=' (Copy)', user=request.user,
             )
-        
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(new_bom)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'])
+    def bulk_clone(self, request):
+        """New versions of many BOMs in one transaction (manufacturing/versioning.py).
+        Body: boms [ids]; optional version (default: each source's bumped), effective_from
+        (date), activate (bool - make the copies default from effective_from/today)."""
+        from django.utils.dateparse import parse_date
+        from .versioning import activate, clone
+
+        effective_from = request.data.get('effective_from')
+        if effective_from:
+            effective_from = parse_date(effective_from)
+            if effective_from is None:
+                return Response({'error': 'effective_from must be a date.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                pairs = clone(
+                    request.user.company, request.data.get('boms') or [], version=request.data.get('version'),
+                    user=request.user, effective_from=effective_from,
+                )
+                activation = None
+                if request.data.get('activate'):
+                    activation = activate(request.user.company, [copy.pk for _, copy in pairs], on=effective_from)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'created': [
+                {'source_id': source.pk, 'bom_id': copy.pk, 'product_id': copy.product_id, 'version': copy.version}
+                for source, copy in pairs
+            ],
+            'activation': activation,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """Changes from this BOM to ?against=<BOM id>."""
+        from .versioning import diff
+
+        bom = self.get_object()
+        try:
+            against_id = _request_id(request.query_params.get('against'), 'against')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        against = self.get_queryset().filter(pk=against_id).first()
+        if against is None:
+            return Response({'error': 'against must be a BOM of this company.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(diff(bom, against))
+
+    @action(detail=False, methods=['post'])
+    def activate(self, request):
+        """Makes boms [ids] their products' default BOM from effective_from (date,
+        default today) - at once, or scheduled when the date is in the future."""
+        from django.utils.dateparse import parse_date
+        from .versioning import activate
+
+        effective_from = request.data.get('effective_from')
+        if effective_from:
+            effective_from = parse_date(effective_from)
+            if effective_from is None:
+                return Response({'error': 'effective_from must be a date.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = activate(request.user.company, request.data.get('boms') or [], on=effective_from)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    def _structure_product(self, request):
+        try:
+            return int(request.query_params['product'])
+        except (KeyError, ValueError):
+            return None
+
+    @action(detail=False, methods=['get'])
+    def where_used(self, request):
+        """Every product that consumes ?product= at any level, from the BOM closure
+        (manufacturing/bom_graph.py): depth 1 = directly, quantity per parent unit."""
+        from products.models import Product
+        from .bom_graph import where_used
+
+        product_id = self._structure_product(request)
+        if product_id is None:
+            return Response({'error': 'product is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = where_used(request.user.company, product_id)
+        names = Product.all_objects.filter(pk__in={row[0] for row in rows}).in_bulk()
+        return Response([
+            {'product_id': pk, 'product_name': names[pk].name if pk in names else '', 'depth': depth, 'quantity': quantity}
+            for pk, depth, quantity in rows
+        ])
+
+    @action(detail=False, methods=['get'])
+    def explosion(self, request):
+        """Total quantity of every component at every level below ?quantity= (default 1)
+        units of ?product=, from the cached BOM graph."""
+        from decimal import Decimal, InvalidOperation
+        from products.models import Product
+        from .bom_graph import BOMCycleError, graph
+
+        product_id = self._structure_product(request)
+        if product_id is None:
+            return Response({'error': 'product is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quantity = Decimal(request.query_params.get('quantity', '1'))
+        except InvalidOperation:
+            return Response({'error': 'quantity must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bom_graph = graph(request.user.company)
+        except BOMCycleError as e:
+            return Response({'error': str(e), 'cycle': e.cycle}, status=status.HTTP_400_BAD_REQUEST)
+        requirements = bom_graph.requirements_for(product_id, quantity)
+        names = Product.all_objects.filter(pk__in=requirements).in_bulk()
+        return Response([
+            {
+                'product_id': pk, 'product_name': names[pk].name if pk in names else '',
+                'low_level_code': bom_graph.low_level_code(pk), 'quantity': total,
+            }
+            for pk, total in sorted(requirements.items())
+        ])
+
+    @action(detail=False, methods=['post'])
+    def roll_up_costs(self, request):
+        """Multi-level cost roll-up of the company's active BOMs (manufacturing/costing.py).
+        Body (all optional): boms [integer ids] to cost (default all), price_overrides
+        {product_id: unit price} for a what-if run, which is never saved."""
+        from .costing import roll_up
+
+        try:
+            bom_ids = request.data.get('boms')
+            if bom_ids is not None:
+                if not isinstance(bom_ids, list):
+                    raise ValueError('boms must be a list of integer ids')
+                bom_ids = [_request_id(value, 'boms') for value in bom_ids]
+            result = roll_up(
+                request.user.company, bom_ids=bom_ids, price_overrides=request.data.get('price_overrides'),
+            )
+        except (TypeError, ValueError, ArithmeticError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
 
 class BillOfMaterialsItemViewSet(viewsets.ModelViewSet):
     serializer_class = BillOfMaterialsItemSerializer
@@ -163,6 +256,31 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'Operations generated successfully'})
 
+    @action(detail=False, methods=['post'])
+    def schedule(self, request):
+        """Finite-capacity scheduling of planned/released work orders onto their work
+        centers (manufacturing/scheduling.py). Body (all optional): rule 'priority' or
+        'edd', start (ISO datetime, default now), work_orders [ids], horizon_days."""
+        from django.utils.dateparse import parse_datetime
+        from .scheduling import schedule
+
+        start = request.data.get('start')
+        if start:
+            start = parse_datetime(start)
+            if start is None:
+                return Response({'error': 'start must be an ISO datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+        try:
+            horizon_days = int(request.data.get('horizon_days', 30))
+            result = schedule(
+                request.user.company, rule=request.data.get('rule', 'priority'), start=start,
+                work_order_ids=request.data.get('work_orders'), horizon_days=max(horizon_days, 1),
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
 
 class WorkOrderOperationViewSet(viewsets.ModelViewSet):
     serializer_class = WorkOrderOperationSerializer
@@ -475,7 +593,7 @@ class CapacityPlanViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def capacity_analysis(self, request):
         """Get capacity analysis across all work centers"""
-        plans = self.get_queryset().order_by('plan_date', 'work_center__name')
+        plans = self.get_queryset().select_related('work_center').order_by('plan_date', 'work_center__name')
         
         analysis = {
             'overloaded_centers': [],
@@ -488,9 +606,9 @@ class CapacityPlanViewSet(viewsets.ModelViewSet):
         center_count = 0
         
         for plan in plans:
+            # In memory only - save() already stores it; a GET must not write every row.
             plan.calculate_utilization()
-            plan.save()
-            
+
             utilization = float(plan.utilization_percentage)
             total_utilization += utilization
             center_count += 1
@@ -532,77 +650,79 @@ from reportlab.lib.pagesizes import letter
 from io import BytesIO
 
 
+def _request_id(value, name):
+    """`value` (an int or a string of digits) as a primary key; ValueError naming the
+    field otherwise."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError(f'{name} must be an integer id')
+    return int(value)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def bulk_create_purchase_orders(request):
-    """Create purchase orders for all pending purchase requirements"""
+    """Create purchase orders for all pending purchase requirements - one draft PO per
+    supplier, planned and written in bulk by manufacturing.procurement. Optional body:
+    `mrp_plan_id`, `requirement_ids` (a list), `warehouse_id` - integer ids, a 400
+    otherwise - and `dry_run` (a boolean) to get the plan without writing it."""
     try:
+        from rest_framework.exceptions import ValidationError
+        from rest_framework.fields import BooleanField
+        from inventory.models import Warehouse
+        from .procurement import create_purchase_orders, pending_requirements, plan_purchase_orders
+
         company = request.user.company
-        
-        # Get all pending purchase requirements
-        requirements = MRPRequirement.objects.filter(
-            mrp_plan__company=company,
-            source_type='purchase',
-            status='pending',
-            shortage_quantity__gt=0
-        )
-        
+        data = request.data
+        try:
+            mrp_plan_id, warehouse_id = (
+                _request_id(data[name], name) if data.get(name) not in (None, '') else None
+                for name in ('mrp_plan_id', 'warehouse_id')
+            )
+            requirement_ids = data.get('requirement_ids')
+            if requirement_ids is not None:
+                if not isinstance(requirement_ids, list):
+                    raise ValueError('requirement_ids must be a list of integer ids')
+                requirement_ids = [_request_id(value, 'requirement_ids') for value in requirement_ids]
+            # DRF's boolean parsing - a form's 'false' or '0' must not skip the write
+            dry_run = BooleanField().to_internal_value(data.get('dry_run') or False)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        except ValidationError:
+            return JsonResponse({'success': False, 'error': 'dry_run must be true or false'}, status=400)
+
+        mrp_plan = None
+        if mrp_plan_id is not None:
+            mrp_plan = MRPPlan.objects.filter(pk=mrp_plan_id, company=company).first()
+            if mrp_plan is None:
+                return JsonResponse({'success': False, 'error': 'MRP plan not found'}, status=404)
+        warehouse = None
+        if warehouse_id is not None:
+            warehouse = Warehouse.objects.filter(pk=warehouse_id, company=company).first()
+            if warehouse is None:
+                return JsonResponse({'success': False, 'error': 'Warehouse not found'}, status=404)
+
+        requirements = pending_requirements(company, mrp_plan, requirement_ids)
         if not requirements.exists():
             return JsonResponse({
                 'success': False,
                 'error': 'No pending purchase requirements found'
             })
-        
-        from purchase.models import PurchaseRequest, PurchaseRequestItem
-        from decimal import Decimal
-        
-        # Group requirements by suggested order date
-        requirements_by_date = {}
-        for req in requirements:
-            date_key = req.suggested_order_date
-            if date_key not in requirements_by_date:
-                requirements_by_date[date_key] = []
-            requirements_by_date[date_key].append(req)
-        
-        pos_created = 0
-        
-        with transaction.atomic():
-            for order_date, reqs in requirements_by_date.items():
-                # Create purchase request
-                pr = PurchaseRequest.objects.create(
-                    company=company,
-                    title=f"Bulk MRP PO - {order_date}",
-                    description=f"Auto-generated from MRP requirements",
-                    priority='normal',
-                    required_date=order_date,
-                    created_by=request.user,
-                    status='draft'
-                )
-                
-                # Add items
-                for req in reqs:
-                    PurchaseRequestItem.objects.create(
-                        purchase_request=pr,
-                        product=req.product,
-                        description=req.product.description or req.product.name,
-                        quantity=req.shortage_quantity,
-                        estimated_cost=Decimal('0'),
-                        priority='normal'
-                    )
-                    
-                    # Update requirement status
-                    req.status = 'ordered'
-                    req.notes = f"Purchase Request created: {pr.title}"
-                    req.save()
-                
-                pos_created += 1
-        
+
+        if dry_run:
+            plan = plan_purchase_orders(company, requirements)
+            return JsonResponse({'success': True, 'dry_run': True, **plan})
+
+        plan = create_purchase_orders(company, requirements, user=request.user, warehouse=warehouse)
+        pos_created = len(plan['orders'])
         return JsonResponse({
             'success': True,
             'pos_created': pos_created,
+            'purchase_orders': plan['orders'],
+            'unsourced': plan['unsourced'],
             'message': f'{pos_created} purchase orders created successfully'
+            + (f", {len(plan['unsourced'])} product(s) have no supplier" if plan['unsourced'] else '')
         })
-        
+
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -673,40 +793,30 @@ def create_purchase_order_from_requirement(request, requirement_id):
                 'error': 'Requirement is not pending'
             })
         
-        from purchase.models import PurchaseRequest, PurchaseRequestItem
-        from decimal import Decimal
-        
-        with transaction.atomic():
-            # Create purchase request
-            pr = PurchaseRequest.objects.create(
-                company=request.user.company,
-                title=f"MRP PO - {requirement.product.name}",
-                description=f"Generated from MRP requirement #{requirement.id}",
-                priority='normal',
-                required_date=requirement.suggested_order_date,
-                created_by=request.user,
-                status='draft'
-            )
-            
-            # Add item
-            PurchaseRequestItem.objects.create(
-                purchase_request=pr,
-                product=requirement.product,
-                description=requirement.product.description or requirement.product.name,
-                quantity=requirement.shortage_quantity,
-                estimated_cost=Decimal('0'),
-                priority='normal'
-            )
-            
-            # Update requirement status
-            requirement.status = 'ordered'
-            requirement.notes = f"Purchase Request created: {pr.title}"
-            requirement.save()
-        
+        if requirement.shortage_quantity <= 0:
+            return JsonResponse({
+                'success': False,
+                'error': 'Requirement has no shortage to order'
+            })
+
+        from .procurement import create_purchase_orders, pending_requirements
+
+        plan = create_purchase_orders(
+            request.user.company, pending_requirements(request.user.company, requirement_ids=[requirement.pk]),
+            user=request.user,
+        )
+        if not plan['orders']:
+            return JsonResponse({
+                'success': False,
+                'error': f'No active supplier offers {requirement.product.name}'
+            })
+        order = plan['orders'][0]
+
         return JsonResponse({
             'success': True,
-            'purchase_request_id': pr.id,
-            'message': 'Purchase order created successfully'
+            'purchase_order_id': order['purchase_order_id'],
+            'po_number': order['po_number'],
+            'message': f"Purchase order {order['po_number']} created successfully"
         })
         
     except MRPRequirement.DoesNotExist:
@@ -915,43 +1025,24 @@ def export_mrp_report(request):
                 'error': 'No MRP plans found'
             }, status=404)
         
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        
-        # MRP Requirements sheet
-        ws1 = wb.active
-        ws1.title = "MRP Requirements"
-        
-        headers = [
-            'Product Name', 'Product Code', 'Required Quantity', 'Available Quantity',
-            'Shortage Quantity', 'Required Date', 'Suggested Order Date',
-            'Source Type', 'Status', 'Notes'
+        from core.exports import Column, Sheet, stream_xlsx
+
+        columns = [
+            Column('Product Name', 'product__name', width=40),
+            Column('Product Code', 'product__sku', width=20),
+            Column('Required Quantity', 'required_quantity'),
+            Column('Available Quantity', 'available_quantity'),
+            Column('Shortage Quantity', 'shortage_quantity'),
+            Column('Required Date', 'required_date'),
+            Column('Suggested Order Date', 'suggested_order_date'),
+            Column('Source Type', 'source_type'),
+            Column('Status', 'status'),
+            Column('Notes', 'notes', width=50),
         ]
-        
-        for col, header in enumerate(headers, 1):
-            ws1.cell(row=1, column=col, value=header)
-        
-        requirements = mrp_plan.requirements.all()
-        for row, req in enumerate(requirements, 2):
-            ws1.cell(row=row, column=1, value=req.product.name)
-            ws1.cell(row=row, column=2, value=req.product.code or '')
-            ws1.cell(row=row, column=3, value=float(req.required_quantity))
-            ws1.cell(row=row, column=4, value=float(req.available_quantity))
-            ws1.cell(row=row, column=5, value=float(req.shortage_quantity))
-            ws1.cell(row=row, column=6, value=req.required_date.strftime('%Y-%m-%d'))
-            ws1.cell(row=row, column=7, value=req.suggested_order_date.strftime('%Y-%m-%d'))
-            ws1.cell(row=row, column=8, value=req.source_type)
-            ws1.cell(row=row, column=9, value=req.status)
-            ws1.cell(row=row, column=10, value=req.notes or '')
-        
-        # Save to response
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        requirements = mrp_plan.requirements.select_related('product').order_by('required_date', 'id')
+        return stream_xlsx(
+            f'mrp_report_{mrp_plan.plan_date}.xlsx', [Sheet('MRP Requirements', columns, requirements)],
         )
-        response['Content-Disposition'] = f'attachment; filename="mrp_report_{mrp_plan.plan_date}.xlsx"'
-        
-        wb.save(response)
-        return response
         
     except Exception as e:
         return JsonResponse({
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ManufacturingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'manufacturing'
+
+    def ready(self):
+        from . import bom_graph, kpis
+        bom_graph.connect_signals()
+        kpis.connect_signals()
@@ -0,0 +1,318 @@
+"""
+Where-used index and cached product-structure graph.
+
+Nothing could answer "which finished goods consume this component?" short of walking
+bom_components query by query up every level, and MRP levelled its products with two
+queries each - and only knew "has a BOM or not", not how deep a component sits. Here
+each company's product structure is materialised as BOMClosure rows, one per
+(ancestor, descendant, depth): the descendant appears `depth` levels below the
+ancestor, `quantity` times per one ancestor (summed over every path of that length).
+
+- The structure follows each product's effective BOM - its default active BOM, else its
+  highest active version (the BOM Meta ordering) - the same one manufacturing.costing
+  rolls up. An item's quantity per unit of the parent is
+  quantity x (1 + waste_percentage) / lot_size.
+- where-used is one lookup on (company, descendant), explosion one on ancestor, and a
+  product's low-level code - the deepest level it is used at, 0 for products nothing
+  consumes - is the max depth of its where-used rows.
+
+The closure is recomputed per company once a transaction that saved or deleted a
+BillOfMaterials or BillOfMaterialsItem commits (the same drain-on-commit scheme as
+core.search), after chunked imports of either, and on refresh() after bulk writes. A
+structure that contains itself can't be materialised: the rebuild is skipped with a
+warning and the previous closure kept. Every rebuild stamps the company's
+BOMGraphState with a new version.
+
+graph(company) is the in-process side: a BOMGraph of the whole closure (direct
+components, multi-level requirements, where-used, low-level codes), cached per
+company and reused while the stored version is unchanged - one primary-key lookup per
+call - so MRP levelling and explosion are dictionary reads. Each worker process has
+its own cache of at most MAX_CACHED_COMPANIES graphs.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_CACHED_COMPANIES = 64
+_QUANTITY = Decimal('0.000001')
+_HUNDRED = Decimal(100)
+
+_local = threading.local()
+_lock = threading.Lock()
+_graphs = OrderedDict()  # company id -> BOMGraph, least recently used first
+
+
+class BOMCycleError(ValueError):
+    """`cycle` is the product ids around the loop, the first repeated at the end."""
+
+    def __init__(self, message, cycle=()):
+        super().__init__(message)
+        self.cycle = list(cycle)
+
+
+class BOMClosure(models.Model):
+    """One (ancestor, descendant, depth) of a company's product structure. Derived -
+    rebuilt from the BOMs, never synced."""
+    company = models.ForeignKey('user_auth.Company', on_delete=models.CASCADE, related_name='bom_closure')
+    ancestor = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    descendant = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='+')
+    depth = models.PositiveSmallIntegerField()
+    quantity = models.DecimalField(max_digits=20, decimal_places=6)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant', 'depth')
+        indexes = [models.Index(fields=['company', 'descendant'], name='mfg_bomclosure_where_used')]
+
+    def __str__(self):
+        return f'{self.ancestor_id} > {self.descendant_id} (level {self.depth}) x {self.quantity}'
+
+
+class BOMGraphState(models.Model):
+    """The version of a company's closure - replaced by every rebuild()."""
+    company = models.OneToOneField('user_auth.Company', on_delete=models.CASCADE, related_name='bom_graph_state')
+    # A nanosecond clock stamp rather than a counter, for the reason core.company_cache
+    # gives: a rebuild rolled back with its transaction must not leave a cached graph
+    # under a version number the next committed rebuild would reuse.
+    version = models.BigIntegerField()
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.company_id} v{self.version}'
+
+
+def effective_boms(boms):
+    """{product id: BOM} - the default active BOM of each product, else its highest
+    active version, out of `boms`."""
+    chosen = {}
+    for bom in boms:
+        if not bom.is_active:
+            continue
+        current = chosen.get(bom.product_id)
+        if current is None or (bom.is_default, bom.version) > (current.is_default, current.version):
+            chosen[bom.product_id] = bom
+    return chosen
+
+
+def _edges(company_id):
+    """{product id: {component id: quantity per unit}} over the effective BOMs."""
+    from .models import BillOfMaterials, BillOfMaterialsItem
+
+    boms = BillOfMaterials.objects.filter(company_id=company_id, is_active=True).only(
+        'pk', 'product_id', 'version', 'is_default', 'is_active', 'lot_size',
+    )
+    effective = {bom.pk: bom for bom in effective_boms(boms).values()}
+    edges = defaultdict(lambda: defaultdict(Decimal))
+    items = BillOfMaterialsItem.objects.filter(bom__company_id=company_id, bom__is_active=True).values_list(
+        'bom_id', 'component_id', 'quantity', 'waste_percentage',
+    )
+    for bom_id, component_id, quantity, waste in items:
+        bom = effective.get(bom_id)
+        if bom is None:
+            continue
+        lot_size = bom.lot_size if bom.lot_size > 0 else Decimal(1)
+        edges[bom.product_id][component_id] += quantity * (1 + waste / _HUNDRED) / lot_size
+    return edges
+
+
+def closure_rows(edges):
+    """{ancestor: {(descendant, depth): quantity}} for the structure `edges`."""
+    closure, open_products, path = {}, set(), []
+
+    def expand(product):
+        if product in closure:
+            return closure[product]
+        if product in open_products:
+            cycle = path[path.index(product):] + [product]
+            raise BOMCycleError(f'Product {product} is used in its own structure.', cycle)
+        open_products.add(product)
+        path.append(product)
+        rows = defaultdict(Decimal)
+        for component, quantity in edges.get(product, {}).items():
+            rows[(component, 1)] += quantity
+            for (descendant, depth), below in expand(component).items():
+                rows[(descendant, depth + 1)] += quantity * below
+        open_products.discard(product)
+        path.pop()
+        closure[product] = rows
+        return rows
+
+    for product in list(edges):
+        expand(product)
+    return {product: rows for product, rows in closure.items() if rows}
+
+
+def _lock_company(company_id):
+    # FOR NO KEY UPDATE on the company row, as analytics.facts.ensure_built() - it
+    # serialises rebuilds without blocking inserts that reference the company
+    from user_auth.models import Company
+    Company.objects.select_for_update(no_key=True).filter(pk=company_id).first()
+
+
+def rebuild(company):
+    """Recomputes the company's closure. Returns the new version. Rebuilds of one
+    company queue on its row, so two of them never interleave their delete and insert."""
+    company_id = getattr(company, 'pk', company)
+    with transaction.atomic():
+        _lock_company(company_id)
+        closure = closure_rows(_edges(company_id))
+        now = timezone.now()
+        BOMClosure.objects.filter(company_id=company_id).delete()
+        BOMClosure.objects.bulk_create(
+            [
+                BOMClosure(
+                    company_id=company_id, ancestor_id=ancestor, descendant_id=descendant, depth=depth,
+                    quantity=quantity.quantize(_QUANTITY),
+                )
+                for ancestor, rows in closure.items()
+                for (descendant, depth), quantity in rows.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        version = time.time_ns()
+        BOMGraphState.objects.update_or_create(company_id=company_id, defaults={'version': version, 'built_at': now})
+    return version
+
+
+# --- the cached graph --------------------------------------------------------------
+
+class BOMGraph:
+    """One company's closure, indexed for lookups in both directions."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.components = defaultdict(dict)  # parent -> {component: quantity per unit}
+        self.requirements = defaultdict(lambda: defaultdict(Decimal))  # ancestor -> {descendant: total}
+        self.used_in = defaultdict(lambda: defaultdict(Decimal))  # descendant -> {ancestor: total}
+        self.low_level_codes = {}
+        for ancestor, descendant, depth, quantity in rows:
+            if depth == 1:
+                self.components[ancestor][descendant] = quantity
+            self.requirements[ancestor][descendant] += quantity
+            self.used_in[descendant][ancestor] += quantity
+            self.low_level_codes[descendant] = max(depth, self.low_level_codes.get(descendant, 0))
+
+    def explode(self, product_id):
+        """{component id: quantity per unit} one level down."""
+        return self.components.get(product_id, {})
+
+    def requirements_for(self, product_id, quantity=1):
+        """{descendant id: total quantity} at every level below `quantity` units."""
+        return {pk: per_unit * quantity for pk, per_unit in self.requirements.get(product_id, {}).items()}
+
+    def where_used(self, product_id):
+        """{ancestor id: total quantity per ancestor unit} at every level above."""
+        return dict(self.used_in.get(product_id, {}))
+
+    def low_level_code(self, product_id):
+        return self.low_level_codes.get(product_id, 0)
+
+    def is_manufactured(self, product_id):
+        return product_id in self.components
+
+
+def graph(company):
+    """The company's BOMGraph, rebuilt from BOMClosure only when its version moved.
+    Raises BOMCycleError, naming the products around the loop, when the closure was
+    never built and can't be because a structure contains itself."""
+    company_id = getattr(company, 'pk', company)
+    state = BOMGraphState.objects.filter(company_id=company_id).values_list('version', flat=True)
+    version = state.first()
+    if version is None:
+        try:
+            with transaction.atomic():
+                # concurrent first readers wait here; all but the first find it built
+                _lock_company(company_id)
+                version = state.first()
+                if version is None:
+                    version = rebuild(company_id)
+        except BOMCycleError as e:
+            from products.models import Product
+            names = Product.all_objects.filter(pk__in=e.cycle).in_bulk()
+            loop = ' -> '.join(names[pk].name if pk in names else str(pk) for pk in e.cycle)
+            raise BOMCycleError(f'The bills of materials contain a cycle: {loop}.', e.cycle) from e
+    with _lock:
+        cached = _graphs.get(company_id)
+        if cached is not None and cached.version == version:
+            _graphs.move_to_end(company_id)
+            return cached
+    rows = BOMClosure.objects.filter(company_id=company_id).values_list('ancestor_id', 'descendant_id', 'depth', 'quantity')
+    built = BOMGraph(version, rows.iterator(chunk_size=BATCH_SIZE))
+    with _lock:
+        _graphs[company_id] = built
+        _graphs.move_to_end(company_id)
+        while len(_graphs) > MAX_CACHED_COMPANIES:
+            _graphs.popitem(last=False)
+    return built
+
+
+def where_used(company, product_id):
+    """[(ancestor id, depth, quantity)] straight from the index, nearest first."""
+    return list(
+        BOMClosure.objects.filter(company=company, descendant_id=product_id)
+        .order_by('depth', 'ancestor_id').values_list('ancestor_id', 'depth', 'quantity')
+    )
+
+
+# --- incremental maintenance -------------------------------------------------------
+
+def _pending():
+    if not hasattr(_local, 'company_ids'):
+        _local.company_ids = set()
+    return _local.company_ids
+
+
+def _schedule(company_id):
+    if company_id is None:
+        return
+    _pending().add(company_id)
+    # Same drain-on-first-callback scheme as analytics.facts._schedule().
+    transaction.on_commit(_flush, robust=True)
+
+
+def refresh(company):
+    """Rebuilds the company's closure once the current transaction commits - for bulk
+    BOM writes, which bypass the signals below."""
+    _schedule(getattr(company, 'pk', company))
+
+
+def _flush():
+    pending = _pending()
+    while pending:
+        company_id = pending.pop()
+        try:
+            rebuild(company_id)
+        except BOMCycleError as e:
+            logger.warning('BOM closure of company %s not rebuilt: %s', company_id, e)
+
+
+def _bom_changed(sender, instance, **kwargs):
+    _schedule(instance.company_id)
+
+
+def _item_changed(sender, instance, **kwargs):
+    from .models import BillOfMaterials
+    _schedule(BillOfMaterials.objects.filter(pk=instance.bom_id).values_list('company_id', flat=True).first())
+
+
+def _records_imported(sender, company_id, **kwargs):
+    if sender._meta.label in ('manufacturing.BillOfMaterials', 'manufacturing.BillOfMaterialsItem'):
+        _schedule(company_id)
+
+
+def connect_signals():
+    from core.imports import records_imported
+    post_save.connect(_bom_changed, sender='manufacturing.BillOfMaterials', dispatch_uid='bom_graph_bom_save')
+    post_delete.connect(_bom_changed, sender='manufacturing.BillOfMaterials', dispatch_uid='bom_graph_bom_delete')
+    post_save.connect(_item_changed, sender='manufacturing.BillOfMaterialsItem', dispatch_uid='bom_graph_item_save')
+    # pre_delete: by post_delete a cascading BOM delete has already removed the BOM row.
+    pre_delete.connect(_item_changed, sender='manufacturing.BillOfMaterialsItem', dispatch_uid='bom_graph_item_delete')
+    records_imported.connect(_records_imported, dispatch_uid='bom_graph_imported')
@@ -0,0 +1,172 @@
+"""
+Multi-level BOM cost roll-up.
+
+BillOfMaterials.calculate_total_cost() used to add up the stored total_cost of its own
+items and operations, so a sub-assembly was costed at whatever unit_cost was typed on
+the item, operations only counted if someone had filled in their total_cost, and
+nothing moved when a component's price did. roll_up() costs a company's BOMs bottom-up
+instead:
+
+- A component's price is, in order: a what-if override for it, the rolled-up unit cost
+  of its own BOM if it is a sub-assembly (the product's default active BOM, else its
+  highest active version - the BOM Meta ordering), or the product's cost_price (the
+  item's own unit_cost when the product has none).
+- Material cost is the sum of quantity x (1 + waste_percentage) x price over the items,
+  raised by the BOM's scrap_percentage (scrapped output consumes material too).
+- Labor cost is each active operation's setup + run time for lot_size units + cleanup,
+  in hours, at the operation's cost_per_hour (else its work center's).
+- overhead_cost stays as entered; total_cost is the sum, and the BOM's unit cost -
+  what a parent BOM pays for it - is total_cost / lot_size.
+
+Every active BOM of the company, its items, its operations and the component prices
+are read up front (four queries) and each BOM is costed once, memoised, however many
+parents it has; a BOM that contains itself, directly or further down, raises
+BOMCycleError.
+
+With `save` (and no overrides - a what-if never overwrites the stored costs) the
+results are written back in bulk: the BOMs' material/labor/total_cost, the items'
+unit_cost/effective_quantity/total_cost and the operations' total_cost, only the rows
+whose rounded values changed, as primary-key upserts like manufacturing.scheduling.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .bom_graph import BOMCycleError, effective_boms
+from .models import BillOfMaterials, BillOfMaterialsItem, BOMOperation
+
+BATCH_SIZE = 500
+_CENT = Decimal('0.01')
+_HUNDRED = Decimal(100)
+_SIXTY = Decimal(60)
+
+
+def _cents(value):
+    return value.quantize(_CENT)
+
+
+class _Roll:
+    def __init__(self, company, bom_ids, price_overrides):
+        from django.db.models import Q
+        from products.models import Product
+
+        self.overrides = {int(pk): Decimal(str(price)) for pk, price in (price_overrides or {}).items()}
+        # Inactive BOMs are costed when asked for by id, but never used as sub-assemblies.
+        boms = BillOfMaterials.objects.filter(Q(is_active=True) | Q(pk__in=bom_ids or ()), company=company)
+        self.boms = {bom.pk: bom for bom in boms}
+        self.bom_for_product = effective_boms(self.boms.values())
+        self.items, self.operations = {}, {}
+        for item in BillOfMaterialsItem.objects.filter(bom__in=boms.values('pk')).order_by('bom_id', 'sequence', 'pk'):
+            self.items.setdefault(item.bom_id, []).append(item)
+        for operation in (
+            BOMOperation.objects.filter(bom__in=boms.values('pk'), is_active=True)
+            .select_related('work_center').order_by('bom_id', 'sequence')
+        ):
+            self.operations.setdefault(operation.bom_id, []).append(operation)
+        components = {item.component_id for items in self.items.values() for item in items}
+        self.cost_prices = dict(Product.all_objects.filter(pk__in=components).values_list('pk', 'cost_price'))
+        self.costs = {}  # bom_id -> dict, filled by cost()
+        self.item_prices = {}  # item pk -> price used
+        self.operation_costs = {}  # operation pk -> cost
+        self._open = set()
+
+    def price(self, item):
+        if item.component_id in self.overrides:
+            return self.overrides[item.component_id]
+        sub_bom = self.bom_for_product.get(item.component_id)
+        if sub_bom is not None:
+            return self.cost(sub_bom)['unit_cost']
+        return self.cost_prices.get(item.component_id) or item.unit_cost
+
+    def cost(self, bom):
+        if bom.pk in self.costs:
+            return self.costs[bom.pk]
+        if bom.pk in self._open:
+            raise BOMCycleError(f'BOM {bom} contains itself.')
+        self._open.add(bom.pk)
+
+        material = Decimal(0)
+        for item in self.items.get(bom.pk, ()):
+            price = self.price(item)
+            self.item_prices[item.pk] = price
+            material += item.quantity * (1 + item.waste_percentage / _HUNDRED) * price
+        material *= 1 + bom.scrap_percentage / _HUNDRED
+
+        lot_size = bom.lot_size if bom.lot_size > 0 else Decimal(1)
+        labor = Decimal(0)
+        for operation in self.operations.get(bom.pk, ()):
+            rate = operation.cost_per_hour or operation.work_center.cost_per_hour
+            operation_cost = operation.calculate_total_time(lot_size) / _SIXTY * rate
+            self.operation_costs[operation.pk] = operation_cost
+            labor += operation_cost
+
+        total = material + labor + bom.overhead_cost
+        self._open.discard(bom.pk)
+        self.costs[bom.pk] = result = {
+            'material_cost': material, 'labor_cost': labor, 'overhead_cost': bom.overhead_cost,
+            'total_cost': total, 'unit_cost': total / lot_size,
+        }
+        return result
+
+    def changed_rows(self):
+        boms, items, operations = [], [], []
+        for bom_id, cost in self.costs.items():
+            bom = self.boms[bom_id]
+            values = (_cents(cost['material_cost']), _cents(cost['labor_cost']), _cents(cost['total_cost']))
+            if (bom.material_cost, bom.labor_cost, bom.total_cost) != values:
+                bom.material_cost, bom.labor_cost, bom.total_cost = values
+                boms.append(bom)
+            for item in self.items.get(bom_id, ()):
+                effective = item.quantity * (1 + item.waste_percentage / _HUNDRED)
+                values = (_cents(self.item_prices[item.pk]), _cents(effective), _cents(effective * self.item_prices[item.pk]))
+                if (item.unit_cost, item.effective_quantity, item.total_cost) != values:
+                    item.unit_cost, item.effective_quantity, item.total_cost = values
+                    items.append(item)
+            for operation in self.operations.get(bom_id, ()):
+                value = _cents(self.operation_costs[operation.pk])
+                if operation.total_cost != value:
+                    operation.total_cost = value
+                    operations.append(operation)
+        return boms, items, operations
+
+
+def roll_up(company, bom_ids=None, price_overrides=None, save=True):
+    """Costs `company`'s active BOMs (or just `bom_ids` and what they contain), with
+    `price_overrides` ({product_id: unit price}) applied. Returns a summary dict with
+    one row per BOM costed; stores the costs only when `save` and not a what-if."""
+    roll = _Roll(company, bom_ids, price_overrides)
+    targets = roll.boms.values() if bom_ids is None else [roll.boms[pk] for pk in bom_ids if pk in roll.boms]
+    for bom in targets:
+        roll.cost(bom)
+
+    what_if = bool(roll.overrides)
+    updated = {'boms': 0, 'items': 0, 'operations': 0}
+    if save and not what_if:
+        boms, items, operations = roll.changed_rows()
+        with transaction.atomic():
+            BillOfMaterials.objects.bulk_create(
+                boms, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['pk'],
+                update_fields=['material_cost', 'labor_cost', 'total_cost', 'updated_at'],
+            )
+            BillOfMaterialsItem.objects.bulk_create(
+                items, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['pk'],
+                update_fields=['unit_cost', 'effective_quantity', 'total_cost'],
+            )
+            BOMOperation.objects.bulk_create(
+                operations, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['pk'],
+                update_fields=['total_cost'],
+            )
+        updated = {'boms': len(boms), 'items': len(items), 'operations': len(operations)}
+
+    return {
+        'what_if': what_if,
+        'updated': updated,
+        'boms': [
+            {
+                'bom_id': bom_id, 'product_id': roll.boms[bom_id].product_id, 'version': roll.boms[bom_id].version,
+                **{key: _cents(value) for key, value in cost.items() if key != 'unit_cost'},
+                'unit_cost': cost['unit_cost'].quantize(Decimal('0.0001')),
+            }
+            for bom_id, cost in roll.costs.items()
+        ],
+    }
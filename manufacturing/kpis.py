@@ -0,0 +1,247 @@
+"""
+Manufacturing KPIs for the manufacturing dashboard and manufacturing_reports - computed
+for every work center at once in a fixed number of grouped queries, cached per company
+and day.
+
+Previously _get_work_center_utilization() ran two count() queries per work center (and
+called "in-progress operations / max_operators" utilisation), capacity utilisation
+summed work-center capacity in Python against a count of running operations, and every
+other figure was its own query inside a bare `except:` that turned any error into a
+plausible-looking 0. Now, over the last PERIOD_DAYS days:
+
+- utilisation: hours of operations completed in the period (actual_start ->
+  actual_end) over the hours the work center is open - operating_hours_per_day on
+  operating_days_per_week days a week (from Monday, as manufacturing.scheduling counts
+  them), times max_operators;
+- OEE-style availability (run time over run time + downtime, a downtime OperationLog
+  lasting until the operation's next log), performance (setup + run time per unit x
+  units + cleanup of the operation's BOMOperation, over actual run time, capped at
+  100%) and quality (good units over good + rejected), and OEE = A x P x Q;
+- quality-check pass rate (passed over decided checks), production scrap rate
+  (rejected over produced + rejected on work orders completed in the period), material
+  scrap rate (MaterialConsumption waste over consumption) and on-time delivery (work
+  orders completed in the period by their scheduled_end).
+
+A figure with nothing to measure is None, not 0. The work-center rows come from one
+grouped query per source table - WorkOrderOperation, OperationLog (downtime, with the
+end of each stop as a correlated subquery), QualityCheck - and the company figures are
+added up from them, plus one aggregate each for work orders, material consumption and
+the dashboard's headline counts.
+
+The result is a plain dict cached per (company, day) through core.company_cache, like
+sales.reports, and invalidated whenever a work center, BOM, work order, operation,
+operation log, quality check, material consumption, production plan or MRP requirement
+of that company is written (or bulk-imported, see core.imports.records_imported).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DecimalField, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from core import company_cache
+
+CACHE_NAMESPACE = 'manufacturing_kpis'
+PERIOD_DAYS = 30
+TOP_PRODUCTS = 5
+DECIDED_CHECK_STATUSES = ('passed', 'failed', 'conditional')
+ACTIVE_WORK_ORDER_STATUSES = ('planned', 'released', 'in_progress')
+
+# model label -> how to find the company of one of its rows
+SOURCE_MODELS = {
+    'manufacturing.WorkCenter': 'company_id',
+    'manufacturing.BillOfMaterials': 'company_id',
+    'manufacturing.WorkOrder': 'company_id',
+    'manufacturing.ProductionPlan': 'company_id',
+    'manufacturing.WorkOrderOperation': 'work_order',
+    'manufacturing.QualityCheck': 'work_order',
+    'manufacturing.MaterialConsumption': 'work_order',
+    'manufacturing.OperationLog': 'work_center',
+    'manufacturing.MRPRequirement': 'mrp_plan',
+}
+
+
+def _percent(part, whole):
+    if not whole:
+        return None
+    return round(float(part) / float(whole) * 100, 2)
+
+
+def _hours(duration):
+    return duration.total_seconds() / 3600 if duration else 0.0
+
+
+def _duration(end, start):
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+
+def _open_hours(work_center, first_day, days):
+    open_days = sum(1 for n in range(days) if (first_day + timedelta(days=n)).weekday() < work_center.operating_days_per_week)
+    return open_days * float(work_center.operating_hours_per_day) * max(work_center.max_operators, 1)
+
+
+def _oee(run, downtime, ideal, good, rejected):
+    """availability, performance, quality and OEE (percent, None when undefined)."""
+    availability = _percent(run, run + downtime)
+    performance = min(_percent(ideal, run), 100.0) if ideal and run else None
+    quality = _percent(good, good + rejected)
+    parts = (availability, performance, quality)
+    oee = None if None in parts else round(availability * performance * quality / 10000, 2)
+    return {'availability': availability, 'performance': performance, 'quality': quality, 'oee': oee}
+
+
+def compute_kpis(company, today):
+    from .models import (
+        BillOfMaterials, MaterialConsumption, MRPRequirement, OperationLog, ProductionPlan, QualityCheck, WorkCenter,
+        WorkOrder, WorkOrderOperation,
+    )
+
+    tz = timezone.get_current_timezone()
+    first_day = today - timedelta(days=PERIOD_DAYS - 1)
+    start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(today + timedelta(days=1), time.min), tz)
+    month_start = timezone.make_aware(datetime.combine(today.replace(day=1), time.min), tz)
+    in_period = Q(status='completed', actual_start__isnull=False, actual_end__gte=start, actual_end__lt=end)
+
+    operations = {
+        row['work_center']: row
+        for row in WorkOrderOperation.objects.filter(work_center__company=company).values('work_center').annotate(
+            total=Count('id'),
+            active=Count('id', filter=Q(status='in_progress')),
+            run=Sum(_duration('actual_end', 'actual_start'), filter=in_period),
+            ideal=Sum(
+                ExpressionWrapper(
+                    F('bom_operation__setup_time_minutes') + F('bom_operation__cleanup_time_minutes')
+                    + F('bom_operation__run_time_per_unit_minutes') * (F('quantity_produced') + F('quantity_rejected')),
+                    output_field=DecimalField(),
+                ),
+                filter=in_period,
+            ),
+            good=Sum('quantity_produced', filter=in_period),
+            rejected=Sum('quantity_rejected', filter=in_period),
+        )
+    }
+    stop_ended = OperationLog.objects.filter(
+        work_order_operation=OuterRef('work_order_operation'), timestamp__gt=OuterRef('timestamp'),
+    ).order_by('timestamp').values('timestamp')[:1]
+    downtime = dict(
+        OperationLog.objects.filter(work_center__company=company, log_type='downtime', timestamp__gte=start, timestamp__lt=end)
+        .annotate(ended=Subquery(stop_ended)).values('work_center')
+        .annotate(stopped=Sum(_duration('ended', 'timestamp'))).values_list('work_center', 'stopped')
+    )
+    checks = {
+        row['work_order_operation__work_center']: row
+        for row in QualityCheck.objects.filter(work_order__company=company).values('work_order_operation__work_center').annotate(
+            decided=Count('id', filter=Q(status__in=DECIDED_CHECK_STATUSES, inspection_date__gte=start, inspection_date__lt=end)),
+            passed=Count('id', filter=Q(status='passed', inspection_date__gte=start, inspection_date__lt=end)),
+            pending=Count('id', filter=Q(status='pending')),
+        )
+    }
+
+    rows, totals = [], {'open': 0.0, 'run': 0.0, 'downtime': 0.0, 'ideal': 0.0, 'good': 0, 'rejected': 0}
+    for work_center in WorkCenter.objects.filter(company=company, is_active=True).order_by('name'):
+        ops = operations.get(work_center.pk, {})
+        run_hours = _hours(ops.get('run'))
+        downtime_hours = _hours(downtime.get(work_center.pk))
+        ideal_hours = float(ops.get('ideal') or 0) / 60
+        good, rejected = ops.get('good') or 0, ops.get('rejected') or 0
+        open_hours = _open_hours(work_center, first_day, PERIOD_DAYS)
+        wc_checks = checks.get(work_center.pk, {})
+        rows.append({
+            'work_center_id': work_center.pk,
+            'work_center': work_center.name,
+            'code': work_center.code,
+            'available_hours': round(open_hours, 2),
+            'run_hours': round(run_hours, 2),
+            'downtime_hours': round(downtime_hours, 2),
+            'utilization': _percent(run_hours, open_hours),
+            **_oee(run_hours, downtime_hours, ideal_hours, good, rejected),
+            'quality_pass_rate': _percent(wc_checks.get('passed', 0), wc_checks.get('decided', 0)),
+            'active_operations': ops.get('active', 0),
+            'total_operations': ops.get('total', 0),
+        })
+        for key, value in (('open', open_hours), ('run', run_hours), ('downtime', downtime_hours), ('ideal', ideal_hours),
+                           ('good', good), ('rejected', rejected)):
+            totals[key] += value
+
+    work_orders = WorkOrder.objects.filter(company=company).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status__in=ACTIVE_WORK_ORDER_STATUSES)),
+        completed_this_month=Count('id', filter=Q(status='completed', actual_end__gte=month_start)),
+        completed=Count('id', filter=Q(in_period, scheduled_end__isnull=False)),
+        on_time=Count('id', filter=Q(in_period, scheduled_end__isnull=False, actual_end__lte=F('scheduled_end'))),
+        produced=Sum('quantity_produced', filter=Q(status='completed', actual_end__gte=start, actual_end__lt=end)),
+        rejected=Sum('quantity_rejected', filter=Q(status='completed', actual_end__gte=start, actual_end__lt=end)),
+    )
+    materials = MaterialConsumption.objects.filter(
+        work_order__company=company, consumed_at__gte=start, consumed_at__lt=end,
+    ).aggregate(consumed=Sum('consumed_quantity'), waste=Sum('waste_quantity'))
+    boms = BillOfMaterials.objects.filter(company=company).aggregate(
+        active=Count('id', filter=Q(is_active=True)), new_this_month=Count('id', filter=Q(created_at__gte=month_start)),
+    )
+    top_products = list(
+        WorkOrder.objects.filter(company=company, status='completed', actual_end__gte=month_start)
+        .values('product__name').annotate(total_quantity=Sum('quantity_produced')).order_by('-total_quantity')[:TOP_PRODUCTS]
+    )
+
+    produced, rejected = work_orders['produced'] or 0, work_orders['rejected'] or 0
+    decided = sum(row['decided'] for row in checks.values())
+    return {
+        'as_of': today,
+        'period_start': first_day,
+        'period_days': PERIOD_DAYS,
+        'total_work_orders': work_orders['total'],
+        'active_work_orders': work_orders['active'],
+        'completed_this_month': work_orders['completed_this_month'],
+        'on_time_delivery': _percent(work_orders['on_time'], work_orders['completed']),
+        'capacity_utilization': _percent(totals['run'], totals['open']),
+        **_oee(totals['run'], totals['downtime'], totals['ideal'], totals['good'], totals['rejected']),
+        'quality_pass_rate': _percent(sum(row['passed'] for row in checks.values()), decided),
+        'quality_checks_pending': sum(row['pending'] for row in checks.values()),
+        'scrap_rate': _percent(rejected, produced + rejected),
+        'material_scrap_rate': _percent(materials['waste'] or 0, materials['consumed']),
+        'active_boms': boms['active'],
+        'new_boms_this_month': boms['new_this_month'],
+        'production_plans': ProductionPlan.objects.filter(company=company, status__in=['approved', 'in_progress']).count(),
+        'mrp_requirements_due': MRPRequirement.objects.filter(
+            mrp_plan__company=company, status='pending', required_date__lte=today + timedelta(days=7),
+        ).count(),
+        'top_products': top_products,
+        'work_centers': rows,
+    }
+
+
+def get_kpis(company, today=None):
+    today = today or timezone.localdate()
+    return company_cache.get_or_compute(CACHE_NAMESPACE, company.id, lambda: compute_kpis(company, today), today)
+
+
+# --- invalidation ------------------------------------------------------------------
+
+def _company_id(instance):
+    from .models import MRPPlan, WorkCenter, WorkOrder
+
+    path = SOURCE_MODELS[instance._meta.label]
+    if path == 'company_id':
+        return instance.company_id
+    parent_model = {'work_order': WorkOrder, 'work_center': WorkCenter, 'mrp_plan': MRPPlan}[path]
+    return parent_model.objects.filter(pk=getattr(instance, f'{path}_id')).values_list('company_id', flat=True).first()
+
+
+def invalidate_kpis(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    company_cache.invalidate(CACHE_NAMESPACE, _company_id(instance))
+
+
+def invalidate_after_import(sender, company_id, **kwargs):
+    if sender._meta.label in SOURCE_MODELS:
+        company_cache.invalidate(CACHE_NAMESPACE, company_id)
+
+
+def connect_signals():
+    from core.imports import records_imported
+    for sender in SOURCE_MODELS:
+        post_save.connect(invalidate_kpis, sender=sender, dispatch_uid=f'manufacturing_kpis_{sender}_save')
+        post_delete.connect(invalidate_kpis, sender=sender, dispatch_uid=f'manufacturing_kpis_{sender}_delete')
+    records_imported.connect(invalidate_after_import, dispatch_uid='manufacturing_kpis_imported')
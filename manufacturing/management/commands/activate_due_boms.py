@@ -0,0 +1,27 @@
+"""
+Applies the BOM activations scheduled for today or earlier (manufacturing/versioning.py)
+- run daily, like run_mrp.
+
+Usage: python manage.py activate_due_boms
+       python manage.py activate_due_boms --company-id 3
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from manufacturing.versioning import apply_due_activations
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Make BOMs scheduled for activation their products\' default BOM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Apply activations for this company only')
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company_id']:
+            company = Company.objects.filter(pk=options['company_id']).first()
+            if company is None:
+                raise CommandError(f"Company with ID {options['company_id']} does not exist")
+        count = apply_due_activations(company=company)
+        self.stdout.write(f'{count} BOM activation(s) applied')
@@ -0,0 +1,34 @@
+"""
+Re-costs every active BOM bottom-up (manufacturing/costing.py) and stores the results -
+the batch job to run after component prices change.
+
+Usage: python manage.py roll_up_bom_costs
+       python manage.py roll_up_bom_costs --company-id 3
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from manufacturing.costing import roll_up
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Roll up multi-level BOM costs for all companies or a specific company'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', type=int, help='Roll up costs for this company only')
+
+    def handle(self, *args, **options):
+        if options['company_id']:
+            companies = Company.objects.filter(pk=options['company_id'])
+            if not companies.exists():
+                raise CommandError(f"Company with ID {options['company_id']} does not exist")
+        else:
+            companies = Company.objects.filter(is_active=True)
+
+        for company in companies:
+            result = roll_up(company)
+            updated = result['updated']
+            self.stdout.write(
+                f"{company.name}: {len(result['boms'])} BOMs costed, {updated['boms']} BOMs, "
+                f"{updated['items']} items and {updated['operations']} operations updated"
+            )
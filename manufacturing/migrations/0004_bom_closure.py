@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0003_mrprunlog_capacityplan_demandforecast_reorderrule_and_more'),
+        ('products', '0004_product_auto_reorder_product_bill_of_materials_and_more'),
+        ('user_auth', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BOMGraphState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField()),
+                ('built_at', models.DateTimeField()),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bom_graph_state', to='user_auth.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BOMClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('quantity', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bom_closure', to='user_auth.company')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'descendant'], name='mfg_bomclosure_where_used')],
+                'unique_together': {('ancestor', 'descendant', 'depth')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0004_bom_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billofmaterials',
+            name='activate_on',
+            field=models.DateField(blank=True, help_text="Becomes the product's default BOM on this date", null=True),
+        ),
+    ]
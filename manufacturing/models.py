@@ -83,6 +83,7 @@ class BillOfMaterials(models.Model):
     is_default = models.BooleanField(default=False)
     effective_from = models.DateField(null=True, blank=True)
     effective_to = models.DateField(null=True, blank=True)
+    activate_on = models.DateField(null=True, blank=True, help_text="Becomes the product's default BOM on this date")
     
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_boms')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -95,12 +96,15 @@ class BillOfMaterials(models.Model):
     overhead_account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True, related_name='boms_overhead')
 
     def calculate_total_cost(self):
-        """Calculate total BOM cost including materials, labor, and overhead"""
-        material_cost = sum(item.total_cost for item in self.items.all())
-        operation_cost = sum(op.total_cost for op in self.operations.all())
-        self.material_cost = material_cost
-        self.labor_cost = operation_cost
-        self.total_cost = material_cost + operation_cost + self.overhead_cost
+        """Calculate total BOM cost including materials (sub-assemblies rolled up),
+        labor, and overhead - see manufacturing/costing.py. Sets the fields without
+        saving them."""
+        from .costing import roll_up
+
+        costs = next(row for row in roll_up(self.company, bom_ids=[self.pk], save=False)['boms'] if row['bom_id'] == self.pk)
+        self.material_cost = costs['material_cost']
+        self.labor_cost = costs['labor_cost']
+        self.total_cost = costs['total_cost']
         return self.total_cost
 
     def __str__(self):
@@ -135,7 +139,7 @@ class BillOfMaterialsItem(models.Model):
 
     def save(self, *args, **kwargs):
         # Calculate effective quantity including waste
-        waste_factor = 1 + (self.waste_percentage / 100)
+        waste_factor = 1 + (Decimal(str(self.waste_percentage)) / 100)
         self.effective_quantity = self.quantity * waste_factor
         self.total_cost = self.effective_quantity * self.unit_cost
         super().save(*args, **kwargs)
@@ -1015,6 +1019,12 @@ class CapacityPlan(models.Model):
         else:
             self.utilization_percentage = 0
             self.is_overloaded = False
+
+    def save(self, *args, **kwargs):
+        # Stored utilisation always matches the hours, so reading plans never has to
+        # recalculate and re-save them (bulk writes call calculate_utilization() themselves).
+        self.calculate_utilization()
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.work_center.name} - {self.plan_date} - {self.utilization_percentage}%"
@@ -1022,3 +1032,6 @@ class CapacityPlan(models.Model):
     class Meta:
         unique_together = ['company', 'work_center', 'plan_date']
         ordering = ['plan_date', 'work_center__name']
+
+
+from .bom_graph import BOMClosure, BOMGraphState  # noqa: E402,F401
@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.db import transaction
 from collections import defaultdict, OrderedDict
 
+from .bom_graph import graph as bom_graph
 from .models import (
     MRPPlan, MRPRequirement, BillOfMaterials, BillOfMaterialsItem,
     WorkOrder, ProductionPlan, ProductionPlanItem
@@ -92,6 +93,9 @@ class MRPEngine:
         # Combine and get unique products
         self.products = (products_with_boms | component_products).distinct()
         
+        # Product structure - levels and explosion (manufacturing/bom_graph.py)
+        self.bom_graph = bom_graph(self.company)
+        
         # Initialize current inventory levels
         for product in self.products:
             try:
@@ -182,25 +186,18 @@ class MRPEngine:
         # Process products in order (finished goods first, then components)
         products_by_level = self._get_products_by_bom_level()
         
-        for level in sorted(products_by_level.keys(), reverse=True):
+        for level in sorted(products_by_level.keys()):
             for product in products_by_level[level]:
                 self._calculate_product_requirements(product)
     
     def _get_products_by_bom_level(self):
-        """Organize products by BOM level (0=finished goods, higher=components)"""
+        """Organize products by low-level code (0=finished goods, higher=components) -
+        the deepest level a product is used at in any structure, so a component is only
+        netted once every parent has exploded its requirements into it"""
         products_by_level = defaultdict(list)
         
         for product in self.products:
-            # Simple level calculation - can be enhanced
-            level = 0
-            if product.boms.filter(is_active=True).exists():
-                level = 1  # Has BOM, so it's manufactured
-            
-            # Check if it's used as a component (higher level)
-            if product.bom_components.exists():
-                level = max(level, 0)  # Component level
-            
-            products_by_level[level].append(product)
+            products_by_level[self.bom_graph.low_level_code(product.id)].append(product)
         
         return products_by_level
     
@@ -278,16 +275,9 @@ class MRPEngine:
     def _explode_bom(self, product, quantity, order_date):
         """Explode BOM to create gross requirements for components"""
         
-        bom = product.boms.filter(is_active=True, is_default=True).first()
-        if not bom:
-            return
-        
-        for bom_item in bom.items.all():
-            component = bom_item.component
-            component_qty = bom_item.effective_quantity * quantity
-            
+        for component_id, quantity_per_unit in self.bom_graph.explode(product.id).items():
             # Add to gross requirements for the component
-            self.gross_requirements[component.id][order_date] += component_qty
+            self.gross_requirements[component_id][order_date] += quantity_per_unit * quantity
     
     def _create_mrp_requirements(self):
         """Create MRPRequirement records from calculated data"""
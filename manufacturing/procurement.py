@@ -0,0 +1,267 @@
+"""
+Purchase orders for a whole MRP run at once, planned in memory and written in bulk.
+
+bulk_create_purchase_orders and create_purchase_order_from_requirement turned pending
+purchase requirements into documents one requirement at a time (a create per line and
+a save per requirement), priced nothing, and ignored every supplier record the company
+keeps. plan_purchase_orders() reads the requirements and everything needed to source
+them in a fixed number of queries, then per product:
+
+- picks the supplier - the preferred_supplier of the product's StockItem, else the
+  SupplierLeadTime marked is_preferred, else whichever source (an active, currently
+  valid SupplierProductCatalog entry or SupplierLeadTime row of an active supplier) is
+  cheapest for the quantity, then quickest. A product with no source is reported as
+  unsourced and its requirements stay pending;
+- adds up the shortages of its requirements into one line, raised to the largest
+  minimum order quantity on record for that supplier, and prices the line at
+  SupplierProductCatalog.get_price_for_quantity() (so price breaks apply to the whole
+  MRP run's quantity, not to each requirement), falling back to the lead-time row's
+  price_per_unit and then the product's cost_price;
+- offsets by the lead time (catalog, lead-time row, supplier's delivery_lead_time,
+  StockItem.lead_time_days - the first one set): the line is due on its earliest
+  required date, to be ordered lead-time days before it, and is flagged late when even
+  ordering today can't make that date - its delivery date is then today + lead time.
+
+Lines are grouped into one draft PurchaseOrder per supplier. create_purchase_orders()
+writes the plan: one leased range of PO numbers (core.numbering.lease_range(), the same
+counter PurchaseOrder.save() draws from), one bulk insert each for the orders and their
+items with the totals computed here, and the requirements marked ordered as a
+primary-key upsert - all in one transaction, with the requirements locked so two
+concurrent runs can't order the same shortage twice.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import MRPRequirement, SupplierLeadTime
+
+BATCH_SIZE = 1000
+_CENT = Decimal('0.01')
+
+
+def pending_requirements(company, mrp_plan=None, requirement_ids=None):
+    """The company's pending purchase requirements with a shortage, optionally of one
+    MRP plan or a list of requirement ids."""
+    requirements = MRPRequirement.objects.filter(
+        mrp_plan__company=company, source_type='purchase', status='pending', shortage_quantity__gt=0,
+    )
+    if mrp_plan is not None:
+        requirements = requirements.filter(mrp_plan=mrp_plan)
+    if requirement_ids is not None:
+        requirements = requirements.filter(pk__in=requirement_ids)
+    return requirements
+
+
+class _Source:
+    """One supplier's terms for one product, from its catalog entry and/or lead-time row."""
+
+    def __init__(self, supplier):
+        self.supplier = supplier
+        self.catalog = None
+        self.lead = None
+
+    def moq(self):
+        return max(
+            [row.minimum_order_quantity for row in (self.catalog, self.lead) if row is not None and row.minimum_order_quantity]
+            or [Decimal(0)]
+        )
+
+    def unit_price(self, product, quantity):
+        if self.catalog is not None:
+            return self.catalog.get_price_for_quantity(quantity)
+        if self.lead is not None and self.lead.price_per_unit:
+            return self.lead.price_per_unit
+        return product.cost_price or Decimal(0)
+
+    def lead_time_days(self, stock_lead_time):
+        for days in (
+            self.catalog and self.catalog.lead_time_days, self.lead and self.lead.lead_time_days,
+            self.supplier.delivery_lead_time, stock_lead_time,
+        ):
+            if days:
+                return days
+        return 0
+
+
+def _plan(company, requirements, today):
+    """(plan, the requirements read) for `requirements` (a queryset) - five queries,
+    nothing written. Lines carry their 'requirement_ids'."""
+    from inventory.models import StockItem
+    from purchase.models import Supplier, SupplierProductCatalog
+
+    requirements = list(requirements.select_related('product').order_by('required_date', 'pk'))
+    product_ids = {requirement.product_id for requirement in requirements}
+    preferred, stock_lead_time = {}, {}
+    for product_id, supplier_id, days in StockItem.objects.filter(
+        company=company, product_id__in=product_ids,
+    ).order_by('pk').values_list('product_id', 'preferred_supplier_id', 'lead_time_days'):
+        if supplier_id:
+            preferred.setdefault(product_id, supplier_id)
+        if days:
+            stock_lead_time.setdefault(product_id, days)
+    catalog = list(SupplierProductCatalog.objects.filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gte=today),
+        supplier__company=company, product_id__in=product_ids, is_active=True, effective_date__lte=today,
+    ).order_by('pk'))
+    # SupplierLeadTime points at the supplier's Partner - carry its Supplier's id along
+    leads = list(SupplierLeadTime.objects.filter(
+        Q(valid_from__isnull=True) | Q(valid_from__lte=today), Q(valid_to__isnull=True) | Q(valid_to__gte=today),
+        company=company, product_id__in=product_ids, is_active=True, supplier__supplier_profile__company=company,
+    ).annotate(supplier_profile_id=F('supplier__supplier_profile__id')).order_by('pk'))
+    suppliers = Supplier.objects.filter(company=company, is_active=True).select_related('partner').in_bulk(
+        set(preferred.values()) | {row.supplier_id for row in catalog} | {row.supplier_profile_id for row in leads}
+    )
+
+    sources = defaultdict(dict)  # {product id: {supplier id: _Source}}
+
+    def source(product_id, supplier_id):
+        if supplier_id not in suppliers:
+            return None
+        if supplier_id not in sources[product_id]:
+            sources[product_id][supplier_id] = _Source(suppliers[supplier_id])
+        return sources[product_id][supplier_id]
+
+    preferred_lead = {}
+    for row in catalog:
+        if source(row.product_id, row.supplier_id):
+            source(row.product_id, row.supplier_id).catalog = row
+    for row in leads:
+        if source(row.product_id, row.supplier_profile_id):
+            source(row.product_id, row.supplier_profile_id).lead = row
+            if row.is_preferred:
+                preferred_lead.setdefault(row.product_id, row.supplier_profile_id)
+    for product_id, supplier_id in preferred.items():
+        source(product_id, supplier_id)
+
+    by_product = defaultdict(list)
+    for requirement in requirements:
+        by_product[requirement.product_id].append(requirement)
+    lines, unsourced = defaultdict(list), []
+    for product_id, product_requirements in by_product.items():
+        product = product_requirements[0].product
+        needed = sum(requirement.shortage_quantity for requirement in product_requirements)
+        candidates = sources.get(product_id, {})
+        chosen = next(
+            (supplier_id for supplier_id in (preferred.get(product_id), preferred_lead.get(product_id)) if supplier_id in candidates),
+            None,
+        )
+        if chosen is not None:
+            chosen = candidates[chosen]
+        elif candidates:
+            chosen = min(candidates.values(), key=lambda candidate: (
+                candidate.unit_price(product, max(needed, candidate.moq())),
+                candidate.lead_time_days(stock_lead_time.get(product_id)), candidate.supplier.pk,
+            ))
+        else:
+            unsourced.append({
+                'product_id': product_id, 'product_name': product.name, 'quantity': needed,
+                'requirement_ids': [requirement.pk for requirement in product_requirements],
+            })
+            continue
+
+        moq = chosen.moq()
+        quantity = max(needed, moq)
+        unit_price = Decimal(chosen.unit_price(product, quantity)).quantize(_CENT)
+        lead_time = chosen.lead_time_days(stock_lead_time.get(product_id))
+        needed_by = product_requirements[0].required_date
+        earliest = today + timedelta(days=lead_time)
+        lines[chosen.supplier.pk].append({
+            'product_id': product_id,
+            'product_name': product.name,
+            'required_quantity': needed,
+            'quantity': quantity,
+            'minimum_order_quantity': moq,
+            'unit_price': unit_price,
+            'line_total': (quantity * unit_price).quantize(_CENT),
+            'lead_time_days': lead_time,
+            'needed_by': needed_by,
+            'order_by': needed_by - timedelta(days=lead_time),
+            'delivery_date': max(needed_by, earliest),
+            'late': earliest > needed_by,
+            'requirement_ids': [requirement.pk for requirement in product_requirements],
+        })
+
+    orders = []
+    for supplier_id in sorted(lines):
+        supplier, supplier_lines = suppliers[supplier_id], lines[supplier_id]
+        subtotal = sum(line['line_total'] for line in supplier_lines)
+        orders.append({
+            'supplier_id': supplier_id,
+            'supplier_name': supplier.name,
+            'expected_delivery_date': min(line['delivery_date'] for line in supplier_lines),
+            'subtotal': subtotal,
+            'below_minimum_order_value': subtotal < (supplier.minimum_order_value or 0),
+            'lines': supplier_lines,
+        })
+    return {'orders': orders, 'unsourced': unsourced}, requirements
+
+
+def plan_purchase_orders(company, requirements=None, today=None):
+    """The purchase orders create_purchase_orders() would write for `requirements`
+    (default: every pending one of the company), without writing them. Returns
+    {'orders': [one per supplier, with its 'lines'], 'unsourced': [one per product]}."""
+    if requirements is None:
+        requirements = pending_requirements(company)
+    return _plan(company, requirements, today or timezone.localdate())[0]
+
+
+def create_purchase_orders(company, requirements=None, user=None, warehouse=None, today=None):
+    """Plans and writes the purchase orders for `requirements` (default: every pending
+    one of the company) and marks the requirements ordered. Requirements no longer
+    pending by the time they're locked are left out. Returns the plan, each order with
+    its 'purchase_order_id' and 'po_number'."""
+    from core.dashboard_metrics import invalidate_model
+    from core.imports import records_imported
+    from core.numbering import format_number, lease_range
+    from purchase.models import PurchaseOrder, PurchaseOrderItem
+
+    if requirements is None:
+        requirements = pending_requirements(company)
+    with transaction.atomic():
+        plan, requirements = _plan(
+            company, requirements.filter(status='pending').select_for_update(of=('self',)), today or timezone.localdate(),
+        )
+        orders = plan['orders']
+        if not orders:
+            return plan
+
+        start, _, year = lease_range(
+            company, 'purchase_order', 'PO', 4, len(orders), PurchaseOrder, 'po_number', 'objects', year_scoped=True,
+        )
+        purchase_orders = PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(
+                company=company, supplier_id=order['supplier_id'], po_number=format_number('PO', 4, start + n, year),
+                warehouse=warehouse, created_by=user, expected_delivery_date=order['expected_delivery_date'],
+                subtotal=order['subtotal'], total_amount=order['subtotal'], status='draft',
+                notes='Auto-generated from MRP requirements',
+            )
+            for n, order in enumerate(orders)
+        ], batch_size=BATCH_SIZE)
+        items, changed = [], []
+        by_pk = {requirement.pk: requirement for requirement in requirements}
+        for order, purchase_order in zip(orders, purchase_orders):
+            order.update(purchase_order_id=purchase_order.pk, po_number=purchase_order.po_number)
+            for line in order['lines']:
+                items.append(PurchaseOrderItem(
+                    purchase_order=purchase_order, product_id=line['product_id'], quantity=line['quantity'],
+                    unit_price=line['unit_price'], minimum_order_qty=line['minimum_order_quantity'] or Decimal(1),
+                    line_total=line['line_total'], delivery_date=line['delivery_date'],
+                ))
+                for requirement_id in line['requirement_ids']:
+                    requirement = by_pk[requirement_id]
+                    requirement.status = 'ordered'
+                    requirement.notes = f'Purchase Order {purchase_order.po_number}'
+                    changed.append(requirement)
+        PurchaseOrderItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        MRPRequirement.objects.bulk_create(
+            changed, update_conflicts=True, unique_fields=['pk'], update_fields=['status', 'notes'], batch_size=BATCH_SIZE,
+        )
+
+    for model in (PurchaseOrder, PurchaseOrderItem, MRPRequirement):
+        invalidate_model(model._meta.label, company.pk)
+        records_imported.send(sender=model, company_id=company.pk)
+    return plan
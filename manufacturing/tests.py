@@ -1,3 +1,512 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Product
+from user_auth.models import Company, Role, User
+
+from .models import BillOfMaterials, BillOfMaterialsItem, BOMOperation, CapacityPlan, MRPRequirement, WorkCenter, WorkOrder
+
+
+def _at(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class WorkOrderSchedulingTests(TestCase):
+    """manufacturing.scheduling - finite capacity, routing order, calendars, dispatch rules."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Plant')
+        self.product = Product.objects.create(company=self.company, name='Widget')
+        self.bom = BillOfMaterials.objects.create(company=self.company, product=self.product, name='Widget BOM')
+        self.cutting = WorkCenter.objects.create(company=self.company, name='Cutting', code='T-CUT')
+        self.assembly = WorkCenter.objects.create(company=self.company, name='Assembly', code='T-ASM', max_operators=2)
+        BOMOperation.objects.create(
+            bom=self.bom, work_center=self.cutting, operation_name='Cut', sequence=10,
+            run_time_per_unit_minutes=Decimal(60),
+        )
+        BOMOperation.objects.create(
+            bom=self.bom, work_center=self.assembly, operation_name='Assemble', sequence=20,
+            setup_time_minutes=Decimal(30),
+        )
+
+    def _order(self, priority='normal', quantity=2):
+        return WorkOrder.objects.create(
+            company=self.company, bom=self.bom, product=self.product, quantity_planned=Decimal(quantity),
+            status='released', priority=priority,
+        )
+
+    def test_orders_share_capacity_in_priority_order(self):
+        from .scheduling import schedule
+
+        normal, urgent, low = self._order(), self._order('urgent'), self._order('low')
+        monday = _at(2026, 10, 19, 8, 0)
+        result = schedule(self.company, start=monday)
+
+        self.assertEqual((result['work_orders'], result['operations']), (3, 6))
+        cuts = {}
+        for order in (urgent, normal, low):
+            order.refresh_from_db()
+            cut, assemble = order.operations.order_by('sequence')
+            self.assertGreaterEqual(assemble.planned_start, cut.planned_end)
+            self.assertEqual(order.scheduled_end, assemble.planned_end)
+            cuts[order.priority] = (cut.planned_start, cut.planned_end)
+        # one cutter, two hours each, urgent first
+        self.assertEqual(cuts['urgent'], (monday, _at(2026, 10, 19, 10, 0)))
+        self.assertEqual(cuts['normal'], (_at(2026, 10, 19, 10, 0), _at(2026, 10, 19, 12, 0)))
+        self.assertEqual(cuts['low'], (_at(2026, 10, 19, 12, 0), _at(2026, 10, 19, 14, 0)))
+
+        plan = CapacityPlan.objects.get(work_center=self.cutting, plan_date=monday.date())
+        self.assertEqual(plan.planned_hours, Decimal('6.00'))
+
+    def test_operations_continue_on_the_next_working_day(self):
+        from .scheduling import schedule
+
+        order = self._order(quantity=4)
+        schedule(self.company, start=_at(2026, 10, 23, 14, 0))  # a Friday, 2h before close
+
+        cut = order.operations.get(sequence=10)
+        self.assertEqual(cut.planned_start, _at(2026, 10, 23, 14, 0))
+        self.assertEqual(cut.planned_end, _at(2026, 10, 26, 10, 0))
+
+    def test_an_operation_moved_to_another_center_is_scheduled_there(self):
+        from .scheduling import schedule
+
+        order = self._order()
+        monday = _at(2026, 10, 19, 8, 0)
+        schedule(self.company, start=monday)
+        laser = WorkCenter.objects.create(company=self.company, name='Laser', code='T-LASER')
+        order.operations.filter(sequence=10).update(work_center=laser)
+
+        schedule(self.company, start=monday)
+        self.assertTrue(CapacityPlan.objects.filter(work_center=laser, plan_date=monday.date(), planned_hours=Decimal('2.00')).exists())
+        self.assertEqual(order.operations.get(sequence=10).work_center, laser)
+
+    def test_capacity_analysis_does_not_write(self):
+        owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        CapacityPlan.objects.create(
+            company=self.company, work_center=self.cutting, plan_date=_at(2026, 10, 19).date(),
+            available_hours=Decimal(40), planned_hours=Decimal(50),
+        )
+        client = APIClient()
+        client.force_authenticate(owner)
+        with self.assertNumQueries(1):
+            response = client.get('/api/manufacturing/capacity-plans/capacity_analysis/')
+        self.assertEqual(len(response.data['overloaded_centers']), 1)
+
+
+class BOMCostRollUpTests(TestCase):
+    """manufacturing.costing - sub-assemblies, waste/scrap, operations, what-if prices."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Bikes')
+        self.steel = Product.objects.create(company=self.company, name='Steel tube', cost_price=Decimal(5))
+        self.bolt = Product.objects.create(company=self.company, name='Bolt', cost_price=Decimal('0.50'))
+        self.frame = Product.objects.create(company=self.company, name='Frame')
+        self.bike = Product.objects.create(company=self.company, name='Bike')
+        welding = WorkCenter.objects.create(company=self.company, name='Welding', code='T-WELD', cost_per_hour=Decimal(60))
+
+        self.frame_bom = BillOfMaterials.objects.create(
+            company=self.company, product=self.frame, name='Frame', lot_size=Decimal(2), is_default=True,
+        )
+        BillOfMaterialsItem.objects.create(bom=self.frame_bom, component=self.steel, quantity=Decimal(4), waste_percentage=Decimal(10))
+        BOMOperation.objects.create(
+            bom=self.frame_bom, work_center=welding, operation_name='Weld',
+            setup_time_minutes=Decimal(30), run_time_per_unit_minutes=Decimal(15),
+        )
+        self.bike_bom = BillOfMaterials.objects.create(
+            company=self.company, product=self.bike, name='Bike', scrap_percentage=Decimal(10),
+        )
+        # the typed unit_cost of a sub-assembly is replaced by its rolled-up cost
+        self.frame_item = BillOfMaterialsItem.objects.create(
+            bom=self.bike_bom, component=self.frame, quantity=Decimal(1), unit_cost=Decimal(99),
+        )
+        BillOfMaterialsItem.objects.create(bom=self.bike_bom, component=self.bolt, quantity=Decimal(10))
+
+    def test_roll_up_costs_sub_assemblies_bottom_up(self):
+        from .costing import roll_up
+
+        result = roll_up(self.company)
+
+        # frame: 4 x 1.1 x 5 = 22 material, (30 + 2 x 15) min at 60/h = 60 labor, per 2 units
+        self.frame_bom.refresh_from_db()
+        self.assertEqual((self.frame_bom.material_cost, self.frame_bom.labor_cost), (Decimal('22.00'), Decimal('60.00')))
+        self.assertEqual(self.frame_bom.total_cost, Decimal('82.00'))
+        # bike: (41 frame + 10 x 0.50 bolts) x 1.1 scrap
+        self.bike_bom.refresh_from_db()
+        self.assertEqual(self.bike_bom.total_cost, Decimal('50.60'))
+        self.frame_item.refresh_from_db()
+        self.assertEqual((self.frame_item.unit_cost, self.frame_item.total_cost), (Decimal('41.00'), Decimal('41.00')))
+        self.assertEqual(result['updated'], {'boms': 2, 'items': 3, 'operations': 1})
+        self.assertEqual(roll_up(self.company)['updated'], {'boms': 0, 'items': 0, 'operations': 0})
+
+        # what-if: steel at 10 -> frame 104 / 2 = 52, bike (52 + 5) x 1.1; nothing saved
+        what_if = roll_up(self.company, bom_ids=[self.bike_bom.pk], price_overrides={str(self.steel.pk): '10'})
+        self.assertTrue(what_if['what_if'])
+        costs = {row['bom_id']: row for row in what_if['boms']}
+        self.assertEqual(costs[self.bike_bom.pk]['total_cost'], Decimal('62.70'))
+        self.assertEqual(costs[self.frame_bom.pk]['unit_cost'], Decimal('52.0000'))
+        self.bike_bom.refresh_from_db()
+        self.assertEqual(self.bike_bom.total_cost, Decimal('50.60'))
+        self.assertEqual(self.bike_bom.calculate_total_cost(), Decimal('50.60'))
+
+    def test_roll_up_endpoint_checks_bom_ids(self):
+        owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        client = APIClient()
+        client.force_authenticate(owner)
+        for boms in (str(self.bike_bom.pk), ['bike'], [None]):
+            response = client.post('/api/manufacturing/boms/roll_up_costs/', {'boms': boms}, format='json')
+            self.assertEqual(response.status_code, 400, boms)
+        # ids sent as strings are costed, not silently left out
+        response = client.post(
+            '/api/manufacturing/boms/roll_up_costs/',
+            {'boms': [str(self.bike_bom.pk)], 'price_overrides': {str(self.steel.pk): '10'}}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn(self.bike_bom.pk, [row['bom_id'] for row in response.data['boms']])
+
+    def test_cycle_is_rejected(self):
+        from .costing import BOMCycleError, roll_up
+
+        BillOfMaterialsItem.objects.create(bom=self.frame_bom, component=self.bike, quantity=Decimal(1))
+        with self.assertRaises(BOMCycleError):
+            roll_up(self.company)
+
+
+class BOMGraphTests(TestCase):
+    """manufacturing.bom_graph - closure rows, low-level codes, the cached graph."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Bikes')
+        self.steel = Product.objects.create(company=self.company, name='Steel tube')
+        self.bolt = Product.objects.create(company=self.company, name='Bolt')
+        self.frame = Product.objects.create(company=self.company, name='Frame')
+        self.bike = Product.objects.create(company=self.company, name='Bike')
+        with self.captureOnCommitCallbacks(execute=True):
+            frame_bom = BillOfMaterials.objects.create(company=self.company, product=self.frame, name='Frame', lot_size=Decimal(2))
+            BillOfMaterialsItem.objects.create(bom=frame_bom, component=self.steel, quantity=Decimal(4), waste_percentage=Decimal(10))
+            self.bike_bom = BillOfMaterials.objects.create(company=self.company, product=self.bike, name='Bike')
+            BillOfMaterialsItem.objects.create(bom=self.bike_bom, component=self.frame, quantity=Decimal(1))
+            BillOfMaterialsItem.objects.create(bom=self.bike_bom, component=self.steel, quantity=Decimal(1))
+
+    def test_closure_and_cached_graph(self):
+        from .bom_graph import BOMClosure, graph, where_used
+
+        # a frame takes 4 x 1.1 / 2 = 2.2 tubes; a bike one directly and 2.2 in its frame
+        self.assertEqual(where_used(self.company, self.steel.pk), [
+            (self.frame.pk, 1, Decimal('2.2')), (self.bike.pk, 1, Decimal(1)), (self.bike.pk, 2, Decimal('2.2')),
+        ])
+        bom_graph = graph(self.company)
+        self.assertEqual(
+            [bom_graph.low_level_code(p.pk) for p in (self.bike, self.frame, self.steel)], [0, 1, 2],
+        )
+        self.assertEqual(bom_graph.requirements_for(self.bike.pk, 2)[self.steel.pk], Decimal('6.4'))
+        with self.assertNumQueries(1):
+            self.assertIs(graph(self.company), bom_graph)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BillOfMaterialsItem.objects.create(bom=self.bike_bom, component=self.bolt, quantity=Decimal(10))
+        rebuilt = graph(self.company)
+        self.assertIsNot(rebuilt, bom_graph)
+        self.assertEqual(rebuilt.explode(self.bike.pk)[self.bolt.pk], Decimal(10))
+        self.assertEqual(BOMClosure.objects.filter(company=self.company).count(), 5)
+
+    def test_where_used_endpoint(self):
+        owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        client = APIClient()
+        client.force_authenticate(user=owner)
+
+        response = client.get('/api/manufacturing/boms/where_used/', {'product': self.frame.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['product_name'], row['depth']) for row in response.data], [('Bike', 1)],
+        )
+        response = client.get('/api/manufacturing/boms/explosion/', {'product': self.bike.pk, 'quantity': '3'})
+        self.assertEqual(
+            {row['product_name']: row['quantity'] for row in response.data},
+            {'Frame': Decimal(3), 'Steel tube': Decimal('9.6')},
+        )
+
+        # never built, and can't be: a tube made of bikes
+        from .bom_graph import BOMGraphState
+        BOMGraphState.objects.all().delete()
+        tube_bom = BillOfMaterials.objects.create(company=self.company, product=self.steel, name='Tube')
+        BillOfMaterialsItem.objects.create(bom=tube_bom, component=self.bike, quantity=Decimal(1))
+        response = client.get('/api/manufacturing/boms/explosion/', {'product': self.bike.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Steel tube -> Bike -> Frame -> Steel tube', response.data['error'])
+
+
+class BOMVersioningTests(TestCase):
+    """manufacturing.versioning - bulk clone, diff, effective-dated activation."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Bikes')
+        self.steel = Product.objects.create(company=self.company, name='Steel tube')
+        self.alloy = Product.objects.create(company=self.company, name='Alloy tube')
+        welding = WorkCenter.objects.create(company=self.company, name='Welding', code='T-WELD2')
+        self.boms = []
+        for name in ('Frame', 'Fork'):
+            product = Product.objects.create(company=self.company, name=name)
+            bom = BillOfMaterials.objects.create(company=self.company, product=product, name=name, version='1.0', is_default=True)
+            item = BillOfMaterialsItem.objects.create(bom=bom, component=self.steel, quantity=Decimal(2))
+            item.substitute_products.add(self.alloy)
+            BOMOperation.objects.create(bom=bom, work_center=welding, operation_name='Weld', sequence=10)
+            self.boms.append(bom)
+
+    def test_clone_is_a_fixed_number_of_queries_and_diffs(self):
+        from .versioning import clone, diff
+
+        with self.assertNumQueries(11):
+            pairs = clone(self.company, [bom.pk for bom in self.boms])
+        frame, copy = pairs[0]
+        self.assertEqual((copy.version, copy.is_default, copy.is_active), ('1.1', False, True))
+        item = copy.items.get()
+        self.assertEqual(list(item.substitute_products.all()), [self.alloy])
+        self.assertEqual(copy.operations.count(), 1)
+        # a second revision skips the versions already taken
+        self.assertEqual(clone(self.company, [frame.pk])[0][1].version, '1.2')
+
+        item.quantity = Decimal(3)
+        item.save()
+        BillOfMaterialsItem.objects.create(bom=copy, component=self.alloy, quantity=Decimal(1))
+        changes = diff(frame, copy)
+        self.assertEqual(changes['items']['added'], [self.alloy.pk])
+        self.assertEqual(changes['items']['changed'], {self.steel.pk: {'quantity': [Decimal(2), Decimal(3)]}})
+        self.assertEqual(changes['operations'], {'added': [], 'removed': [], 'changed': {}})
+
+    def test_diff_endpoint_rejects_a_malformed_bom_id(self):
+        owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        client = APIClient()
+        client.force_authenticate(owner)
+        frame, fork = self.boms
+        for against in ('abc', ''):
+            response = client.get(f'/api/manufacturing/boms/{frame.pk}/diff/', {'against': against})
+            self.assertEqual(response.status_code, 400, against)
+        response = client.get(f'/api/manufacturing/boms/{frame.pk}/diff/', {'against': fork.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_activation_now_and_scheduled(self):
+        from datetime import date, timedelta
+        from .versioning import activate, apply_due_activations, clone
+
+        (frame, frame_v2), (fork, fork_v2) = clone(self.company, [bom.pk for bom in self.boms])
+        today = timezone.localdate()
+        activate(self.company, [frame_v2.pk])
+        result = activate(self.company, [fork_v2.pk], on=today + timedelta(days=7))
+        self.assertEqual(result['scheduled'], [fork_v2.pk])
+
+        frame.refresh_from_db()
+        frame_v2.refresh_from_db()
+        self.assertEqual((frame.is_default, frame.effective_to), (False, today - timedelta(days=1)))
+        self.assertEqual((frame_v2.is_default, frame_v2.effective_from), (True, today))
+        fork_v2.refresh_from_db()
+        self.assertEqual((fork_v2.is_default, fork_v2.activate_on), (False, today + timedelta(days=7)))
+
+        self.assertEqual(apply_due_activations(today=today + timedelta(days=7)), 1)
+        fork.refresh_from_db()
+        fork_v2.refresh_from_db()
+        self.assertEqual((fork.is_default, fork_v2.is_default, fork_v2.activate_on), (False, True, None))
+        self.assertIsInstance(fork_v2.effective_from, date)
+
+
+class ManufacturingKPITests(TestCase):
+    """manufacturing.kpis - utilisation, OEE, quality and delivery in grouped queries."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Works')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        start = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=1), time(8)))
+        at = lambda hours: start + timedelta(hours=hours)  # noqa: E731
+        product = Product.objects.create(company=self.company, name='Bracket')
+        bom = BillOfMaterials.objects.create(company=self.company, product=product, name='Bracket BOM')
+        self.press = WorkCenter.objects.create(company=self.company, name='Press', code='T-PRESS')
+        WorkCenter.objects.create(company=self.company, name='Paint', code='T-PAINT')
+        stamping = BOMOperation.objects.create(
+            bom=bom, work_center=self.press, operation_name='Stamp', sequence=10, run_time_per_unit_minutes=Decimal(30),
+        )
+        on_time = WorkOrder.objects.create(
+            company=self.company, bom=bom, product=product, quantity_planned=Decimal(4), status='completed',
+            quantity_produced=Decimal(3), quantity_rejected=Decimal(1),
+            scheduled_end=at(4), actual_start=at(0), actual_end=at(2),
+        )
+        WorkOrder.objects.create(
+            company=self.company, bom=bom, product=product, quantity_planned=Decimal(1), status='completed',
+            scheduled_end=at(-20), actual_start=at(0), actual_end=at(1),
+        )
+        operation = on_time.operations.create(
+            bom_operation=stamping, work_center=self.press, sequence=10, status='completed',
+            quantity_produced=Decimal(3), quantity_rejected=Decimal(1),
+            actual_start=at(0), actual_end=at(2),
+        )
+        for log_type, hours in (('downtime', 0.5), ('resume', 1)):
+            operation.logs.create(work_center=self.press, operator=self.owner, log_type=log_type, timestamp=at(hours))
+        for check_status in ('passed', 'passed', 'failed', 'pending'):
+            on_time.quality_checks.create(
+                work_order_operation=operation, product=product, quality_type='final', status=check_status,
+                inspector=self.owner, inspection_date=at(3),
+            )
+
+    def test_kpis_per_work_center_and_company(self):
+        from .kpis import compute_kpis
+
+        with self.assertNumQueries(10):
+            kpis = compute_kpis(self.company, timezone.localdate())
+        press, paint = sorted(kpis['work_centers'], key=lambda row: row['code'], reverse=True)
+        self.assertEqual((press['run_hours'], press['downtime_hours']), (2.0, 0.5))
+        self.assertEqual(press['utilization'], round(2 / press['available_hours'] * 100, 2))
+        # 2h run of 2.5h, 4 units x 30 min in 2h, 3 good of 4
+        self.assertEqual((press['availability'], press['performance'], press['quality'], press['oee']), (80.0, 100.0, 75.0, 60.0))
+        self.assertEqual(press['quality_pass_rate'], 66.67)
+        self.assertEqual((paint['utilization'], paint['oee']), (0.0, None))
+        self.assertEqual((kpis['oee'], kpis['on_time_delivery'], kpis['scrap_rate']), (60.0, 50.0, 25.0))
+        self.assertEqual((kpis['quality_checks_pending'], kpis['material_scrap_rate']), (1, None))
+
+    def test_reports_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.get('/manufacturing/api/reports/', {'type': 'efficiency'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('oee', response.json())
+        self.assertEqual(response.json()['on_time_delivery'], 50.0)
+
+    def test_dashboard_shows_no_data_rather_than_a_placeholder(self):
+        self.client.force_login(self.owner)
+        response = self.client.get('/manufacturing/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('error', response.context)
+        self.assertContains(response, '60.0% efficiency')
+        self.assertContains(response, 'No data')
+        self.assertNotContains(response, '94.5%')
+
+
+class MRPProcurementTests(TestCase):
+    """manufacturing.procurement - a whole MRP run's purchase orders in one pass."""
+
+    def setUp(self):
+        from crm.models import Partner
+        from inventory.models import StockItem, Warehouse
+        from purchase.models import Supplier, SupplierProductCatalog
+        from .models import MRPPlan, SupplierLeadTime
+
+        self.company = Company.objects.create(name='Test Works')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        self.today = timezone.localdate()
+        acme, bolt_co = (
+            Partner.objects.create(company=self.company, name=name, partner_type='company', is_supplier=True)
+            for name in ('Acme Supply', 'Bolt Co')
+        )
+        self.acme = Supplier.objects.create(company=self.company, partner=acme)
+        self.bolt_co = Supplier.objects.create(company=self.company, partner=bolt_co)
+        self.steel = Product.objects.create(company=self.company, name='Steel sheet')
+        self.screw = Product.objects.create(company=self.company, name='Screw')
+        self.glue = Product.objects.create(company=self.company, name='Glue')
+        # Acme is dearer for small lots but breaks below Bolt Co from 50 up
+        SupplierProductCatalog.objects.create(
+            supplier=self.acme, product=self.steel, unit_price=Decimal(12), tier_1_qty=Decimal(50),
+            tier_1_price=Decimal(9), lead_time_days=3, effective_date=self.today,
+        )
+        SupplierProductCatalog.objects.create(
+            supplier=self.bolt_co, product=self.steel, unit_price=Decimal(10), lead_time_days=1, effective_date=self.today,
+        )
+        SupplierLeadTime.objects.create(
+            company=self.company, supplier=bolt_co, product=self.screw, lead_time_days=20,
+            price_per_unit=Decimal('0.50'), minimum_order_quantity=Decimal(100),
+        )
+        StockItem.objects.create(
+            company=self.company, product=self.screw, warehouse=Warehouse.objects.create(company=self.company, name='Main'),
+            preferred_supplier=self.bolt_co,
+        )
+        plan = MRPPlan.objects.create(company=self.company, name='Weekly')
+        self.requirements = [
+            plan.requirements.create(
+                product=product, required_quantity=quantity, shortage_quantity=quantity, source_type='purchase',
+                required_date=self.today + timedelta(days=days),
+            )
+            for product, quantity, days in (
+                (self.steel, Decimal(30), 10), (self.steel, Decimal(40), 5), (self.screw, Decimal(25), 7),
+                (self.glue, Decimal(2), 7),
+            )
+        ]
+
+    def test_plan_groups_prices_and_offsets(self):
+        from .procurement import plan_purchase_orders
+
+        with self.assertNumQueries(5):
+            plan = plan_purchase_orders(self.company)
+        orders = {order['supplier_id']: order for order in plan['orders']}
+        [steel] = orders[self.acme.pk]['lines']
+        self.assertEqual((steel['quantity'], steel['unit_price'], steel['line_total']), (Decimal(70), Decimal(9), Decimal(630)))
+        self.assertEqual((steel['needed_by'], steel['order_by'], steel['late']), (
+            self.today + timedelta(days=5), self.today + timedelta(days=2), False,
+        ))
+        [screw] = orders[self.bolt_co.pk]['lines']
+        self.assertEqual((screw['quantity'], screw['line_total'], screw['late']), (Decimal(100), Decimal(50), True))
+        self.assertEqual(screw['delivery_date'], self.today + timedelta(days=20))
+        self.assertEqual([row['product_id'] for row in plan['unsourced']], [self.glue.pk])
+
+    def test_bulk_create_endpoint(self):
+        from purchase.models import PurchaseOrder
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post('/api/manufacturing/bulk-create-pos/', {}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['pos_created'], 2)
+        orders = PurchaseOrder.objects.filter(company=self.company).order_by('po_number')
+        first, second = (int(order.po_number.rsplit('-', 1)[1]) for order in orders)
+        self.assertEqual(second, first + 1)
+        self.assertEqual(
+            sorted((order.supplier_id, order.total_amount, order.items.count()) for order in orders),
+            sorted([(self.acme.pk, Decimal(630), 1), (self.bolt_co.pk, Decimal(50), 1)]),
+        )
+        statuses = [requirement.status for requirement in MRPRequirement.objects.order_by('pk')]
+        self.assertEqual(statuses, ['ordered', 'ordered', 'ordered', 'pending'])
+
+        # nothing left that can be sourced
+        response = client.post('/api/manufacturing/bulk-create-pos/', {}, format='json')
+        self.assertEqual(response.json()['pos_created'], 0)
+
+    def test_bulk_create_rejects_malformed_ids(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        for body in (
+            {'requirement_ids': str(self.requirements[0].pk)}, {'requirement_ids': [self.requirements[0].pk, 'x']},
+            {'requirement_ids': [True]}, {'mrp_plan_id': 'weekly'}, {'warehouse_id': [1]}, {'dry_run': 'maybe'},
+        ):
+            response = client.post('/api/manufacturing/bulk-create-pos/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(MRPRequirement.objects.exclude(status='pending').exists())
+
+        response = client.post(
+            '/api/manufacturing/bulk-create-pos/', {'requirement_ids': [str(self.requirements[2].pk)], 'dry_run': True}, format='json',
+        )
+        self.assertEqual([order['supplier_id'] for order in response.json()['orders']], [self.bolt_co.pk])
+        self.assertFalse(MRPRequirement.objects.exclude(status='pending').exists())
+        response = client.post(
+            '/api/manufacturing/bulk-create-pos/', {'requirement_ids': [self.requirements[2].pk], 'dry_run': 'false'}, format='json',
+        )
+        self.assertEqual(response.json()['pos_created'], 1)
 
-# Create your tests here.
+    def test_single_requirement_without_a_shortage(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        requirement = self.requirements[0]
+        MRPRequirement.objects.filter(pk=requirement.pk).update(shortage_quantity=0)
+        response = client.post(f'/api/manufacturing/mrp-requirements/{requirement.pk}/create-po/')
+        self.assertEqual(response.json()['error'], 'Requirement has no shortage to order')
@@ -0,0 +1,222 @@
+"""
+BOM revisions in bulk: cloning, diffing and effective-dated activation.
+
+BillOfMaterialsViewSet.duplicate used to copy a BOM one INSERT per item and operation,
+and a mass revision after an engineering change - a new version of 500 BOMs - meant 500
+such calls, each committed on its own. Here:
+
+- clone() copies any number of a company's BOMs in one transaction and a fixed number
+  of queries, whatever their size: the sources, their items (with substitutes) and
+  operations are read in four queries, the existing versions of their products in one,
+  and the copies written with one bulk_create per table (per BATCH_SIZE rows). A copy
+  gets `version`, or the source's version with its last number bumped ('1.0' -> '1.1',
+  'v3' -> 'v4', else '.1' appended) past every version its product already has. Copies
+  are active but not default - a revision only replaces the current default when it is
+  activated.
+- diff() compares two BOMs: header fields, items matched by component and operations
+  matched by sequence, each added, removed or changed (field: [old, new]).
+- activate() makes BOMs their products' default from a date: today or earlier takes
+  effect at once - the product's previous default BOM loses is_default and gets
+  effective_to the day before - a later date is recorded in activate_on and applied
+  by apply_due_activations() (`manage.py activate_due_boms`, run daily like run_mrp).
+
+Bulk writes skip signals, so every write here re-derives the BOM closure through
+manufacturing.bom_graph.refresh().
+"""
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import bom_graph
+from .models import BillOfMaterials, BillOfMaterialsItem, BOMOperation
+
+BATCH_SIZE = 500
+
+_LAST_NUMBER = re.compile(r'(\d+)(?!.*\d)')
+# Fields a copy never takes from its source.
+_NOT_COPIED = {'id', 'bom', 'version', 'is_default', 'activate_on', 'created_by', 'created_at', 'updated_at'}
+DIFF_FIELDS = {
+    'bom': ('name', 'revision', 'manufacturing_type', 'lot_size', 'lead_time_days', 'scrap_percentage', 'overhead_cost',
+            'routing_required', 'phantom_bom', 'quality_check_required'),
+    'item': ('quantity', 'unit_cost', 'waste_percentage', 'is_optional', 'preferred_supplier_id', 'sequence'),
+    'operation': ('operation_name', 'work_center_id', 'setup_time_minutes', 'run_time_per_unit_minutes',
+                  'cleanup_time_minutes', 'operators_required', 'cost_per_hour', 'is_active'),
+}
+
+
+def next_version(version, taken):
+    """`version` with its last number bumped until it isn't in `taken`."""
+    candidate = version
+    while candidate == version or candidate in taken:
+        match = _LAST_NUMBER.search(candidate)
+        if match:
+            candidate = f'{candidate[:match.start()]}{int(match.group()) + 1}{candidate[match.end():]}'
+        else:
+            candidate = f'{candidate}.1'
+    return candidate
+
+
+def _copy(instance, **values):
+    fields = {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if field.name not in _NOT_COPIED
+    }
+    return type(instance)(**{**fields, **values})
+
+
+def _load(company, bom_ids):
+    bom_ids = list(dict.fromkeys(bom_ids))
+    boms = BillOfMaterials.objects.filter(company=company).in_bulk(bom_ids)
+    missing = [pk for pk in bom_ids if pk not in boms]
+    if missing:
+        raise ValueError(f"No BOM {', '.join(map(str, missing))} in this company.")
+    return [boms[pk] for pk in bom_ids]
+
+
+def clone(company, bom_ids, version=None, name_suffix='', user=None, effective_from=None):
+    """Copies `bom_ids` (items, substitutes and operations included) as new versions.
+    Returns [(source, copy)] in `bom_ids` order."""
+    sources = _load(company, bom_ids)
+    taken = defaultdict(set)
+    for product_id, existing in BillOfMaterials.objects.filter(
+        company=company, product_id__in={bom.product_id for bom in sources},
+    ).values_list('product_id', 'version'):
+        taken[product_id].add(existing)
+
+    copies = []
+    for bom in sources:
+        if version is not None:
+            if version in taken[bom.product_id]:
+                raise ValueError(f'Product {bom.product_id} already has a BOM version {version}.')
+            new_version = version
+        else:
+            new_version = next_version(bom.version, taken[bom.product_id])
+        taken[bom.product_id].add(new_version)
+        copies.append(_copy(
+            bom, version=new_version, name=f'{bom.name}{name_suffix}', is_default=False, is_active=True,
+            effective_from=effective_from, effective_to=None, created_by=user,
+        ))
+
+    items = defaultdict(list)
+    for item in BillOfMaterialsItem.objects.filter(bom__in=sources).order_by('pk'):
+        items[item.bom_id].append(item)
+    # Read from the through table directly: prefetch_related() builds a queryset per item.
+    Through = BillOfMaterialsItem.substitute_products.through
+    substitutes_of = defaultdict(list)
+    for item_id, product_id in Through.objects.filter(billofmaterialsitem__bom__in=sources).values_list(
+        'billofmaterialsitem_id', 'product_id',
+    ):
+        substitutes_of[item_id].append(product_id)
+    operations = defaultdict(list)
+    for operation in BOMOperation.objects.filter(bom__in=sources).order_by('pk'):
+        operations[operation.bom_id].append(operation)
+
+    with transaction.atomic():
+        BillOfMaterials.objects.bulk_create(copies, batch_size=BATCH_SIZE)
+        new_items, substitutes = [], []
+        for bom, copy in zip(sources, copies):
+            for item in items[bom.pk]:
+                new_items.append((_copy(item, bom_id=copy.pk), item))
+        BillOfMaterialsItem.objects.bulk_create([new for new, _ in new_items], batch_size=BATCH_SIZE)
+        for new, item in new_items:
+            substitutes.extend(
+                Through(billofmaterialsitem_id=new.pk, product_id=product_id) for product_id in substitutes_of[item.pk]
+            )
+        Through.objects.bulk_create(substitutes, batch_size=BATCH_SIZE)
+        BOMOperation.objects.bulk_create(
+            [_copy(operation, bom_id=copy.pk) for bom, copy in zip(sources, copies) for operation in operations[bom.pk]],
+            batch_size=BATCH_SIZE,
+        )
+        bom_graph.refresh(company)
+    return list(zip(sources, copies))
+
+
+def _changes(old, new, fields):
+    return {
+        field: [getattr(old, field), getattr(new, field)]
+        for field in fields if getattr(old, field) != getattr(new, field)
+    }
+
+
+def _diff_rows(old_rows, new_rows, fields):
+    added = [key for key in new_rows if key not in old_rows]
+    removed = [key for key in old_rows if key not in new_rows]
+    changed = {}
+    for key in old_rows.keys() & new_rows.keys():
+        fields_changed = _changes(old_rows[key], new_rows[key], fields)
+        if fields_changed:
+            changed[key] = fields_changed
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff(old, new):
+    """What changes going from BOM `old` to BOM `new`. Items are keyed by component id,
+    operations by sequence."""
+    items, operations = defaultdict(dict), defaultdict(dict)
+    for item in BillOfMaterialsItem.objects.filter(bom__in=[old, new]):
+        items[item.bom_id][item.component_id] = item
+    for operation in BOMOperation.objects.filter(bom__in=[old, new]):
+        operations[operation.bom_id][operation.sequence] = operation
+    return {
+        'from': {'bom_id': old.pk, 'version': old.version},
+        'to': {'bom_id': new.pk, 'version': new.version},
+        'header': _changes(old, new, DIFF_FIELDS['bom']),
+        'items': _diff_rows(items[old.pk], items[new.pk], DIFF_FIELDS['item']),
+        'operations': _diff_rows(operations[old.pk], operations[new.pk], DIFF_FIELDS['operation']),
+    }
+
+
+def _apply(company_id, boms, on):
+    """Makes `boms` (at most one per product) their products' default from `on`."""
+    now = timezone.now()
+    ids = [bom.pk for bom in boms]
+    BillOfMaterials.objects.filter(
+        company_id=company_id, product_id__in=[bom.product_id for bom in boms], is_default=True,
+    ).exclude(pk__in=ids).update(is_default=False, effective_to=on - timedelta(days=1), updated_at=now)
+    BillOfMaterials.objects.filter(pk__in=ids).update(
+        is_default=True, is_active=True, effective_from=on, effective_to=None, activate_on=None, updated_at=now,
+    )
+    bom_graph.refresh(company_id)
+
+
+def activate(company, bom_ids, on=None):
+    """Makes `bom_ids` their products' default BOM from `on` (default today): at once
+    when that isn't in the future, else scheduled. Returns the ids activated and the
+    ids scheduled."""
+    today = timezone.localdate()
+    on = on or today
+    boms = _load(company, bom_ids)
+    products = [bom.product_id for bom in boms]
+    if len(set(products)) != len(products):
+        raise ValueError('Only one BOM per product can be activated at a time.')
+    ids = [bom.pk for bom in boms]
+    with transaction.atomic():
+        if on > today:
+            BillOfMaterials.objects.filter(pk__in=ids).update(activate_on=on, updated_at=timezone.now())
+            return {'activated': [], 'scheduled': ids, 'effective_from': on}
+        _apply(company.pk, boms, on)
+    return {'activated': ids, 'scheduled': [], 'effective_from': on}
+
+
+def apply_due_activations(today=None, company=None):
+    """Applies every scheduled activation due by `today`. Where one product has several
+    due, the latest date (then the newest BOM) wins. Returns the number applied."""
+    today = today or timezone.localdate()
+    due = BillOfMaterials.objects.filter(activate_on__lte=today)
+    if company is not None:
+        due = due.filter(company=company)
+    latest = {}
+    for bom in due.order_by('activate_on', 'pk'):
+        latest[(bom.company_id, bom.product_id)] = bom
+    groups = defaultdict(list)
+    for (company_id, _), bom in latest.items():
+        groups[(company_id, bom.activate_on)].append(bom)
+    with transaction.atomic():
+        for (company_id, on), boms in groups.items():
+            _apply(company_id, boms, on)
+        # superseded schedules are dropped, not left to fire later
+        due.exclude(pk__in=[bom.pk for bom in latest.values()]).update(activate_on=None)
+    return len(latest)
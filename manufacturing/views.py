@@ -2,9 +2,9 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Count, Q, Sum, F, Avg
+from django.db.models import Count, Q, Sum, Avg
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
 from django.core.paginator import Paginator
 from django.contrib import messages
@@ -21,6 +21,7 @@ from .models import (
     ProductionPlanItem, JobCard, Subcontractor, SubcontractWorkOrder,
     DemandForecast, ReorderRule, SupplierLeadTime
 )
+from .kpis import get_kpis
 from .serializers import (
     WorkCenterSerializer, BillOfMaterialsSerializer, WorkOrderSerializer,
     ProductionPlanSerializer, MRPPlanSerializer, QualityCheckSerializer
@@ -36,43 +37,8 @@ def manufacturing_dashboard(request):
     try:
         company = request.user.company
         
-        # Key metrics
-        total_boms = BillOfMaterials.objects.filter(company=company, is_active=True).count()
-        new_boms_this_month = BillOfMaterials.objects.filter(
-            company=company, 
-            created_at__gte=timezone.now().replace(day=1)
-        ).count()
-        
-        # Work orders metrics
-        active_work_orders = WorkOrder.objects.filter(
-            company=company, 
-            status__in=['planned', 'released', 'in_progress']
-        ).count()
-        
-        completed_work_orders_this_month = WorkOrder.objects.filter(
-            company=company,
-            status='completed',
-            actual_end__gte=timezone.now().replace(day=1)
-        ).count()
-        
-        # Production metrics
-        production_plans = ProductionPlan.objects.filter(
-            company=company,
-            status__in=['approved', 'in_progress']
-        ).count()
-        
-        # Quality metrics
-        quality_checks_pending = QualityCheck.objects.filter(
-            work_order__company=company,
-            status='pending'
-        ).count()
-        
-        quality_pass_rate = QualityCheck.objects.filter(
-            work_order__company=company,
-            status='passed',
-            inspection_date__gte=timezone.now().replace(day=1)
-        ).count()
-        
+        kpis = get_kpis(company)
+
         # Recent activities
         recent_work_orders = WorkOrder.objects.filter(
             company=company
@@ -83,28 +49,26 @@ def manufacturing_dashboard(request):
         ).order_by('-created_at')[:5]
         
         # Capacity utilization
-        work_centers = WorkCenter.objects.filter(company=company, is_active=True)
-        
-        # MRP alerts
-        mrp_requirements = MRPRequirement.objects.filter(
-            mrp_plan__company=company,
-            status='pending',
-            required_date__lte=timezone.now().date() + timedelta(days=7)
-        ).count()
+        work_centers = list(WorkCenter.objects.filter(company=company, is_active=True))
+        oee_by_work_center = {row['work_center_id']: row['oee'] for row in kpis['work_centers']}
+        for work_center in work_centers:
+            work_center.efficiency = oee_by_work_center.get(work_center.pk)
         
         context = {
-            'total_boms': total_boms,
-            'new_boms_this_month': new_boms_this_month,
-            'active_work_orders': active_work_orders,
-            'completed_work_orders_this_month': completed_work_orders_this_month,
-            'production_plans': production_plans,
-            'quality_checks_pending': quality_checks_pending,
-            'quality_pass_rate': quality_pass_rate,
+            'total_boms': kpis['active_boms'],
+            'new_boms_this_month': kpis['new_boms_this_month'],
+            'active_work_orders': kpis['active_work_orders'],
+            'completed_work_orders_this_month': kpis['completed_this_month'],
+            'production_plans': kpis['production_plans'],
+            'quality_checks_pending': kpis['quality_checks_pending'],
+            'quality_pass_rate': kpis['quality_pass_rate'],
+            'production_efficiency': kpis['oee'],
+            'on_time_delivery': kpis['on_time_delivery'],
             'recent_work_orders': recent_work_orders,
             'recent_boms': recent_boms,
-            'work_centers_count': work_centers.count(),
+            'work_centers_count': len(work_centers),
             'work_centers': work_centers,  # Add the actual work centers for the template
-            'mrp_requirements': mrp_requirements,
+            'mrp_requirements': kpis['mrp_requirements_due'],
         }
         return render(request, 'manufacturing/dashboard.html', context)
     except Exception as e:
@@ -794,26 +758,31 @@ def manufacturing_reports(request):
         company = request.user.company
         report_type = request.GET.get('type', 'overview')
         
+        kpis = get_kpis(company)
+
         if report_type == 'overview':
             # Production overview
             data = {
-                'total_work_orders': WorkOrder.objects.filter(company=company).count(),
-                'completed_this_month': WorkOrder.objects.filter(
-                    company=company,
-                    status='completed',
-                    actual_end__gte=timezone.now().replace(day=1)
-                ).count(),
-                'quality_pass_rate': _calculate_quality_pass_rate(company),
-                'top_products': _get_top_produced_products(company),
-                'work_center_utilization': _get_work_center_utilization(company),
+                'total_work_orders': kpis['total_work_orders'],
+                'completed_this_month': kpis['completed_this_month'],
+                'quality_pass_rate': kpis['quality_pass_rate'],
+                'top_products': kpis['top_products'],
+                'work_center_utilization': kpis['work_centers'],
             }
         elif report_type == 'efficiency':
             # Efficiency metrics
             data = {
-                'on_time_delivery': _calculate_on_time_delivery(company),
-                'capacity_utilization': _calculate_capacity_utilization(company),
-                'scrap_rate': _calculate_scrap_rate(company),
+                'on_time_delivery': kpis['on_time_delivery'],
+                'capacity_utilization': kpis['capacity_utilization'],
+                'scrap_rate': kpis['scrap_rate'],
+                'material_scrap_rate': kpis['material_scrap_rate'],
+                'availability': kpis['availability'],
+                'performance': kpis['performance'],
+                'quality': kpis['quality'],
+                'oee': kpis['oee'],
             }
+        elif report_type == 'kpis':
+            data = kpis
         else:
             data = {'error': 'Invalid report type'}
         
@@ -822,124 +791,6 @@ def manufacturing_reports(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-
-def _calculate_quality_pass_rate(company):
-    """Calculate quality pass rate for the company"""
-    try:
-        total_checks = QualityCheck.objects.filter(
-            work_order__company=company,
-            inspection_date__gte=timezone.now().replace(day=1)
-        ).count()
-        
-        passed_checks = QualityCheck.objects.filter(
-            work_order__company=company,
-            status='passed',
-            inspection_date__gte=timezone.now().replace(day=1)
-        ).count()
-        
-        if total_checks > 0:
-            return round((passed_checks / total_checks) * 100, 2)
-        return 0
-    except:
-        return 0
-
-
-def _get_top_produced_products(company, limit=5):
-    """Get top produced products"""
-    try:
-        return list(WorkOrder.objects.filter(
-            company=company,
-            status='completed',
-            actual_end__gte=timezone.now().replace(day=1)
-        ).values('product__name').annotate(
-            total_quantity=Sum('quantity_produced')
-        ).order_by('-total_quantity')[:limit])
-    except:
-        return []
-
-
-def _get_work_center_utilization(company):
-    """Calculate work center utilization"""
-    try:
-        work_centers = WorkCenter.objects.filter(company=company, is_active=True)
-        utilization_data = []
-        
-        for wc in work_centers:
-            total_operations = wc.work_order_operations.count()
-            active_operations = wc.work_order_operations.filter(status='in_progress').count()
-            
-            utilization = (active_operations / max(1, wc.max_operators)) * 100 if wc.max_operators else 0
-            
-            utilization_data.append({
-                'work_center': wc.name,
-                'utilization': round(utilization, 2),
-                'active_operations': active_operations,
-                'total_operations': total_operations
-            })
-        
-        return utilization_data
-    except:
-        return []
-
-
-def _calculate_on_time_delivery(company):
-    """Calculate on-time delivery percentage"""
-    try:
-        completed_orders = WorkOrder.objects.filter(
-            company=company,
-            status='completed',
-            actual_end__isnull=False,
-            scheduled_end__isnull=False
-        )
-        
-        total_orders = completed_orders.count()
-        on_time_orders = completed_orders.filter(actual_end__lte=F('scheduled_end')).count()
-        
-        if total_orders > 0:
-            return round((on_time_orders / total_orders) * 100, 2)
-        return 0
-    except:
-        return 0
-
-
-def _calculate_capacity_utilization(company):
-    """Calculate overall capacity utilization"""
-    try:
-        work_centers = WorkCenter.objects.filter(company=company, is_active=True)
-        total_capacity = sum(wc.capacity_per_hour * wc.operating_hours_per_day for wc in work_centers)
-        
-        # This is a simplified calculation - in reality, you'd track actual hours used
-        active_operations = WorkOrderOperation.objects.filter(
-            work_center__company=company,
-            status='in_progress'
-        ).count()
-        
-        if total_capacity > 0:
-            return round((active_operations / total_capacity) * 100, 2)
-        return 0
-    except:
-        return 0
-
-
-def _calculate_scrap_rate(company):
-    """Calculate scrap rate"""
-    try:
-        total_produced = WorkOrder.objects.filter(
-            company=company,
-            status='completed'
-        ).aggregate(total=Sum('quantity_produced'))['total'] or 0
-        
-        total_rejected = WorkOrder.objects.filter(
-            company=company,
-            status='completed'
-        ).aggregate(total=Sum('quantity_rejected'))['total'] or 0
-        
-        if total_produced > 0:
-            return round((total_rejected / (total_produced + total_rejected)) * 100, 2)
-        return 0
-    except:
-        return 0
-
 @login_required
 def boms_add(request):
     """Handle both GET and POST for BOM creation"""
@@ -0,0 +1,129 @@
+"""Product import for core.imports."""
+from collections import deque
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core.imports import (
+    Importer, RowError, cell, owned, parse_bool, parse_choice, parse_decimal, register,
+)
+
+from .models import Product, ProductCategory
+
+ZERO = Decimal('0')
+
+
+@register
+class ProductImporter(Importer):
+    """Columns: name, sku, barcode, brand, description, category, product_type,
+    unit_of_measure, cost_price, selling_price, tracking_method, minimum_stock,
+    reorder_level, is_active, is_saleable, is_purchasable, is_stockable.
+
+    Rows are matched on SKU; `update_existing` and the recycle-bin/other-company checks
+    work as for customers. Rows without a SKU get one in Product.save()'s
+    PRD-<company>-<n> shape. `category` is a category name - unknown names are reported
+    unless the `create_categories` option is on."""
+    name = 'products'
+    models = ('products.Product', 'products.ProductCategory')
+    update_fields = [
+        'name', 'barcode', 'brand', 'description', 'category', 'product_type', 'unit_of_measure',
+        'cost_price', 'selling_price', 'tracking_method', 'requires_individual_tracking',
+        'requires_expiry_tracking', 'requires_batch_tracking', 'minimum_stock', 'reorder_level',
+        'is_active', 'is_saleable', 'is_purchasable', 'is_stockable', 'updated_by', 'updated_at',
+    ]
+
+    def load(self):
+        self.categories = {c.name.lower(): c for c in ProductCategory.objects.filter(company=self.company)}
+        self.new_categories = {}
+        self.next_sku = None
+
+    def key(self, row):
+        sku = cell(row, 'sku')
+        return str(sku) if sku != '' else None
+
+    def existing(self, keys):
+        return {p.sku: p for p in Product.all_objects.filter(sku__in=keys)}
+
+    def _category(self, name):
+        category = self.categories.get(name.lower())
+        if category is None and self.option('create_categories'):
+            category = ProductCategory(company=self.company, name=name)
+            self.categories[name.lower()] = self.new_categories[name.lower()] = category
+        if category is None:
+            raise RowError(f"Unknown category '{name}' (tick 'create categories' to create it)")
+        return category
+
+    def build(self, row, current):
+        name = cell(row, 'name', 'product_name')
+        if not name:
+            raise RowError('Missing required field: name')
+        sku = self.key(row)
+        product = current.get(sku) if sku else None
+        if product is not None:
+            owned(product, self.company, 'Product', sku)
+            if not self.option('update_existing'):
+                raise RowError(f"Product with SKU '{sku}' already exists")
+        else:
+            product = Product(company=self.company, sku=sku or '', created_by=self.user)
+            if sku:
+                current[sku] = product
+
+        category = cell(row, 'category')
+        product.name = str(name)
+        product.barcode = str(cell(row, 'barcode')) or None
+        product.brand = cell(row, 'brand')
+        product.description = cell(row, 'description')
+        product.category = self._category(str(category)) if category != '' else product.category
+        product.product_type = parse_choice(cell(row, 'product_type', 'type'), Product.PRODUCT_TYPE_CHOICES, 'product type', product.product_type)
+        product.unit_of_measure = parse_choice(cell(row, 'unit_of_measure', 'uom'), Product.UOM_CHOICES, 'unit of measure', product.unit_of_measure)
+        product.cost_price = parse_decimal(cell(row, 'cost_price'), 'cost_price', product.cost_price, minimum=ZERO)
+        product.selling_price = parse_decimal(cell(row, 'selling_price', 'price'), 'selling_price', product.selling_price, minimum=ZERO)
+        product.tracking_method = parse_choice(cell(row, 'tracking_method'), Product.PRODUCT_TRACKING_CHOICES, 'tracking method', product.tracking_method)
+        product.minimum_stock = parse_decimal(cell(row, 'minimum_stock'), 'minimum_stock', product.minimum_stock, minimum=ZERO)
+        product.reorder_level = parse_decimal(cell(row, 'reorder_level'), 'reorder_level', product.reorder_level, minimum=ZERO)
+        product.is_active = parse_bool(cell(row, 'is_active'))
+        product.is_saleable = parse_bool(cell(row, 'is_saleable'))
+        product.is_purchasable = parse_bool(cell(row, 'is_purchasable'))
+        product.is_stockable = parse_bool(cell(row, 'is_stockable'))
+        product.updated_by = self.user
+        product.apply_tracking_flags()
+        return product
+
+    def _assign_skus(self, products, reserved):
+        """PRD-<company>-<n> SKUs for `products`, continuing from the company's last
+        product id like Product.save() - checked against every company's SKUs (the
+        column is globally unique) one window of candidates per query."""
+        if self.next_sku is None:
+            last_id = Product.all_objects.filter(company=self.company).order_by('-id').values_list('id', flat=True).first()
+            self.next_sku = (last_id or 0) + 1
+        pending = deque(products)
+        while pending:
+            numbers = range(self.next_sku, self.next_sku + 2 * len(pending))
+            candidates = [f'PRD-{self.company.pk}-{n:05d}' for n in numbers]
+            taken = reserved | set(Product.all_objects.filter(sku__in=candidates).values_list('sku', flat=True))
+            for number, candidate in zip(numbers, candidates):
+                if not pending:
+                    break
+                self.next_sku = number + 1
+                if candidate not in taken:
+                    pending.popleft().sku = candidate
+
+    def write(self, instances):
+        try:
+            self._write(instances)
+        except Exception:
+            # Rolled back with the chunk - see AccountImporter.write().
+            for category in self.new_categories.values():
+                category.pk, category._state.adding = None, True
+            raise
+        self.new_categories = {}
+
+    def _write(self, instances):
+        ProductCategory.objects.bulk_create(self.new_categories.values())
+        now = timezone.now()
+        for product in instances:
+            product.updated_at = now
+        new = [p for p in instances if p.pk is None]
+        Product.objects.bulk_update([p for p in instances if p.pk is not None], self.update_fields)
+        self._assign_skus([p for p in new if not p.sku], {p.sku for p in instances if p.sku})
+        Product.objects.bulk_create(new)
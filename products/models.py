@@ -193,8 +193,9 @@ class Product(SoftDeleteMixin, models.Model):
         """Check if tracking numbers can be auto-generated for this product"""
         return self.tracking_method in ['barcode', 'batch'] and self.requires_individual_tracking
     
-    def save(self, *args, **kwargs):
-        # Auto-set tracking flags based on tracking method
+    def apply_tracking_flags(self):
+        """Auto-set tracking flags based on tracking method (also used by the bulk
+        importer, products/importers.py, which never calls save())."""
         if self.tracking_method == 'expiry':
             self.requires_expiry_tracking = True
         elif self.tracking_method == 'batch':
@@ -202,6 +203,9 @@ class Product(SoftDeleteMixin, models.Model):
         elif self.tracking_method in ['serial', 'imei', 'barcode']:
             self.requires_individual_tracking = True
 
+    def save(self, *args, **kwargs):
+        self.apply_tracking_flags()
+
         if not self.sku:
             # sku is globally unique (not just per-company), so the generated value has
             # to include the company id even though numbering itself is per-company -
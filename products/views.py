@@ -543,9 +543,20 @@ class AttributeUpdateView(LoginRequiredMixin, UpdateView):
 
 @login_required
 def import_products(request):
-    """Import products from CSV (placeholder for now)"""
+    """Import products from a CSV/Excel file through the background import pipeline
+    (core/imports.py, products/importers.py)"""
     if request.method == 'POST':
-        messages.info(request, 'Import functionality coming soon!')
+        from core.imports import start_import
+
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            messages.error(request, 'Please select a file to import.')
+            return redirect('products:import')
+        operation = start_import(uploaded_file, 'products', request.user, options=request.POST.dict())
+        if operation.status == 'failed':
+            messages.error(request, f'Import failed: {operation.error_log}')
+        else:
+            messages.info(request, f'Import of {operation.file_name} started - progress is listed under Accounting > Import/Export.')
         return redirect('products:list')
     
     return render(request, 'products/import.html')
@@ -2,6 +2,7 @@ from decimal import Decimal, InvalidOperation
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
 from django.db import transaction, IntegrityError
 from django.db.models import Q, Sum, Count
 from datetime import timedelta
@@ -141,7 +142,48 @@ class SupplierViewSet(IdempotentCreateMixin, PkConflictReportingMixin, SoftDelet
             })
             d += timedelta(days=1)
 
-        return Response({'days': series})
+        from .scorecards import monthly, scorecards
+        return Response({
+            'days': series,
+            'months': monthly(supplier),
+            'scorecard': scorecards(supplier.company_id, [supplier.pk]).get(supplier.pk),
+        })
+
+    @action(detail=False, methods=['get'])
+    def scorecards(self, request):
+        """Every supplier's scorecard over the last year (or `date_from`..`date_to`,
+        whole months) - read from the monthly rollups, see purchase.scorecards."""
+        from datetime import date
+        from .scorecards import scorecards
+        try:
+            start, end = (
+                date.fromisoformat(request.query_params[key]) if request.query_params.get(key) else None
+                for key in ('date_from', 'date_to')
+            )
+        except ValueError:
+            return Response({'error': 'date_from and date_to must be YYYY-MM-DD dates.'}, status=status.HTTP_400_BAD_REQUEST)
+        cards = scorecards(request.user.company, start=start, end=end)
+        names = dict(self.get_queryset().filter(pk__in=cards).values_list('pk', 'partner__name'))
+        return Response([
+            {'supplier_id': supplier_id, 'supplier': names[supplier_id], **card}
+            for supplier_id, card in cards.items() if supplier_id in names
+        ])
+
+    @action(detail=False, methods=['post'], url_path='record-ratings')
+    def record_ratings(self, request):
+        """Stores a SupplierRating for every supplier active in `period_start`..
+        `period_end` (whole months), computed from the scorecards."""
+        from datetime import date
+        from .scorecards import record_ratings
+        try:
+            start = date.fromisoformat(request.data['period_start'])
+            end = date.fromisoformat(request.data['period_end'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'period_start and period_end (YYYY-MM-DD) are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({'error': 'period_end is before period_start.'}, status=status.HTTP_400_BAD_REQUEST)
+        ratings = record_ratings(request.user.company, start, end, user=request.user)
+        return Response({'created': len(ratings)}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'])
     def ledger(self, request, pk=None):
@@ -259,6 +301,36 @@ class RequestForQuotationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return RequestForQuotation.objects.filter(company=self.request.user.company)
 
+    @action(detail=True, methods=['get'])
+    def comparison(self, request, pk=None):
+        """The submitted quotations ranked per RFQ line, and the cheapest award split
+        across suppliers (purchase.quotation_utils)."""
+        from .quotation_utils import QuotationComparison
+        comparison = QuotationComparison(self.get_object())
+        return Response({
+            'items': [
+                {
+                    'rfq_item_id': line['rfq_item_id'],
+                    'product_id': line['product'].pk,
+                    'required_base_qty': line['required_base_qty'],
+                    'quotations': [
+                        {
+                            'supplier_id': quote['supplier'].pk,
+                            'quotation_id': quote['quotation'].pk,
+                            'quotation_item_id': quote['quotation_item_id'],
+                            'rank': quote['rank'],
+                            'base_unit_price': quote['base_unit_price'],
+                            'lead_time': quote['lead_time'],
+                            **quote['cost_for_required_qty'],
+                        }
+                        for quote in sorted(line['quotations'], key=lambda quote: quote['rank'])
+                    ],
+                }
+                for line in comparison.get_comparison_matrix()
+            ],
+            'award_split': comparison.get_award_split(),
+        })
+
 class RFQItemViewSet(viewsets.ModelViewSet):
     serializer_class = RFQItemSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -364,17 +436,44 @@ class BillViewSet(SoftDeleteViewSetMixin, viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def three_way_match(self, request, pk=None):
+        from .matching import match_bills
         bill = self.get_object()
-        matched = bill.validate_three_way_match()
-        bill.save()
-        return Response({
-            'status': 'matched' if matched else 'mismatched',
-            'three_way_match_status': bill.three_way_match_status,
-            'po_match_status': bill.po_match_status,
-            'grn_match_status': bill.grn_match_status,
-            'has_additional_items': bill.has_additional_items,
-            'has_quantity_variances': bill.has_quantity_variances,
-        })
+        try:
+            result = match_bills([bill], request.data.get('tolerances'))['bills']
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not result:
+            return Response({'error': 'The bill has no purchase order or GRN to match against.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'matched' if result[0]['matched'] else 'mismatched', **result[0]})
+
+    @action(detail=False, methods=['post'])
+    def match(self, request):
+        """
+        Matches many bills in one call (purchase.matching) - `bill_ids`, or every bill
+        dated `date_from`..`date_to` (optionally of one `supplier`), e.g. a month of vendor
+        invoices. `tolerances` overrides the configured PURCHASE_MATCHING values. Lines are
+        returned only for the bills that didn't match.
+        """
+        from .matching import match_bills
+        bills = self.get_queryset()
+        bill_ids = request.data.get('bill_ids')
+        date_from, date_to = request.data.get('date_from'), request.data.get('date_to')
+        if not bill_ids and not (date_from and date_to):
+            return Response({'error': 'Give bill_ids, or date_from and date_to.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if bill_ids:
+                bills = bills.filter(pk__in=bill_ids)
+            if date_from and date_to:
+                bills = bills.filter(bill_date__range=(date_from, date_to))
+            if request.data.get('supplier'):
+                bills = bills.filter(supplier_id=request.data['supplier'])
+            result = match_bills(bills, request.data.get('tolerances'))
+        except (ValueError, TypeError, ValidationError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        for bill in result['bills']:
+            if bill['matched']:
+                del bill['lines']
+        return Response(result)
 
     @action(detail=False, methods=['get'], url_path='pending-receipt')
     def pending_receipt(self, request):
@@ -687,7 +786,7 @@ def vendor_invoice_create(request):
     # endpoint rather than a raw row upsert: Bill.save() posts to the supplier ledger).
     from core.device_registry import validated_desktop_pk, validated_desktop_number
     from core.pk_conflict import create_with_pk_fallback
-    from purchase.services import receive_bill_line
+    from purchase.services import receive_bill_lines
     desktop_item_pks = (data.get('desktop_pks') or {}).get('items') or []
     desktop_tracking_pks = (data.get('desktop_pks') or {}).get('tracking_units') or []
     tracking_index = 0
@@ -715,6 +814,7 @@ def vendor_invoice_create(request):
                 pk_conflicts.append({'model': 'purchase.Bill', **bill_conflict})
 
             item_summaries = []
+            received_lines = []
             received_items = []
             received_tracking_unit_ids = []
             for index, line in enumerate(items_data):
@@ -764,25 +864,25 @@ def vendor_invoice_create(request):
                 # confirm the bill (goods_received stays False) - that's still an
                 # explicit separate step.
                 if line.get('received'):
-                    def _next_tracking_pk():
-                        nonlocal tracking_index
-                        explicit_id = None
-                        if tracking_index < len(desktop_tracking_pks):
-                            explicit_id = validated_desktop_pk(
-                                {'desktop_pks': {'unit': desktop_tracking_pks[tracking_index]}, 'device_id': data.get('device_id')},
-                                'unit', company,
-                            )
-                        tracking_index += 1
-                        return explicit_id
-
-                    received_summary, received_ids, received_conflicts = receive_bill_line(
-                        bill_item, warehouse, company, request.user,
-                        codes=line.get('codes'), quantity=line.get('received_quantity'),
-                        tracking_pk_provider=_next_tracking_pk,
-                    )
-                    received_tracking_unit_ids.extend(received_ids)
-                    pk_conflicts.extend(received_conflicts)
-                    received_items.append(received_summary)
+                    received_lines.append((bill_item, line.get('codes'), line.get('received_quantity')))
+
+            if received_lines:
+                # all of the received lines in one batch (purchase.services)
+                def _next_tracking_pk():
+                    nonlocal tracking_index
+                    explicit_id = None
+                    if tracking_index < len(desktop_tracking_pks):
+                        explicit_id = validated_desktop_pk(
+                            {'desktop_pks': {'unit': desktop_tracking_pks[tracking_index]}, 'device_id': data.get('device_id')},
+                            'unit', company,
+                        )
+                    tracking_index += 1
+                    return explicit_id
+
+                received_items, received_tracking_unit_ids, received_conflicts = receive_bill_lines(
+                    received_lines, warehouse, company, request.user, tracking_pk_provider=_next_tracking_pk,
+                )
+                pk_conflicts.extend(received_conflicts)
 
             try:
                 bill.discount_amount = Decimal(str(data.get('discount_amount', '0')))
@@ -868,43 +968,44 @@ def bill_receive_items(request, bill_id):
     if not items_data:
         return Response({'error': 'items are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    from purchase.services import receive_bill_line
+    from purchase.services import receive_bill_lines
+
+    def _next_tracking_pk():
+        nonlocal tracking_index
+        explicit_id = None
+        if tracking_index < len(desktop_tracking_pks):
+            explicit_id = validated_desktop_pk(
+                {'desktop_pks': {'unit': desktop_tracking_pks[tracking_index]}, 'device_id': data.get('device_id')},
+                'unit', company,
+            )
+        tracking_index += 1
+        return explicit_id
 
     try:
         with transaction.atomic():
-            tracking_units_created = 0
-            tracking_unit_ids = []
-            line_summaries = []
-
+            # The whole shipment is received in one batch (purchase.services) - one
+            # query for its bill lines, one for all of its codes.
+            try:
+                bill_items = bill.items.select_related('product', 'variant', 'bill__supplier').in_bulk(
+                    [line.get('bill_item_id') for line in items_data if line.get('bill_item_id')]
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise ValueError('Each bill_item_id must be an integer.')
+            lines = []
             for line in items_data:
                 bill_item_id = line.get('bill_item_id')
                 if not bill_item_id:
                     raise ValueError('Each item requires a bill_item_id.')
-                try:
-                    bill_item = BillItem.objects.get(pk=bill_item_id, bill=bill)
-                except BillItem.DoesNotExist:
+                bill_item = bill_items.get(int(bill_item_id))
+                if bill_item is None:
                     raise ValueError(f'Bill item {bill_item_id} not found on bill {bill_id}.')
+                lines.append((bill_item, line.get('codes'), line.get('quantity')))
 
-                def _next_tracking_pk():
-                    nonlocal tracking_index
-                    explicit_id = None
-                    if tracking_index < len(desktop_tracking_pks):
-                        explicit_id = validated_desktop_pk(
-                            {'desktop_pks': {'unit': desktop_tracking_pks[tracking_index]}, 'device_id': data.get('device_id')},
-                            'unit', company,
-                        )
-                    tracking_index += 1
-                    return explicit_id
-
-                summary, ids, conflicts = receive_bill_line(
-                    bill_item, warehouse, company, request.user,
-                    codes=line.get('codes'), quantity=line.get('quantity'),
-                    tracking_pk_provider=_next_tracking_pk,
-                )
-                tracking_unit_ids.extend(ids)
-                tracking_units_created += len(ids)
-                pk_conflicts.extend(conflicts)
-                line_summaries.append(summary)
+            line_summaries, tracking_unit_ids, conflicts = receive_bill_lines(
+                lines, warehouse, company, request.user, tracking_pk_provider=_next_tracking_pk,
+            )
+            tracking_units_created = len(tracking_unit_ids)
+            pk_conflicts.extend(conflicts)
 
     except ValueError as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
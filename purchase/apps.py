@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PurchaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'purchase'
+
+    def ready(self):
+        from . import importers  # noqa: F401 - registers this app's importer with core.imports
+        from . import scorecards
+        scorecards.connect_signals()
@@ -0,0 +1,80 @@
+"""Supplier import for core.imports."""
+from django.utils import timezone
+
+from core.imports import Importer, RowError, cell, owned, parse_bool, parse_choice, parse_decimal, register
+from core.numbering import format_number, lease_range
+from crm.importers import clean_email
+from crm.models import Partner
+
+from .models import Supplier
+
+
+@register
+class SupplierImporter(Importer):
+    """Columns: name, supplier_code/code, email, phone, contact_person, supplier_type,
+    status, delivery_lead_time, minimum_order_value, is_active. Matching, the
+    `update_existing` option and numbering work as for customers (crm/importers.py);
+    the name and contact details live on the supplier's Partner."""
+    name = 'suppliers'
+    models = ('purchase.Supplier', 'crm.Partner')
+    update_fields = ['supplier_type', 'status', 'delivery_lead_time', 'minimum_order_value', 'is_active', 'updated_at']
+
+    def key(self, row):
+        code = cell(row, 'supplier_code', 'code')
+        return str(code) if code != '' else None
+
+    def existing(self, keys):
+        return {
+            s.supplier_code: s
+            for s in Supplier.all_objects.filter(supplier_code__in=keys).select_related('partner')
+        }
+
+    def build(self, row, current):
+        name = cell(row, 'name', 'supplier_name')
+        if not name:
+            raise RowError('Missing required field: name')
+        code = self.key(row)
+        supplier = current.get(code) if code else None
+        if supplier is not None:
+            owned(supplier, self.company, 'Supplier', code)
+            if not self.option('update_existing'):
+                raise RowError(f"Supplier with code '{code}' already exists")
+        else:
+            supplier = Supplier(
+                company=self.company, supplier_code=code or '', created_by=self.user,
+                partner=Partner(company=self.company, partner_type='company', is_supplier=True, created_by=self.user),
+            )
+            if code:
+                current[code] = supplier
+        supplier.supplier_type = parse_choice(cell(row, 'supplier_type', 'type'), Supplier.SUPPLIER_TYPE_CHOICES, 'supplier type', supplier.supplier_type)
+        supplier.status = parse_choice(cell(row, 'status'), Supplier.SUPPLIER_STATUS_CHOICES, 'status', supplier.status)
+        supplier.delivery_lead_time = int(parse_decimal(cell(row, 'delivery_lead_time', 'lead_time'), 'delivery_lead_time', supplier.delivery_lead_time, minimum=0))
+        supplier.minimum_order_value = parse_decimal(cell(row, 'minimum_order_value'), 'minimum_order_value', supplier.minimum_order_value, minimum=0)
+        supplier.is_active = parse_bool(cell(row, 'is_active'))
+
+        partner = supplier.partner
+        partner.name = str(name)
+        partner.email = clean_email(row)
+        partner.phone = str(cell(row, 'phone'))
+        partner.contact_person = cell(row, 'contact_person')
+        return supplier
+
+    def write(self, instances):
+        now = timezone.now()
+        new = [s for s in instances if s.pk is None]
+        updated = [s for s in instances if s.pk is not None]
+
+        Partner.objects.bulk_create([s.partner for s in new])
+        for supplier in updated:
+            supplier.partner.updated_at = supplier.updated_at = now
+        Partner.objects.bulk_update([s.partner for s in updated], ['name', 'email', 'phone', 'contact_person', 'updated_at'])
+        Supplier.objects.bulk_update(updated, self.update_fields)
+
+        unnumbered = [s for s in new if not s.supplier_code]
+        if unnumbered:
+            start, _, _ = lease_range(
+                self.company, 'supplier', 'SUP', 6, len(unnumbered), Supplier, 'supplier_code', 'all_objects',
+            )
+            for offset, supplier in enumerate(unnumbered):
+                supplier.supplier_code = format_number('SUP', 6, start + offset)
+        Supplier.objects.bulk_create(new)
@@ -0,0 +1,31 @@
+"""
+Recomputes the monthly supplier scorecards (purchase/scorecards.py) and the supplier
+ratings and lead times derived from them - after a bulk import, a raw-SQL fix, or
+anything else that wrote GRNs, inspections, bills or payments without their signals.
+
+Usage: python manage.py rebuild_supplier_scorecards
+       python manage.py rebuild_supplier_scorecards --company 3
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from purchase.scorecards import rebuild
+from user_auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-company monthly supplier scorecards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only this company id (default: every company).')
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by('id')
+        if options['company']:
+            companies = companies.filter(pk=options['company'])
+            if not companies.exists():
+                raise CommandError(f"No company with id {options['company']}.")
+
+        for company in companies:
+            months = rebuild(company)
+            self.stdout.write(f'{company.name}: {months} supplier-month(s) rebuilt')
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,248 @@
+"""
+Three-way matching of supplier bills against their purchase orders and goods receipts,
+any number of bills at a time.
+
+Bill.validate_three_way_match() and its two-way siblings loaded the PO, GRN and bill
+lines of one bill per call, compared only which products appeared where, and never
+looked at a price - and the three_way_match action ran it one bill at a time, so
+reconciling a month of vendor invoices was one request (and six queries) per bill.
+match_bills() takes a queryset or list of bills and, per BATCH_SIZE of them, reads
+every bill line, PO line and GRN line in three queries, then per bill:
+
+- sums each product's lines on the bill, its PO and its GRN (net received:
+  received_qty - rejected_qty - returned_qty), and the quantity-weighted unit price on
+  the bill and the PO;
+- flags a quantity variance where the bill's quantity exceeds the PO's, or the net
+  received quantity, by more than QUANTITY_TOLERANCE_PERCENT of it, and a price
+  variance where the bill's unit price exceeds the PO's by more than
+  PRICE_TOLERANCE_PERCENT of it or PRICE_TOLERANCE_AMOUNT, whichever is larger.
+  Billing less than ordered or received is a partial invoice, not a mismatch; a product
+  missing from the PO or GRN is, and so is a bill without lines;
+- sets matching_type, po/grn/three_way_match_status, has_additional_items,
+  has_quantity_variances, has_price_variances and matched_at on the bill, and the
+  quantity and price variances (per product, so every line of a product carries the
+  product's figures) on its lines.
+
+Manual bills - no PO, no GRN - are skipped. With `save` the results are written back as
+primary-key upserts, one statement per table and batch, as in manufacturing.costing;
+this bypasses Bill.save(), which is fine because no field the supplier ledger mirrors
+changes, and the supplier scorecard months whose price variances moved are refreshed
+through purchase.scorecards.mark().
+
+Tolerances come from the settings.PURCHASE_MATCHING dict, overridable per call:
+
+    PURCHASE_MATCHING = {
+        'QUANTITY_TOLERANCE_PERCENT': 0,
+        'PRICE_TOLERANCE_PERCENT': 0,
+        'PRICE_TOLERANCE_AMOUNT': 0,
+    }
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from . import scorecards
+from .models import Bill, BillItem, GRNItem, PurchaseOrderItem
+
+BATCH_SIZE = 500
+DEFAULTS = {
+    'QUANTITY_TOLERANCE_PERCENT': 0,
+    'PRICE_TOLERANCE_PERCENT': 0,
+    'PRICE_TOLERANCE_AMOUNT': 0,
+}
+BILL_FIELDS = [
+    'matching_type', 'three_way_match_status', 'po_match_status', 'grn_match_status', 'has_additional_items',
+    'has_quantity_variances', 'has_price_variances', 'matched_at', 'updated_at',
+]
+ITEM_FIELDS = ['po_quantity_variance', 'grn_quantity_variance', 'price_variance', 'is_additional_item']
+_CENT = Decimal('0.01')
+_HUNDRED = Decimal(100)
+
+
+def tolerances(overrides=None):
+    """The configured tolerances with `overrides` applied. Raises ValueError on a value
+    that isn't a non-negative number."""
+    configured = {**DEFAULTS, **getattr(settings, 'PURCHASE_MATCHING', {}), **(overrides or {})}
+    result = {}
+    for key in DEFAULTS:
+        try:
+            value = Decimal(str(configured[key]))
+        except ArithmeticError:
+            raise ValueError(f'{key} must be a number.')
+        if not value.is_finite() or value < 0:
+            raise ValueError(f'{key} must be a non-negative number.')
+        result[key] = value
+    return result
+
+
+def matching_type(bill):
+    if bill.purchase_order_id and bill.grn_id:
+        return 'three_way'
+    if bill.purchase_order_id:
+        return 'two_way_po'
+    if bill.grn_id:
+        return 'two_way_grn'
+    return 'manual'
+
+
+class _Lines:
+    """{document id: {product id: [quantity, amount]}} - amount is quantity x unit price."""
+
+    def __init__(self, rows):
+        self.documents = defaultdict(lambda: defaultdict(lambda: [Decimal(0), Decimal(0)]))
+        for document_id, product_id, quantity, unit_price in rows:
+            totals = self.documents[document_id][product_id]
+            totals[0] += quantity
+            totals[1] += quantity * unit_price
+
+    def get(self, document_id):
+        return self.documents.get(document_id, {}) if document_id else None
+
+
+def _unit_price(totals):
+    return totals[1] / totals[0] if totals[0] else Decimal(0)
+
+
+def _evaluate(bill, items, po_lines, grn_lines, tol):
+    """Sets the match fields of `bill` and its `items`; returns the bill's result."""
+    on_bill = _Lines((item.bill_id, item.product_id, item.quantity, item.unit_price) for item in items)
+    billed = on_bill.get(bill.pk)
+    po, grn = po_lines.get(bill.purchase_order_id), grn_lines.get(bill.grn_id)
+
+    lines, per_product = [], {}
+    for product_id, totals in billed.items():
+        quantity, price = totals[0], _unit_price(totals)
+        line = {'product_id': product_id, 'quantity': quantity, 'unit_price': price.quantize(_CENT), 'issues': []}
+        po_variance = grn_variance = price_variance = Decimal(0)
+        if po is not None:
+            if product_id in po:
+                ordered, ordered_price = po[product_id][0], _unit_price(po[product_id])
+                po_variance, price_variance = quantity - ordered, price - ordered_price
+                line.update(po_quantity=ordered, po_unit_price=ordered_price.quantize(_CENT))
+                if po_variance > ordered * tol['QUANTITY_TOLERANCE_PERCENT'] / _HUNDRED:
+                    line['issues'].append('over_ordered')
+                if price_variance > max(ordered_price * tol['PRICE_TOLERANCE_PERCENT'] / _HUNDRED, tol['PRICE_TOLERANCE_AMOUNT']):
+                    line['issues'].append('over_price')
+            else:
+                line['issues'].append('not_on_po')
+        if grn is not None:
+            if product_id in grn:
+                received = grn[product_id][0]
+                grn_variance = quantity - received
+                line['grn_quantity'] = received
+                if grn_variance > received * tol['QUANTITY_TOLERANCE_PERCENT'] / _HUNDRED:
+                    line['issues'].append('over_received')
+            else:
+                line['issues'].append('not_received')
+        additional = (po is None or product_id not in po) and (grn is None or product_id not in grn)
+        line.update(
+            po_quantity_variance=po_variance, grn_quantity_variance=grn_variance,
+            price_variance=price_variance.quantize(_CENT), additional=additional,
+        )
+        per_product[product_id] = line
+        lines.append(line)
+
+    for item in items:
+        line = per_product[item.product_id]
+        item.po_quantity_variance = line['po_quantity_variance']
+        item.grn_quantity_variance = line['grn_quantity_variance']
+        item.price_variance = line['price_variance']
+        item.is_additional_item = line['additional']
+
+    issues = {issue for line in lines for issue in line['issues']} or ({'no_lines'} if not lines else set())
+    bill.matching_type = matching_type(bill)
+    bill.po_match_status = po is not None and not issues & {'no_lines', 'not_on_po', 'over_ordered', 'over_price'}
+    bill.grn_match_status = grn is not None and not issues & {'no_lines', 'not_received', 'over_received'}
+    bill.three_way_match_status = bill.po_match_status and bill.grn_match_status
+    bill.has_additional_items = any(line['additional'] for line in lines)
+    bill.has_quantity_variances = bool(issues & {'over_ordered', 'over_received'})
+    bill.has_price_variances = 'over_price' in issues
+    bill.matched_at = timezone.now()
+    matched = {
+        'three_way': bill.three_way_match_status, 'two_way_po': bill.po_match_status, 'two_way_grn': bill.grn_match_status,
+    }[bill.matching_type]
+    return {
+        'bill_id': bill.pk,
+        'bill_number': bill.bill_number,
+        'matching_type': bill.matching_type,
+        'matched': matched,
+        'three_way_match_status': bill.three_way_match_status,
+        'po_match_status': bill.po_match_status,
+        'grn_match_status': bill.grn_match_status,
+        'has_additional_items': bill.has_additional_items,
+        'has_quantity_variances': bill.has_quantity_variances,
+        'has_price_variances': bill.has_price_variances,
+        'warnings': [f"Product {line['product_id']}: {', '.join(line['issues'])}" for line in lines if line['issues']]
+        or (['The bill has no lines.'] if not lines else []),
+        'lines': lines,
+    }
+
+
+def _batches(bills):
+    if isinstance(bills, QuerySet):
+        ids = list(bills.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = Bill.all_objects.in_bulk(ids[start:start + BATCH_SIZE])
+            yield [batch[pk] for pk in ids[start:start + BATCH_SIZE] if pk in batch]
+    else:
+        bills = list(bills)
+        for start in range(0, len(bills), BATCH_SIZE):
+            yield bills[start:start + BATCH_SIZE]
+
+
+def match_bills(bills, tolerance_overrides=None, save=True):
+    """Matches `bills` (a queryset or a list of Bill instances, updated in place).
+    Returns {'summary': counts, 'bills': [one result per bill matched]}."""
+    tol = tolerances(tolerance_overrides)
+    results, skipped = [], 0
+    for batch in _batches(bills):
+        matchable = [bill for bill in batch if matching_type(bill) != 'manual']
+        skipped += len(batch) - len(matchable)
+        if not matchable:
+            continue
+        items = defaultdict(list)
+        for item in BillItem.objects.filter(bill__in=[bill.pk for bill in matchable]).order_by('pk'):
+            items[item.bill_id].append(item)
+        po_lines = _Lines(PurchaseOrderItem.objects.filter(
+            purchase_order_id__in={bill.purchase_order_id for bill in matchable if bill.purchase_order_id},
+        ).values_list('purchase_order_id', 'product_id', 'quantity', 'unit_price'))
+        grn_lines = _Lines(
+            (grn_id, product_id, received - rejected - returned, Decimal(0))
+            for grn_id, product_id, received, rejected, returned in GRNItem.objects.filter(
+                grn_id__in={bill.grn_id for bill in matchable if bill.grn_id}, product__isnull=False,
+            ).values_list('grn_id', 'product_id', 'received_qty', 'rejected_qty', 'returned_qty')
+        )
+
+        changed_items, by_pk = [], {bill.pk: bill for bill in matchable}
+        for bill in matchable:
+            before = {item.pk: tuple(getattr(item, field) for field in ITEM_FIELDS) for item in items[bill.pk]}
+            results.append(_evaluate(bill, items[bill.pk], po_lines, grn_lines, tol))
+            changed_items.extend(
+                item for item in items[bill.pk] if tuple(getattr(item, field) for field in ITEM_FIELDS) != before[item.pk]
+            )
+        if save:
+            with transaction.atomic():
+                Bill.all_objects.bulk_create(
+                    matchable, update_conflicts=True, unique_fields=['pk'], update_fields=BILL_FIELDS,
+                )
+                BillItem.objects.bulk_create(
+                    changed_items, update_conflicts=True, unique_fields=['pk'], update_fields=ITEM_FIELDS,
+                )
+                # the price variances feed the supplier scorecards
+                for bill_id in {item.bill_id for item in changed_items}:
+                    bill = by_pk[bill_id]
+                    scorecards.mark(bill.company_id, bill.supplier_id, bill.bill_date)
+
+    return {
+        'summary': {
+            'matched': sum(1 for result in results if result['matched']),
+            'mismatched': sum(1 for result in results if not result['matched']),
+            'skipped_manual': skipped,
+            'tolerances': tol,
+        },
+        'bills': results,
+    }
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0022_bill_discount_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['company', 'bill_date', 'status'], name='purch_bill_co_date_status_idx'),
+        ),
+    ]
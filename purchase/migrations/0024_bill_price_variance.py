@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0023_company_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='has_price_variances',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='matched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='billitem',
+            name='price_variance',
+            field=models.DecimalField(decimal_places=2, default=0, help_text="Unit price over the PO's, per purchase.matching", max_digits=12),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0024_bill_price_variance'),
+        ('user_auth', '0004_activitylog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierScorecardState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField()),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_scorecard_state', to='user_auth.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SupplierMonthlyScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('grn_count', models.PositiveIntegerField(default=0)),
+                ('due_deliveries', models.PositiveIntegerField(default=0, help_text='GRNs against a PO with an expected delivery date')),
+                ('on_time_deliveries', models.PositiveIntegerField(default=0)),
+                ('lead_time_days', models.PositiveIntegerField(default=0, help_text='Sum of PO order -> receipt days')),
+                ('lead_time_count', models.PositiveIntegerField(default=0)),
+                ('inspected_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('passed_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('bill_count', models.PositiveIntegerField(default=0)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('po_priced_amount', models.DecimalField(decimal_places=2, default=0, help_text='Billed lines at their PO price', max_digits=15)),
+                ('price_variance_amount', models.DecimalField(decimal_places=2, default=0, help_text='Billed above (or below) the PO price', max_digits=15)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('payment_days', models.IntegerField(default=0, help_text='Sum of bill date -> payment days')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_monthly_scores', to='user_auth.company')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_scores', to='purchase.supplier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'month'], name='purch_supscore_co_month_idx')],
+                'unique_together': {('supplier', 'month')},
+            },
+        ),
+    ]
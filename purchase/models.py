@@ -239,33 +239,23 @@ class Supplier(SoftDeleteMixin, models.Model):
         return total_debit - total_credit
 
     def get_total_purchases(self, year=None):
-        """Get total purchase amount for a year or all time"""
-        bills = self.bills.filter(status__in=['approved', 'paid'])
-        if year:
-            bills = bills.filter(bill_date__year=year)
-        return bills.aggregate(total=Sum('total_amount'))['total'] or 0
+        """Get total purchase amount for a year or all time - from the monthly scorecard
+        rollups (purchase.scorecards)"""
+        from .scorecards import supplier_totals
+        return supplier_totals(self, year)['spend']
 
     def get_average_payment_days(self):
-        """Calculate average payment days"""
-        payments = self.payments.filter(status='completed')
-        if not payments.exists():
-            return 0
-        
-        total_days = 0
-        count = 0
-        for payment in payments:
-            if payment.bill and payment.actual_date:
-                days = (payment.actual_date - payment.bill.bill_date).days
-                total_days += days
-                count += 1
-        
-        return total_days / count if count > 0 else 0
+        """Average days from bill date to payment, over every completed bill payment"""
+        from .scorecards import supplier_totals
+        totals = supplier_totals(self)
+        return totals['payment_days'] / totals['payment_count'] if totals['payment_count'] else 0
 
     def update_performance_ratings(self):
-        """Update performance ratings based on historical data"""
-        # This would be implemented based on your business logic
-        # For now, it's a placeholder for future enhancement
-        pass
+        """Re-derive the quality/delivery/price ratings (and lead times) from the last
+        year of scorecards - see purchase.scorecards"""
+        from .scorecards import apply_ratings
+        apply_ratings(self.company_id, [self.pk], build=False)
+        self.refresh_from_db(fields=['quality_rating', 'delivery_rating', 'price_rating', 'overall_rating'])
 
     def __str__(self):
         return self.partner.name if self.partner else f"Supplier {self.supplier_code}"
@@ -1219,108 +1209,18 @@ class GRNItem(models.Model):
         
         super().save(*args, **kwargs)
         
-        # Create inventory lock for received items
+        # Create inventory lock for received items (queued when a whole GRN is being
+        # received under purchase.services.deferred_grn_locks())
         if self.pk and self.received_qty > 0 and self.grn.status == 'received':
-            self.create_inventory_lock()
+            from .services import defer_grn_lock
+            if not defer_grn_lock(self):
+                self.create_inventory_lock()
     
     def create_inventory_lock(self):
-        """Create inventory lock for received items pending bill creation using existing GRNInventoryLock"""
-        if not self.product or not getattr(self.product, 'is_stockable', True):
-            return None
-            
-        # Create inventory tracking in inventory app
-        if self._create_stock_item_and_movement():
-            # Create GRN inventory lock using existing model
-            lock = GRNInventoryLock.objects.create(
-                grn=self.grn,
-                grn_item=self,
-                locked_quantity=self.received_qty,
-                lock_reason='pending_invoice',
-                locked_by=self.grn.received_by,
-                lock_notes=f"GRN {self.grn.grn_number} pending bill creation",
-            )
-            
-            # Also lock any tracking items
-            for tracking_item in self.tracking_items.all():
-                GRNInventoryLock.objects.create(
-                    grn=self.grn,
-                    grn_item=self,
-                    tracking_item=tracking_item,
-                    locked_quantity=1,  # Individual items are quantity 1
-                    lock_reason='pending_invoice',
-                    locked_by=self.grn.received_by,
-                    lock_notes=f"Tracking item {tracking_item.tracking_number} locked pending bill",
-                )
-            
-            return lock
-        
-        return None
-    
-    def _create_stock_item_and_movement(self):
-        """Create stock item and initial movement in inventory app"""
-        try:
-            # Import here to avoid circular imports
-            from inventory.models import StockItem, StockMovement, Warehouse
-            
-            # Get warehouse for this item
-            warehouse = self.warehouse
-            if not warehouse:
-                warehouse = self.grn.warehouse
-            if not warehouse:
-                # Get company's first active warehouse as fallback
-                warehouse = Warehouse.objects.filter(
-                    company=self.grn.company, 
-                    is_active=True
-                ).first()
-                
-            if not warehouse:
-                return False
-                
-            # Get or create stock item
-            stock_item, created = StockItem.objects.get_or_create(
-                company=self.grn.company,
-                product=self.product,
-                warehouse=warehouse,
-                defaults={
-                    'category': getattr(self.product, 'category', None),
-                    'valuation_method': getattr(self.product, 'valuation_method', 'weighted_avg'),
-                    'min_stock': getattr(self.product, 'minimum_stock', 0),
-                    'max_stock': getattr(self.product, 'maximum_stock', 0),
-                    'reorder_point': getattr(self.product, 'reorder_level', 0),
-                    'purchase_status': 'received_unbilled',
-                    'stock_status': 'locked',
-                }
-            )
-            
-            # Update status if stock item already exists
-            if not created:
-                stock_item.purchase_status = 'received_unbilled'
-                stock_item.stock_status = 'locked'
-                stock_item.save()
-            
-            # Create stock movement for GRN receipt (locked)
-            movement = StockMovement.objects.create(
-                company=self.grn.company,
-                stock_item=stock_item,
-                movement_type='grn_receipt',
-                quantity=self.received_qty,
-                unit_cost=0,  # Will be updated when bill is created
-                reference_type='grn',
-                reference_id=self.grn.id,
-                reference_number=self.grn.grn_number,
-                batch_number=getattr(self, 'batch_number', ''),
-                lot_number=getattr(self, 'lot_number', ''),
-                expiry_date=self.expiry_date,
-                grn_item=self,
-                notes=f"GRN Receipt: {self.grn.grn_number} - Locked pending bill",
-                performed_by=self.grn.received_by,
-            )
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error creating stock item and movement: {e}")
-            return False
+        """Create inventory lock for received items pending bill creation using existing
+        GRNInventoryLock - purchase.services.lock_grn_items() for this one line."""
+        from .services import lock_grn_items
+        return lock_grn_items([self]).get(self.pk)
     
     def unlock_inventory_on_bill(self, bill_item):
         """Unlock inventory when bill is created and update costs"""
@@ -1541,7 +1441,7 @@ class GRNItemTracking(models.Model):
                 product=self.grn_item.product,
                 grn_item=self.grn_item,
                 current_warehouse=self.grn_item.warehouse,
-                purchase_price=self.grn_item.unit_price,
+                purchase_price=self.grn_item.po_item.unit_price if self.grn_item.po_item_id else None,
                 purchase_date=self.grn_item.grn.received_date.date(),
                 supplier=self.grn_item.grn.supplier,
                 manufacturing_date=self.manufacturing_date,
@@ -1758,6 +1658,8 @@ class Bill(SoftDeleteMixin, models.Model):
     grn_match_status = models.BooleanField(default=False)  # GRN matches invoice
     has_additional_items = models.BooleanField(default=False)  # Items not in PO/GRN
     has_quantity_variances = models.BooleanField(default=False)  # Quantity differences
+    has_price_variances = models.BooleanField(default=False)  # Billed above the PO price (purchase.matching)
+    matched_at = models.DateTimeField(null=True, blank=True)
     
     notes = models.TextField(blank=True)
     
@@ -1831,93 +1733,37 @@ class Bill(SoftDeleteMixin, models.Model):
     
     def determine_matching_type(self):
         """Determine the matching type based on linked documents"""
-        if self.purchase_order and self.grn:
-            return 'three_way'
-        elif self.purchase_order:
-            return 'two_way_po'
-        elif self.grn:
-            return 'two_way_grn'
-        else:
-            return 'manual'
+        from .matching import matching_type
+        return matching_type(self)
     
     def perform_matching_validation(self):
-        """Perform matching validation based on matching type"""
-        self.matching_type = self.determine_matching_type()
-        
-        if self.matching_type == 'three_way':
-            self.validate_three_way_match()
-        elif self.matching_type == 'two_way_po':
-            self.validate_po_match()
-        elif self.matching_type == 'two_way_grn':
-            self.validate_grn_match()
-        
-        self.save()
+        """Match this bill against its PO and/or GRN (purchase.matching) and store the
+        result. Returns the result dict."""
+        from .matching import match_bills
+        return match_bills([self])['bills'][0] if self.determine_matching_type() != 'manual' else None
     
     def validate_three_way_match(self):
-        """Validate three-way match between PO, GRN, and Invoice"""
-        if not (self.purchase_order and self.grn):
+        """Validate three-way match between PO, GRN, and Invoice - see purchase.matching"""
+        if not (self.purchase_order_id and self.grn_id):
             self.three_way_match_status = False
             return False
-        
-        # Check if all quantities and items match
-        po_items = {item.product_id: item.quantity for item in self.purchase_order.items.all()}
-        grn_items = {item.product_id: item.received_qty for item in self.grn.items.all()}
-        bill_items = {item.product_id: item.quantity for item in self.items.all()}
-        
-        # Check if all items are present in all three documents
-        po_products = set(po_items.keys())
-        grn_products = set(grn_items.keys())
-        bill_products = set(bill_items.keys())
-        
-        self.three_way_match_status = (po_products == grn_products == bill_products)
-        self.po_match_status = (po_products == bill_products)
-        self.grn_match_status = (grn_products == bill_products)
-        
-        # Check for additional items not in PO/GRN
-        self.has_additional_items = bool(bill_products - (po_products | grn_products))
-        
-        # Check for quantity variances
-        self.has_quantity_variances = False
-        for product_id in bill_products:
-            if product_id in po_items and product_id in grn_items:
-                if not (bill_items[product_id] == grn_items[product_id]):
-                    self.has_quantity_variances = True
-                    break
-        
+        self.perform_matching_validation()
         return self.three_way_match_status
     
     def validate_po_match(self):
-        """Validate two-way match between PO and Invoice"""
-        if not self.purchase_order:
+        """Validate two-way match between PO and Invoice - see purchase.matching"""
+        if not self.purchase_order_id:
             self.po_match_status = False
             return False
-        
-        po_items = {item.product_id: item.quantity for item in self.purchase_order.items.all()}
-        bill_items = {item.product_id: item.quantity for item in self.items.all()}
-        
-        po_products = set(po_items.keys())
-        bill_products = set(bill_items.keys())
-        
-        self.po_match_status = po_products.issubset(bill_products)
-        self.has_additional_items = bool(bill_products - po_products)
-        
+        self.perform_matching_validation()
         return self.po_match_status
     
     def validate_grn_match(self):
-        """Validate two-way match between GRN and Invoice"""
-        if not self.grn:
+        """Validate two-way match between GRN and Invoice - see purchase.matching"""
+        if not self.grn_id:
             self.grn_match_status = False
             return False
-        
-        grn_items = {item.product_id: item.received_qty for item in self.grn.items.all()}
-        bill_items = {item.product_id: item.quantity for item in self.items.all()}
-        
-        grn_products = set(grn_items.keys())
-        bill_products = set(bill_items.keys())
-        
-        self.grn_match_status = grn_products.issubset(bill_products)
-        self.has_additional_items = bool(bill_products - grn_products)
-        
+        self.perform_matching_validation()
         return self.grn_match_status
     
     def unlock_grn_items(self):
@@ -1991,6 +1837,9 @@ class Bill(SoftDeleteMixin, models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['company', 'bill_date', 'status'], name='purch_bill_co_date_status_idx'),
+        ]
 
 # Enhanced Bill Items with Tracking Support
 class BillItem(models.Model):
@@ -2025,6 +1874,7 @@ class BillItem(models.Model):
     # Variance tracking
     po_quantity_variance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     grn_quantity_variance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    price_variance = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Unit price over the PO's, per purchase.matching")
     is_additional_item = models.BooleanField(default=False, help_text="Item not in PO/GRN")
     
     # Notes and additional info
@@ -2742,3 +2592,44 @@ class PurchaseApproval(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+
+# Supplier scorecards (purchase/scorecards.py)
+class SupplierMonthlyScore(models.Model):
+    """One supplier's deliveries, inspections, bills and payments in one calendar month.
+    Derived - recomputed by purchase.scorecards from the source documents, never edited."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='supplier_monthly_scores')
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='monthly_scores')
+    month = models.DateField(help_text="First day of the month")
+
+    grn_count = models.PositiveIntegerField(default=0)
+    due_deliveries = models.PositiveIntegerField(default=0, help_text="GRNs against a PO with an expected delivery date")
+    on_time_deliveries = models.PositiveIntegerField(default=0)
+    lead_time_days = models.PositiveIntegerField(default=0, help_text="Sum of PO order -> receipt days")
+    lead_time_count = models.PositiveIntegerField(default=0)
+    inspected_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    passed_quantity = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    bill_count = models.PositiveIntegerField(default=0)
+    spend = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    po_priced_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Billed lines at their PO price")
+    price_variance_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Billed above (or below) the PO price")
+    payment_count = models.PositiveIntegerField(default=0)
+    payment_days = models.IntegerField(default=0, help_text="Sum of bill date -> payment days")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.supplier_id} {self.month:%Y-%m}"
+
+    class Meta:
+        unique_together = ['supplier', 'month']
+        indexes = [models.Index(fields=['company', 'month'], name='purch_supscore_co_month_idx')]
+
+
+class SupplierScorecardState(models.Model):
+    """Marks a company whose scorecard history has been fully built (see
+    scorecards.ensure_built(), the same scheme as analytics.SalesFactState)."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name='supplier_scorecard_state')
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.company_id} built {self.built_at}'
@@ -1,11 +1,98 @@
 """
 Quotation Comparison and Analysis Utilities
+
+QuotationComparison compares the submitted quotations of one RFQ. It used to query
+SupplierQuotationItem once per RFQ line (plus a supplier fetch per quote), then
+get_best_quotation_analysis() rebuilt the whole matrix and re-costed every quote in
+nested loops - and it read a lead_time_days the quotation lines don't have. Now the
+RFQ lines and every quotation line of the RFQ are read in two queries, and one pass
+over the quotation lines normalises them:
+
+- base units: a quoted unit holds package_qty base units (1 where it is unset) and the
+  RFQ quantity is converted with its required_uom's conversion_factor, so price per
+  base unit (unit_price / package_qty) compares across suppliers and pack sizes;
+- cost for the required quantity: whole quoted units, at least minimum_order_qty of
+  them (the MOQ is in quoted units, as in UOMConverter.calculate_purchase_requirements);
+- lead time: the line's delivery_time_days, else the quotation's.
+
+Per product the quotes are ranked by that cost (then base unit price, then lead time).
+get_award_split() then finds the cheapest way to cover each line from one or more
+suppliers: a quote's quoted quantity is the most it can supply, an award to it is whole
+quoted units and at least its MOQ, and the line's maximum_qty_acceptable (when set)
+caps what may be ordered. Offers are taken cheapest base price first; before each one
+the remainder is instead closed by whichever of the offers not yet used covers it
+cheapest, and the cheapest of those plans wins (quotes on one line rarely run past a
+few dozen, so this is a handful of comparisons, not a search). A line nobody can cover
+gets everything offered and a shortfall.
 """
 
-from django.db.models import Min, Max, Avg, Q
-from decimal import Decimal
-from .models import SupplierQuotation, SupplierQuotationItem, RFQItem
-from products.models import Product
+from collections import defaultdict
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+from .models import RFQItem, SupplierQuotation, SupplierQuotationItem
+
+_ONE = Decimal(1)
+
+
+def _whole(value):
+    return value.to_integral_value(rounding=ROUND_CEILING)
+
+
+class _Offer:
+    """One quotation line, normalised to base units."""
+
+    def __init__(self, item):
+        quotation = item.quotation
+        self.item, self.quotation, self.supplier = item, quotation, quotation.supplier
+        self.per_unit = item.package_qty if item.package_qty > 0 else _ONE
+        self.unit_price = item.unit_price
+        self.base_unit_price = item.unit_price / self.per_unit
+        self.moq = _whole(max(item.minimum_order_qty, _ONE))
+        self.capacity = item.quantity.to_integral_value(rounding=ROUND_FLOOR)
+        self.lead_time = item.delivery_time_days or quotation.delivery_time_days
+
+    def units_for(self, base_qty):
+        """Quoted units to order for `base_qty` base units, MOQ respected."""
+        return max(_whole(base_qty / self.per_unit), self.moq)
+
+    def award(self, units):
+        return {
+            'supplier_id': self.supplier.pk, 'supplier_name': self.supplier.name, 'quotation_id': self.quotation.pk,
+            'quotation_item_id': self.item.pk, 'quantity': units, 'base_quantity': units * self.per_unit,
+            'unit_price': self.unit_price, 'cost': units * self.unit_price,
+        }
+
+
+def _split(required, offers, maximum=None):
+    """The cheapest plan found to cover `required` base units from `offers` (sorted by
+    base unit price): ([award], cost, shortfall)."""
+    def closing(remaining, candidates):
+        options = []
+        for offer in candidates:
+            units = offer.units_for(remaining)
+            if units <= offer.capacity:
+                options.append((units * offer.unit_price, offer, units))
+        return min(options, key=lambda option: option[0], default=None)
+
+    best, plan, cost, remaining = None, [], Decimal(0), required
+    for index, offer in enumerate(offers):
+        close = closing(remaining, offers[index:])
+        if close and (maximum is None or required - remaining + close[2] * close[1].per_unit <= maximum):
+            if best is None or cost + close[0] < best[1]:
+                best = (plan + [close[1].award(close[2])], cost + close[0])
+        units = offer.capacity
+        if units * offer.per_unit >= remaining:
+            break
+        if units < offer.moq:
+            continue
+        plan = plan + [offer.award(units)]
+        cost += units * offer.unit_price
+        remaining -= units * offer.per_unit
+    if best is not None:
+        return best[0], best[1], Decimal(0)
+    # nobody closes the gap: everything that can be ordered is, the rest is short
+    return plan, cost, max(remaining, Decimal(0))
+
 
 class QuotationComparison:
     """Utility class for comparing supplier quotations"""
@@ -13,103 +100,88 @@ class QuotationComparison:
     def __init__(self, rfq):
         self.rfq = rfq
         self.quotations = SupplierQuotation.objects.filter(rfq=rfq, status='submitted')
-    
+        self._lines = None
+
+    def _load(self):
+        """[(rfq item, required base units, [offer ranked by cost for it])] - two queries."""
+        if self._lines is not None:
+            return self._lines
+        offers = defaultdict(list)
+        for item in SupplierQuotationItem.objects.filter(quotation__in=self.quotations).select_related(
+            'quotation__supplier__partner', 'quoted_uom',
+        ).order_by('pk'):
+            offers[item.product_id].append(_Offer(item))
+
+        self._lines = []
+        for rfq_item in RFQItem.objects.filter(rfq=self.rfq).select_related('product', 'required_uom').order_by('pk'):
+            factor = rfq_item.required_uom.conversion_factor if rfq_item.required_uom else _ONE
+            required = rfq_item.quantity * (factor or _ONE)
+            ranked = []
+            for offer in offers.get(rfq_item.product_id, ()):
+                units = offer.units_for(required)
+                ranked.append((units * offer.unit_price, offer.base_unit_price, offer.lead_time, offer, units))
+            ranked.sort(key=lambda row: row[:3])
+            self._lines.append((rfq_item, required, ranked))
+        return self._lines
+
     def get_comparison_matrix(self):
         """Generate a comparison matrix for all quotations"""
         comparison_data = []
-        
-        for rfq_item in self.rfq.items.all():
-            product_comparison = {
+        for rfq_item, required, ranked in self._load():
+            quotations = []
+            for rank, (cost, base_price, lead_time, offer, units) in enumerate(ranked, start=1):
+                item = offer.item
+                quotations.append({
+                    'supplier': offer.supplier,
+                    'quotation': offer.quotation,
+                    'quotation_item_id': item.pk,
+                    'quoted_qty': item.quantity,
+                    'quoted_uom': item.quoted_uom,
+                    'unit_price': item.unit_price,
+                    'base_unit_price': base_price,
+                    'package_qty': item.package_qty,
+                    'minimum_order_qty': item.minimum_order_qty,
+                    'total_amount': item.total_amount,
+                    'lead_time': lead_time,
+                    'payment_terms': offer.quotation.payment_terms,
+                    'valid_until': offer.quotation.valid_until,
+                    'rank': rank,
+                    'cost_for_required_qty': {
+                        'packages_needed': units,
+                        'total_cost': cost,
+                        'actual_qty_received': units * offer.per_unit,
+                        'unit_cost_for_required_qty': cost / required if required > 0 else 0,
+                    },
+                })
+            # Sort by base unit price, as the matrix always has; 'rank' keeps the cost order
+            quotations.sort(key=lambda quote: quote['base_unit_price'])
+            comparison_data.append({
+                'rfq_item_id': rfq_item.pk,
                 'product': rfq_item.product,
                 'required_qty': rfq_item.quantity,
+                'required_base_qty': required,
                 'required_uom': rfq_item.required_uom,
                 'target_price': rfq_item.target_unit_price,
-                'quotations': []
-            }
-            
-            # Get quotations for this product
-            quotation_items = SupplierQuotationItem.objects.filter(
-                quotation__in=self.quotations,
-                product=rfq_item.product
-            ).select_related('quotation__supplier')
-            
-            for quote_item in quotation_items:
-                quote_data = {
-                    'supplier': quote_item.quotation.supplier,
-                    'quotation': quote_item.quotation,
-                    'quoted_qty': quote_item.quantity,
-                    'quoted_uom': quote_item.quoted_uom,
-                    'unit_price': quote_item.unit_price,
-                    'base_unit_price': quote_item.base_unit_price,
-                    'package_qty': quote_item.package_qty,
-                    'minimum_order_qty': quote_item.minimum_order_qty,
-                    'total_amount': quote_item.total_amount,
-                    'lead_time': quote_item.lead_time_days,
-                    'payment_terms': quote_item.quotation.payment_terms,
-                    'valid_until': quote_item.quotation.valid_until,
-                    'cost_for_required_qty': self._calculate_cost_for_required_qty(
-                        quote_item, rfq_item.quantity
-                    )
-                }
-                product_comparison['quotations'].append(quote_data)
-            
-            # Sort by base unit price
-            product_comparison['quotations'].sort(
-                key=lambda x: x['base_unit_price']
-            )
-            
-            comparison_data.append(product_comparison)
-        
+                'quotations': quotations,
+            })
         return comparison_data
     
-    def _calculate_cost_for_required_qty(self, quote_item, required_qty):
-        """Calculate actual cost for the required quantity"""
-        # Convert required quantity to supplier's UOM
-        if quote_item.package_qty > 0:
-            packages_needed = required_qty / quote_item.package_qty
-            # Round up to minimum order quantity
-            packages_needed = max(packages_needed, quote_item.minimum_order_qty)
-            total_cost = packages_needed * quote_item.unit_price
-            actual_qty_received = packages_needed * quote_item.package_qty
-            
-            return {
-                'packages_needed': packages_needed,
-                'total_cost': total_cost,
-                'actual_qty_received': actual_qty_received,
-                'unit_cost_for_required_qty': total_cost / required_qty if required_qty > 0 else 0
-            }
-        else:
-            return {
-                'packages_needed': required_qty,
-                'total_cost': required_qty * quote_item.unit_price,
-                'actual_qty_received': required_qty,
-                'unit_cost_for_required_qty': quote_item.unit_price
-            }
-    
     def get_best_quotation_analysis(self):
         """Analyze and recommend best quotations"""
-        comparison_matrix = self.get_comparison_matrix()
         recommendations = []
-        
-        for product_data in comparison_matrix:
-            if not product_data['quotations']:
+        for product_data in self.get_comparison_matrix():
+            quotes = product_data['quotations']
+            if not quotes:
                 continue
-            
+
             # Find best options by different criteria
-            best_price = min(product_data['quotations'], 
-                           key=lambda x: x['base_unit_price'])
-            best_lead_time = min(product_data['quotations'], 
-                               key=lambda x: x['lead_time'])
-            best_total_cost = min(product_data['quotations'], 
-                                key=lambda x: x['cost_for_required_qty']['total_cost'])
-            
-            # Calculate savings
-            worst_price = max(product_data['quotations'], 
-                            key=lambda x: x['base_unit_price'])
-            potential_savings = (worst_price['base_unit_price'] - 
-                               best_price['base_unit_price']) * product_data['required_qty']
+            best_price = quotes[0]
+            worst_price = quotes[-1]
+            best_lead_time = min(quotes, key=lambda x: x['lead_time'])
+            best_total_cost = min(quotes, key=lambda x: x['rank'])
+            potential_savings = (worst_price['base_unit_price'] - best_price['base_unit_price']) * product_data['required_base_qty']
             
-            recommendation = {
+            recommendations.append({
                 'product': product_data['product'],
                 'best_price_supplier': best_price['supplier'],
                 'best_price_per_unit': best_price['base_unit_price'],
@@ -121,11 +193,37 @@ class QuotationComparison:
                 'recommendation': self._generate_recommendation(
                     best_price, best_lead_time, best_total_cost, product_data
                 )
-            }
-            
-            recommendations.append(recommendation)
-        
+            })
         return recommendations
+
+    def get_award_split(self):
+        """The cheapest award of every RFQ line across suppliers (see the module
+        docstring), with what the cheapest single supplier would have cost. Plain ids,
+        names and Decimals, ready for a JSON response."""
+        lines, totals, total_cost = [], defaultdict(Decimal), Decimal(0)
+        for rfq_item, required, ranked in self._load():
+            offers = sorted((row[3] for row in ranked), key=lambda offer: (offer.base_unit_price, offer.lead_time))
+            maximum = None
+            if rfq_item.maximum_qty_acceptable and rfq_item.maximum_qty_acceptable > 0:
+                factor = rfq_item.required_uom.conversion_factor if rfq_item.required_uom else _ONE
+                maximum = rfq_item.maximum_qty_acceptable * (factor or _ONE)
+            awards, cost, shortfall = _split(required, offers, maximum)
+            single = next((row[0] for row in ranked if row[4] <= row[3].capacity), None)
+            for award in awards:
+                totals[award['supplier_id']] += award['cost']
+            total_cost += cost
+            lines.append({
+                'rfq_item_id': rfq_item.pk,
+                'product_id': rfq_item.product_id,
+                'product_name': rfq_item.product.name,
+                'required_base_qty': required,
+                'awards': awards,
+                'total_cost': cost,
+                'single_supplier_cost': single,
+                'savings': single - cost if single is not None and not shortfall else None,
+                'shortfall': shortfall,
+            })
+        return {'lines': lines, 'supplier_totals': dict(totals), 'total_cost': total_cost}
     
     def _generate_recommendation(self, best_price, best_lead_time, best_total_cost, product_data):
         """Generate recommendation based on analysis"""
@@ -137,31 +235,29 @@ class QuotationComparison:
             score = 0
             
             # Price score (40% weight)
-            if quote == best_price:
+            if quote is best_price or not quote['base_unit_price']:
                 score += 40
             else:
-                price_ratio = best_price['base_unit_price'] / quote['base_unit_price']
-                score += 40 * price_ratio
+                score += 40 * best_price['base_unit_price'] / quote['base_unit_price']
             
             # Lead time score (30% weight)
-            if quote == best_lead_time:
+            if quote is best_lead_time:
                 score += 30
             elif quote['lead_time'] > 0:
-                time_ratio = best_lead_time['lead_time'] / quote['lead_time']
-                score += 30 * time_ratio
+                score += 30 * Decimal(best_lead_time['lead_time']) / quote['lead_time']
             
             # Total cost score (30% weight)
-            if quote == best_total_cost:
+            quote_cost = quote['cost_for_required_qty']['total_cost']
+            if quote is best_total_cost or not quote_cost:
                 score += 30
             else:
-                cost_ratio = (best_total_cost['cost_for_required_qty']['total_cost'] / 
-                            quote['cost_for_required_qty']['total_cost'])
-                score += 30 * cost_ratio
+                score += 30 * best_total_cost['cost_for_required_qty']['total_cost'] / quote_cost
             
-            scores[supplier] = {
-                'score': score,
-                'quotation': quote
-            }
+            if supplier not in scores or score > scores[supplier]['score']:
+                scores[supplier] = {
+                    'score': score,
+                    'quotation': quote
+                }
         
         # Get highest scoring supplier
         recommended = max(scores.items(), key=lambda x: x[1]['score'])
@@ -178,11 +274,11 @@ class QuotationComparison:
         """Generate reasons for recommendation"""
         reasons = []
         
-        if quote == best_price:
+        if quote is best_price:
             reasons.append("Best unit price")
-        if quote == best_lead_time:
+        if quote is best_lead_time:
             reasons.append("Fastest delivery")
-        if quote == best_total_cost:
+        if quote is best_total_cost:
             reasons.append("Best total cost for required quantity")
         
         # Add quality indicators
@@ -0,0 +1,510 @@
+"""
+Supplier scorecards: monthly rollups of how each supplier delivers, what passes
+inspection, how its bills compare with its purchase orders and how fast it is paid.
+
+Supplier.get_average_payment_days() walked every completed payment in Python, fetching
+each one's bill; get_total_purchases() re-aggregated the bills on every call; and
+update_performance_ratings() did nothing, so the supplier ratings and the SupplierLeadTime
+matrix MRP plans with were whatever someone last typed in. Here every (supplier, month)
+gets one SupplierMonthlyScore row:
+
+- deliveries: the GRNs received that month (draft and cancelled ones aside), how many were
+  against a PO with an expected_delivery_date and arrived by it, and the days from the PO's
+  order_date to receipt;
+- quality: the inspected and passed quantities of the QualityInspectionResults recorded
+  that month on the supplier's GRNs;
+- spend and price: the approved/paid bills dated that month, and on the lines of those
+  purchase.matching has matched against a PO, the amount at PO price and the recorded
+  price variance (price_variance x quantity);
+- payments: the completed payments against a bill made that month, and the days from
+  bill date to payment.
+
+compute() builds the rows for any set of suppliers and months in five queries (the GRN
+one returns rows - its days cross a DateTimeField and a DateField, which SQL can't
+subtract portably - the other four are grouped by supplier and month). Maintenance is
+the analytics.facts scheme at month granularity: saving or deleting a GRN, inspection
+result, bill, bill line or payment marks its (company, supplier, month) dirty - the old
+and the new month when it is re-dated - and once the transaction commits the dirty
+months are recomputed together, then apply_ratings() re-derives the touched suppliers'
+ratings and lead times. rebuild() (`manage.py rebuild_supplier_scorecards`) recomputes a
+company's whole history; ensure_built() runs it the first time a company's scorecards
+are read. Supplier's own methods (supplier_totals(), apply_ratings(build=False)) never
+trigger it.
+
+From the last RATING_MONTHS months of rollups:
+
+- Supplier.delivery_rating is the on-time rate / 10, quality_rating the pass rate / 10
+  and price_rating 10 less the percentage billed over PO prices, overall_rating their
+  mean as in Supplier.save(); a rating with nothing to measure is left as it was. The
+  rating columns hold at most 9.99, so that is the top score.
+- SupplierLeadTime gets, per (supplier, product) received in the window against a PO,
+  the average/min/max order-to-receipt days, deliveries, late deliveries and on-time
+  rate, and where the product was inspected its pass rate / 10 as quality_rating (new
+  rows are created for pairs that had none).
+- record_ratings() stores a crm.SupplierRating per supplier for a chosen period.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from .models import SupplierMonthlyScore, SupplierScorecardState
+
+RATING_MONTHS = 12
+BATCH_SIZE = 1000
+BILL_STATUSES = ('approved', 'paid')
+EXCLUDED_GRN_STATUSES = ('draft', 'cancelled')
+SUMMED = (
+    'grn_count', 'due_deliveries', 'on_time_deliveries', 'lead_time_days', 'lead_time_count', 'inspected_quantity',
+    'passed_quantity', 'bill_count', 'spend', 'po_priced_amount', 'price_variance_amount', 'payment_count',
+    'payment_days',
+)
+_TEN = Decimal(10)
+_MAX_RATING = Decimal('9.99')
+
+_local = threading.local()
+
+
+def month_of(value):
+    if isinstance(value, datetime):
+        value = timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value.replace(day=1) if value else None
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _months_back(today, months):
+    month = month_of(today)
+    for _ in range(months - 1):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return month
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _percent(part, whole):
+    return round(float(part) / float(whole) * 100, 2) if whole else None
+
+
+def compute(company_id, supplier_ids=None, start=None, end=None):
+    """{(supplier id, month): {field: value}} for the company's suppliers (or just
+    `supplier_ids`) over the months start..end (either optional)."""
+    from .models import Bill, BillItem, GoodsReceiptNote, PurchasePayment, QualityInspectionResult
+
+    def bounded(qs, supplier_field, date_field, aware=False):
+        if supplier_ids is not None:
+            qs = qs.filter(**{f'{supplier_field}__in': supplier_ids})
+        if start:
+            qs = qs.filter(**{f'{date_field}__gte': _aware(start) if aware else start})
+        if end:
+            qs = qs.filter(**{f'{date_field}__lt': _aware(_next_month(end)) if aware else _next_month(end)})
+        return qs
+
+    rows = defaultdict(lambda: dict.fromkeys(SUMMED, 0))
+    grns = bounded(
+        GoodsReceiptNote.objects.filter(company_id=company_id).exclude(status__in=EXCLUDED_GRN_STATUSES),
+        'supplier_id', 'received_date', aware=True,
+    )
+    for supplier_id, received, ordered, expected in grns.values_list(
+        'supplier_id', 'received_date', 'purchase_order__order_date', 'purchase_order__expected_delivery_date',
+    ):
+        day = timezone.localdate(received)
+        row = rows[(supplier_id, day.replace(day=1))]
+        row['grn_count'] += 1
+        if ordered:
+            row['lead_time_days'] += max((day - ordered).days, 0)
+            row['lead_time_count'] += 1
+        if expected:
+            row['due_deliveries'] += 1
+            row['on_time_deliveries'] += day <= expected
+
+    month = TruncMonth('inspected_at', output_field=DateField())
+    for row in bounded(
+        QualityInspectionResult.objects.filter(inspection__company_id=company_id),
+        'grn_item__grn__supplier_id', 'inspected_at', aware=True,
+    ).annotate(month=month).values('grn_item__grn__supplier_id', 'month').annotate(
+        inspected=Sum('inspected_quantity'), passed=Sum('passed_quantity'),
+    ):
+        target = rows[(row['grn_item__grn__supplier_id'], row['month'])]
+        target['inspected_quantity'], target['passed_quantity'] = row['inspected'], row['passed']
+
+    bills = Bill.objects.filter(company_id=company_id, status__in=BILL_STATUSES)
+    month = TruncMonth('bill_date', output_field=DateField())
+    for row in bounded(bills, 'supplier_id', 'bill_date').annotate(month=month).values('supplier_id', 'month').annotate(
+        count=Count('id'), spend=Sum('total_amount'),
+    ):
+        target = rows[(row['supplier_id'], row['month'])]
+        target['bill_count'], target['spend'] = row['count'], row['spend']
+
+    month = TruncMonth('bill__bill_date', output_field=DateField())
+    for row in bounded(
+        BillItem.objects.filter(bill__in=bills.filter(purchase_order__isnull=False, matched_at__isnull=False)),
+        'bill__supplier_id', 'bill__bill_date',
+    ).annotate(month=month).values('bill__supplier_id', 'month').annotate(
+        billed=Sum(F('quantity') * F('unit_price')), variance=Sum(F('quantity') * F('price_variance')),
+    ):
+        target = rows[(row['bill__supplier_id'], row['month'])]
+        target['po_priced_amount'] = row['billed'] - row['variance']
+        target['price_variance_amount'] = row['variance']
+
+    month = TruncMonth('actual_date', output_field=DateField())
+    for row in bounded(
+        PurchasePayment.objects.filter(company_id=company_id, status='completed', bill__isnull=False, actual_date__isnull=False),
+        'supplier_id', 'actual_date',
+    ).annotate(month=month).values('supplier_id', 'month').annotate(
+        count=Count('id'),
+        days=Sum(ExpressionWrapper(F('actual_date') - F('bill__bill_date'), output_field=DurationField())),
+    ):
+        target = rows[(row['supplier_id'], row['month'])]
+        target['payment_count'], target['payment_days'] = row['count'], row['days'].days if row['days'] else 0
+
+    return rows
+
+
+def _score(company_id, key, values):
+    return SupplierMonthlyScore(company_id=company_id, supplier_id=key[0], month=key[1], **values)
+
+
+def _write(company_id, rows):
+    SupplierMonthlyScore.objects.bulk_create(
+        [_score(company_id, key, values) for key, values in rows.items()], batch_size=BATCH_SIZE,
+        update_conflicts=True, unique_fields=['supplier', 'month'], update_fields=[*SUMMED, 'updated_at'],
+    )
+
+
+def refresh(company_id, keys):
+    """Recomputes the company's (supplier id, month) `keys`."""
+    keys = set(keys)
+    if not keys:
+        return
+    months = [month for _, month in keys]
+    rows = compute(company_id, {supplier_id for supplier_id, _ in keys}, min(months), max(months))
+    gone = Q()
+    for key in keys - rows.keys():
+        gone |= Q(supplier_id=key[0], month=key[1])
+    with transaction.atomic():
+        if gone:
+            SupplierMonthlyScore.objects.filter(gone, company_id=company_id).delete()
+        _write(company_id, {key: values for key, values in rows.items() if key in keys})
+
+
+def rebuild(company):
+    """Recomputes the company's whole scorecard history and re-derives every supplier's
+    ratings and lead times. Returns the number of (supplier, month) rows."""
+    company_id = getattr(company, 'pk', company)
+    rows = compute(company_id)
+    with transaction.atomic():
+        SupplierMonthlyScore.objects.filter(company_id=company_id).delete()
+        _write(company_id, rows)
+        SupplierScorecardState.objects.update_or_create(company_id=company_id, defaults={'built_at': timezone.now()})
+        apply_ratings(company_id)
+    return len(rows)
+
+
+def ensure_built(company):
+    """Builds the company's history once (see analytics.facts.ensure_built() for the
+    locking). Only the scorecard reads below call this - `manage.py
+    rebuild_supplier_scorecards` builds it up front."""
+    company_id = getattr(company, 'pk', company)
+    if SupplierScorecardState.objects.filter(company_id=company_id).exists():
+        return
+    from user_auth.models import Company
+    with transaction.atomic():
+        Company.objects.select_for_update(no_key=True).filter(pk=company_id).first()
+        if not SupplierScorecardState.objects.filter(company_id=company_id).exists():
+            rebuild(company_id)
+
+
+def supplier_totals(supplier, year=None):
+    """{field: sum} over one supplier's months (one year's, or all). Read from the
+    rollups once the company's history is built; until then computed on the spot for
+    this supplier alone and not stored - Supplier's own methods use this, and a model
+    method must never set off a company-wide rebuild."""
+    if SupplierScorecardState.objects.filter(company_id=supplier.company_id).exists():
+        scores = SupplierMonthlyScore.objects.filter(supplier=supplier)
+        if year:
+            scores = scores.filter(month__year=year)
+        totals = scores.aggregate(**{field: Sum(field) for field in SUMMED})
+        return {field: totals[field] or 0 for field in SUMMED}
+    start, end = (date(year, 1, 1), date(year, 12, 1)) if year else (None, None)
+    rows = compute(supplier.company_id, [supplier.pk], start, end).values()
+    return {field: sum(row[field] for row in rows) for field in SUMMED}
+
+
+# --- reading -----------------------------------------------------------------------
+
+def _card(totals):
+    card = {field: totals.get(field) or 0 for field in SUMMED}
+    card.update(
+        on_time_rate=_percent(card['on_time_deliveries'], card['due_deliveries']),
+        quality_pass_rate=_percent(card['passed_quantity'], card['inspected_quantity']),
+        price_variance_percent=_percent(card['price_variance_amount'], card['po_priced_amount']),
+        average_lead_time_days=round(card['lead_time_days'] / card['lead_time_count'], 1) if card['lead_time_count'] else None,
+        average_payment_days=round(card['payment_days'] / card['payment_count'], 1) if card['payment_count'] else None,
+    )
+    return card
+
+
+def scorecards(company, supplier_ids=None, start=None, end=None, build=True):
+    """{supplier id: scorecard} summed over the months start..end (default: the last
+    RATING_MONTHS months) - one grouped query over the rollups. With build=False a
+    company whose history isn't built yet gets its figures computed on the spot and
+    not stored, as supplier_totals() does."""
+    company_id = getattr(company, 'pk', company)
+    start = start or _months_back(timezone.localdate(), RATING_MONTHS)
+    if not build and not SupplierScorecardState.objects.filter(company_id=company_id).exists():
+        totals = defaultdict(lambda: dict.fromkeys(SUMMED, 0))
+        for (supplier_id, _), row in compute(company_id, supplier_ids, month_of(start), end and month_of(end)).items():
+            for field in SUMMED:
+                totals[supplier_id][field] += row[field]
+        return {supplier_id: _card(row) for supplier_id, row in totals.items()}
+    ensure_built(company_id)
+    scores = SupplierMonthlyScore.objects.filter(company_id=company_id, month__gte=month_of(start))
+    if end:
+        scores = scores.filter(month__lte=month_of(end))
+    if supplier_ids is not None:
+        scores = scores.filter(supplier_id__in=supplier_ids)
+    return {
+        row['supplier_id']: _card(row)
+        for row in scores.values('supplier_id').annotate(**{field: Sum(field) for field in SUMMED})
+    }
+
+
+def monthly(supplier, months=RATING_MONTHS):
+    """[scorecard per month] of one supplier, oldest first."""
+    ensure_built(supplier.company_id)
+    start = _months_back(timezone.localdate(), months)
+    return [
+        {'month': score.month.isoformat(), **_card({field: getattr(score, field) for field in SUMMED})}
+        for score in SupplierMonthlyScore.objects.filter(supplier=supplier, month__gte=start).order_by('month')
+    ]
+
+
+def _scaled(percent):
+    return None if percent is None else min(max(Decimal(str(percent)) / _TEN, Decimal(0)), _MAX_RATING).quantize(Decimal('0.01'))
+
+
+def ratings(card):
+    """{'quality_rating', 'delivery_rating', 'price_rating'} on the 0-10 scale, None
+    where the card has nothing to measure."""
+    variance = card['price_variance_percent']
+    return {
+        'quality_rating': _scaled(card['quality_pass_rate']),
+        'delivery_rating': _scaled(card['on_time_rate']),
+        'price_rating': None if variance is None else _scaled(100 - variance * 10),
+    }
+
+
+# --- derived ratings and lead times -------------------------------------------------
+
+def apply_ratings(company_id, supplier_ids=None, build=True):
+    """Re-derives the ratings of the company's suppliers (or `supplier_ids`) and their
+    SupplierLeadTime rows from the last RATING_MONTHS months. build=False (Supplier's
+    update_performance_ratings()) never sets off the history rebuild - see scorecards()."""
+    from .models import Supplier
+
+    cards = scorecards(company_id, supplier_ids, build=build)
+    suppliers = Supplier.all_objects.filter(company_id=company_id, pk__in=cards)
+    changed = []
+    for supplier in suppliers:
+        values = {key: value for key, value in ratings(cards[supplier.pk]).items() if value is not None}
+        if not values:
+            continue
+        for key, value in values.items():
+            setattr(supplier, key, value)
+        given = [r for r in (supplier.quality_rating, supplier.delivery_rating, supplier.price_rating, supplier.service_rating) if r > 0]
+        supplier.overall_rating = (sum(given) / len(given)).quantize(Decimal('0.01')) if given else Decimal(0)
+        changed.append(supplier)
+    Supplier.all_objects.bulk_create(
+        changed, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['pk'],
+        update_fields=['quality_rating', 'delivery_rating', 'price_rating', 'overall_rating', 'updated_at'],
+    )
+    _apply_lead_times(company_id, supplier_ids)
+
+
+def _apply_lead_times(company_id, supplier_ids):
+    from manufacturing.models import SupplierLeadTime
+    from .models import GRNItem, QualityInspectionResult
+
+    start = _months_back(timezone.localdate(), RATING_MONTHS)
+    items = GRNItem.objects.filter(
+        grn__company_id=company_id, grn__received_date__gte=_aware(start), grn__purchase_order__isnull=False,
+        product__isnull=False,
+    ).exclude(grn__status__in=EXCLUDED_GRN_STATUSES)
+    if supplier_ids is not None:
+        items = items.filter(grn__supplier_id__in=supplier_ids)
+    deliveries = defaultdict(dict)  # (partner, product) -> {grn id: (lead days, late or None)}
+    for grn_id, partner_id, product_id, received, ordered, expected in items.values_list(
+        'grn_id', 'grn__supplier__partner_id', 'product_id', 'grn__received_date', 'grn__purchase_order__order_date',
+        'grn__purchase_order__expected_delivery_date',
+    ):
+        day = timezone.localdate(received)
+        deliveries[(partner_id, product_id)][grn_id] = (max((day - ordered).days, 0), None if expected is None else day > expected)
+    inspections = QualityInspectionResult.objects.filter(
+        inspection__company_id=company_id, inspected_at__gte=_aware(start), grn_item__product__isnull=False,
+    )
+    if supplier_ids is not None:
+        inspections = inspections.filter(grn_item__grn__supplier_id__in=supplier_ids)
+    quality = {
+        (row['grn_item__grn__supplier__partner_id'], row['grn_item__product_id']): _scaled(_percent(row['passed'], row['inspected']))
+        for row in inspections.values('grn_item__grn__supplier__partner_id', 'grn_item__product_id').annotate(
+            inspected=Sum('inspected_quantity'), passed=Sum('passed_quantity'),
+        )
+    }
+
+    rated, unrated = [], []
+    for (partner_id, product_id), by_grn in deliveries.items():
+        days = [lead for lead, _ in by_grn.values()]
+        due = [late for _, late in by_grn.values() if late is not None]
+        row = SupplierLeadTime(
+            company_id=company_id, supplier_id=partner_id, product_id=product_id,
+            lead_time_days=round(sum(days) / len(days)), min_lead_time_days=min(days), max_lead_time_days=max(days),
+            actual_deliveries=len(by_grn), late_deliveries=sum(due),
+            on_time_delivery_rate=Decimal(str(_percent(len(due) - sum(due), len(due)) if due else 100)),
+        )
+        if quality.get((partner_id, product_id)) is not None:
+            row.quality_rating = quality[(partner_id, product_id)]
+            rated.append(row)
+        else:
+            unrated.append(row)
+    fields = [
+        'lead_time_days', 'min_lead_time_days', 'max_lead_time_days', 'actual_deliveries', 'late_deliveries',
+        'on_time_delivery_rate', 'last_updated',
+    ]
+    # Two statements: a pair nobody inspected keeps the quality_rating it has.
+    for rows, update_fields in ((rated, [*fields, 'quality_rating']), (unrated, fields)):
+        SupplierLeadTime.objects.bulk_create(
+            rows, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['company', 'supplier', 'product'],
+            update_fields=update_fields,
+        )
+
+
+def record_ratings(company, start, end, user=None):
+    """Stores a crm.SupplierRating for every supplier with activity in the months
+    start..end, from the rollups. Returns the ratings created."""
+    from crm.models import SupplierRating
+
+    created = []
+    for supplier_id, card in scorecards(company, start=start, end=end).items():
+        values = {key: value or Decimal(0) for key, value in ratings(card).items()}
+        given = [value for value in values.values() if value > 0]
+        created.append(SupplierRating(
+            company=company, supplier_id=supplier_id, rating_period_start=month_of(start),
+            rating_period_end=_next_month(month_of(end)) - timedelta(days=1), rated_by=user,
+            overall_rating=sum(given) / len(given) if given else Decimal(0),
+            comments='Computed from the supplier scorecard.', **values,
+        ))
+    return SupplierRating.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+# --- incremental maintenance -------------------------------------------------------
+
+def _pending():
+    if not hasattr(_local, 'keys'):
+        _local.keys, _local.bill_ids, _local.grn_items = set(), set(), set()
+    return _local.keys, _local.bill_ids, _local.grn_items
+
+
+def _schedule(keys=(), bill_ids=(), grn_items=()):
+    pending_keys, pending_bills, pending_grn_items = _pending()
+    pending_keys.update((c, s, m) for c, s, m in keys if c and s and m)
+    pending_bills.update(pk for pk in bill_ids if pk)
+    pending_grn_items.update((pk, m) for pk, m in grn_items if pk and m)
+    # Same drain-on-first-callback scheme as analytics.facts._schedule().
+    transaction.on_commit(_flush, robust=True)
+
+
+def mark(company_id, supplier_id, day):
+    """Recomputes (company, supplier, month of `day`) after the current transaction
+    commits - for writes that bypass the signals below (bulk updates)."""
+    _schedule(keys=[(company_id, supplier_id, month_of(day))])
+
+
+def _flush():
+    from .models import Bill, GRNItem
+    keys, bill_ids, grn_items = _pending()
+    if bill_ids:
+        keys.update(
+            (company_id, supplier_id, month_of(bill_date))
+            for company_id, supplier_id, bill_date in Bill.all_objects.filter(pk__in=bill_ids).values_list(
+                'company_id', 'supplier_id', 'bill_date',
+            )
+        )
+    if grn_items:
+        months = dict(grn_items)
+        keys.update(
+            (company_id, supplier_id, months[pk])
+            for pk, company_id, supplier_id in GRNItem.objects.filter(pk__in=months).values_list(
+                'pk', 'grn__company_id', 'grn__supplier_id',
+            )
+        )
+    by_company = defaultdict(set)
+    for company_id, supplier_id, month in keys:
+        by_company[company_id].add((supplier_id, month))
+    keys.clear()
+    bill_ids.clear()
+    grn_items.clear()
+    # A company not built yet gets its whole history built on first read instead.
+    built = set(SupplierScorecardState.objects.filter(company_id__in=by_company).values_list('company_id', flat=True))
+    for company_id, company_keys in sorted(by_company.items()):
+        if company_id not in built:
+            continue
+        refresh(company_id, company_keys)
+        apply_ratings(company_id, {supplier_id for supplier_id, _ in company_keys})
+
+
+_DATE_FIELDS = {'goodsreceiptnote': 'received_date', 'bill': 'bill_date', 'purchasepayment': 'actual_date'}
+
+
+def _key(sender, instance):
+    d = instance.__dict__
+    return (d.get('company_id'), d.get('supplier_id'), month_of(d.get(_DATE_FIELDS[sender._meta.model_name])))
+
+
+def _remember_key(sender, instance, **kwargs):
+    instance._scorecard_key = _key(sender, instance)
+
+
+def _document_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    key = _key(sender, instance)
+    _schedule(keys=[getattr(instance, '_scorecard_key', (None, None, None)), key])
+    instance._scorecard_key = key
+
+
+def _bill_item_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    _schedule(bill_ids=[instance.bill_id])
+
+
+def _inspection_result_changed(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    _schedule(grn_items=[(instance.grn_item_id, month_of(instance.inspected_at or timezone.now()))])
+
+
+def connect_signals():
+    documents = ('purchase.GoodsReceiptNote', 'purchase.Bill', 'purchase.PurchasePayment')
+    for sender in documents:
+        post_init.connect(_remember_key, sender=sender, dispatch_uid=f'purchase_scorecards_init_{sender}')
+    for signal in (post_save, post_delete):
+        name = 'save' if signal is post_save else 'delete'
+        for sender in documents:
+            signal.connect(_document_changed, sender=sender, dispatch_uid=f'purchase_scorecards_{sender}_{name}')
+        signal.connect(_bill_item_changed, sender='purchase.BillItem', dispatch_uid=f'purchase_scorecards_item_{name}')
+        signal.connect(
+            _inspection_result_changed, sender='purchase.QualityInspectionResult',
+            dispatch_uid=f'purchase_scorecards_inspection_{name}',
+        )
@@ -5,12 +5,256 @@ immediately at bill-creation time via vendor_invoice_create()'s optional per-lin
 `received: true` (the shop already has the phones in hand when recording the invoice).
 Extracted so both call sites share one set of IMEI-format/uniqueness checks and one
 StockItem/average-cost bump, instead of two copies drifting apart over time.
+
+Receiving is batched: a container of 2,000 phones used to cost an exists() and an
+INSERT per IMEI plus two StockItem saves and a cost layer per line. receive_bill_lines()
+takes a whole shipment - every line of the call - and:
+
+- validates every line and code first (format, over-receipt, duplicates within the
+  shipment), then checks all the codes against ProductTracking in one `__in` query, so
+  a bad code fails the call before anything is written;
+- creates the tracking units with one bulk INSERT (core.pk_conflict's bulk fallback
+  keeps the desktop-replay PK contract);
+- reads the shipment's StockItems in one query, creates the missing ones in one, adds
+  one cost layer per line in one, applies every line's quantity and average cost to
+  its item in memory (StockItem.apply_receipt_cost() - the same arithmetic as
+  update_average_cost()) and writes items and bill lines back as primary-key upserts.
+
+The legacy GRN path is batched the same way: lock_grn_items() does what
+GRNItem.create_inventory_lock() did per line - the StockItem, the locked 'grn_receipt'
+movement, the line's lock and one per tracking item - for any number of lines with a
+fixed number of queries; inside deferred_grn_locks() GRNItem.save() queues its line
+instead and the whole GRN is locked in one batch at the end.
+
+Bulk writes send no post_save, so both paths finish as a bulk import does
+(core.imports.Importer.finish()): the dashboard metrics and inventory analytics of the
+written models are invalidated for the company.
 """
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
 from decimal import Decimal
 
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
 from products.models import ProductTracking
 from inventory.models import StockItem
 
+BATCH_SIZE = 1000
+TRACKED_METHODS = ('imei', 'serial', 'barcode')
+STOCK_FIELDS = [
+    'quantity', 'locked_quantity', 'available_quantity', 'average_cost', 'total_cost_value', 'last_purchase_cost',
+    'category', 'stock_status', 'purchase_status', 'last_movement_date', 'last_received_date', 'updated_at',
+]
+
+_local = threading.local()
+
+
+def _finish_bulk_write(company_id, labels):
+    """What post_save would have triggered for bulk-written `labels`."""
+    from django.apps import apps
+    from core.dashboard_metrics import invalidate_model
+    from core.imports import records_imported
+    for label in labels:
+        invalidate_model(label, company_id)
+        records_imported.send(sender=apps.get_model(label), company_id=company_id)
+
+
+def check_new_codes(entries):
+    """Raises ValueError unless every (product, code) in `entries` is unique within
+    them and unknown to ProductTracking - soft-deleted units included, since the
+    database's unique constraints include them. One query for all of them."""
+    seen, by_field = set(), defaultdict(set)
+    for product, code in entries:
+        field = product.get_tracking_field_name()
+        if (field, code) in seen:
+            raise ValueError(f'{product.get_tracking_method_display()} "{code}" appears more than once in this shipment.')
+        seen.add((field, code))
+        by_field[field].add(code)
+    if not by_field:
+        return
+    query = Q()
+    for field, codes in by_field.items():
+        query |= Q(**{f'{field}__in': codes})
+    fields = list(by_field)
+    taken = set()
+    for row in ProductTracking.all_objects.filter(query).values_list(*fields):
+        taken.update((field, value) for field, value in zip(fields, row) if value in by_field[field])
+    for product, code in entries:
+        if (product.get_tracking_field_name(), code) in taken:
+            raise ValueError(f'{product.get_tracking_method_display()} "{code}" already exists in the system.')
+
+
+def _validated_codes(product, codes):
+    cleaned = []
+    for code in codes:
+        code = str(code).strip()
+        if not code:
+            raise ValueError(f'Empty tracking code for product {product.name}.')
+        if product.tracking_method == 'imei' and not (len(code) == 15 and code.isdigit()):
+            raise ValueError(
+                f'"{code}" is not a valid IMEI for {product.name} - an IMEI must be '
+                f'exactly 15 digits.'
+            )
+        cleaned.append(code)
+    return cleaned
+
+
+def _stock_items(company, pairs, defaults):
+    """{(product id, warehouse id): StockItem} for `pairs` (product, warehouse), the
+    missing ones created with `defaults` - two queries."""
+    products = {product.pk: product for product, _ in pairs}
+    items = {
+        (item.product_id, item.warehouse_id): item
+        for item in StockItem.objects.filter(
+            company=company, product_id__in=products, warehouse_id__in={warehouse.pk for _, warehouse in pairs},
+        )
+    }
+    missing = []
+    for product, warehouse in pairs:
+        if (product.pk, warehouse.pk) not in items:
+            item = items[(product.pk, warehouse.pk)] = StockItem(
+                company=company, product=product, warehouse=warehouse, **defaults(product),
+            )
+            item.refresh_derived_fields()
+            missing.append(item)
+    StockItem.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    for item in items.values():
+        item.product = products[item.product_id]
+    return items
+
+
+def _save_stock_items(items):
+    for item in items:
+        item.refresh_derived_fields()
+        item.updated_at = timezone.now()
+    StockItem.objects.bulk_create(
+        items, batch_size=BATCH_SIZE, update_conflicts=True, unique_fields=['pk'], update_fields=STOCK_FIELDS,
+    )
+
+
+def receive_bill_lines(lines, warehouse, company, user, tracking_pk_provider=None):
+    """
+    Receives a shipment: `lines` is a list of (bill_item, codes, quantity), each
+    received exactly as receive_bill_line() describes - tracking `codes` for
+    imei/serial/barcode products, a plain `quantity` otherwise (the product's
+    tracking_method decides). A bill line may appear more than once. Raises ValueError
+    on the first validation failure and writes nothing in that case.
+
+    `tracking_pk_provider` is called once per tracking code, in line and then code
+    order - the creation order desktop replays index their PKs by.
+
+    Returns (summaries: list[dict] one per line, tracking_unit_ids: list[int],
+    pk_conflicts: list[dict]).
+    """
+    from core.pk_conflict import bulk_create_with_pk_fallback
+    from inventory.models import CostLayer
+    from .models import BillItem
+
+    received = {}
+    plan = []
+    for bill_item, codes, quantity in lines:
+        product = bill_item.product
+        already = received.get(bill_item.pk, bill_item.received_quantity)
+        if product.tracking_method in TRACKED_METHODS:
+            codes = codes or []
+            if not codes:
+                raise ValueError(
+                    f'Product {product.name} requires individual codes '
+                    f'({product.get_tracking_method_display()}) - none provided.'
+                )
+            if already + len(codes) > bill_item.quantity:
+                raise ValueError(
+                    f'{product.name}: receiving {len(codes)} more would total '
+                    f'{already + len(codes)}, more than the '
+                    f'{bill_item.quantity} ordered on this line.'
+                )
+            codes = _validated_codes(product, codes)
+            count = Decimal(len(codes))
+        else:
+            codes = None
+            count = Decimal(str(quantity or '0'))
+            if count <= 0:
+                raise ValueError(f'quantity must be > 0 for product {product.name}.')
+            if already + count > bill_item.quantity:
+                raise ValueError(
+                    f'{product.name}: receiving {count} more would total '
+                    f'{already + count}, more than the '
+                    f'{bill_item.quantity} ordered on this line.'
+                )
+        received[bill_item.pk] = already + count
+        plan.append((bill_item, codes, count))
+    check_new_codes([(bill_item.product, code) for bill_item, codes, _ in plan for code in codes or ()])
+
+    units = []
+    for bill_item, codes, _ in plan:
+        for code in codes or ():
+            units.append(ProductTracking(
+                id=tracking_pk_provider() if tracking_pk_provider else None,
+                product=bill_item.product,
+                variant=bill_item.variant,
+                current_warehouse=warehouse,
+                supplier=bill_item.bill.supplier,
+                bill_item=bill_item,
+                purchase_price=bill_item.unit_price,
+                purchase_date=bill_item.bill.bill_date,
+                status='available',
+                created_by=user,
+                **{bill_item.product.get_tracking_field_name(): code}
+            ))
+    units, conflicts = bulk_create_with_pk_fallback(ProductTracking.objects, units)
+    pk_conflicts = [{'model': 'products.ProductTracking', **conflict} for conflict in conflicts]
+
+    # Dual-write a StockItem alongside ProductTracking (mirrors the existing GRN
+    # receiving pattern) - process_inventory_reduction() is StockItem-driven, so
+    # without this a tracked product sold via POS would silently never get its
+    # ProductTracking unit marked sold.
+    items = _stock_items(
+        company, [(bill_item.product, warehouse) for bill_item, _, _ in plan],
+        lambda product: {'stock_status': 'available', 'purchase_status': 'ready_for_use'},
+    )
+    now = timezone.now()
+    CostLayer.objects.bulk_create([
+        CostLayer(
+            company_id=company.pk, stock_item=items[(bill_item.product_id, warehouse.pk)], quantity=count,
+            remaining_quantity=count, unit_cost=(bill_item.unit_price or Decimal(0)).quantize(Decimal('0.01')),
+            received_at=now,
+        )
+        for bill_item, _, count in plan
+    ], batch_size=BATCH_SIZE)
+    layered = [item.pk for item in items.values() if item.valuation_method in ('fifo', 'lifo')]
+    layer_averages = {
+        row['stock_item']: (row['value'] / row['qty']).quantize(Decimal('0.01'))
+        for row in CostLayer.objects.filter(stock_item__in=layered, remaining_quantity__gt=0).values('stock_item').annotate(
+            qty=Sum('remaining_quantity'), value=Sum(F('remaining_quantity') * F('unit_cost')),
+        ) if row['qty']
+    } if layered else {}
+
+    summaries, bill_items = [], {}
+    for bill_item, codes, count in plan:
+        stock_item = items[(bill_item.product_id, warehouse.pk)]
+        # apply_receipt_cost() computes the new weighted average from the CURRENT
+        # (pre-addition) quantity + the incoming quantity - so quantity must only be
+        # incremented after that call, not before.
+        stock_item.apply_receipt_cost(count, bill_item.unit_price, layer_averages.get(stock_item.pk))
+        stock_item.quantity += count
+        # received already holds each line's running total, however many instances
+        bill_item.received_quantity = received[bill_item.pk]
+        bill_items[bill_item.pk] = bill_item
+        if codes is not None:
+            summaries.append({'bill_item_id': bill_item.id, 'product_name': bill_item.product.name, 'units_received': len(codes)})
+        else:
+            summaries.append({'bill_item_id': bill_item.id, 'product_name': bill_item.product.name, 'quantity_received': str(count)})
+    _save_stock_items(list(items.values()))
+    BillItem.objects.bulk_create(
+        list(bill_items.values()), update_conflicts=True, unique_fields=['pk'], update_fields=['received_quantity'],
+    )
+
+    _finish_bulk_write(company.pk, ['products.ProductTracking', 'inventory.StockItem', 'inventory.CostLayer'])
+    return summaries, [unit.id for unit in units], pk_conflicts
+
 
 def receive_bill_line(bill_item, warehouse, company, user, codes=None, quantity=None, tracking_pk_provider=None):
     """
@@ -27,98 +271,118 @@ def receive_bill_line(bill_item, warehouse, company, user, codes=None, quantity=
     vendor_invoice_create's own) without this shared function needing to know about it.
 
     Returns (summary: dict, tracking_unit_ids: list[int], pk_conflicts: list[dict]).
+    A one-line receive_bill_lines().
     """
-    from core.pk_conflict import create_with_pk_fallback
+    summaries, tracking_unit_ids, pk_conflicts = receive_bill_lines(
+        [(bill_item, codes, quantity)], warehouse, company, user, tracking_pk_provider=tracking_pk_provider,
+    )
+    return summaries[0], tracking_unit_ids, pk_conflicts
 
-    product = bill_item.product
-    variant = bill_item.variant
-    tracking_unit_ids = []
-    pk_conflicts = []
 
-    if product.tracking_method in ('imei', 'serial', 'barcode'):
-        codes = codes or []
-        if not codes:
-            raise ValueError(
-                f'Product {product.name} requires individual codes '
-                f'({product.get_tracking_method_display()}) - none provided.'
-            )
-        if bill_item.received_quantity + len(codes) > bill_item.quantity:
-            raise ValueError(
-                f'{product.name}: receiving {len(codes)} more would total '
-                f'{bill_item.received_quantity + len(codes)}, more than the '
-                f'{bill_item.quantity} ordered on this line.'
-            )
-        tracking_field = product.get_tracking_field_name()
+# --- GRN inventory locks ---------------------------------------------------------------
 
-        for code in codes:
-            code = str(code).strip()
-            if not code:
-                raise ValueError(f'Empty tracking code for product {product.name}.')
-            if product.tracking_method == 'imei' and not (len(code) == 15 and code.isdigit()):
-                raise ValueError(
-                    f'"{code}" is not a valid IMEI for {product.name} - an IMEI must be '
-                    f'exactly 15 digits.'
-                )
-            if ProductTracking.objects.filter(**{tracking_field: code}).exists():
-                raise ValueError(f'{product.get_tracking_method_display()} "{code}" already exists in the system.')
-            explicit_tracking_id = tracking_pk_provider() if tracking_pk_provider else None
-            tracking_unit, tracking_conflict = create_with_pk_fallback(
-                ProductTracking.objects, explicit_tracking_id,
-                product=product,
-                variant=variant,
-                current_warehouse=warehouse,
-                supplier=bill_item.bill.supplier,
-                bill_item=bill_item,
-                purchase_price=bill_item.unit_price,
-                purchase_date=bill_item.bill.bill_date,
-                status='available',
-                created_by=user,
-                **{tracking_field: code}
-            )
-            if tracking_conflict:
-                pk_conflicts.append({'model': 'products.ProductTracking', **tracking_conflict})
-            tracking_unit_ids.append(tracking_unit.id)
-
-        # Dual-write a StockItem alongside ProductTracking (mirrors the existing GRN
-        # receiving pattern) - process_inventory_reduction() is StockItem-driven, so
-        # without this a tracked product sold via POS would silently never get its
-        # ProductTracking unit marked sold.
-        stock_item, _ = StockItem.objects.get_or_create(
-            company=company, product=product, warehouse=warehouse,
-            defaults={'stock_status': 'available', 'purchase_status': 'ready_for_use'}
-        )
-        stock_item.update_average_cost(Decimal(len(codes)), bill_item.unit_price)
-        stock_item.quantity += len(codes)
-        stock_item.save()
-
-        bill_item.received_quantity += len(codes)
-        bill_item.save(update_fields=['received_quantity'])
-
-        summary = {'bill_item_id': bill_item.id, 'product_name': product.name, 'units_received': len(codes)}
-    else:
-        quantity = Decimal(str(quantity or '0'))
-        if quantity <= 0:
-            raise ValueError(f'quantity must be > 0 for product {product.name}.')
-        if bill_item.received_quantity + quantity > bill_item.quantity:
-            raise ValueError(
-                f'{product.name}: receiving {quantity} more would total '
-                f'{bill_item.received_quantity + quantity}, more than the '
-                f'{bill_item.quantity} ordered on this line.'
+def lock_grn_items(grn_items):
+    """GRNItem.create_inventory_lock() for many lines: a 'grn_receipt' movement into
+    each stockable line's StockItem (locked pending the bill), a GRNInventoryLock for
+    the line and one per tracking item. Lines without a warehouse (their own, their
+    GRN's or the company's first active one) are skipped, as before. Returns {grn item
+    id: the line's lock}."""
+    from inventory.models import StockMovement, Warehouse
+    from .models import GRNInventoryLock, GRNItemTracking
+
+    grn_items = [item for item in grn_items if item.product_id and getattr(item.product, 'is_stockable', True)]
+    if not grn_items:
+        return {}
+    fallback = {}
+    for item in grn_items:
+        company_id = item.grn.company_id
+        if not (item.warehouse_id or item.grn.warehouse_id) and company_id not in fallback:
+            fallback[company_id] = Warehouse.objects.filter(company_id=company_id, is_active=True).first()
+    warehouses = {}
+    for item in grn_items:
+        warehouse = item.warehouse or item.grn.warehouse or fallback.get(item.grn.company_id)
+        if warehouse is not None:
+            warehouses[item.pk] = warehouse
+    grn_items = [item for item in grn_items if item.pk in warehouses]
+
+    by_company = defaultdict(list)
+    for item in grn_items:
+        by_company[item.grn.company].append(item)
+    tracking = defaultdict(list)
+    for tracking_item in GRNItemTracking.objects.filter(grn_item__in=grn_items).order_by('pk'):
+        tracking[tracking_item.grn_item_id].append(tracking_item)
+
+    now, locks = timezone.now(), {}
+    with transaction.atomic():
+        for company, items in by_company.items():
+            stock = _stock_items(
+                company, [(item.product, warehouses[item.pk]) for item in items],
+                lambda product: {
+                    'category_id': getattr(product, 'category_id', None),
+                    'valuation_method': getattr(product, 'valuation_method', 'weighted_avg'),
+                    'min_stock': getattr(product, 'minimum_stock', 0),
+                    'max_stock': getattr(product, 'maximum_stock', 0),
+                    'reorder_point': getattr(product, 'reorder_level', 0),
+                },
             )
-        stock_item, _ = StockItem.objects.get_or_create(
-            company=company, product=product, warehouse=warehouse,
-            defaults={'stock_status': 'available', 'purchase_status': 'ready_for_use'}
-        )
-        # update_average_cost() computes the new weighted average from the CURRENT
-        # (pre-addition) quantity + the incoming quantity, then saves - so quantity must
-        # only be incremented after that call, not before.
-        stock_item.update_average_cost(quantity, bill_item.unit_price)
-        stock_item.quantity += quantity
-        stock_item.save()
+            movements, new_locks = [], []
+            for item in items:
+                grn = item.grn
+                stock_item = stock[(item.product_id, warehouses[item.pk].pk)]
+                # what the 'grn_receipt' movement's update_stock_quantities() does
+                stock_item.locked_quantity += item.received_qty
+                stock_item.purchase_status = 'received_unbilled'
+                stock_item.stock_status = 'locked'
+                stock_item.last_movement_date = stock_item.last_received_date = now
+                movements.append(StockMovement(
+                    company=company, stock_item=stock_item, movement_type='grn_receipt',
+                    quantity=item.received_qty, unit_cost=0, total_cost=0,  # costed when the bill is created
+                    reference_type='grn', reference_id=grn.id, reference_number=grn.grn_number,
+                    expiry_date=item.expiry_date, grn_item=item,
+                    notes=f"GRN Receipt: {grn.grn_number} - Locked pending bill", performed_by=grn.received_by,
+                ))
+                locks[item.pk] = GRNInventoryLock(
+                    grn=grn, grn_item=item, locked_quantity=item.received_qty, lock_reason='pending_invoice',
+                    locked_by=grn.received_by, lock_notes=f"GRN {grn.grn_number} pending bill creation",
+                )
+                new_locks.append(locks[item.pk])
+                new_locks.extend(
+                    GRNInventoryLock(
+                        grn=grn, grn_item=item, tracking_item=tracking_item,
+                        locked_quantity=1,  # Individual items are quantity 1
+                        lock_reason='pending_invoice', locked_by=grn.received_by,
+                        lock_notes=f"Tracking item {tracking_item.tracking_number} locked pending bill",
+                    )
+                    for tracking_item in tracking[item.pk]
+                )
+            _save_stock_items(list(stock.values()))
+            StockMovement.objects.bulk_create(movements, batch_size=BATCH_SIZE)
+            GRNInventoryLock.objects.bulk_create(new_locks, batch_size=BATCH_SIZE)
+            _finish_bulk_write(company.pk, ['inventory.StockItem', 'inventory.StockMovement', 'purchase.GRNInventoryLock'])
+    return locks
+
 
-        bill_item.received_quantity += quantity
-        bill_item.save(update_fields=['received_quantity'])
+def defer_grn_lock(grn_item):
+    """Queues `grn_item` for the enclosing deferred_grn_locks() block; False outside one."""
+    pending = getattr(_local, 'grn_items', None)
+    if pending is None:
+        return False
+    pending[grn_item.pk] = grn_item
+    return True
 
-        summary = {'bill_item_id': bill_item.id, 'product_name': product.name, 'quantity_received': str(quantity)}
 
-    return summary, tracking_unit_ids, pk_conflicts
+@contextmanager
+def deferred_grn_locks():
+    """Within the block GRNItem.save() queues received lines instead of locking each
+    one; on a clean exit they are all locked by one lock_grn_items()."""
+    outer = getattr(_local, 'grn_items', None)
+    if outer is not None:
+        yield
+        return
+    _local.grn_items = {}
+    try:
+        yield
+        pending = list(_local.grn_items.values())
+    finally:
+        _local.grn_items = None
+    lock_grn_items(pending)
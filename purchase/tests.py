@@ -1,3 +1,327 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from crm.models import Partner
+from products.models import Product
+from user_auth.models import Company, Role, User
+
+from .models import (
+    Bill, BillItem, GoodsReceiptNote, GRNItem, PurchaseOrder, PurchaseOrderItem, PurchasePayment, QualityInspection,
+    QualityInspectionResult, RequestForQuotation, RFQItem, Supplier, SupplierMonthlyScore, SupplierQuotation,
+    SupplierQuotationItem,
+)
+
+
+class ThreeWayMatchTests(TestCase):
+    """purchase.matching - batched PO/GRN/bill matching with tolerances."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Traders')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        partner = Partner.objects.create(company=self.company, name='Acme Supply', partner_type='company', is_supplier=True)
+        self.supplier = Supplier.objects.create(company=self.company, partner=partner)
+        self.bolt = Product.objects.create(company=self.company, name='Bolt')
+        self.nut = Product.objects.create(company=self.company, name='Nut')
+        order = PurchaseOrder.objects.create(company=self.company, supplier=self.supplier)
+        PurchaseOrderItem.objects.create(purchase_order=order, product=self.bolt, quantity=Decimal(10), unit_price=Decimal(5))
+        PurchaseOrderItem.objects.create(purchase_order=order, product=self.nut, quantity=Decimal(5), unit_price=Decimal(2))
+        grn = GoodsReceiptNote.objects.create(company=self.company, supplier=self.supplier, purchase_order=order, received_by=self.owner)
+        GRNItem.objects.create(grn=grn, product=self.bolt, received_qty=Decimal(9), rejected_qty=Decimal(1))
+        GRNItem.objects.create(grn=grn, product=self.nut, received_qty=Decimal(5))
+
+        self.exact = self._bill(order, grn, [(self.bolt, 8, '5.00'), (self.nut, 5, '2.00')])
+        self.over = self._bill(order, grn, [(self.bolt, 5, '5.00'), (self.bolt, 5, '5.20')])
+        self.manual = self._bill(None, None, [(self.nut, 1, '2.00')])
+
+    def _bill(self, order, grn, lines):
+        bill = Bill.objects.create(
+            company=self.company, supplier=self.supplier, purchase_order=order, grn=grn, bill_date=date(2026, 9, 15),
+        )
+        for product, quantity, price in lines:
+            BillItem.objects.create(bill=bill, product=product, quantity=Decimal(quantity), unit_price=Decimal(price))
+        return bill
+
+    def test_batch_match_with_tolerances(self):
+        from .matching import match_bills
+
+        with self.assertNumQueries(9):
+            result = match_bills(Bill.objects.filter(company=self.company))
+        self.assertEqual(result['summary']['skipped_manual'], 1)
+        results = {row['bill_id']: row for row in result['bills']}
+        self.assertTrue(results[self.exact.pk]['matched'])
+        # 10 billed against 8 received net, at 5.10 on average against 5.00
+        over = results[self.over.pk]
+        self.assertEqual((over['matched'], over['po_match_status'], over['grn_match_status']), (False, False, False))
+        self.assertEqual(over['lines'][0]['issues'], ['over_price', 'over_received'])
+        self.over.refresh_from_db()
+        self.assertTrue(self.over.has_price_variances and self.over.has_quantity_variances)
+        self.assertEqual(
+            list(self.over.items.values_list('grn_quantity_variance', 'price_variance').distinct()),
+            [(Decimal(2), Decimal('0.10'))],
+        )
+
+        result = match_bills([self.over], {'QUANTITY_TOLERANCE_PERCENT': 25, 'PRICE_TOLERANCE_PERCENT': 2})
+        self.assertTrue(result['bills'][0]['matched'])
+        self.over.refresh_from_db()
+        self.assertEqual((self.over.three_way_match_status, self.over.has_price_variances), (True, False))
+
+    def test_bulk_match_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(
+            '/api/purchase/bills/match/', {'date_from': '2026-09-01', 'date_to': '2026-09-30'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['summary']['matched'], response.data['summary']['mismatched']), (1, 1))
+        self.assertNotIn('lines', next(row for row in response.data['bills'] if row['matched']))
+
+        response = client.post('/api/purchase/bills/match/', {'bill_ids': [self.exact.pk], 'tolerances': {'PRICE_TOLERANCE_PERCENT': 'x'}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SupplierScorecardTests(TestCase):
+    """purchase.scorecards - monthly rollups kept current on commit, ratings derived from them."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Traders')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        partner = Partner.objects.create(company=self.company, name='Acme Supply', partner_type='company', is_supplier=True)
+        self.supplier = Supplier.objects.create(company=self.company, partner=partner)
+        self.bolt = Product.objects.create(company=self.company, name='Bolt')
+
+    def test_rollups_and_ratings_follow_documents(self):
+        from manufacturing.models import SupplierLeadTime
+        from . import scorecards
+        from .matching import match_bills
+
+        today = timezone.localdate()
+        scorecards.rebuild(self.company)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = PurchaseOrder.objects.create(company=self.company, supplier=self.supplier, expected_delivery_date=today)
+            PurchaseOrder.objects.filter(pk=order.pk).update(order_date=today.replace(day=1))
+            PurchaseOrderItem.objects.create(purchase_order=order, product=self.bolt, quantity=Decimal(10), unit_price=Decimal(5))
+            grn = GoodsReceiptNote.objects.create(
+                company=self.company, supplier=self.supplier, purchase_order=order, received_by=self.owner, status='completed',
+            )
+            grn_item = GRNItem.objects.create(grn=grn, product=self.bolt, received_qty=Decimal(10))
+            inspection = QualityInspection.objects.create(company=self.company, grn=grn)
+            QualityInspectionResult.objects.create(
+                inspection=inspection, grn_item=grn_item, inspected_quantity=Decimal(10), passed_quantity=Decimal(9),
+            )
+            bill = Bill.objects.create(
+                company=self.company, supplier=self.supplier, purchase_order=order, grn=grn, bill_date=today, status='approved',
+            )
+            BillItem.objects.create(bill=bill, product=self.bolt, quantity=Decimal(10), unit_price=Decimal('5.05'))
+            match_bills([bill])
+            PurchasePayment.objects.create(
+                company=self.company, supplier=self.supplier, bill=bill, amount=Decimal(10), payment_date=today,
+                actual_date=today, status='completed',
+            )
+
+        score = SupplierMonthlyScore.objects.get(supplier=self.supplier, month=today.replace(day=1))
+        self.assertEqual(
+            (score.grn_count, score.due_deliveries, score.on_time_deliveries, score.lead_time_count, score.bill_count),
+            (1, 1, 1, 1, 1),
+        )
+        self.assertEqual((score.inspected_quantity, score.passed_quantity), (Decimal(10), Decimal(9)))
+        self.assertEqual((score.po_priced_amount, score.price_variance_amount), (Decimal(50), Decimal('0.5')))
+        self.assertEqual(score.payment_count, 1)
+
+        self.supplier.refresh_from_db()
+        # 100% on time (capped at 9.99), 90% passed, billed 1% over PO price
+        self.assertEqual(
+            (self.supplier.delivery_rating, self.supplier.quality_rating, self.supplier.price_rating),
+            (Decimal('9.99'), Decimal('9.00'), Decimal('9.00')),
+        )
+        lead_time = SupplierLeadTime.objects.get(company=self.company, supplier=self.supplier.partner, product=self.bolt)
+        self.assertEqual((lead_time.lead_time_days, lead_time.actual_deliveries, lead_time.quality_rating), (today.day - 1, 1, Decimal('9.00')))
+
+        # a re-dated bill moves out of this month's rollup
+        with self.captureOnCommitCallbacks(execute=True):
+            bill.bill_date = today.replace(day=1) - timedelta(days=1)
+            bill.save()
+        score.refresh_from_db()
+        self.assertEqual((score.bill_count, score.po_priced_amount), (0, 0))
+        self.assertEqual(scorecards.scorecards(self.company)[self.supplier.pk]['bill_count'], 1)
+
+    def test_supplier_methods_do_not_build_the_history(self):
+        from .models import SupplierScorecardState
+
+        today = timezone.localdate()
+        bill = Bill.objects.create(
+            company=self.company, supplier=self.supplier, bill_date=today - timedelta(days=3), status='approved',
+        )
+        BillItem.objects.create(bill=bill, product=self.bolt, quantity=Decimal(2), unit_price=Decimal(5))
+        bill.refresh_from_db()
+        PurchasePayment.objects.create(
+            company=self.company, supplier=self.supplier, bill=bill, amount=Decimal(10), payment_date=today,
+            actual_date=today, status='completed',
+        )
+        self.assertEqual(self.supplier.get_total_purchases(), bill.total_amount)
+        self.assertEqual(self.supplier.get_total_purchases(bill.bill_date.year - 1), 0)
+        self.assertEqual(self.supplier.get_average_payment_days(), 3)
+        order = PurchaseOrder.objects.create(company=self.company, supplier=self.supplier, expected_delivery_date=today)
+        GoodsReceiptNote.objects.create(
+            company=self.company, supplier=self.supplier, purchase_order=order, received_by=self.owner, status='completed',
+        )
+        self.supplier.update_performance_ratings()
+        self.assertEqual(self.supplier.delivery_rating, Decimal('9.99'))
+        self.assertFalse(SupplierScorecardState.objects.exists())
+        self.assertFalse(SupplierMonthlyScore.objects.exists())
+
+
+class QuotationComparisonTests(TestCase):
+    """purchase.quotation_utils - set-based ranking and the multi-supplier award split."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Traders')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        self.bolt = Product.objects.create(company=self.company, name='Bolt')
+        self.nut = Product.objects.create(company=self.company, name='Nut')
+        self.rfq = RequestForQuotation.objects.create(
+            company=self.company, rfq_number='RFQ-1', response_deadline=date(2026, 9, 30), created_by=self.owner,
+        )
+        RFQItem.objects.create(rfq=self.rfq, product=self.bolt, quantity=Decimal(100))
+        RFQItem.objects.create(rfq=self.rfq, product=self.nut, quantity=Decimal(30))
+        self.suppliers = {}
+        # name: (package_qty, price per package, packages on offer, MOQ in packages, lead time)
+        for name, package, price, offered, moq, lead in [
+            ('Cheap', 10, '40.00', 6, 1, 10), ('Bulk', 25, '112.50', 10, 2, 5), ('Loose', 1, '5.00', 1000, 1, 2),
+        ]:
+            partner = Partner.objects.create(company=self.company, name=name, partner_type='company', is_supplier=True)
+            supplier = self.suppliers[name] = Supplier.objects.create(company=self.company, partner=partner)
+            quotation = SupplierQuotation.objects.create(
+                company=self.company, quotation_number=name, rfq=self.rfq, supplier=supplier, status='submitted',
+                quotation_date=date(2026, 9, 1), valid_until=date(2026, 10, 31), delivery_time_days=lead,
+            )
+            SupplierQuotationItem.objects.create(
+                quotation=quotation, product=self.bolt, quantity=Decimal(offered), unit_price=Decimal(price),
+                package_qty=Decimal(package), minimum_order_qty=Decimal(moq),
+            )
+            if name != 'Bulk':
+                SupplierQuotationItem.objects.create(
+                    quotation=quotation, product=self.nut, quantity=Decimal(offered), unit_price=Decimal(price),
+                    package_qty=Decimal(package), minimum_order_qty=Decimal(moq),
+                )
+
+    def test_ranking_and_award_split(self):
+        from .quotation_utils import QuotationComparison
+
+        comparison = QuotationComparison(self.rfq)
+        with self.assertNumQueries(2):
+            matrix = comparison.get_comparison_matrix()
+        bolts = {quote['supplier'].name: quote for quote in matrix[0]['quotations']}
+        # Cheap can't cover 100 alone but is still costed for it: 10 packages
+        self.assertEqual([bolts[name]['rank'] for name in ('Bulk', 'Cheap', 'Loose')], [2, 1, 3])
+        self.assertEqual(bolts['Bulk']['cost_for_required_qty']['total_cost'], Decimal(450))
+        self.assertEqual(comparison.get_best_quotation_analysis()[1]['best_lead_time'], 2)
+
+        with self.assertNumQueries(0):
+            split = comparison.get_award_split()
+        bolt = split['lines'][0]
+        # 60 from Cheap at 4.00 and the last 40 loose at 5.00 beat 4 packs of Bulk
+        self.assertEqual(
+            [(award['supplier_name'], award['quantity'], award['cost']) for award in bolt['awards']],
+            [('Cheap', 6, Decimal(240)), ('Loose', 40, Decimal(200))],
+        )
+        self.assertEqual((bolt['total_cost'], bolt['single_supplier_cost'], bolt['savings']), (Decimal(440), Decimal(450), Decimal(10)))
+        # 30 nuts: three packs of Cheap
+        self.assertEqual([(award['supplier_name'], award['quantity']) for award in split['lines'][1]['awards']], [('Cheap', 3)])
+        self.assertEqual(split['supplier_totals'][self.suppliers['Cheap'].pk], Decimal(360))
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.get(f'/api/purchase/rfqs/{self.rfq.pk}/comparison/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['items'][0]['quotations'][0]['supplier_id'], self.suppliers['Cheap'].pk)
+
+
+class BillReceivingTests(TestCase):
+    """purchase.services.receive_bill_lines - a shipment received in one batch."""
+
+    def setUp(self):
+        from inventory.models import Warehouse
+
+        self.company = Company.objects.create(name='Test Traders')
+        self.owner = User.objects.create_user(
+            email='owner@test.local', password='x', company=self.company, role=Role.objects.create(name='Owner', level=1),
+        )
+        partner = Partner.objects.create(company=self.company, name='Acme Supply', partner_type='company', is_supplier=True)
+        supplier = Supplier.objects.create(company=self.company, partner=partner)
+        self.warehouse = Warehouse.objects.create(company=self.company, name='Main')
+        self.phone = Product.objects.create(
+            company=self.company, name='Phone', tracking_method='imei', requires_individual_tracking=True,
+        )
+        self.case = Product.objects.create(company=self.company, name='Case')
+        self.bill = Bill.objects.create(
+            company=self.company, supplier=supplier, warehouse=self.warehouse, bill_date=date(2026, 9, 15),
+        )
+        self.phones = BillItem.objects.create(bill=self.bill, product=self.phone, quantity=Decimal(3), unit_price=Decimal(100))
+        self.cases = BillItem.objects.create(bill=self.bill, product=self.case, quantity=Decimal(10), unit_price=Decimal(2))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def _receive(self, items):
+        return self.client.post(
+            f'/api/purchase/bills/{self.bill.pk}/receive-items/', {'items': items}, format='json',
+        )
+
+    def test_receive_shipment(self):
+        from inventory.models import CostLayer, StockItem
+        from products.models import ProductTracking
+
+        imeis = ['356938035643809', '356938035643817']
+        response = self._receive([
+            {'bill_item_id': self.phones.pk, 'codes': imeis},
+            {'bill_item_id': self.cases.pk, 'quantity': '4'},
+            {'bill_item_id': self.cases.pk, 'quantity': '2'},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['tracking_units_created'], 2)
+        self.assertEqual(
+            sorted(ProductTracking.objects.filter(bill_item=self.phones).values_list('imei_number', flat=True)), imeis,
+        )
+        self.phones.refresh_from_db()
+        self.cases.refresh_from_db()
+        self.assertEqual((self.phones.received_quantity, self.cases.received_quantity), (Decimal(2), Decimal(6)))
+        stock = StockItem.objects.get(product=self.case, warehouse=self.warehouse)
+        self.assertEqual((stock.quantity, stock.average_cost), (Decimal(6), Decimal(2)))
+        self.assertEqual(CostLayer.objects.filter(stock_item__company=self.company).count(), 3)
+
+        # one code already on file, one repeated and one over-receipt: each rejected
+        # without writing anything
+        for items in (
+            [{'bill_item_id': self.phones.pk, 'codes': ['356938035643825', imeis[0]]}],
+            [{'bill_item_id': self.phones.pk, 'codes': ['356938035643825', '356938035643825']}],
+            [{'bill_item_id': self.cases.pk, 'quantity': '3'}, {'bill_item_id': self.cases.pk, 'quantity': '2'}],
+        ):
+            response = self._receive(items)
+            self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(ProductTracking.objects.filter(product=self.phone).count(), 2)
+        self.assertEqual(StockItem.objects.get(product=self.case, warehouse=self.warehouse).quantity, Decimal(6))
+
+    def test_grn_tracking_unit_is_priced_from_the_po_line(self):
+        from .models import GRNItemTracking
+
+        order = PurchaseOrder.objects.create(company=self.company, supplier=self.bill.supplier)
+        po_item = PurchaseOrderItem.objects.create(purchase_order=order, product=self.phone, quantity=Decimal(2), unit_price=Decimal(250))
+        grn = GoodsReceiptNote.objects.create(
+            company=self.company, supplier=self.bill.supplier, purchase_order=order, received_by=self.owner, warehouse=self.warehouse,
+        )
+        ordered = GRNItem.objects.create(grn=grn, product=self.phone, po_item=po_item, received_qty=Decimal(1), warehouse=self.warehouse)
+        unordered = GRNItem.objects.create(grn=grn, product=self.phone, received_qty=Decimal(1), warehouse=self.warehouse)
 
-# Create your tests here.
+        tracked = GRNItemTracking.objects.create(grn_item=ordered, tracking_number='356938035643833', tracking_type='imei')
+        self.assertEqual(tracked.product_tracking.purchase_price, Decimal(250))
+        tracked = GRNItemTracking.objects.create(grn_item=unordered, tracking_number='356938035643841', tracking_type='imei')
+        self.assertIsNone(tracked.product_tracking.purchase_price)
@@ -32,6 +32,7 @@ from .forms import (
 from products.models import Product
 from inventory.models import Warehouse
 from .quotation_utils import QuotationComparison, UOMConverter, QuotationValidator
+from .services import deferred_grn_locks
 
 # =====================================
 # DASHBOARD & OVERVIEW VIEWS
@@ -1141,234 +1142,236 @@ def grn_add(request):
             
             grn.save()
             
-            # Process items based on mode
-            if po_id:
-                # PO Mode - Process PO items
-                po_item_ids = request.POST.getlist('po_item_ids[]')
-                po_products = request.POST.getlist('po_products[]')
-                po_received_quantities = request.POST.getlist('po_received_quantities[]')
-                po_expiry_dates = request.POST.getlist('po_expiry_dates[]')
-                po_batch_numbers = request.POST.getlist('po_batch_numbers[]')
-                po_storage_locations = request.POST.getlist('po_storage_locations[]')
-                po_item_notes = request.POST.getlist('po_item_notes[]')
+            # Process items based on mode - the received lines are locked into
+            # inventory together at the end of the block (purchase.services)
+            with deferred_grn_locks():
+                if po_id:
+                    # PO Mode - Process PO items
+                    po_item_ids = request.POST.getlist('po_item_ids[]')
+                    po_products = request.POST.getlist('po_products[]')
+                    po_received_quantities = request.POST.getlist('po_received_quantities[]')
+                    po_expiry_dates = request.POST.getlist('po_expiry_dates[]')
+                    po_batch_numbers = request.POST.getlist('po_batch_numbers[]')
+                    po_storage_locations = request.POST.getlist('po_storage_locations[]')
+                    po_item_notes = request.POST.getlist('po_item_notes[]')
                 
-                # Tracking data
-                po_tracking_types = request.POST.getlist('po_tracking_types[]')
-                po_tracking_numbers = request.POST.getlist('po_tracking_numbers[]')
-                po_tracking_conditions = request.POST.getlist('po_tracking_conditions[]')
-                po_tracking_notes = request.POST.getlist('po_tracking_notes[]')
+                    # Tracking data
+                    po_tracking_types = request.POST.getlist('po_tracking_types[]')
+                    po_tracking_numbers = request.POST.getlist('po_tracking_numbers[]')
+                    po_tracking_conditions = request.POST.getlist('po_tracking_conditions[]')
+                    po_tracking_notes = request.POST.getlist('po_tracking_notes[]')
                 
-                for i, po_item_id in enumerate(po_item_ids):
-                    if i < len(po_received_quantities) and float(po_received_quantities[i]) > 0:
-                        po_item = PurchaseOrderItem.objects.get(id=po_item_id)
-                        received_qty = float(po_received_quantities[i])
-                        
-                        # Create GRN item
-                        grn_item = GRNItem.objects.create(
-                            grn=grn,
-                            po_item=po_item,
-                            product=po_item.product,
-                            uom=po_item.uom,
-                            ordered_qty=po_item.quantity,
-                            received_qty=received_qty,
-                            accepted_qty=received_qty,  # Initially all accepted
-                            warehouse=grn.warehouse,
-                            expiry_date=po_expiry_dates[i] if po_expiry_dates[i] else None,
-                            location=po_storage_locations[i] if i < len(po_storage_locations) else '',
-                            remarks=po_item_notes[i] if i < len(po_item_notes) else '',
-                            quality_status='pending' if grn.requires_quality_inspection else 'passed'
-                        )
+                    for i, po_item_id in enumerate(po_item_ids):
+                        if i < len(po_received_quantities) and float(po_received_quantities[i]) > 0:
+                            po_item = PurchaseOrderItem.objects.get(id=po_item_id)
+                            received_qty = float(po_received_quantities[i])
                         
-                        # Set batch number if provided
-                        if i < len(po_batch_numbers) and po_batch_numbers[i]:
-                            grn_item.tracking_type = 'batch'
-                            grn_item.tracking_required = True
-                            grn_item.save()
-                            
-                            # Create batch tracking
-                            GRNItemTracking.objects.create(
-                                grn_item=grn_item,
-                                tracking_number=po_batch_numbers[i],
-                                tracking_type='batch',
-                                batch_number=po_batch_numbers[i],
+                            # Create GRN item
+                            grn_item = GRNItem.objects.create(
+                                grn=grn,
+                                po_item=po_item,
+                                product=po_item.product,
+                                uom=po_item.uom,
+                                ordered_qty=po_item.quantity,
+                                received_qty=received_qty,
+                                accepted_qty=received_qty,  # Initially all accepted
+                                warehouse=grn.warehouse,
+                                expiry_date=po_expiry_dates[i] if po_expiry_dates[i] else None,
+                                location=po_storage_locations[i] if i < len(po_storage_locations) else '',
+                                remarks=po_item_notes[i] if i < len(po_item_notes) else '',
                                 quality_status='pending' if grn.requires_quality_inspection else 'passed'
                             )
                         
-                        # Auto-set tracking based on product configuration
-                        if po_item.product.tracking_method != 'none':
-                            grn_item.tracking_type = po_item.product.tracking_method
-                            grn_item.tracking_required = po_item.product.requires_individual_tracking
-                            grn_item.save()
-                        
-                        # Create inventory lock for GRN item
-                        # Lock items until purchase invoice is created
-                        if grn.requires_quality_inspection:
-                            # For items requiring quality inspection, lock all received quantity
-                            # Items will be unlocked after quality inspection passes
-                            lock_reason = 'quality_hold'
-                            locked_quantity = received_qty
-                        else:
-                            # For items not requiring quality inspection, lock all received quantity
-                            # Items will be unlocked when purchase invoice is created
-                            lock_reason = 'pending_invoice'
-                            locked_quantity = received_qty
-                        
-                        GRNInventoryLock.objects.create(
-                            grn=grn,
-                            grn_item=grn_item,
-                            locked_quantity=locked_quantity,
-                            lock_reason=lock_reason,
-                            locked_by=request.user,
-                            lock_notes=f'Auto-locked on GRN creation - {lock_reason}'
-                        )
-                        
-                        # Update PO item received quantity
-                        po_item.received_quantity = (po_item.received_quantity or 0) + received_qty
-                        po_item.save()
-                
-                # Process individual tracking items
-                tracking_item_index = 0
-                for tracking_type, tracking_number, condition, tracking_note in zip(
-                    po_tracking_types, po_tracking_numbers, po_tracking_conditions, po_tracking_notes
-                ):
-                    if tracking_number and tracking_item_index < len(po_item_ids):
-                        # Find corresponding GRN item
-                        item_index = tracking_item_index // 10  # Assuming max 10 tracking items per product
-                        if item_index < len(po_item_ids):
-                            grn_item = GRNItem.objects.filter(
-                                grn=grn, 
-                                po_item_id=po_item_ids[item_index]
-                            ).first()
+                            # Set batch number if provided
+                            if i < len(po_batch_numbers) and po_batch_numbers[i]:
+                                grn_item.tracking_type = 'batch'
+                                grn_item.tracking_required = True
+                                grn_item.save()
                             
-                            if grn_item:
+                                # Create batch tracking
                                 GRNItemTracking.objects.create(
                                     grn_item=grn_item,
-                                    tracking_number=tracking_number,
-                                    tracking_type=tracking_type,
-                                    condition=condition,
-                                    notes=tracking_note,
+                                    tracking_number=po_batch_numbers[i],
+                                    tracking_type='batch',
+                                    batch_number=po_batch_numbers[i],
                                     quality_status='pending' if grn.requires_quality_inspection else 'passed'
                                 )
-                                
-                                grn_item.tracking_required = True
-                                grn_item.tracking_type = tracking_type
+                        
+                            # Auto-set tracking based on product configuration
+                            if po_item.product.tracking_method != 'none':
+                                grn_item.tracking_type = po_item.product.tracking_method
+                                grn_item.tracking_required = po_item.product.requires_individual_tracking
                                 grn_item.save()
+                        
+                            # Create inventory lock for GRN item
+                            # Lock items until purchase invoice is created
+                            if grn.requires_quality_inspection:
+                                # For items requiring quality inspection, lock all received quantity
+                                # Items will be unlocked after quality inspection passes
+                                lock_reason = 'quality_hold'
+                                locked_quantity = received_qty
+                            else:
+                                # For items not requiring quality inspection, lock all received quantity
+                                # Items will be unlocked when purchase invoice is created
+                                lock_reason = 'pending_invoice'
+                                locked_quantity = received_qty
+                        
+                            GRNInventoryLock.objects.create(
+                                grn=grn,
+                                grn_item=grn_item,
+                                locked_quantity=locked_quantity,
+                                lock_reason=lock_reason,
+                                locked_by=request.user,
+                                lock_notes=f'Auto-locked on GRN creation - {lock_reason}'
+                            )
+                        
+                            # Update PO item received quantity
+                            po_item.received_quantity = (po_item.received_quantity or 0) + received_qty
+                            po_item.save()
+                
+                    # Process individual tracking items
+                    tracking_item_index = 0
+                    for tracking_type, tracking_number, condition, tracking_note in zip(
+                        po_tracking_types, po_tracking_numbers, po_tracking_conditions, po_tracking_notes
+                    ):
+                        if tracking_number and tracking_item_index < len(po_item_ids):
+                            # Find corresponding GRN item
+                            item_index = tracking_item_index // 10  # Assuming max 10 tracking items per product
+                            if item_index < len(po_item_ids):
+                                grn_item = GRNItem.objects.filter(
+                                    grn=grn, 
+                                    po_item_id=po_item_ids[item_index]
+                                ).first()
+                            
+                                if grn_item:
+                                    GRNItemTracking.objects.create(
+                                        grn_item=grn_item,
+                                        tracking_number=tracking_number,
+                                        tracking_type=tracking_type,
+                                        condition=condition,
+                                        notes=tracking_note,
+                                        quality_status='pending' if grn.requires_quality_inspection else 'passed'
+                                    )
+                                
+                                    grn_item.tracking_required = True
+                                    grn_item.tracking_type = tracking_type
+                                    grn_item.save()
                     
-                    tracking_item_index += 1
+                        tracking_item_index += 1
                 
-                # Update PO status
-                po = PurchaseOrder.objects.get(id=po_id)
-                po_items = po.items.all()
-                all_received = all(
-                    (item.received_quantity or 0) >= item.quantity for item in po_items
-                )
-                if all_received:
-                    po.status = 'fully_received'
-                else:
-                    po.status = 'partially_received'
-                po.save()
+                    # Update PO status
+                    po = PurchaseOrder.objects.get(id=po_id)
+                    po_items = po.items.all()
+                    all_received = all(
+                        (item.received_quantity or 0) >= item.quantity for item in po_items
+                    )
+                    if all_received:
+                        po.status = 'fully_received'
+                    else:
+                        po.status = 'partially_received'
+                    po.save()
                 
-            else:
-                # Manual Mode - Process manual items
-                manual_products = request.POST.getlist('manual_products[]')
-                manual_received_quantities = request.POST.getlist('manual_received_quantities[]')
-                manual_uoms = request.POST.getlist('manual_uoms[]')
-                manual_expiry_dates = request.POST.getlist('manual_expiry_dates[]')
-                manual_batch_numbers = request.POST.getlist('manual_batch_numbers[]')
-                manual_storage_locations = request.POST.getlist('manual_storage_locations[]')
-                manual_item_notes = request.POST.getlist('manual_item_notes[]')
+                else:
+                    # Manual Mode - Process manual items
+                    manual_products = request.POST.getlist('manual_products[]')
+                    manual_received_quantities = request.POST.getlist('manual_received_quantities[]')
+                    manual_uoms = request.POST.getlist('manual_uoms[]')
+                    manual_expiry_dates = request.POST.getlist('manual_expiry_dates[]')
+                    manual_batch_numbers = request.POST.getlist('manual_batch_numbers[]')
+                    manual_storage_locations = request.POST.getlist('manual_storage_locations[]')
+                    manual_item_notes = request.POST.getlist('manual_item_notes[]')
                 
-                # Tracking data
-                manual_tracking_types = request.POST.getlist('manual_tracking_types[]')
-                manual_tracking_numbers = request.POST.getlist('manual_tracking_numbers[]')
-                manual_tracking_conditions = request.POST.getlist('manual_tracking_conditions[]')
-                manual_tracking_notes = request.POST.getlist('manual_tracking_notes[]')
+                    # Tracking data
+                    manual_tracking_types = request.POST.getlist('manual_tracking_types[]')
+                    manual_tracking_numbers = request.POST.getlist('manual_tracking_numbers[]')
+                    manual_tracking_conditions = request.POST.getlist('manual_tracking_conditions[]')
+                    manual_tracking_notes = request.POST.getlist('manual_tracking_notes[]')
                 
-                for i, product_id in enumerate(manual_products):
-                    if i < len(manual_received_quantities) and float(manual_received_quantities[i]) > 0:
-                        product = Product.objects.get(id=product_id)
-                        received_qty = float(manual_received_quantities[i])
+                    for i, product_id in enumerate(manual_products):
+                        if i < len(manual_received_quantities) and float(manual_received_quantities[i]) > 0:
+                            product = Product.objects.get(id=product_id)
+                            received_qty = float(manual_received_quantities[i])
                         
-                        # Create GRN item
-                        grn_item = GRNItem.objects.create(
-                            grn=grn,
-                            product=product,
-                            uom_id=manual_uoms[i] if i < len(manual_uoms) else None,
-                            received_qty=received_qty,
-                            accepted_qty=received_qty,  # Initially all accepted
-                            warehouse=grn.warehouse,
-                            expiry_date=manual_expiry_dates[i] if i < len(manual_expiry_dates) and manual_expiry_dates[i] else None,
-                            location=manual_storage_locations[i] if i < len(manual_storage_locations) else '',
-                            remarks=manual_item_notes[i] if i < len(manual_item_notes) else '',
-                            quality_status='pending' if grn.requires_quality_inspection else 'passed'
-                        )
-                        
-                        # Set batch number if provided
-                        if i < len(manual_batch_numbers) and manual_batch_numbers[i]:
-                            grn_item.tracking_type = 'batch'
-                            grn_item.tracking_required = True
-                            grn_item.save()
-                            
-                            # Create batch tracking
-                            GRNItemTracking.objects.create(
-                                grn_item=grn_item,
-                                tracking_number=manual_batch_numbers[i],
-                                tracking_type='batch',
-                                batch_number=manual_batch_numbers[i],
+                            # Create GRN item
+                            grn_item = GRNItem.objects.create(
+                                grn=grn,
+                                product=product,
+                                uom_id=manual_uoms[i] if i < len(manual_uoms) else None,
+                                received_qty=received_qty,
+                                accepted_qty=received_qty,  # Initially all accepted
+                                warehouse=grn.warehouse,
+                                expiry_date=manual_expiry_dates[i] if i < len(manual_expiry_dates) and manual_expiry_dates[i] else None,
+                                location=manual_storage_locations[i] if i < len(manual_storage_locations) else '',
+                                remarks=manual_item_notes[i] if i < len(manual_item_notes) else '',
                                 quality_status='pending' if grn.requires_quality_inspection else 'passed'
                             )
                         
-                        # Create inventory lock for GRN item
-                        # Lock items until purchase invoice is created
-                        if grn.requires_quality_inspection:
-                            # For items requiring quality inspection, lock all received quantity
-                            # Items will be unlocked after quality inspection passes
-                            lock_reason = 'quality_hold'
-                            locked_quantity = received_qty
-                        else:
-                            # For items not requiring quality inspection, lock all received quantity
-                            # Items will be unlocked when purchase invoice is created
-                            lock_reason = 'pending_invoice'
-                            locked_quantity = received_qty
-                        
-                        GRNInventoryLock.objects.create(
-                            grn=grn,
-                            grn_item=grn_item,
-                            locked_quantity=locked_quantity,
-                            lock_reason=lock_reason,
-                            locked_by=request.user,
-                            lock_notes=f'Auto-locked on GRN creation - {lock_reason}'
-                        )
-                
-                # Process individual tracking items for manual mode
-                tracking_item_index = 0
-                for tracking_type, tracking_number, condition, tracking_note in zip(
-                    manual_tracking_types, manual_tracking_numbers, manual_tracking_conditions, manual_tracking_notes
-                ):
-                    if tracking_number and tracking_item_index < len(manual_products):
-                        # Find corresponding GRN item
-                        item_index = tracking_item_index // 10  # Assuming max 10 tracking items per product
-                        if item_index < len(manual_products):
-                            grn_item = GRNItem.objects.filter(
-                                grn=grn,
-                                product_id=manual_products[item_index]
-                            ).first()
+                            # Set batch number if provided
+                            if i < len(manual_batch_numbers) and manual_batch_numbers[i]:
+                                grn_item.tracking_type = 'batch'
+                                grn_item.tracking_required = True
+                                grn_item.save()
                             
-                            if grn_item:
+                                # Create batch tracking
                                 GRNItemTracking.objects.create(
                                     grn_item=grn_item,
-                                    tracking_number=tracking_number,
-                                    tracking_type=tracking_type,
-                                    condition=condition,
-                                    notes=tracking_note,
+                                    tracking_number=manual_batch_numbers[i],
+                                    tracking_type='batch',
+                                    batch_number=manual_batch_numbers[i],
                                     quality_status='pending' if grn.requires_quality_inspection else 'passed'
                                 )
+                        
+                            # Create inventory lock for GRN item
+                            # Lock items until purchase invoice is created
+                            if grn.requires_quality_inspection:
+                                # For items requiring quality inspection, lock all received quantity
+                                # Items will be unlocked after quality inspection passes
+                                lock_reason = 'quality_hold'
+                                locked_quantity = received_qty
+                            else:
+                                # For items not requiring quality inspection, lock all received quantity
+                                # Items will be unlocked when purchase invoice is created
+                                lock_reason = 'pending_invoice'
+                                locked_quantity = received_qty
+                        
+                            GRNInventoryLock.objects.create(
+                                grn=grn,
+                                grn_item=grn_item,
+                                locked_quantity=locked_quantity,
+                                lock_reason=lock_reason,
+                                locked_by=request.user,
+                                lock_notes=f'Auto-locked on GRN creation - {lock_reason}'
+                            )
+                
+                    # Process individual tracking items for manual mode
+                    tracking_item_index = 0
+                    for tracking_type, tracking_number, condition, tracking_note in zip(
+                        manual_tracking_types, manual_tracking_numbers, manual_tracking_conditions, manual_tracking_notes
+                    ):
+                        if tracking_number and tracking_item_index < len(manual_products):
+                            # Find corresponding GRN item
+                            item_index = tracking_item_index // 10  # Assuming max 10 tracking items per product
+                            if item_index < len(manual_products):
+                                grn_item = GRNItem.objects.filter(
+                                    grn=grn,
+                                    product_id=manual_products[item_index]
+                                ).first()
+                            
+                                if grn_item:
+                                    GRNItemTracking.objects.create(
+                                        grn_item=grn_item,
+                                        tracking_number=tracking_number,
+                                        tracking_type=tracking_type,
+                                        condition=condition,
+                                        notes=tracking_note,
+                                        quality_status='pending' if grn.requires_quality_inspection else 'passed'
+                                    )
                                 
-                                grn_item.tracking_required = True
-                                grn_item.tracking_type = tracking_type
-                                grn_item.save()
+                                    grn_item.tracking_required = True
+                                    grn_item.tracking_type = tracking_type
+                                    grn_item.save()
                     
-                    tracking_item_index += 1
+                        tracking_item_index += 1
             
             # Create quality inspection if required
             if grn.requires_quality_inspection:
@@ -1797,10 +1800,9 @@ def bill_add(request):
                 bill.save()
                 
                 # Validate matching if applicable
-                if bill.matching_type in ['three_way', 'two_way_po', 'two_way_grn']:
-                    validation_result = bill.validate_three_way_match()
-                    if not validation_result['is_valid']:
-                        messages.warning(request, f'Matching validation warnings: {", ".join(validation_result["warnings"])}')
+                validation_result = bill.perform_matching_validation()
+                if validation_result and not validation_result['matched']:
+                    messages.warning(request, f'Matching validation warnings: {", ".join(validation_result["warnings"])}')
                 
                 messages.success(request, f'Bill {bill.bill_number} created successfully.')
                 return redirect('bill_detail', pk=bill.id)
@@ -1915,10 +1917,9 @@ def bill_edit(request, pk):
                 bill.save()
                 
                 # Validate matching if applicable
-                if bill.matching_type in ['three_way', 'two_way_po', 'two_way_grn']:
-                    validation_result = bill.validate_three_way_match()
-                    if not validation_result['is_valid']:
-                        messages.warning(request, f'Matching validation warnings: {", ".join(validation_result["warnings"])}')
+                validation_result = bill.perform_matching_validation()
+                if validation_result and not validation_result['matched']:
+                    messages.warning(request, f'Matching validation warnings: {", ".join(validation_result["warnings"])}')
                 
                 messages.success(request, f'Bill {bill.bill_number} updated successfully.')
                 return redirect('bill_detail', pk=bill.id)
@@ -3015,7 +3016,6 @@ def quotation_compare(request):
         # Generate comparison
         comparison = QuotationComparison(rfq)
         comparison_matrix = comparison.get_comparison_matrix()
-        recommendations = comparison.get_best_quotation_analysis()
         
         # Convert to JSON-serializable format
         comparison_data = []
@@ -3038,6 +3038,7 @@ def quotation_compare(request):
                     'package_qty': float(quote['package_qty']),
                     'total_cost': float(quote['cost_for_required_qty']['total_cost']),
                     'lead_time': quote['lead_time'],
+                    'rank': quote['rank'],
                 }
                 product_comparison['quotations'].append(quote_data)
             
@@ -3046,7 +3047,8 @@ def quotation_compare(request):
         return JsonResponse({
             'success': True,
             'comparison_matrix': comparison_data,
-            'recommendations': []  # Simplified for JSON response
+            'recommendations': [],  # Simplified for JSON response
+            'award_split': comparison.get_award_split(),
         })
     
     except Exception as e:
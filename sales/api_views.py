@@ -256,6 +256,24 @@ def _avg_purchase_price(product):
     return avg if avg is not None else (product.cost_price or Decimal('0'))
 
 
+def pos_scanned_units(company, code):
+    """Available tracked units whose IMEI, serial or barcode is exactly `code` - one
+    indexed lookup per column, what every scanner hit needs."""
+    return ProductTracking.objects.filter(
+        Q(imei_number=code) | Q(serial_number=code) | Q(barcode=code),
+        product__company=company, status='available'
+    ).select_related('product', 'variant')
+
+
+def pos_browse_units(company, q):
+    """Available tracked units whose product name/brand/SKU contains `q` - typed
+    browsing, necessarily a scan of the company's available units."""
+    return ProductTracking.objects.filter(
+        Q(product__name__icontains=q) | Q(product__brand__icontains=q) | Q(product__sku__icontains=q),
+        product__company=company, status='available'
+    ).select_related('product', 'variant')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, POSStaff])
 def pos_search(request):
@@ -272,11 +290,9 @@ def pos_search(request):
     company = request.user.company
     results = []
 
-    tracked_units = ProductTracking.objects.filter(
-        Q(imei_number=q) | Q(serial_number=q) | Q(barcode=q) |
-        Q(product__name__icontains=q) | Q(product__brand__icontains=q) | Q(product__sku__icontains=q),
-        product__company=company, status='available'
-    ).select_related('product', 'variant')[:20]
+    # A scanned code is looked up on its own first: OR-ing it with the substring
+    # conditions made every scan a full pass over the company's units.
+    tracked_units = list(pos_scanned_units(company, q)[:20]) or pos_browse_units(company, q)[:20]
 
     for unit in tracked_units:
         unit_price = unit.selling_price if unit.selling_price is not None else unit.product.selling_price
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from .reports import connect_signals
+        connect_signals()
+        from . import dashboard_metrics  # noqa: F401 - registers this app's dashboard metrics
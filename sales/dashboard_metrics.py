@@ -0,0 +1,25 @@
+"""Sales dashboard headline metrics - see core/dashboard_metrics.py."""
+from django.db.models import Count, F, Q, Sum
+
+from core.dashboard_metrics import month_start, register
+
+MODULE = 'sales'
+
+register(MODULE, 'total_products', 'products.Product', Count('id', filter=Q(is_active=True)))
+register(MODULE, 'total_delivery_notes', 'sales.DeliveryNote', Count('id'))
+
+register(MODULE, 'total_quotations', 'sales.Quotation', Count('id'))
+register(MODULE, 'pending_quotations', 'sales.Quotation', Count('id', filter=Q(status='draft')))
+register(MODULE, 'monthly_quotations', 'sales.Quotation', lambda now: Count('id', filter=Q(created_at__gte=month_start(now))))
+
+register(MODULE, 'total_sales_orders', 'sales.SalesOrder', Count('id'))
+register(MODULE, 'pending_orders', 'sales.SalesOrder', Count('id', filter=Q(status='pending')))
+register(MODULE, 'monthly_sales', 'sales.SalesOrder', lambda now: Sum('total', filter=Q(created_at__gte=month_start(now))))
+
+register(MODULE, 'total_invoices', 'sales.Invoice', Count('id'))
+register(MODULE, 'overdue_invoices', 'sales.Invoice', Count('id', filter=Q(status='overdue')))
+register(
+    MODULE, 'monthly_revenue', 'sales.Invoice',
+    lambda now: Sum('paid_amount', filter=Q(invoice_date__gte=month_start(now).date(), status__in=['paid', 'partially_paid'])),
+)
+register(MODULE, 'outstanding_invoices', 'sales.Invoice', Sum(F('total') - F('paid_amount'), filter=Q(status__in=['sent', 'partially_paid'])))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_invoice_discount_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'invoice_date', 'status'], name='sales_inv_co_date_status_idx'),
+        ),
+    ]
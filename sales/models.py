@@ -645,8 +645,11 @@ class Invoice(SoftDeleteMixin, models.Model):
     def process_inventory_reduction(self):
         """Reduce inventory and create stock movements when invoice is confirmed"""
         from inventory.models import StockItem, StockMovement
+        from inventory import costing
         
-        with transaction.atomic():
+        # costing.batch(): every sale movement below is costed against its stock item's
+        # receipt layers together on exit, one layer read/write for the whole invoice
+        with transaction.atomic(), costing.batch():
             for item in self.items.all():
                 # Find stock items for this product
                 stock_items = StockItem.objects.filter(
@@ -849,6 +852,11 @@ class Invoice(SoftDeleteMixin, models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # Invoice lists, the sales report and the analytics fact rebuild all filter a
+        # company's invoices by date range and status - see core/query_plans.py.
+        indexes = [
+            models.Index(fields=['company', 'invoice_date', 'status'], name='sales_inv_co_date_status_idx'),
+        ]
 
 
 class InvoiceItem(models.Model):
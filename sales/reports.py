@@ -0,0 +1,185 @@
+"""
+Sales report numbers for SalesReportPageView - the same figures the page always showed,
+computed in a fixed number of grouped queries instead of one per month/status/total.
+
+Previously get_context_data() ran two queries per month for the 12-month trend (24 in
+a loop), one count() per quotation and sales-order status choice, and a separate
+count()/aggregate() per headline total - and the top-customers query joined invoices
+and sales orders in one go, so each customer's invoice total was multiplied by their
+order count. Now:
+
+- headline totals: one aggregate() per document type (count + sums together), and one
+  filtered aggregate() for outstanding + overdue receivables.
+- status breakdowns: one values('status').annotate(Count) per document type.
+- monthly trend: one TruncMonth group-by for sales orders and one for quotations.
+- top customers/products: one grouped query each, plus one for the top customers'
+  order counts.
+
+The result is a plain dict, cached per (company, filter set, day) through
+core.company_cache and invalidated whenever a quotation, sales order (or its lines),
+invoice, customer or product of that company is written (or bulk-imported, see
+core.imports.records_imported).
+"""
+import json
+from datetime import date
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save
+
+from core import company_cache
+
+CACHE_NAMESPACE = 'sales_report'
+TREND_MONTHS = 12
+OPEN_INVOICE_STATUSES = ['sent', 'partially_paid']
+SOURCE_MODELS = ('sales.Quotation', 'sales.SalesOrder', 'sales.SalesOrderItem', 'sales.Invoice', 'crm.Customer', 'products.Product')
+
+
+def _trend_months(today):
+    """First day of each of the last TREND_MONTHS months, oldest first."""
+    year, month = today.year, today.month
+    months = []
+    for _ in range(TREND_MONTHS):
+        months.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def _month_key(value):
+    # TruncMonth returns a date for DateFields, but a datetime on some backends.
+    return date(value.year, value.month, 1)
+
+
+def _status_breakdown(queryset, choices):
+    counts = dict(queryset.values_list('status').annotate(count=Count('id')).order_by())
+    return {label: counts.get(value, 0) for value, label in choices}
+
+
+def compute_sales_report(company, date_from, date_to, customer_id=None, today=None):
+    from .models import (
+        QUOTATION_STATUS_CHOICES, SALES_ORDER_STATUS_CHOICES, Invoice, Quotation, SalesOrder, SalesOrderItem,
+    )
+    today = today or date.today()
+
+    quotations = Quotation.objects.filter(company=company, date__gte=date_from, date__lte=date_to)
+    sales_orders = SalesOrder.objects.filter(company=company, order_date__gte=date_from, order_date__lte=date_to)
+    invoices = Invoice.objects.filter(company=company, invoice_date__gte=date_from, invoice_date__lte=date_to)
+    if customer_id:
+        quotations = quotations.filter(customer_id=customer_id)
+        sales_orders = sales_orders.filter(customer_id=customer_id)
+        invoices = invoices.filter(customer_id=customer_id)
+
+    quote_totals = quotations.aggregate(count=Count('id'), value=Sum('total'))
+    order_totals = sales_orders.aggregate(count=Count('id'), value=Sum('total'))
+    invoice_totals = invoices.aggregate(count=Count('id'), value=Sum('total'), paid=Sum('paid_amount'))
+    total_quotations = quote_totals['count']
+    total_sales_orders = order_totals['count']
+    total_invoices = invoice_totals['count']
+    total_invoice_value = invoice_totals['value'] or 0
+    total_paid_amount = invoice_totals['paid'] or 0
+
+    open_q = Q(status__in=OPEN_INVOICE_STATUSES)
+    overdue_q = open_q & Q(due_date__lt=today)
+    receivables = Invoice.objects.filter(company=company).aggregate(
+        open_total=Sum('total', filter=open_q), open_paid=Sum('paid_amount', filter=open_q),
+        overdue_total=Sum('total', filter=overdue_q), overdue_paid=Sum('paid_amount', filter=overdue_q),
+    )
+
+    top_invoiced = list(
+        Invoice.objects.filter(company=company, invoice_date__gte=date_from, invoice_date__lte=date_to)
+        .values('customer_id', 'customer__name')
+        .annotate(total_sales=Sum('total'), total_paid=Sum('paid_amount'))
+        .order_by('-total_sales')[:10]
+    )
+    order_counts = dict(
+        SalesOrder.objects.filter(company=company, customer_id__in=[row['customer_id'] for row in top_invoiced])
+        .values_list('customer_id').annotate(count=Count('id')).order_by()
+    )
+    top_customers = [
+        {
+            'id': row['customer_id'],
+            'name': row['customer__name'],
+            'total_sales': row['total_sales'],
+            'total_paid': row['total_paid'],
+            'total_orders': order_counts.get(row['customer_id'], 0),
+        }
+        for row in top_invoiced
+    ]
+
+    top_products = [
+        {'id': row['product_id'], 'name': row['product__name'], 'total_sold': row['total_sold'], 'order_count': row['order_count']}
+        for row in SalesOrderItem.objects.filter(
+            sales_order__company=company, sales_order__order_date__gte=date_from, sales_order__order_date__lte=date_to,
+        )
+        .values('product_id', 'product__name')
+        .annotate(total_sold=Sum('line_total'), order_count=Count('sales_order', distinct=True))
+        .order_by('-total_sold')[:10]
+    ]
+
+    months = _trend_months(today)
+    sales_by_month = {
+        _month_key(row['month']): row['total'] or 0
+        for row in SalesOrder.objects.filter(company=company, order_date__gte=months[0])
+        .annotate(month=TruncMonth('order_date')).values('month').annotate(total=Sum('total')).order_by()
+    }
+    quotes_by_month = {
+        _month_key(row['month']): row['count']
+        for row in Quotation.objects.filter(company=company, date__gte=months[0])
+        .annotate(month=TruncMonth('date')).values('month').annotate(count=Count('id')).order_by()
+    }
+    monthly_sales = [
+        {'month': m.strftime('%b %Y'), 'sales': float(sales_by_month.get(m, 0)), 'quotes': quotes_by_month.get(m, 0)}
+        for m in months
+    ]
+
+    return {
+        'total_quotations': total_quotations,
+        'total_quotation_value': quote_totals['value'] or 0,
+        'total_sales_orders': total_sales_orders,
+        'total_sales_value': order_totals['value'] or 0,
+        'total_invoices': total_invoices,
+        'total_invoice_value': total_invoice_value,
+        'total_paid_amount': total_paid_amount,
+        'outstanding_invoices': (receivables['open_total'] or 0) - (receivables['open_paid'] or 0),
+        'overdue_invoices': (receivables['overdue_total'] or 0) - (receivables['overdue_paid'] or 0),
+        'quotation_to_order_rate': (total_sales_orders / total_quotations * 100) if total_quotations > 0 else 0,
+        'order_to_invoice_rate': (total_invoices / total_sales_orders * 100) if total_sales_orders > 0 else 0,
+        'payment_collection_rate': (total_paid_amount / total_invoice_value * 100) if total_invoice_value > 0 else 0,
+        'top_customers': top_customers,
+        'top_products': top_products,
+        'monthly_sales': json.dumps(monthly_sales),
+        'quotation_status_breakdown': _status_breakdown(quotations, QUOTATION_STATUS_CHOICES),
+        'sales_order_status_breakdown': _status_breakdown(sales_orders, SALES_ORDER_STATUS_CHOICES),
+    }
+
+
+def get_sales_report(company, date_from, date_to, customer_id=None, today=None):
+    today = today or date.today()
+    return company_cache.get_or_compute(
+        CACHE_NAMESPACE, company.id,
+        lambda: compute_sales_report(company, date_from, date_to, customer_id, today),
+        date_from, date_to, customer_id or None, today,
+    )
+
+
+def invalidate_sales_report(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    company_id = getattr(instance, 'company_id', None)
+    if company_id is None and getattr(instance, 'sales_order_id', None):
+        from .models import SalesOrder
+        company_id = SalesOrder.objects.filter(pk=instance.sales_order_id).values_list('company_id', flat=True).first()
+    company_cache.invalidate(CACHE_NAMESPACE, company_id)
+
+
+def invalidate_after_import(sender, company_id, **kwargs):
+    if sender._meta.label in SOURCE_MODELS:
+        company_cache.invalidate(CACHE_NAMESPACE, company_id)
+
+
+def connect_signals():
+    from core.imports import records_imported
+    for sender in SOURCE_MODELS:
+        post_save.connect(invalidate_sales_report, sender=sender, dispatch_uid=f'sales_report_{sender}_save')
+        post_delete.connect(invalidate_sales_report, sender=sender, dispatch_uid=f'sales_report_{sender}_delete')
+    records_imported.connect(invalidate_after_import, dispatch_uid='sales_report_imported')
@@ -1,3 +1,47 @@
+from datetime import date, timedelta
+
 from django.test import TestCase
 
-# Create your tests here.
+from user_auth.models import Company
+from crm.models import Customer
+from sales.models import Invoice, Quotation
+from sales.reports import compute_sales_report
+
+
+class SalesReportTests(TestCase):
+    """sales.reports - SalesReportPageView's figures in a fixed number of queries."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name='Test Shop')
+        self.customer = Customer.objects.create(company=self.company, name='Walk-in')
+        self.today = date(2026, 3, 15)
+
+    def test_query_count_does_not_depend_on_the_range(self):
+        for months_back in (0, 1, 5):
+            Quotation.objects.create(
+                company=self.company, customer=self.customer, status='sent',
+                date=self.today - timedelta(days=31 * months_back),
+            )
+        Invoice.objects.create(company=self.company, customer=self.customer, status='sent', total=50, invoice_date=self.today)
+        with self.assertNumQueries(11):
+            compute_sales_report(self.company, date(2025, 1, 1), self.today, today=self.today)
+        with self.assertNumQueries(11):
+            report = compute_sales_report(self.company, self.today.replace(day=1), self.today, today=self.today)
+
+        self.assertEqual(report['total_quotations'], 1)
+        self.assertEqual(report['quotation_status_breakdown']['Sent'], 1)
+        self.assertEqual(report['quotation_status_breakdown']['Draft'], 0)
+
+    def test_top_customer_total_is_not_multiplied_by_order_count(self):
+        from sales.models import SalesOrder
+        for _ in range(3):
+            SalesOrder.objects.create(company=self.company, customer=self.customer, order_date=self.today)
+        Invoice.objects.create(
+            company=self.company, customer=self.customer, status='sent', total=100,
+            invoice_date=self.today, due_date=self.today - timedelta(days=1),
+        )
+        report = compute_sales_report(self.company, self.today.replace(day=1), self.today, today=self.today)
+
+        top = report['top_customers'][0]
+        self.assertEqual((top['total_sales'], top['total_orders']), (100, 3))
+        self.assertEqual(report['overdue_invoices'], 100)
@@ -30,43 +30,10 @@ def sales_dashboard(request):
     """Enhanced Sales module dashboard with comprehensive metrics"""
     company = request.user.company
     
-    # Key metrics
-    total_products = Product.objects.filter(company=company, is_active=True).count()
-    total_quotations = Quotation.objects.filter(company=company).count()
-    total_sales_orders = SalesOrder.objects.filter(company=company).count()
-    total_invoices = Invoice.objects.filter(company=company).count()
-    total_delivery_notes = DeliveryNote.objects.filter(company=company).count()
-    
-    # Status-based counts
-    pending_quotations = Quotation.objects.filter(company=company, status='draft').count()
-    pending_orders = SalesOrder.objects.filter(company=company, status='pending').count()
-    overdue_invoices = Invoice.objects.filter(company=company, status='overdue').count()
-    
-    # Monthly statistics
-    current_month = timezone.now().replace(day=1)
-    monthly_quotations = Quotation.objects.filter(
-        company=company, 
-        created_at__gte=current_month
-    ).count()
-    
-    monthly_sales = SalesOrder.objects.filter(
-        company=company, 
-        created_at__gte=current_month
-    ).aggregate(total=Sum('total'))['total'] or 0
-    
-    monthly_revenue = Invoice.objects.filter(
-        company=company,
-        invoice_date__gte=current_month.date(),
-        status__in=['paid', 'partially_paid']
-    ).aggregate(total=Sum('paid_amount'))['total'] or 0
-    
-    # Outstanding amounts
-    outstanding_invoices = Invoice.objects.filter(
-        company=company,
-        status__in=['sent', 'partially_paid']
-    ).aggregate(
-        total_outstanding=Sum('total') - Sum('paid_amount')
-    )['total_outstanding'] or 0
+    # Headline counts/sums - registered in sales/dashboard_metrics.py, computed in one
+    # conditional aggregate per model and cached (core/dashboard_metrics.py)
+    from core.dashboard_metrics import get_metrics
+    metrics = get_metrics('sales', company)
     
     # Recent activities
     recent_quotations = Quotation.objects.filter(company=company).select_related('customer').order_by('-created_at')[:5]
@@ -82,18 +49,7 @@ def sales_dashboard(request):
     ).order_by('-total_sales')[:5]
     
     context = {
-        'total_products': total_products,
-        'total_quotations': total_quotations,
-        'total_sales_orders': total_sales_orders,
-        'total_invoices': total_invoices,
-        'total_delivery_notes': total_delivery_notes,
-        'pending_quotations': pending_quotations,
-        'pending_orders': pending_orders,
-        'overdue_invoices': overdue_invoices,
-        'monthly_quotations': monthly_quotations,
-        'monthly_sales': monthly_sales,
-        'monthly_revenue': monthly_revenue,
-        'outstanding_invoices': outstanding_invoices,
+        **metrics,
         'recent_quotations': recent_quotations,
         'recent_orders': recent_orders,
         'recent_invoices': recent_invoices,
@@ -651,126 +607,11 @@ class SalesReportPageView(LoginRequiredMixin, TemplateView):
             date_from_parsed = first_day_month
             date_to_parsed = today
         
-        # Base querysets for the period
-        quotations = Quotation.objects.filter(
-            company=company,
-            date__gte=date_from_parsed,
-            date__lte=date_to_parsed
-        )
-        
-        sales_orders = SalesOrder.objects.filter(
-            company=company,
-            order_date__gte=date_from_parsed,
-            order_date__lte=date_to_parsed
-        )
-        
-        invoices = Invoice.objects.filter(
-            company=company,
-            invoice_date__gte=date_from_parsed,
-            invoice_date__lte=date_to_parsed
-        )
-        
-        # Apply filters
-        if customer_filter:
-            quotations = quotations.filter(customer_id=customer_filter)
-            sales_orders = sales_orders.filter(customer_id=customer_filter)
-            invoices = invoices.filter(customer_id=customer_filter)
-        
-        # Sales Performance Metrics
-        total_quotations = quotations.count()
-        total_quotation_value = quotations.aggregate(total=Sum('total'))['total'] or 0
-        
-        total_sales_orders = sales_orders.count()
-        total_sales_value = sales_orders.aggregate(total=Sum('total'))['total'] or 0
-        
-        total_invoices = invoices.count()
-        total_invoice_value = invoices.aggregate(total=Sum('total'))['total'] or 0
-        total_paid_amount = invoices.aggregate(total=Sum('paid_amount'))['total'] or 0
-        
-        # Conversion rates
-        quotation_to_order_rate = (total_sales_orders / total_quotations * 100) if total_quotations > 0 else 0
-        order_to_invoice_rate = (total_invoices / total_sales_orders * 100) if total_sales_orders > 0 else 0
-        payment_collection_rate = (total_paid_amount / total_invoice_value * 100) if total_invoice_value > 0 else 0
-        
-        # Top performing customers
-        top_customers = Customer.objects.filter(
-            company=company,
-            invoices__invoice_date__gte=date_from_parsed,
-            invoices__invoice_date__lte=date_to_parsed
-        ).annotate(
-            total_sales=Sum('invoices__total'),
-            total_orders=Count('sales_orders', distinct=True),
-            total_paid=Sum('invoices__paid_amount')
-        ).order_by('-total_sales')[:10]
-        
-        # Top performing products - fix the annotation
-        # We need to aggregate from sales order items for actual sales
-        from django.db.models import F
-        top_products = Product.objects.filter(
-            company=company,
-            salesorderitem__sales_order__created_at__gte=date_from_parsed,
-            salesorderitem__sales_order__created_at__lte=date_to_parsed
-        ).annotate(
-            total_sold=Sum('salesorderitem__line_total'),
-            order_count=Count('salesorderitem__sales_order', distinct=True)
-        ).order_by('-total_sold')[:10]
-        
-        # Monthly trends (last 12 months)
-        monthly_sales = []
-        monthly_quotes = []
-        for i in range(12):
-            month_start = (today.replace(day=1) - timedelta(days=32*i)).replace(day=1)
-            month_end = (month_start.replace(month=month_start.month % 12 + 1) - timedelta(days=1)) if month_start.month < 12 else month_start.replace(year=month_start.year + 1, month=1) - timedelta(days=1)
-            
-            month_sales = SalesOrder.objects.filter(
-                company=company,
-                order_date__gte=month_start,
-                order_date__lte=month_end
-            ).aggregate(total=Sum('total'))['total'] or 0
-            
-            month_quotes = Quotation.objects.filter(
-                company=company,
-                date__gte=month_start,
-                date__lte=month_end
-            ).count()
-            
-            monthly_sales.append({
-                'month': month_start.strftime('%b %Y'),
-                'sales': float(month_sales),
-                'quotes': month_quotes
-            })
-        
-        monthly_sales.reverse()
-        
-        # Sales by status
-        quotation_status_breakdown = {}
-        for choice in QUOTATION_STATUS_CHOICES:
-            quotation_status_breakdown[choice[1]] = quotations.filter(status=choice[0]).count()
-        
-        sales_order_status_breakdown = {}
-        for choice in SALES_ORDER_STATUS_CHOICES:
-            sales_order_status_breakdown[choice[1]] = sales_orders.filter(status=choice[0]).count()
-        
-        # Outstanding receivables
-        outstanding_invoices_data = Invoice.objects.filter(
-            company=company,
-            status__in=['sent', 'partially_paid']
-        ).aggregate(
-            total_amount=Sum('total'),
-            paid_amount=Sum('paid_amount')
-        )
-        outstanding_invoices = (outstanding_invoices_data['total_amount'] or 0) - (outstanding_invoices_data['paid_amount'] or 0)
-        
-        overdue_invoices_data = Invoice.objects.filter(
-            company=company,
-            due_date__lt=today,
-            status__in=['sent', 'partially_paid']
-        ).aggregate(
-            total_amount=Sum('total'),
-            paid_amount=Sum('paid_amount')
-        )
-        overdue_invoices = (overdue_invoices_data['total_amount'] or 0) - (overdue_invoices_data['paid_amount'] or 0)
-        
+        # All report figures come from sales/reports.py - a fixed number of grouped
+        # queries regardless of the range, cached per company and filter set.
+        from .reports import get_sales_report
+        report = get_sales_report(company, date_from_parsed, date_to_parsed, customer_filter, today)
+
         # Get dropdown data
         customers = Customer.objects.filter(company=company).order_by('name')
         products = Product.objects.filter(company=company, is_active=True).order_by('name')
@@ -783,32 +624,8 @@ class SalesReportPageView(LoginRequiredMixin, TemplateView):
             'current_product': product_filter,
             'customers': customers,
             'products': products,
-            
-            # Performance Metrics
-            'total_quotations': total_quotations,
-            'total_quotation_value': total_quotation_value,
-            'total_sales_orders': total_sales_orders,
-            'total_sales_value': total_sales_value,
-            'total_invoices': total_invoices,
-            'total_invoice_value': total_invoice_value,
-            'total_paid_amount': total_paid_amount,
-            'outstanding_invoices': outstanding_invoices,
-            'overdue_invoices': overdue_invoices,
-            
-            # Conversion Rates
-            'quotation_to_order_rate': quotation_to_order_rate,
-            'order_to_invoice_rate': order_to_invoice_rate,
-            'payment_collection_rate': payment_collection_rate,
-            
-            # Top Performers
-            'top_customers': top_customers,
-            'top_products': top_products,
-            
-            # Trends and Breakdowns
-            'monthly_sales': json.dumps(monthly_sales),
-            'quotation_status_breakdown': quotation_status_breakdown,
-            'sales_order_status_breakdown': sales_order_status_breakdown,
         })
+        context.update(report)
         return context
 
 class QuotationPageView(LoginRequiredMixin, TemplateView):
@@ -1341,40 +1158,27 @@ def delivery_notes_create(request):
 
 @login_required
 def delivery_notes_export(request):
-    """Export delivery notes to CSV"""
-    import csv
-    from django.http import HttpResponse
-    
+    """Export delivery notes to CSV (streamed - see core.exports)"""
+    from core.exports import Column, Sheet, stream_csv
+
     company = request.user.company
     delivery_notes = DeliveryNote.objects.filter(company=company).select_related(
         'customer', 'sales_order'
     ).order_by('-created_at')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="delivery_notes.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Delivery Number', 'Customer', 'Sales Order', 'Delivery Date',
-        'Status', 'Transporter', 'Vehicle Number', 'Driver Name',
-        'Tracking Number', 'Created Date'
-    ])
-    
-    for dn in delivery_notes:
-        writer.writerow([
-            dn.delivery_number,
-            dn.customer.name,
-            dn.sales_order.order_number if dn.sales_order else 'Direct',
-            dn.delivery_date.strftime('%Y-%m-%d'),
-            dn.get_status_display(),
-            dn.transporter_name,
-            dn.vehicle_number,
-            dn.driver_name,
-            dn.tracking_number,
-            dn.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-    
-    return response
+
+    columns = [
+        Column('Delivery Number', 'delivery_number'),
+        Column('Customer', 'customer__name'),
+        Column('Sales Order', lambda dn: dn.sales_order.order_number if dn.sales_order else 'Direct'),
+        Column('Delivery Date', lambda dn: dn.delivery_date.strftime('%Y-%m-%d')),
+        Column('Status', 'get_status_display'),
+        Column('Transporter', 'transporter_name'),
+        Column('Vehicle Number', 'vehicle_number'),
+        Column('Driver Name', 'driver_name'),
+        Column('Tracking Number', 'tracking_number'),
+        Column('Created Date', lambda dn: dn.created_at.strftime('%Y-%m-%d %H:%M')),
+    ]
+    return stream_csv('delivery_notes.csv', Sheet('Delivery Notes', columns, delivery_notes))
 
 class InvoicePageView(LoginRequiredMixin, TemplateView):
     template_name = 'sales/invoice_list.html'
@@ -2184,38 +1988,26 @@ def payments_edit(request, pk):
 
 @login_required
 def payments_export(request):
-    """Export payments to CSV"""
-    import csv
-    from django.http import HttpResponse
-    
+    """Export payments to CSV (streamed - see core.exports)"""
+    from core.exports import Column, Sheet, stream_csv
+
     company = request.user.company
     payments = Payment.objects.filter(company=company).select_related(
         'customer', 'invoice', 'received_by'
     ).order_by('-created_at')
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="payments.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Payment Number', 'Customer', 'Invoice', 'Amount', 'Method',
-        'Payment Date', 'Reference', 'Received By', 'Created Date'
-    ])
-    
-    for payment in payments:
-        writer.writerow([
-            payment.payment_number,
-            payment.customer.name if payment.customer else 'N/A',
-            payment.invoice.invoice_number if payment.invoice else 'Advance',
-            payment.amount,
-            payment.get_method_display(),
-            payment.payment_date.strftime('%Y-%m-%d'),
-            payment.reference,
-            payment.received_by.email if payment.received_by else 'N/A',
-            payment.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-    
-    return response
+
+    columns = [
+        Column('Payment Number', 'payment_number'),
+        Column('Customer', lambda p: p.customer.name if p.customer else 'N/A'),
+        Column('Invoice', lambda p: p.invoice.invoice_number if p.invoice else 'Advance'),
+        Column('Amount', 'amount'),
+        Column('Method', 'get_method_display'),
+        Column('Payment Date', lambda p: p.payment_date.strftime('%Y-%m-%d')),
+        Column('Reference', 'reference'),
+        Column('Received By', lambda p: p.received_by.email if p.received_by else 'N/A'),
+        Column('Created Date', lambda p: p.created_at.strftime('%Y-%m-%d %H:%M')),
+    ]
+    return stream_csv('payments.csv', Sheet('Payments', columns, payments))
 
 # Credit Note Views
 class CreditNotePageView(LoginRequiredMixin, TemplateView):
@@ -97,6 +97,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'user_auth.middleware.ActivityLogMiddleware',  # Activity log middleware
     'core.desktop_sync_middleware.DesktopSyncQueueMiddleware',  # Phase C outbox capture - no-ops unless IS_DESKTOP
+    'core.instrumentation.QueryInstrumentationMiddleware',  # per-view query stats - no-ops unless QUERY_INSTRUMENTATION['ENABLED']
 ]
 
 # True only under the desktop app's frozen desktop_server.py entry point - gates the
@@ -107,6 +108,16 @@ MIDDLEWARE = [
 # being the desktop app).
 IS_DESKTOP = env.bool('USE_SQLITE', default=False)
 
+# Numbers per in-process block for gap-tolerant document sequences (core.numbering's
+# block pool) - 0 keeps every sequence on the one-locked-row-per-number path. Always
+# off on the desktop app: seed_device_ranges() moves its counters into the device's
+# reserved range, which numbers already pooled below that floor would escape.
+NUMBER_BLOCK_SIZE = 0 if IS_DESKTOP else env.int('NUMBER_BLOCK_SIZE', default=0)
+
+# How long a completed client_request_id is remembered (core.idempotency) - long enough
+# to outlast any offline device's retry window; purge_idempotency_keys deletes older rows.
+IDEMPOTENCY_KEY_TTL_DAYS = env.int('IDEMPOTENCY_KEY_TTL_DAYS', default=30)
+
 ROOT_URLCONF = 'setting.urls'
 
 TEMPLATES = [
@@ -279,6 +290,38 @@ else:
         },
     }
 
+# ActivityLogMiddleware's buffered writer (user_auth/activity_log.py, which documents
+# every key and its default). Unbuffered on Vercel - see that module for why.
+ACTIVITY_LOG = {
+    'BUFFERED': env.bool('ACTIVITY_LOG_BUFFERED', default=not IS_PRODUCTION),
+    'READ_SAMPLE_RATE': env.float('ACTIVITY_LOG_READ_SAMPLE_RATE', default=1.0),
+}
+
+# Spreadsheet imports (core/imports.py, which documents every key and its default).
+# Run inline on Vercel - see that module for why.
+IMPORT_PIPELINE = {
+    'BACKGROUND': env.bool('IMPORT_BACKGROUND', default=not IS_PRODUCTION),
+    'CHUNK_SIZE': env.int('IMPORT_CHUNK_SIZE', default=500),
+}
+
+# Bill matching tolerances (purchase/matching.py), in percent of the PO price/quantity
+# (PRICE_TOLERANCE_AMOUNT in currency). 0 = bills may not exceed the PO/GRN at all.
+PURCHASE_MATCHING = {
+    'QUANTITY_TOLERANCE_PERCENT': env.float('MATCH_QUANTITY_TOLERANCE_PERCENT', default=0),
+    'PRICE_TOLERANCE_PERCENT': env.float('MATCH_PRICE_TOLERANCE_PERCENT', default=0),
+    'PRICE_TOLERANCE_AMOUNT': env.float('MATCH_PRICE_TOLERANCE_AMOUNT', default=0),
+}
+
+# Per-view query count/latency instrumentation (core/instrumentation.py, which documents
+# every key and its default). Off unless QUERY_INSTRUMENTATION=True - meant for staging,
+# or briefly on production while chasing a slow screen. Budgets are keyed by URL name,
+# e.g. {'core-search': {'queries': 5, 'ms': 300}}.
+QUERY_INSTRUMENTATION = {
+    'ENABLED': env.bool('QUERY_INSTRUMENTATION', default=False),
+    'DEFAULT_BUDGET': {'queries': env.int('QUERY_BUDGET_QUERIES', default=50), 'ms': env.int('QUERY_BUDGET_MS', default=1000)},
+    'BUDGETS': {},
+}
+
 # Cache configuration
 if IS_PRODUCTION:
     CACHES = {
@@ -293,6 +336,25 @@ else:
         }
     }
 
+# Dashboard metrics (core/dashboard_metrics.py) get their own cache alias, independent of
+# the DummyCache 'default' above, so dashboards are cache hits everywhere. Any
+# django-environ cache URL works: locmemcache:// (per process - invalidation only
+# reaches the process that saw the write, other workers catch up on the TTL),
+# filecache:///var/tmp/erp-dashboard (shared by every worker on the host) or
+# rediscache://127.0.0.1:6379/1.
+CACHES['dashboard'] = env.cache_url('DASHBOARD_CACHE_URL', default='locmemcache://dashboard-metrics')
+DASHBOARD_METRICS_TIMEOUT = env.int('DASHBOARD_METRICS_TIMEOUT', default=300)
+
+# Per-company report caches (core/company_cache.py - inventory analytics, sales reports,
+# manufacturing KPIs). Same trade-off as above: the default mirrors 'default' (nothing
+# cached in development, per-process locmem in production, so a write invalidates only
+# the worker that made it and the others serve their copy until its TTL). Point
+# COMPANY_CACHE_URL at a shared backend - filecache:// or rediscache:// - for
+# invalidation that reaches every worker.
+CACHES['company'] = env.cache_url(
+    'COMPANY_CACHE_URL', default='locmemcache://company-cache' if IS_PRODUCTION else 'dummycache://',
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,177 @@
+"""
+Buffered writer for ActivityLog - takes the audit INSERT off every authenticated
+request's critical path.
+
+ActivityLogMiddleware used to run ActivityLog.objects.create() inline in process_view(),
+so every request (including the read-only polling the dashboards and lock screens do
+every few seconds) paid for a synchronous DB write before its view even started. It now
+hands an unsaved ActivityLog to `record()`, which:
+
+- drops it if the path is excluded (EXCLUDE_PREFIXES for every method, EXCLUDE_READ_
+  PREFIXES for GET/HEAD/OPTIONS only - polling endpoints), or if it's a read request
+  that loses the READ_SAMPLE_RATE draw. Writes are never sampled - they're the part of
+  the trail anyone actually audits.
+- otherwise appends it to a bounded in-memory buffer. A daemon thread bulk_create()s
+  the buffer every FLUSH_SECONDS, or as soon as BATCH_SIZE entries are waiting. If the
+  buffer is full (MAX_QUEUE - the DB is down or far behind) the entry is dropped and
+  counted rather than letting memory grow without bound.
+
+A batch the database can't take right now (OperationalError/InterfaceError - locked,
+down, connection lost) goes back to the front of the buffer, still capped at MAX_QUEUE
+with the oldest entries dropped first, and is retried on the next flush. A batch
+rejected for its data (an IntegrityError, say from a since-deleted user) would fail
+the same way forever, so it is logged and dropped.
+
+`stats()` exposes the enqueued/written/dropped/sampled-out/failed/requeued counters.
+Whatever is still buffered at interpreter exit is flushed by an atexit hook.
+
+BUFFERED is off on Vercel (settings.IS_PRODUCTION): a serverless instance is frozen as
+soon as its response is sent, so a background thread there can't be relied on to ever
+flush - the middleware keeps writing synchronously in that case, just with the same
+exclusion/sampling rules applied.
+
+All settings live in the settings.ACTIVITY_LOG dict; any key left out falls back to
+DEFAULTS below.
+"""
+import atexit
+import logging
+import random
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BUFFERED': True,
+    'BATCH_SIZE': 200,
+    'FLUSH_SECONDS': 5.0,
+    'MAX_QUEUE': 10000,
+    'READ_SAMPLE_RATE': 1.0,
+    'EXCLUDE_PREFIXES': ('/admin', '/static', '/media'),
+    'EXCLUDE_READ_PREFIXES': ('/api/analytics/dashboard/', '/inventory/locks/status/'),
+}
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def config(name):
+    return getattr(settings, 'ACTIVITY_LOG', {}).get(name, DEFAULTS[name])
+
+
+def should_log(method, path):
+    """Exclusion and sampling rules - see the module docstring."""
+    if path.startswith(tuple(config('EXCLUDE_PREFIXES'))):
+        return False
+    if method in READ_METHODS:
+        if path.startswith(tuple(config('EXCLUDE_READ_PREFIXES'))):
+            return False
+        rate = config('READ_SAMPLE_RATE')
+        if rate < 1 and random.random() >= rate:
+            _buffer.count('sampled_out')
+            return False
+    return True
+
+
+class ActivityLogBuffer:
+    """The bounded buffer plus its flusher thread, started lazily on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._thread = None
+        self._counters = dict(enqueued=0, written=0, dropped=0, sampled_out=0, failed=0, requeued=0)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending))
+
+    def add(self, entry):
+        with self._lock:
+            if len(self._pending) >= config('MAX_QUEUE'):
+                self._counters['dropped'] += 1
+                return False
+            self._pending.append(entry)
+            self._counters['enqueued'] += 1
+            full = len(self._pending) >= config('BATCH_SIZE')
+            self._ensure_thread()
+        if full:
+            self._wake.set()
+        return True
+
+    def _ensure_thread(self):
+        # Called with self._lock held.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='activity-log-flusher')
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=config('FLUSH_SECONDS'))
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far. Safe to call from any thread."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        from django.db import InterfaceError, OperationalError, connection, transaction
+        from .models import ActivityLog
+        try:
+            # all or nothing, so a retried batch never duplicates rows already written
+            with transaction.atomic():
+                ActivityLog.objects.bulk_create(batch, batch_size=config('BATCH_SIZE'))
+        except (OperationalError, InterfaceError) as exc:
+            logger.warning('Activity log: %d entries not written, retrying on the next flush: %s', len(batch), exc)
+            self._requeue(batch)
+            return 0
+        except Exception:
+            logger.exception('Activity log: dropping %d entries the database rejected', len(batch))
+            self.count('failed', len(batch))
+            return 0
+        finally:
+            # This thread's own connection - never handed back to a request cycle, so
+            # close it here rather than leaving it open between flushes.
+            if threading.current_thread() is self._thread:
+                connection.close()
+        self.count('written', len(batch))
+        return len(batch)
+
+    def _requeue(self, batch):
+        for entry in batch:
+            # bulk_create may have assigned ids before the rollback
+            entry.pk = None
+            entry._state.adding = True
+        with self._lock:
+            pending = batch + self._pending
+            overflow = max(len(pending) - config('MAX_QUEUE'), 0)
+            self._pending = pending[overflow:]
+            self._counters['dropped'] += overflow
+            self._counters['requeued'] += len(batch)
+
+
+_buffer = ActivityLogBuffer()
+
+
+def record(entry):
+    """Queues an unsaved ActivityLog, or saves it immediately when BUFFERED is off."""
+    if config('BUFFERED'):
+        return _buffer.add(entry)
+    entry.save()
+    return True
+
+
+def flush():
+    return _buffer.flush()
+
+
+def stats():
+    return _buffer.stats()
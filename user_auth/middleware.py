@@ -1,18 +1,18 @@
 from django.utils.deprecation import MiddlewareMixin
 from .models import ActivityLog
+from . import activity_log
 
 class ActivityLogMiddleware(MiddlewareMixin):
     def process_view(self, request, view_func, view_args, view_kwargs):
-        # Exclude admin, static, and media paths
-        if request.path.startswith('/admin') or request.path.startswith('/static') or request.path.startswith('/media'):
+        # Exclusion/sampling rules and the buffered write live in user_auth/activity_log.py
+        if not request.user.is_authenticated or not activity_log.should_log(request.method, request.path):
             return None
-        if request.user.is_authenticated:
-            ActivityLog.objects.create(
-                user=request.user,
-                action=f"{request.method} {request.path}",
-                details=f"View: {view_func.__module__}.{view_func.__name__}",
-                ip_address=self.get_client_ip(request)
-            )
+        activity_log.record(ActivityLog(
+            user=request.user,
+            action=f"{request.method} {request.path}",
+            details=f"View: {view_func.__module__}.{view_func.__name__}",
+            ip_address=self.get_client_ip(request)
+        ))
         return None
 
     def get_client_ip(self, request):
@@ -21,4 +21,4 @@ class ActivityLogMiddleware(MiddlewareMixin):
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip 
\ No newline at end of file
+        return ip
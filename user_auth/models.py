@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from core.models import SoftDeleteQuerySetMixin
 
@@ -84,7 +85,10 @@ class ActivityLog(models.Model):
     action = models.CharField(max_length=255)
     details = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # default=timezone.now rather than auto_now_add: entries are built at request time
+    # but written later in a batch (user_auth/activity_log.py), and auto_now_add would
+    # stamp them with the flush time instead.
+    created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.user} - {self.action} @ {self.created_at}"
@@ -1,3 +1,41 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from user_auth import activity_log
+from user_auth.models import ActivityLog
+
+
+@override_settings(ACTIVITY_LOG={'BATCH_SIZE': 1000, 'FLUSH_SECONDS': 3600, 'MAX_QUEUE': 2})
+class ActivityLogBufferTests(TestCase):
+    """user_auth.activity_log - exclusion rules, the bounded buffer and its batch flush.
+    The flusher thread's interval is pushed out of reach so flush() runs here, inside
+    the test's own transaction."""
+
+    def test_polling_reads_are_excluded_but_writes_are_not(self):
+        self.assertFalse(activity_log.should_log('GET', '/inventory/locks/status/'))
+        self.assertTrue(activity_log.should_log('POST', '/inventory/locks/status/'))
+        self.assertFalse(activity_log.should_log('POST', '/static/app.js'))
+
+    def test_full_buffer_drops_and_counts(self):
+        buffer = activity_log.ActivityLogBuffer()
+        results = [buffer.add(ActivityLog(action=f'GET /{i}')) for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(buffer.stats()['dropped'], 1)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(buffer.stats()['pending'], 0)
+
+    def test_failed_batch_is_retried_on_the_next_flush(self):
+        buffer = activity_log.ActivityLogBuffer()
+        buffer.add(ActivityLog(action='POST /a'))
+        with mock.patch.object(ActivityLog.objects, 'bulk_create', side_effect=OperationalError('database table is locked')):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.add(ActivityLog(action='POST /b'))
+        self.assertFalse(buffer.add(ActivityLog(action='POST /c')))  # the retried entry still counts
+        self.assertEqual((buffer.stats()['pending'], buffer.stats()['requeued']), (2, 1))
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(sorted(ActivityLog.objects.values_list('action', flat=True)), ['POST /a', 'POST /b'])